@@ -0,0 +1,308 @@
+import os
+import io
+import json
+import time
+import zlib
+import shutil
+import tarfile
+import fnmatch
+import hashlib
+import tempfile
+import uuid
+import itertools
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from sync_engine import file_hash
+from storage_manager import EXEMPT_PREFIXES
+
+ARCHIVE_VERSION = 1
+CHUNK = 1024 * 1024
+# Already compressed media is stored as is
+STORED_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.gif', '.webp', '.webm', '.mp4', '.mp3', '.ogg', '.zip', '.gz'}
+PROGRESS_INTERVAL = 0.1
+# Members compressed ahead of the tar writer; each holds one temp file open
+EXPORT_WINDOW = 8
+# Never part of an archive even though they live in the data dir
+SKIPPED_DIRS = ("assets/", "snapshots/", "cache/", "quarantine/", "diagnostics/", "jobs/", ".sync/", ".chomka-sync/",
+                "extensions/")
+SKIPPED_FILES = ("chomka.log", "*.tmp")
+# Never written by an import; extensions/ is code the extension host would run
+REJECTED_DIRS = tuple(d for d in SKIPPED_DIRS if d != "assets/")
+
+
+class ArchiveError(Exception):
+    pass
+
+
+def _safe_member(name):
+    """Archive member names must stay inside the data dir."""
+    parts = name.split('/')
+    if name.startswith('/') or '\\' in name or any(p in ('', '.', '..') for p in parts) or ':' in parts[0]:
+        raise ArchiveError(f"Unsafe path in archive: {name}")
+    return name
+
+
+def _staging_path(target):
+    """A temp name next to target that no other writer (autosave, sync) uses."""
+    directory, name = os.path.split(target)
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, f".{name}.{uuid.uuid4().hex[:12]}.tmp")
+
+
+def _compress_to_temp(path, compress):
+    """Streams path into a temp file (gzip or stored) and hashes the original."""
+    digest = hashlib.sha256()
+    size = 0
+    tmp = tempfile.TemporaryFile()
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None  # 31: gzip container
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK), b''):
+            digest.update(chunk)
+            size += len(chunk)
+            tmp.write(compressor.compress(chunk) if compressor else chunk)
+    if compressor:
+        tmp.write(compressor.flush())
+    tmp.seek(0)
+    return tmp, size, digest.hexdigest()
+
+
+class Progress:
+    """Throttled progress events for the page."""
+
+    def __init__(self, api, operation, total_bytes):
+        self.api = api
+        self.operation = operation
+        self.total_bytes = total_bytes
+        self.done_bytes = 0
+        self._last = 0.0
+
+    def advance(self, size, current, force=False):
+        self.done_bytes += size
+        now = time.time()
+        if force or now - self._last >= PROGRESS_INTERVAL:
+            self._last = now
+            self.api._push_archive_progress({
+                'operation': self.operation, 'file': current,
+                'done': self.done_bytes, 'total': self.total_bytes,
+            })
+
+
+class ArchiveManager:
+    """Exports the data dir (state plus referenced assets) to one tar file and
+    imports it again.
+
+    Layout: manifest.json first, then assets/, then state files. Members are
+    gzip-compressed individually, in parallel, so neither side ever holds a
+    whole file in memory and import can decide per asset before reading it.
+    Export hashes every file for the manifest first, then compresses a few
+    members ahead of the tar writer, so only EXPORT_WINDOW temp files exist
+    at a time.
+    """
+
+    def __init__(self, api, workers=None):
+        self.api = api
+        self.workers = workers or min(4, os.cpu_count() or 1)
+
+    def _root(self):
+        return self.api._get_share_dir()
+
+    # --- Export ---
+
+    def collect(self):
+        """(kind, rel path) of everything that goes into an archive."""
+        root = self._root()
+        entries = []
+        for dirpath, dirnames, filenames in os.walk(root):
+            rel_dir = os.path.relpath(dirpath, root).replace(os.sep, '/')
+            rel_dir = '' if rel_dir == '.' else rel_dir + '/'
+            dirnames[:] = [d for d in dirnames if not (rel_dir + d + '/').startswith(SKIPPED_DIRS)]
+            for name in sorted(filenames):
+                rel_path = rel_dir + name
+                if not any(fnmatch.fnmatch(rel_path, p) for p in SKIPPED_FILES):
+                    entries.append(('state', rel_path))
+
+        assets_dir = os.path.join(root, "assets")
+        if os.path.isdir(assets_dir):
+            refs = self.api._storage.referenced_assets(include_history=False)
+            for name in sorted(os.listdir(assets_dir)):
+                if name.endswith('.tmp') or not os.path.isfile(os.path.join(assets_dir, name)):
+                    continue
+                if name in refs or name.startswith(EXEMPT_PREFIXES):
+                    entries.append(('asset', f"assets/{name}"))
+        # Assets first so an interrupted import never leaves state pointing at missing files
+        entries.sort(key=lambda e: e[0] != 'asset')
+        return entries
+
+    def _submit_compress(self, pool, root, entry):
+        return pool.submit(_compress_to_temp, os.path.join(root, entry['path']), entry['member'].endswith('.gz'))
+
+    def export(self, dest):
+        root = self._root()
+        entries = self.collect()
+        total = sum(os.path.getsize(os.path.join(root, rel)) for _, rel in entries)
+        progress = Progress(self.api, 'export', total)
+        tmp_dest = dest + ".tmp"
+        created = time.time()
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='chomka-archive') as pool:
+            # Hashes are needed for the manifest, which goes first: hash everything,
+            # then compress again in a bounded window as members are written
+            files = []
+            for (kind, rel), digest in zip(entries, pool.map(lambda e: file_hash(os.path.join(root, e[1])), entries)):
+                size = os.path.getsize(os.path.join(root, rel))
+                compress = os.path.splitext(rel)[1].lower() not in STORED_EXTENSIONS
+                files.append({'path': rel, 'kind': kind, 'size': size, 'sha256': digest,
+                              'member': rel + ('.gz' if compress else '')})
+                progress.advance(size // 2, rel)
+            manifest = {'version': ARCHIVE_VERSION, 'created': created, 'files': files}
+
+            window = deque()
+            try:
+                with tarfile.open(tmp_dest, 'w') as tar:
+                    data = json.dumps(manifest, indent=2).encode('utf-8')
+                    info = tarfile.TarInfo('manifest.json')
+                    info.size = len(data)
+                    info.mtime = int(created)
+                    tar.addfile(info, io.BytesIO(data))
+                    pending = iter(files)
+                    for entry in itertools.islice(pending, EXPORT_WINDOW):
+                        window.append((entry, self._submit_compress(pool, root, entry)))
+                    while window:
+                        entry, future = window.popleft()
+                        rel = entry['path']
+                        tmp, size, digest = future.result()
+                        try:
+                            if (size, digest) != (entry['size'], entry['sha256']):
+                                raise ArchiveError(f"{rel} changed while exporting")
+                            info = tarfile.TarInfo(entry['member'])
+                            info.size = os.fstat(tmp.fileno()).st_size
+                            info.mtime = int(created)
+                            tar.addfile(info, tmp)
+                        finally:
+                            tmp.close()
+                        for entry in itertools.islice(pending, 1):
+                            window.append((entry, self._submit_compress(pool, root, entry)))
+                        progress.advance(size - size // 2, rel)
+                os.replace(tmp_dest, dest)
+            finally:
+                for entry, future in window:
+                    if not future.cancel() and future.exception() is None:
+                        future.result()[0].close()
+                if os.path.exists(tmp_dest):
+                    os.remove(tmp_dest)
+
+        progress.advance(0, None, force=True)
+        self.api.log(f"[Archive] Exported {len(entries)} files ({total} bytes) to {dest}")
+        return {'files': len(entries), 'bytes': total, 'path': dest}
+
+    # --- Import ---
+
+    def _local_assets_by_size(self):
+        assets_dir = os.path.join(self._root(), "assets")
+        by_size = {}
+        if os.path.isdir(assets_dir):
+            for entry in os.scandir(assets_dir):
+                if entry.is_file() and not entry.name.endswith('.tmp'):
+                    by_size.setdefault(entry.stat().st_size, []).append(entry.path)
+        return by_size
+
+    def _find_local_copy(self, entry, by_size, hashes):
+        """A local asset with the same content, hashing only same-sized files."""
+        for path in by_size.get(entry['size'], []):
+            if path not in hashes:
+                hashes[path] = file_hash(path)
+            if hashes[path] == entry['sha256']:
+                return path
+        return None
+
+    def _extract_member(self, fileobj, entry, target):
+        """Streams one member to a temp file next to target and checks its hash."""
+        digest = hashlib.sha256()
+        decompressor = zlib.decompressobj(31) if entry['member'].endswith('.gz') else None
+        tmp_path = _staging_path(target)
+        try:
+            with open(tmp_path, 'wb') as out:
+                for chunk in iter(lambda: fileobj.read(CHUNK), b''):
+                    data = decompressor.decompress(chunk) if decompressor else chunk
+                    digest.update(data)
+                    out.write(data)
+                if decompressor:
+                    data = decompressor.flush()
+                    digest.update(data)
+                    out.write(data)
+            if digest.hexdigest() != entry['sha256']:
+                raise ArchiveError(f"Checksum mismatch for {entry['path']}")
+        except BaseException:
+            # Cut short (truncated archive, cancelled import) or corrupt: leave nothing behind
+            os.remove(tmp_path)
+            raise
+        return tmp_path
+
+    def import_(self, src):
+        root = self._root()
+        staged = []  # (tmp path, final path) of state files, swapped in at the end
+        stats = {'written': 0, 'skipped': 0, 'copied': 0}
+        try:
+            with tarfile.open(src, 'r|') as tar:
+                first = tar.next()
+                if first is None or first.name != 'manifest.json':
+                    raise ArchiveError("Not a Chomka archive (manifest missing)")
+                manifest = json.load(tar.extractfile(first))
+                if manifest.get('version') != ARCHIVE_VERSION:
+                    raise ArchiveError(f"Unsupported archive version {manifest.get('version')}")
+                entries = {e['member']: e for e in manifest['files']}
+                progress = Progress(self.api, 'import', sum(e['size'] for e in entries.values()))
+                by_size = self._local_assets_by_size()
+                hashes = {}
+                seen = set()
+
+                # Stream mode: next() only, iterating would replay the manifest
+                for member in iter(tar.next, None):
+                    entry = entries.get(member.name)
+                    if entry is None or not member.isfile():
+                        raise ArchiveError(f"Unexpected member {member.name}")
+                    rel = _safe_member(entry['path'])
+                    if rel.startswith(REJECTED_DIRS) or (entry['kind'] == 'asset') != rel.startswith("assets/"):
+                        raise ArchiveError(f"Archive may not write {rel}")
+                    target = os.path.join(root, *rel.split('/'))
+                    seen.add(member.name)
+
+                    if entry['kind'] == 'asset':
+                        local = self._find_local_copy(entry, by_size, hashes)
+                        if local and os.path.realpath(local) == os.path.realpath(target):
+                            stats['skipped'] += 1
+                        elif local:
+                            tmp_path = _staging_path(target)
+                            shutil.copyfile(local, tmp_path)
+                            os.replace(tmp_path, target)
+                            self.api._watcher.note_write(target)
+                            stats['copied'] += 1
+                        else:
+                            os.replace(self._extract_member(tar.extractfile(member), entry, target), target)
+                            self.api._watcher.note_write(target)
+                            stats['written'] += 1
+                    else:
+                        staged.append((self._extract_member(tar.extractfile(member), entry, target), target))
+                    progress.advance(entry['size'], rel)
+
+                missing = set(entries) - seen
+                if missing:
+                    raise ArchiveError(f"Archive is truncated ({len(missing)} files missing)")
+
+            # Everything verified: switch the state over, after any save in flight
+            with self.api._state_lock:
+                for tmp_path, target in staged:
+                    os.replace(tmp_path, target)
+                    self.api._watcher.note_write(target)
+                    stats['written'] += 1
+            staged = []
+            progress.advance(0, None, force=True)
+        finally:
+            for tmp_path, target in staged:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+        self.api.log(f"[Archive] Imported {src}: {stats['written']} written, "
+                     f"{stats['skipped']} already present, {stats['copied']} copied from identical local assets")
+        return stats
@@ -0,0 +1,226 @@
+import os
+import re
+import hashlib
+import secrets
+import threading
+import mimetypes
+import urllib.parse
+
+# Files named with a uuid4 hex (assets/<id>_<hex>.<ext>, assets/user_<hex>.<ext>)
+# never change after being written, so they can be cached forever.
+CONTENT_HASHED_RE = re.compile(r'[0-9a-f]{32}\.[A-Za-z0-9]+$')
+CHUNK_SIZE = 256 * 1024
+HASH_LIMIT = 8 * 1024 * 1024
+# The page only loads images, recordings and thumbnails; config.json,
+# workspaces/, the vault and the log are never served
+SERVED_DIRS = ("assets", "cache")
+
+mimetypes.add_type('video/webm', '.webm')
+mimetypes.add_type('image/webp', '.webp')
+
+
+class AssetServer:
+    """Loopback HTTP server that exposes the data directory to the page."""
+
+    def __init__(self, api):
+        self.api = api
+        self.token = secrets.token_urlsafe(16)
+        self._httpd = None
+        self._thread = None
+        self._etag_cache = {}
+        self._etag_lock = threading.Lock()
+
+    @property
+    def is_running(self):
+        return self._httpd is not None
+
+    @property
+    def base_url(self):
+        if not self._httpd:
+            return None
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/{self.token}/"
+
+    def start(self):
+        if self._httpd:
+            return self.base_url
+        # Imported here: http.server is only needed once the server is enabled
+        from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+        handler = type('ChomkaAssetHandler', (_AssetRequestHandler, BaseHTTPRequestHandler), {'server_ref': self})
+        self._httpd = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        self._httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name='chomka-asset-server', daemon=True)
+        self._thread.start()
+        self.api.log(f"[AssetServer] Listening on {self._httpd.server_address[0]}:{self._httpd.server_address[1]}")
+        return self.base_url
+
+    def stop(self):
+        if not self._httpd:
+            return
+        try:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+        except Exception as e:
+            self.api.log(f"[AssetServer] Shutdown error: {e}", "WARNING")
+        self._httpd = None
+        self._thread = None
+
+    def resolve(self, url_path):
+        """Maps a request path to a file under assets/ or cache/, or None."""
+        parts = url_path.split('?', 1)[0].lstrip('/').split('/', 1)
+        if len(parts) != 2 or not secrets.compare_digest(parts[0], self.token):
+            return None
+        rel_path = urllib.parse.unquote(parts[1])
+        share_dir = os.path.realpath(self.api._get_share_dir())
+        full_path = os.path.realpath(os.path.join(share_dir, rel_path))
+        for name in SERVED_DIRS:
+            served_dir = os.path.join(share_dir, name)
+            if os.path.commonpath([served_dir, full_path]) == served_dir and full_path != served_dir:
+                return full_path
+        return None
+
+    def etag_for(self, path, st):
+        """Strong ETag from the file content, cached per (size, mtime).
+
+        Large files (recordings) use size+mtime instead of hashing the whole
+        file on the first request.
+        """
+        key = (st.st_size, st.st_mtime_ns)
+        with self._etag_lock:
+            cached = self._etag_cache.get(path)
+            if cached and cached[0] == key:
+                return cached[1]
+        if st.st_size > HASH_LIMIT:
+            return f'"{st.st_size:x}-{st.st_mtime_ns:x}"'
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                digest.update(chunk)
+        etag = f'"{digest.hexdigest()[:32]}"'
+        with self._etag_lock:
+            self._etag_cache[path] = (key, etag)
+        return etag
+
+
+class _AssetRequestHandler:
+    """Request handling, mixed into BaseHTTPRequestHandler by AssetServer.start()."""
+
+    server_ref = None
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_HEAD(self):
+        self._serve(send_body=False)
+
+    def do_GET(self):
+        self._serve(send_body=True)
+
+    def _serve(self, send_body):
+        path = self.server_ref.resolve(self.path)
+        if not path or not os.path.isfile(path):
+            self.send_error(404)
+            return
+
+        try:
+            st = os.stat(path)
+            etag = self.server_ref.etag_for(path, st)
+        except OSError:
+            self.send_error(404)
+            return
+
+        self.server_ref.api._storage.touch(path)
+        size = st.st_size
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self._send_common_headers(path, etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        start, end = 0, size - 1
+        status = 200
+        range_header = self.headers.get('Range')
+        if_range = self.headers.get('If-Range')
+        if range_header and size > 0 and (not if_range or if_range == etag):
+            byte_range = self._parse_range(range_header, size)
+            if byte_range is None:
+                self.send_response(416)
+                self.send_header('Content-Range', f'bytes */{size}')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            start, end = byte_range
+            status = 206
+
+        length = end - start + 1 if size > 0 else 0
+        self.send_response(status)
+        self._send_common_headers(path, etag)
+        self.send_header('Content-Type', mimetypes.guess_type(path)[0] or 'application/octet-stream')
+        self.send_header('Content-Length', str(length))
+        if status == 206:
+            self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+        self.end_headers()
+
+        if send_body and length > 0:
+            try:
+                with open(path, 'rb') as f:
+                    self._send_file(f, start, length)
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+    def _send_common_headers(self, path, etag):
+        self.send_header('ETag', etag)
+        self.send_header('Accept-Ranges', 'bytes')
+        if CONTENT_HASHED_RE.search(os.path.basename(path)):
+            self.send_header('Cache-Control', 'public, max-age=31536000, immutable')
+        else:
+            self.send_header('Cache-Control', 'no-cache')
+
+    def _send_file(self, f, start, length):
+        """Zero-copy transfer with os.sendfile where supported."""
+        offset, remaining = start, length
+        if hasattr(os, 'sendfile'):
+            try:
+                self.wfile.flush()
+                out_fd = self.connection.fileno()
+                while remaining > 0:
+                    sent = os.sendfile(out_fd, f.fileno(), offset, min(remaining, 1 << 30))
+                    if sent == 0:
+                        break
+                    offset += sent
+                    remaining -= sent
+                return
+            except (BrokenPipeError, ConnectionResetError):
+                raise
+            except OSError:
+                pass  # e.g. not supported for this socket: copy the rest from where sendfile stopped
+        f.seek(offset)
+        while remaining > 0:
+            chunk = f.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            self.wfile.write(chunk)
+            remaining -= len(chunk)
+
+    @staticmethod
+    def _parse_range(header, size):
+        """Parses a single 'bytes=' range. Returns (start, end) or None."""
+        if not header.startswith('bytes=') or ',' in header:
+            return None
+        spec = header[len('bytes='):].strip()
+        try:
+            first, last = spec.split('-', 1)
+            if first == '':
+                suffix = int(last)
+                if suffix <= 0:
+                    return None
+                return max(0, size - suffix), size - 1
+            start = int(first)
+            end = int(last) if last else size - 1
+        except ValueError:
+            return None
+        if start >= size or end < start:
+            return None
+        return start, min(end, size - 1)
@@ -26,8 +26,15 @@ def create_shortcut(target_exe, shortcut_name):
     except subprocess.CalledProcessError as e:
         print(f"Failed to create shortcut: {e.stderr}")
 
-def build_exe():
-    print("Starting build process for Chomka v1.14 (Proxy Rotator) ...")
+def build_exe(fast_start=False):
+    """Builds Chomka.exe.
+
+    fast_start builds a one-folder app instead of --onefile: nothing is
+    unpacked to a temp dir on each launch, UPX decompression is skipped and
+    bytecode is precompiled with -O. Measure with startup_bench.py.
+    """
+    mode = "fast-start, one folder" if fast_start else "single file"
+    print(f"Starting build process for Chomka v1.14 (Proxy Rotator, {mode}) ...")
     
     # Path to icon
     icon_path = os.path.join(os.getcwd(), "icon.ico")
@@ -35,11 +42,18 @@ def build_exe():
         # Fallback to sakura.ico if icon.ico doesn't exist
         icon_path = os.path.join(os.getcwd(), "sakura.ico")
 
+    # Pack the bundled app icons into a sprite atlas (shipped inside assets/)
+    try:
+        from icon_atlas import build_bundled_atlas
+        atlas = build_bundled_atlas(os.getcwd())
+        print(f"Icon atlas built: {len(atlas['icons'])} icons")
+    except Exception as e:
+        print(f"Warning: icon atlas not built, icons load individually: {e}")
+
     # PyInstaller command
     cmd = [
         "python", "-m", "PyInstaller",
         "--noconfirm",
-        "--onefile",
         "--windowed",
         f"--icon={icon_path}",
         "--add-data=index.html;.",
@@ -51,12 +65,19 @@ def build_exe():
         "--name=Chomka",
         "launcher.py"
     ]
+    if fast_start:
+        cmd[4:4] = ["--onedir", "--noupx", "--optimize=1"]
+    else:
+        cmd[4:4] = ["--onefile"]
     
     try:
         subprocess.run(cmd, check=True)
         print("Build successful!")
         
-        exe_path = os.path.abspath(os.path.join("dist", "Chomka.exe"))
+        if fast_start:
+            exe_path = os.path.abspath(os.path.join("dist", "Chomka", "Chomka.exe"))
+        else:
+            exe_path = os.path.abspath(os.path.join("dist", "Chomka.exe"))
         if os.path.exists(exe_path):
             print(f"Verified EXE at: {exe_path}")
             create_shortcut(exe_path, "Chomka v1.14")
@@ -69,4 +90,4 @@ def build_exe():
         print("Error: PyInstaller not found. Please install it using 'pip install pyinstaller'.")
 
 if __name__ == "__main__":
-    build_exe()
+    build_exe(fast_start="--fast-start" in sys.argv)
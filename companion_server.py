@@ -0,0 +1,560 @@
+import os
+import sys
+import json
+import base64
+import socket
+import struct
+import asyncio
+import hashlib
+import secrets
+import threading
+import collections
+import urllib.parse
+
+DEFAULT_PORT = 8766
+QUEUE_LIMIT = 64  # messages waiting for one client before it is resynced with a snapshot
+HISTORY = 256  # recent deltas kept so a reconnecting client can catch up without a snapshot
+MAX_MESSAGE = 1024 * 1024
+SEND_TIMEOUT = 30  # a client that cannot take a frame in this long is dropped
+PING_INTERVAL = 20
+COMMAND_TIMEOUT = 10
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC11B65"
+OP_CONT, OP_TEXT, OP_BINARY, OP_CLOSE, OP_PING, OP_PONG = 0x0, 0x1, 0x2, 0x8, 0x9, 0xA
+COMMANDS = ('move', 'update', 'add', 'remove', 'player', 'workspace')
+PLAYER_ACTIONS = ('play', 'pause', 'seek')
+# Fields a remote 'update' may change; everything else stays owned by the desktop
+UPDATABLE_FIELDS = {'x', 'y', 'w', 'h', 'zIndex', 'title', 'name', 'url', 'content', 'color', 'isYTPinned'}
+APPLY_JS = "window.applyRemoteCommand ? window.applyRemoteCommand({}) : {{success: false, error: 'page not ready'}}"
+
+
+class ProtocolError(Exception):
+    pass
+
+
+def _canonical(item):
+    return json.dumps(item, sort_keys=True, separators=(',', ':'))
+
+
+def _unmask(payload, mask):
+    n = len(payload)
+    key = (mask * (n // 4 + 1))[:n]
+    return (int.from_bytes(payload, 'big') ^ int.from_bytes(key, 'big')).to_bytes(n, 'big')
+
+
+def encode_frame(opcode, payload, mask=False):
+    """One unfragmented frame; clients must mask, the server must not."""
+    if isinstance(payload, str):
+        payload = payload.encode('utf-8')
+    n = len(payload)
+    head = bytearray([0x80 | opcode])
+    bit = 0x80 if mask else 0
+    if n < 126:
+        head.append(bit | n)
+    elif n < 65536:
+        head.append(bit | 126)
+        head += struct.pack('!H', n)
+    else:
+        head.append(bit | 127)
+        head += struct.pack('!Q', n)
+    if mask:
+        key = os.urandom(4)
+        head += key
+        payload = _unmask(payload, key)
+    return bytes(head) + payload
+
+
+async def read_message(reader, send_control):
+    """Next text message (control frames answered via send_control); None once closed."""
+    parts, size = [], 0
+    while True:
+        head = await reader.readexactly(2)
+        fin, opcode = head[0] & 0x80, head[0] & 0x0F
+        length = head[1] & 0x7F
+        if length == 126:
+            length = struct.unpack('!H', await reader.readexactly(2))[0]
+        elif length == 127:
+            length = struct.unpack('!Q', await reader.readexactly(8))[0]
+        if length > MAX_MESSAGE or size + length > MAX_MESSAGE:
+            raise ProtocolError("message too large")
+        mask = await reader.readexactly(4) if head[1] & 0x80 else None
+        payload = await reader.readexactly(length)
+        if mask:
+            payload = _unmask(payload, mask)
+
+        if opcode == OP_CLOSE:
+            await send_control(OP_CLOSE, payload[:2])
+            return None
+        if opcode == OP_PING:
+            await send_control(OP_PONG, payload)
+            continue
+        if opcode == OP_PONG:
+            continue
+        if opcode == OP_BINARY:
+            raise ProtocolError("binary frames are not supported")
+        if opcode not in (OP_TEXT, OP_CONT) or (opcode == OP_CONT) != bool(parts):
+            raise ProtocolError(f"unexpected opcode {opcode}")
+        parts.append(payload)
+        size += length
+        if fin:
+            return b''.join(parts).decode('utf-8')
+
+
+def _lan_address():
+    """Address other devices on the LAN reach us at (no packet is sent)."""
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+            s.connect(('10.255.255.255', 1))
+            return s.getsockname()[0]
+    except OSError:
+        return '127.0.0.1'
+
+
+def validate_command(cmd):
+    """Raises ValueError unless cmd is a well-formed remote command."""
+    if not isinstance(cmd, dict) or cmd.get('op') not in COMMANDS:
+        raise ValueError(f"op must be one of {', '.join(COMMANDS)}")
+    op = cmd['op']
+    if op in ('move', 'update', 'remove', 'player', 'workspace') and not isinstance(cmd.get('id'), str):
+        raise ValueError(f"{op} needs an id")
+    if op == 'move' and not all(isinstance(cmd.get(k), (int, float)) for k in ('x', 'y')):
+        raise ValueError("move needs numeric x and y")
+    if op == 'update':
+        changes = cmd.get('changes')
+        if not isinstance(changes, dict) or not changes:
+            raise ValueError("update needs changes")
+        unknown = set(changes) - UPDATABLE_FIELDS
+        if unknown:
+            raise ValueError(f"fields not updatable: {', '.join(sorted(unknown))}")
+    if op == 'add' and not (isinstance(cmd.get('item'), dict) and isinstance(cmd['item'].get('type'), str)):
+        raise ValueError("add needs an item with a type")
+    if op == 'player':
+        if cmd.get('action') not in PLAYER_ACTIONS:
+            raise ValueError(f"player action must be one of {', '.join(PLAYER_ACTIONS)}")
+        if cmd['action'] == 'seek' and not isinstance(cmd.get('time'), (int, float)):
+            raise ValueError("seek needs a numeric time")
+
+
+class _Client:
+    """One connection: a bounded outgoing queue drained by its own writer task."""
+
+    def __init__(self, server, writer, peer):
+        self.server = server
+        self.writer = writer
+        self.peer = peer
+        self.queue = collections.deque()
+        self.wakeup = asyncio.Event()
+        self.resync = False
+        self.after_seq = 0  # state messages at or below this are already covered by a snapshot
+        self.closed = False
+
+    def offer(self, seq, frame):
+        """Queues a frame; a client that falls too far behind gets one snapshot instead."""
+        if self.closed:
+            return
+        if len(self.queue) >= QUEUE_LIMIT:
+            self.drop_state()
+            self.resync = True
+            self.server.api.log(f"[Companion] {self.peer} fell behind, resyncing with a snapshot", "WARNING")
+        else:
+            self.queue.append((seq, frame))
+        self.wakeup.set()
+
+    def drop_state(self):
+        """Drops queued state frames, which the snapshot replaces; acks (seq None) stay."""
+        self.queue = collections.deque(entry for entry in self.queue if entry[0] is None)
+
+    async def send(self, frame):
+        self.writer.write(frame)
+        await asyncio.wait_for(self.writer.drain(), SEND_TIMEOUT)
+
+    async def write_loop(self):
+        while not self.closed:
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), PING_INTERVAL)
+            except asyncio.TimeoutError:
+                await self.send(encode_frame(OP_PING, b''))
+                continue
+            self.wakeup.clear()
+            if self.resync:
+                self.resync = False
+                self.drop_state()
+                seq, frame = self.server.snapshot_frame()
+                self.after_seq = seq
+                await self.send(frame)
+            while self.queue and not self.resync:
+                seq, frame = self.queue.popleft()
+                if seq is not None and seq <= self.after_seq:
+                    continue
+                await self.send(frame)
+
+
+class CompanionServer:
+    """WebSocket server that mirrors the live desktop to companion devices.
+
+    Clients connect to ws://host:port/<token>[?since=<seq>] and get a
+    snapshot of the active workspace (or, with since, the deltas they
+    missed), then item-level deltas as the desktop is saved and player
+    events as they happen. Every state message carries a sequence number.
+    Commands sent back ({op: move|update|add|remove|player|workspace, ref})
+    are applied by the page exactly like local edits and acknowledged.
+    """
+
+    def __init__(self, api):
+        self.api = api
+        self.host = None
+        self.port = None
+        self._loop = None
+        self._thread = None
+        self._server = None
+        self._clients = set()
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._workspace = None
+        self._items = collections.OrderedDict()  # id -> canonical JSON of the last published state
+        self._players = {}
+        self._history = collections.deque(maxlen=HISTORY)  # (seq, frame)
+
+    @property
+    def is_running(self):
+        return self._server is not None
+
+    @property
+    def token(self):
+        token = self.api.config.get("companion_token")
+        if not token:
+            token = secrets.token_urlsafe(24)
+            self.api.config["companion_token"] = token
+            self.api._save_config()
+        return token
+
+    @property
+    def url(self):
+        if not self.is_running:
+            return None
+        host = _lan_address() if self.host == '0.0.0.0' else self.host
+        return f"ws://{host}:{self.port}/{self.token}"
+
+    # --- Lifecycle ---
+
+    def start(self, lan=False, port=DEFAULT_PORT):
+        if self.is_running:
+            return self.url
+        self.token  # generated before any client can ask
+        workspace = self.api._workspaces.active
+        self.reset(workspace, self.api._watcher.read_items(workspace))
+
+        ready = threading.Event()
+        failure = []
+
+        def run():
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            try:
+                self._server = loop.run_until_complete(
+                    asyncio.start_server(self._handle, '0.0.0.0' if lan else '127.0.0.1', port))
+            except Exception as e:
+                failure.append(e)
+                ready.set()
+                loop.close()
+                return
+            self._loop = loop
+            self.host, self.port = self._server.sockets[0].getsockname()[:2]
+            ready.set()
+            try:
+                loop.run_forever()
+            finally:
+                loop.close()
+
+        self._thread = threading.Thread(target=run, name='chomka-companion', daemon=True)
+        self._thread.start()
+        ready.wait()
+        if failure:
+            self._thread = None
+            raise failure[0]
+        self.api.log(f"[Companion] Listening on {self.host}:{self.port}")
+        return self.url
+
+    def stop(self):
+        if not self.is_running:
+            return
+        loop, server = self._loop, self._server
+        self._server = None
+
+        async def close():
+            server.close()
+            for client in list(self._clients):
+                client.closed = True
+                client.writer.close()
+            tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            loop.stop()
+        try:
+            asyncio.run_coroutine_threadsafe(close(), loop)
+            self._thread.join(timeout=2)
+        except Exception as e:
+            self.api.log(f"[Companion] Shutdown error: {e}", "WARNING")
+        self._loop = None
+        self._thread = None
+        self._clients.clear()
+
+    def client_count(self):
+        return len(self._clients)
+
+    # --- State (called from any thread) ---
+
+    def reset(self, workspace, items):
+        """New baseline (startup, workspace switch); connected clients get a snapshot."""
+        with self._lock:
+            self._workspace = workspace
+            self._items = collections.OrderedDict(
+                (item['id'], _canonical(item)) for item in items if isinstance(item, dict) and 'id' in item)
+            self._players = {}
+            self._seq += 1
+            self._history.clear()
+        self._call(self._resync_all)
+
+    def publish_items(self, workspace, items):
+        """Diffs saved items against the last published state and broadcasts the delta."""
+        if not self.is_running:
+            return
+        if workspace != self._workspace:
+            self.reset(workspace, items)
+            return
+        with self._lock:
+            current = collections.OrderedDict(
+                (item['id'], _canonical(item)) for item in items if isinstance(item, dict) and 'id' in item)
+            upserted = [json.loads(text) for item_id, text in current.items() if self._items.get(item_id) != text]
+            removed = [item_id for item_id in self._items if item_id not in current]
+            # Clients append new items, so only a different arrangement needs the full order
+            expected = [i for i in self._items if i in current] + [i for i in current if i not in self._items]
+            order = list(current) if list(current) != expected else None
+            if not upserted and not removed and order is None:
+                return
+            self._items = current
+            for item_id in removed:
+                self._players.pop(item_id, None)
+            self._seq += 1
+            message = {'type': 'delta', 'seq': self._seq, 'workspace': workspace,
+                       'upserted': upserted, 'removed': removed, 'order': order}
+            self._record(message)
+
+    def publish_player(self, item_id, state, position=None):
+        """Broadcasts a player state change (playing, paused, ended...) of one item."""
+        if not self.is_running:
+            return
+        with self._lock:
+            self._players[item_id] = {'state': state, 'time': position}
+            self._seq += 1
+            message = {'type': 'player', 'seq': self._seq, 'workspace': self._workspace,
+                       'id': item_id, 'state': state, 'time': position}
+            self._record(message)
+
+    def _record(self, message):
+        """Encodes once, keeps it for catch-up and fans it out (caller holds the lock)."""
+        frame = encode_frame(OP_TEXT, json.dumps(message, separators=(',', ':')))
+        self._history.append((message['seq'], frame))
+        self._call(self._fan_out, message['seq'], frame)
+
+    def snapshot_frame(self):
+        with self._lock:
+            items = ','.join(self._items.values())
+            head = json.dumps({'type': 'snapshot', 'seq': self._seq, 'workspace': self._workspace,
+                               'players': self._players}, separators=(',', ':'))
+            return self._seq, encode_frame(OP_TEXT, f'{head[:-1]},"items":[{items}]}}')
+
+    def _catch_up(self, since):
+        """Frames after since if the history still reaches back that far, else None."""
+        with self._lock:
+            if since == self._seq:
+                return []
+            if since > self._seq or not self._history or self._history[0][0] > since + 1:
+                return None
+            return [entry for entry in self._history if entry[0] > since]
+
+    # --- Event loop side ---
+
+    def _call(self, fn, *args):
+        loop = self._loop
+        if loop:
+            try:
+                loop.call_soon_threadsafe(fn, *args)
+            except RuntimeError:
+                pass  # loop closed during stop
+
+    def _fan_out(self, seq, frame):
+        for client in self._clients:
+            client.offer(seq, frame)
+
+    def _resync_all(self):
+        for client in self._clients:
+            client.resync = True
+            client.wakeup.set()
+
+    async def _handle(self, reader, writer):
+        peer = "{}:{}".format(*writer.get_extra_info('peername')[:2])
+        client = None
+        try:
+            since = await self._handshake(reader, writer)
+            if since is False:
+                return
+            client = _Client(self, writer, peer)
+            missed = self._catch_up(since) if since is not None else None
+            if missed is None:
+                client.resync = True
+            else:
+                client.queue.extend(missed)
+            self._clients.add(client)
+            client.wakeup.set()
+            self.api.log(f"[Companion] {peer} connected ({len(self._clients)} client(s))")
+            write_task = asyncio.ensure_future(client.write_loop())
+            read_task = asyncio.ensure_future(self._read_loop(client, reader))
+            done, pending = await asyncio.wait({write_task, read_task}, return_when=asyncio.FIRST_COMPLETED)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            for task in done:
+                if task.exception() and not isinstance(task.exception(), (ConnectionError, asyncio.IncompleteReadError)):
+                    self.api.log(f"[Companion] {peer} dropped: {task.exception()!r}", "WARNING")
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+            pass
+        except Exception as e:
+            self.api.log(f"[Companion] {peer} error: {e}", "ERROR")
+        finally:
+            if client:
+                client.closed = True
+                self._clients.discard(client)
+                self.api.log(f"[Companion] {peer} disconnected")
+            writer.close()
+
+    async def _handshake(self, reader, writer):
+        """Upgrades the HTTP request; returns the since value (or None), False if refused."""
+        request = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), 10)
+        lines = request.decode('latin-1').split('\r\n')
+        parts = lines[0].split(' ')
+        headers = {}
+        for line in lines[1:]:
+            key, _, value = line.partition(':')
+            headers[key.strip().lower()] = value.strip()
+
+        url = urllib.parse.urlsplit(parts[1] if len(parts) > 1 else '/')
+        query = urllib.parse.parse_qs(url.query)
+        token = url.path.strip('/') or (query.get('token') or [''])[0]
+        key = headers.get('sec-websocket-key')
+        if not secrets.compare_digest(token.encode(), self.token.encode()):
+            return await self._refuse(writer, 403, "Forbidden")
+        if parts[0] != 'GET' or headers.get('upgrade', '').lower() != 'websocket' or not key:
+            return await self._refuse(writer, 400, "Bad Request")
+
+        accept = base64.b64encode(hashlib.sha1((key + WS_GUID).encode()).digest()).decode()
+        writer.write(("HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                      f"Sec-WebSocket-Accept: {accept}\r\n\r\n").encode())
+        await writer.drain()
+        try:
+            return int(query['since'][0]) if 'since' in query else None
+        except ValueError:
+            return None
+
+    async def _refuse(self, writer, status, reason):
+        writer.write(f"HTTP/1.1 {status} {reason}\r\nContent-Length: 0\r\nConnection: close\r\n\r\n".encode())
+        await writer.drain()
+        return False
+
+    async def _read_loop(self, client, reader):
+        async def send_control(opcode, payload):
+            await client.send(encode_frame(opcode, payload))
+
+        while True:
+            try:
+                text = await read_message(reader, send_control)
+            except ProtocolError as e:
+                await send_control(OP_CLOSE, struct.pack('!H', 1009 if 'large' in str(e) else 1002))
+                raise
+            if text is None:
+                return
+            cmd = None
+            try:
+                cmd = json.loads(text)
+                validate_command(cmd)
+            except ValueError as e:
+                ref = cmd.get('ref') if isinstance(cmd, dict) else None
+                self._ack(client, ref, {'success': False, 'error': str(e)})
+                continue
+            # Acked when the page is done; this client's reads carry on meanwhile
+            asyncio.ensure_future(self._run_command(client, cmd))
+
+    async def _run_command(self, client, cmd):
+        try:
+            result = await asyncio.wait_for(
+                asyncio.get_running_loop().run_in_executor(None, self._apply, cmd), COMMAND_TIMEOUT)
+        except asyncio.TimeoutError:
+            result = {'success': False, 'error': 'timed out'}
+        except Exception as e:
+            result = {'success': False, 'error': str(e)}
+        self._ack(client, cmd.get('ref'), result)
+
+    def _apply(self, cmd):
+        """Runs one command through the page, the same path local edits take."""
+        window = self.api._window
+        if not window:
+            return {'success': False, 'error': 'no window'}
+        self.api.log(f"[Companion] Command {cmd['op']} {cmd.get('id', '')}".rstrip())
+        result = window.evaluate_js(APPLY_JS.format(json.dumps(cmd)))
+        return result if isinstance(result, dict) else {'success': bool(result)}
+
+    def _ack(self, client, ref, result):
+        message = {'type': 'ack', 'ref': ref, 'ok': bool(result.get('success')), 'error': result.get('error')}
+        client.offer(None, encode_frame(OP_TEXT, json.dumps(message)))
+
+
+# --- Test client ---
+
+async def run_client(url, commands=(), duration=None):
+    """Connects, prints every message it receives and sends the given commands."""
+    parts = urllib.parse.urlsplit(url)
+    reader, writer = await asyncio.open_connection(parts.hostname, parts.port or 80)
+    key = base64.b64encode(os.urandom(16)).decode()
+    path = parts.path + (f"?{parts.query}" if parts.query else '')
+    writer.write((f"GET {path or '/'} HTTP/1.1\r\nHost: {parts.netloc}\r\nUpgrade: websocket\r\n"
+                  f"Connection: Upgrade\r\nSec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\n\r\n").encode())
+    response = await reader.readuntil(b'\r\n\r\n')
+    status = response.split(b'\r\n', 1)[0].decode()
+    if ' 101 ' not in status:
+        raise ConnectionError(status)
+
+    async def send_control(opcode, payload):
+        writer.write(encode_frame(opcode, payload, mask=True))
+        await writer.drain()
+
+    for ref, cmd in enumerate(commands, 1):
+        writer.write(encode_frame(OP_TEXT, json.dumps({'ref': ref, **cmd}), mask=True))
+    await writer.drain()
+
+    async def receive():
+        while True:
+            text = await read_message(reader, send_control)
+            if text is None:
+                return
+            message = json.loads(text)
+            if message.get('type') == 'snapshot':
+                print(f"snapshot seq={message['seq']} workspace={message['workspace']} items={len(message['items'])}")
+            else:
+                print(json.dumps(message))
+    try:
+        await asyncio.wait_for(receive(), duration)
+    except asyncio.TimeoutError:
+        pass
+    finally:
+        writer.close()
+
+
+if __name__ == '__main__':
+    # Test client: python companion_server.py client <ws-url> [command-json ...]
+    if len(sys.argv) >= 3 and sys.argv[1] == 'client':
+        try:
+            asyncio.run(run_client(sys.argv[2], [json.loads(arg) for arg in sys.argv[3:]]))
+        except KeyboardInterrupt:
+            pass
+    else:
+        print("Usage: python companion_server.py client <ws-url> [command-json ...]")
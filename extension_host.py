@@ -0,0 +1,402 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import threading
+import collections
+import importlib.util
+import multiprocessing
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+from hang_watchdog import LatencyHistogram
+from memory_profiler import process_memory
+
+EXTENSIONS_DIR = "extensions"
+MANIFEST = "extension.json"
+# name -> fingerprint of approved extensions, kept in the app's own config.json,
+# which sync and archive import never write
+TRUST_KEY = "trusted_extensions"
+# Per-extension defaults; extension.json can lower or raise them under "limits"
+DEFAULT_LIMITS = {'timeout_ms': 3000, 'cpu_ms': 2000, 'memory_mb': 256}
+MAX_PENDING = 16  # requests in flight per extension before new ones are refused
+MONITOR_INTERVAL = 0.1
+RESTART_BACKOFF = (1, 2, 5, 10, 30)
+CRASH_WINDOW = 300  # this many crashes within CRASH_WINDOW seconds disables an extension
+MAX_CRASHES = 5
+EXIT_LOAD, EXIT_CPU, EXIT_MEMORY = 85, 86, 87
+EXIT_REASONS = {
+    EXIT_LOAD: "failed to load",
+    EXIT_CPU: "exceeded its CPU time per request",
+    EXIT_MEMORY: "exceeded its memory limit",
+}
+
+
+class ExtensionError(Exception):
+    pass
+
+
+class ExtensionTimeout(ExtensionError):
+    pass
+
+
+def fingerprint(ext_dir):
+    """SHA-256 over the paths and contents of every file of an extension."""
+    digest = hashlib.sha256()
+    for dirpath, dirnames, filenames in os.walk(ext_dir):
+        dirnames[:] = sorted(d for d in dirnames if d != '__pycache__')
+        for name in sorted(filenames):
+            path = os.path.join(dirpath, name)
+            digest.update(os.path.relpath(path, ext_dir).replace(os.sep, '/').encode('utf-8') + b'\0')
+            with open(path, 'rb') as f:
+                digest.update(hashlib.sha256(f.read()).digest())
+    return digest.hexdigest()
+
+
+# --- Worker process side ---
+
+def _apply_os_limits(limits):
+    """Hard backstops where the OS offers them; the monitor thread enforces the
+    actual limits on every platform."""
+    try:
+        import resource
+        address_space = limits['memory_mb'] * 4 * 1024 * 1024  # virtual size runs well above RSS
+        resource.setrlimit(resource.RLIMIT_AS, (address_space, address_space))
+        os.nice(5)
+    except (ImportError, ValueError, OSError):
+        pass
+
+
+def _monitor(state, limits):
+    memory_cap = limits['memory_mb'] * 1024 * 1024
+    cpu_cap = limits['cpu_ms'] / 1000
+    while True:
+        time.sleep(MONITOR_INTERVAL)
+        rss, _ = process_memory()
+        if rss and rss > memory_cap:
+            os._exit(EXIT_MEMORY)
+        started = state['cpu_start']
+        if started is not None and time.process_time() - started > cpu_cap:
+            os._exit(EXIT_CPU)
+
+
+def _exported(module, method):
+    exports = getattr(module, 'EXPORTS', None)
+    if method.startswith('_') or (exports is not None and method not in exports):
+        raise AttributeError(f"{method} is not exported")
+    fn = getattr(module, method, None)
+    if not callable(fn):
+        raise AttributeError(f"{method} is not exported")
+    return fn
+
+
+def _worker_main(name, ext_dir, entry, conn, limits):
+    """Entry point of an extension process. Requests and replies are JSON."""
+    _apply_os_limits(limits)
+    state = {'cpu_start': None}
+    threading.Thread(target=_monitor, args=(state, limits), name='chomka-ext-monitor', daemon=True).start()
+    try:
+        sys.path.insert(0, ext_dir)
+        spec = importlib.util.spec_from_file_location(f"chomka_ext_{name}", os.path.join(ext_dir, entry))
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    except Exception as e:
+        print(f"[Extension {name}] Load failed: {e}", file=sys.stderr)
+        os._exit(EXIT_LOAD)
+
+    while True:
+        try:
+            msg = json.loads(conn.recv_bytes())
+        except (EOFError, OSError):
+            return
+        if msg.get('method') == '__exit__':
+            return
+        reply = {'id': msg['id']}
+        state['cpu_start'] = time.process_time()
+        try:
+            fn = _exported(module, msg['method'])
+            params = msg.get('params')
+            result = fn(**params) if isinstance(params, dict) else fn(*(params or []))
+            reply['result'] = result
+            payload = json.dumps(reply)
+        except Exception as e:
+            reply.pop('result', None)
+            reply['error'] = f"{type(e).__name__}: {e}"
+            payload = json.dumps(reply)
+        finally:
+            state['cpu_start'] = None
+        # Resource usage rides along so the host needs no per-platform probing
+        usage = json.dumps({'cpu': time.process_time(), 'rss': process_memory()[0]})
+        conn.send_bytes((payload[:-1] + ', "usage": ' + usage + '}').encode('utf-8'))
+
+
+# --- Host side ---
+
+class ExtensionWorker:
+    """One extension and the process it runs in.
+
+    Requests go over a pipe and are answered by a reader thread; each waits at
+    most the extension's timeout. A worker that misses a deadline is killed,
+    as one that dies on its own, and restarted with backoff. Too many crashes
+    in a short time disable the extension until the next reload.
+    """
+
+    def __init__(self, host, name, ext_dir, manifest):
+        self.host = host
+        self.name = name
+        self.dir = ext_dir
+        self.entry = manifest.get('entry', 'main.py')
+        self.limits = dict(DEFAULT_LIMITS, **manifest.get('limits', {}))
+        self.state = 'stopped'  # stopped, starting, running, restarting, disabled
+        self.process = None
+        self._conn = None
+        self._lock = threading.Lock()
+        self._pending = {}  # request id -> Future
+        self._next_id = 0
+        self._kill_reason = None
+        self._crashes = collections.deque()
+        self._restart_timer = None
+        self.latency = LatencyHistogram()
+        self.counters = collections.Counter()
+        self.last_error = None
+        self.cpu_seconds = 0.0
+        self.rss = None
+
+    # --- Process management ---
+
+    def _spawn(self):
+        if not self.host.is_trusted(self):
+            raise ExtensionError(f"{self.name} is not trusted; approve it in System Settings → Extensions")
+        ctx = multiprocessing.get_context('spawn')
+        parent, child = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, name=f'chomka-ext-{self.name}', daemon=True,
+                                   args=(self.name, self.dir, self.entry, child, self.limits))
+        self.process.start()
+        child.close()
+        self._conn = parent
+        self._kill_reason = None
+        self.state = 'running'
+        threading.Thread(target=self._read_loop, args=(parent, self.process),
+                         name=f'chomka-ext-{self.name}-reader', daemon=True).start()
+        self.host.api.log(f"[Extensions] Started {self.name} (pid {self.process.pid})")
+
+    def _read_loop(self, conn, process):
+        while True:
+            try:
+                msg = json.loads(conn.recv_bytes())
+            except (EOFError, OSError, ValueError):
+                break
+            with self._lock:
+                future = self._pending.pop(msg.get('id'), None)
+            if future:
+                future.set_result(msg)
+        process.join(timeout=2)
+        self._on_exit(process)
+
+    def _on_exit(self, process):
+        with self._lock:
+            if process is not self.process:
+                return
+            code = process.exitcode
+            stopping = self.state in ('stopped', 'disabled')
+            reason = self._kill_reason or EXIT_REASONS.get(code, f"exited with code {code}")
+            pending, self._pending = self._pending, {}
+            self.process = None
+            self._conn = None
+        for future in pending.values():
+            future.set_exception(ExtensionError(f"{self.name} {reason}"))
+        if stopping:
+            return
+
+        self.counters['crashes'] += 1
+        self.last_error = reason
+        now = time.time()
+        self._crashes.append(now)
+        while self._crashes and now - self._crashes[0] > CRASH_WINDOW:
+            self._crashes.popleft()
+        if code == EXIT_LOAD or len(self._crashes) >= MAX_CRASHES:
+            self.state = 'disabled'
+            self.host.api.log(f"[Extensions] {self.name} {reason}; disabled", "ERROR")
+            return
+        delay = RESTART_BACKOFF[min(len(self._crashes), len(RESTART_BACKOFF)) - 1]
+        self.state = 'restarting'
+        self.host.api.log(f"[Extensions] {self.name} {reason}; restarting in {delay} s", "WARNING")
+        self._restart_timer = threading.Timer(delay, self._restart)
+        self._restart_timer.daemon = True
+        self._restart_timer.start()
+
+    def _restart(self):
+        with self._lock:
+            if self.state != 'restarting':
+                return
+            try:
+                self._spawn()
+                self.counters['restarts'] += 1
+            except Exception as e:
+                self.state = 'disabled'
+                self.last_error = str(e)
+                self.host.api.log(f"[Extensions] Could not restart {self.name}: {e}", "ERROR")
+
+    def _kill(self, reason):
+        with self._lock:
+            process = self.process
+            if process is None:
+                return
+            self._kill_reason = reason
+        process.kill()
+
+    def stop(self):
+        with self._lock:
+            self.state = 'stopped'
+            if self._restart_timer:
+                self._restart_timer.cancel()
+            process, conn = self.process, self._conn
+        if process is None:
+            return
+        try:
+            conn.send_bytes(json.dumps({'method': '__exit__'}).encode('utf-8'))
+            process.join(timeout=1)
+        except (OSError, ValueError):
+            pass
+        if process.is_alive():
+            process.kill()
+
+    # --- Requests ---
+
+    def call(self, method, params=None):
+        with self._lock:
+            if self.state == 'disabled':
+                raise ExtensionError(f"{self.name} is disabled: {self.last_error}")
+            if self.state == 'restarting':
+                raise ExtensionError(f"{self.name} is restarting after: {self.last_error}")
+            if self.process is None:
+                self._spawn()
+            if len(self._pending) >= MAX_PENDING:
+                self.counters['rejected'] += 1
+                raise ExtensionError(f"{self.name} is busy ({MAX_PENDING} requests pending)")
+            self._next_id += 1
+            request_id = self._next_id
+            future = Future()
+            self._pending[request_id] = future
+            try:
+                self._conn.send_bytes(json.dumps({'id': request_id, 'method': method, 'params': params}).encode('utf-8'))
+            except (OSError, ValueError) as e:
+                self._pending.pop(request_id, None)
+                raise ExtensionError(f"{self.name} is not reachable: {e}")
+
+        start = time.time()
+        timeout = self.limits['timeout_ms'] / 1000
+        self.counters['calls'] += 1
+        try:
+            reply = future.result(timeout=timeout)
+        except FutureTimeout:
+            self.counters['timeouts'] += 1
+            self._kill(f"missed the {timeout:.1f} s deadline of {method}")
+            raise ExtensionTimeout(f"{self.name}.{method} timed out after {timeout:.1f} s")
+        except ExtensionError:
+            self.counters['errors'] += 1
+            raise
+        finally:
+            self.latency.add((time.time() - start) * 1000)
+        usage = reply.get('usage') or {}
+        self.cpu_seconds = usage.get('cpu', self.cpu_seconds)
+        self.rss = usage.get('rss', self.rss)
+        if 'error' in reply:
+            self.counters['errors'] += 1
+            raise ExtensionError(reply['error'])
+        return reply.get('result')
+
+    def stats(self):
+        return {
+            'name': self.name, 'state': self.state, 'trusted': self.host.is_trusted(self),
+            'pid': self.process.pid if self.process else None,
+            'limits': self.limits, 'latency': self.latency.to_dict(),
+            'calls': self.counters['calls'], 'errors': self.counters['errors'],
+            'timeouts': self.counters['timeouts'], 'rejected': self.counters['rejected'],
+            'crashes': self.counters['crashes'], 'restarts': self.counters['restarts'],
+            'cpu_seconds': round(self.cpu_seconds, 2), 'rss': self.rss,
+            'last_error': self.last_error,
+        }
+
+
+class ExtensionHost:
+    """Runs backend extensions (<data dir>/extensions/<name>/extension.json plus
+    a Python entry module) in their own processes, started on first use, so a
+    slow, leaking or crashing extension never holds up the app's own threads.
+    This isolates failures; it is not a security sandbox.
+
+    The data dir is fed by sync and archive import, so an extension only runs
+    once the user has approved it, and only while its files still match the
+    fingerprint recorded then.
+    """
+
+    def __init__(self, api):
+        self.api = api
+        self._workers = {}
+        self._lock = threading.Lock()
+
+    def _dir(self):
+        return os.path.join(self.api._get_share_dir(), EXTENSIONS_DIR)
+
+    def discover(self):
+        """Picks up extensions added since the last scan; returns their names."""
+        root = self._dir()
+        if not os.path.isdir(root):
+            return sorted(self._workers)
+        with self._lock:
+            for name in sorted(os.listdir(root)):
+                manifest_path = os.path.join(root, name, MANIFEST)
+                if name in self._workers or not os.path.isfile(manifest_path):
+                    continue
+                try:
+                    with open(manifest_path, 'r', encoding='utf-8') as f:
+                        manifest = json.load(f)
+                    self._workers[name] = ExtensionWorker(self, name, os.path.join(root, name), manifest)
+                except (OSError, ValueError) as e:
+                    self.api.log(f"[Extensions] Skipping {name}: bad {MANIFEST}: {e}", "WARNING")
+            return sorted(self._workers)
+
+    def is_trusted(self, worker):
+        approved = self.api.config.get(TRUST_KEY, {}).get(worker.name)
+        try:
+            return approved is not None and approved == fingerprint(worker.dir)
+        except OSError:
+            return False
+
+    def trust(self, name):
+        """Approves an extension as its files are now; returns the fingerprint."""
+        self.discover()
+        worker = self._workers.get(name)
+        if worker is None:
+            raise ExtensionError(f"No extension named {name}")
+        approved = fingerprint(worker.dir)
+        self.api.config.setdefault(TRUST_KEY, {})[name] = approved
+        self.api._save_config()
+        self.api.log(f"[Extensions] Trusted {name} ({approved[:12]})")
+        return approved
+
+    def call(self, name, method, params=None):
+        worker = self._workers.get(name)
+        if worker is None:
+            self.discover()
+            worker = self._workers.get(name)
+        if worker is None:
+            raise ExtensionError(f"No extension named {name}")
+        return worker.call(method, params)
+
+    def stats(self):
+        return [worker.stats() for _, worker in sorted(self._workers.items())]
+
+    def reload(self):
+        """Stops every worker and rescans; workers start again on their next call."""
+        self.stop()
+        with self._lock:
+            self._workers = {}
+        return self.discover()
+
+    def stop(self):
+        for worker in list(self._workers.values()):
+            try:
+                worker.stop()
+            except Exception as e:
+                self.api.log(f"[Extensions] Could not stop {worker.name}: {e}", "WARNING")
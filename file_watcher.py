@@ -0,0 +1,389 @@
+import os
+import sys
+import json
+import time
+import select
+import struct
+import threading
+
+# Only these parts of the data directory matter to the running page
+WATCHED_DIRS = ("saves", "assets", "workspaces")
+IGNORED_NAMES = ("chomka.log",)
+IGNORED_SUFFIXES = (".tmp",)
+OWN_WRITE_TTL = 30.0
+
+# inotify constants (linux/inotify.h)
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+EVENT_HEADER = struct.Struct('iIII')
+
+
+def _canonical(obj):
+    return json.dumps(obj, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+
+
+def _load_libc():
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        import ctypes
+        import ctypes.util
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        return libc
+    except (OSError, AttributeError):
+        return None
+
+
+class _InotifyBackend:
+    """Kernel change notifications; no scanning once the watches are set."""
+
+    def __init__(self, libc, root, on_path):
+        self.libc = libc
+        self.root = root
+        self.on_path = on_path
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError("inotify_init1 failed")
+        self._wake_r, self._wake_w = os.pipe()
+        self._dirs = {}  # watch descriptor -> absolute directory
+        self._add_watch(root)
+        for name in WATCHED_DIRS:
+            self._add_tree(os.path.join(root, name))
+
+    def _add_watch(self, path):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd >= 0:
+            self._dirs[wd] = path
+
+    def _add_tree(self, path):
+        if not os.path.isdir(path):
+            return
+        for dirpath, dirnames, filenames in os.walk(path):
+            self._add_watch(dirpath)
+
+    def run(self, stop_event):
+        while not stop_event.is_set():
+            ready, _, _ = select.select([self.fd, self._wake_r], [], [])
+            if self._wake_r in ready or stop_event.is_set():
+                break
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                continue
+            offset = 0
+            while offset + EVENT_HEADER.size <= len(data):
+                wd, mask, cookie, length = EVENT_HEADER.unpack_from(data, offset)
+                name = data[offset + EVENT_HEADER.size:offset + EVENT_HEADER.size + length].rstrip(b'\0')
+                offset += EVENT_HEADER.size + length
+                directory = self._dirs.get(wd)
+                if directory is None:
+                    continue
+                if mask & IN_DELETE_SELF:
+                    self._dirs.pop(wd, None)
+                    continue
+                path = os.path.join(directory, os.fsdecode(name))
+                if mask & IN_ISDIR:
+                    if mask & (IN_CREATE | IN_MOVED_TO) and self._in_scope(path):
+                        self._add_tree(path)
+                    continue
+                self.on_path(path)
+
+    def _in_scope(self, path):
+        rel_path = os.path.relpath(path, self.root).replace(os.sep, '/')
+        return rel_path.split('/')[0] in WATCHED_DIRS
+
+    def close(self):
+        try:
+            os.write(self._wake_w, b'x')
+        except OSError:
+            pass
+
+    def release(self):
+        for fd in (self.fd, self._wake_r, self._wake_w):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+
+class _PollingBackend:
+    """Fallback for platforms without inotify: compares stat results."""
+
+    def __init__(self, root, on_path, interval):
+        self.root = root
+        self.on_path = on_path
+        self.interval = interval
+        self._state = self._scan()
+        self._wake = threading.Event()
+
+    def _scan(self):
+        state = {}
+        try:
+            for entry in os.scandir(self.root):
+                if entry.is_file():
+                    st = entry.stat()
+                    state[entry.path] = (st.st_size, st.st_mtime_ns)
+        except OSError:
+            return state
+        for name in WATCHED_DIRS:
+            for dirpath, dirnames, filenames in os.walk(os.path.join(self.root, name)):
+                for filename in filenames:
+                    path = os.path.join(dirpath, filename)
+                    try:
+                        st = os.stat(path)
+                    except OSError:
+                        continue
+                    state[path] = (st.st_size, st.st_mtime_ns)
+        return state
+
+    def run(self, stop_event):
+        while not stop_event.is_set():
+            self._wake.wait(self.interval)
+            if stop_event.is_set():
+                break
+            current = self._scan()
+            for path in set(current) | set(self._state):
+                if current.get(path) != self._state.get(path):
+                    self.on_path(path)
+            self._state = current
+
+    def close(self):
+        self._wake.set()
+
+    def release(self):
+        pass
+
+
+class FileWatcher:
+    """Notices changes made to the data directory by other programs.
+
+    Our own writes are fingerprinted (size, mtime) when they happen so the
+    resulting events can be dropped. External changes are debounced and
+    pushed to the page as one incremental event: changed desktop items per
+    workspace and changed asset paths.
+    """
+
+    def __init__(self, api, debounce=0.5, max_delay=3.0, poll_interval=2.0):
+        self.api = api
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.poll_interval = poll_interval
+        self._libc = _load_libc()
+        self._own_writes = {}  # absolute path -> ((size, mtime_ns) or None, recorded at)
+        self._known_items = {}  # workspace -> {item id: canonical json}
+        self._pending = set()
+        self._first_pending = None
+        self._lock = threading.Lock()
+        self._flush_timer = None
+        self._backend = None
+        self._thread = None
+        self._stop = threading.Event()
+        self.root = None
+
+    @property
+    def is_running(self):
+        return self._backend is not None
+
+    @property
+    def mode(self):
+        if self._backend is None:
+            return None
+        return 'inotify' if isinstance(self._backend, _InotifyBackend) else 'polling'
+
+    def start(self):
+        self.stop()
+        self.root = os.path.realpath(self.api._get_share_dir())
+        if not os.path.isdir(self.root):
+            return None
+        self._stop = threading.Event()
+        self._backend = None
+        if self._libc is not None:
+            try:
+                self._backend = _InotifyBackend(self._libc, self.root, self._on_path)
+            except OSError as e:
+                self.api.log(f"[FileWatcher] inotify unavailable, polling instead: {e}", "WARNING")
+        if self._backend is None:
+            self._backend = _PollingBackend(self.root, self._on_path, self.poll_interval)
+        self._thread = threading.Thread(target=self._run, args=(self._backend, self._stop),
+                                        name='chomka-file-watcher', daemon=True)
+        self._thread.start()
+        self.api.log(f"[FileWatcher] Watching {self.root} ({self.mode})")
+        return self.mode
+
+    def _run(self, backend, stop_event):
+        try:
+            backend.run(stop_event)
+        except Exception as e:
+            self.api.log(f"[FileWatcher] Stopped after error: {e}", "ERROR")
+        finally:
+            backend.release()
+
+    def stop(self):
+        if self._backend is None:
+            return
+        self._stop.set()
+        self._backend.close()
+        if self._thread:
+            self._thread.join(timeout=2)
+        self._backend = None
+        self._thread = None
+        with self._lock:
+            self._pending.clear()
+            self._first_pending = None
+            if self._flush_timer:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+
+    def restart(self):
+        """Starts over, e.g. on a different data directory."""
+        with self._lock:
+            self._known_items.clear()
+            self._own_writes.clear()
+        return self.start()
+
+    # --- Own writes ---
+
+    def note_write(self, path):
+        """Records that the app itself just wrote (or removed) path."""
+        path = os.path.realpath(path)
+        try:
+            st = os.stat(path)
+            fingerprint = (st.st_size, st.st_mtime_ns)
+        except OSError:
+            fingerprint = None
+        now = time.monotonic()
+        with self._lock:
+            self._own_writes[path] = (fingerprint, now)
+            if len(self._own_writes) > 512:
+                self._own_writes = {p: v for p, v in self._own_writes.items() if now - v[1] < OWN_WRITE_TTL}
+
+    def remember_items(self, workspace, items):
+        """Baseline the page already has, so only later differences are pushed."""
+        if isinstance(items, list):
+            with self._lock:
+                self._known_items[workspace] = {
+                    item.get('id'): _canonical(item) for item in items if isinstance(item, dict)
+                }
+
+    def _is_own(self, path):
+        with self._lock:
+            record = self._own_writes.get(path)
+        if record is None or time.monotonic() - record[1] > OWN_WRITE_TTL:
+            return False
+        try:
+            st = os.stat(path)
+            current = (st.st_size, st.st_mtime_ns)
+        except OSError:
+            current = None
+        return current == record[0]
+
+    # --- Event handling ---
+
+    def _on_path(self, path):
+        name = os.path.basename(path)
+        if name in IGNORED_NAMES or name.endswith(IGNORED_SUFFIXES):
+            return
+        rel_path = os.path.relpath(path, self.root).replace(os.sep, '/')
+        if '/' in rel_path and rel_path.split('/')[0] not in WATCHED_DIRS:
+            return
+        with self._lock:
+            self._pending.add(path)
+            now = time.monotonic()
+            if self._first_pending is None:
+                self._first_pending = now
+            if self._flush_timer:
+                self._flush_timer.cancel()
+            # Quiet period, but never delay a busy stream forever
+            delay = min(self.debounce, max(0.0, self._first_pending + self.max_delay - now))
+            self._flush_timer = threading.Timer(delay, self._flush)
+            self._flush_timer.daemon = True
+            self._flush_timer.start()
+
+    def _flush(self):
+        with self._lock:
+            paths = self._pending
+            self._pending = set()
+            self._first_pending = None
+            self._flush_timer = None
+
+        external = sorted(p for p in paths if not self._is_own(p))
+        if not external:
+            return
+        rel_paths = [os.path.relpath(p, self.root).replace(os.sep, '/') for p in external]
+        self.api.log(f"[FileWatcher] External changes: {', '.join(rel_paths[:10])}"
+                     + (f" (+{len(rel_paths) - 10} more)" if len(rel_paths) > 10 else ""))
+
+        if any(p.startswith("workspaces/") for p in rel_paths):
+            self.api._workspaces.reset()
+
+        event = {'items': [], 'assets': [], 'files': rel_paths}
+        for rel_path in rel_paths:
+            if rel_path in ("config.json", "screenlayout.txt"):
+                workspace = 'main'
+            elif rel_path.startswith("workspaces/") and rel_path.endswith(".json") and rel_path != "workspaces/index.json":
+                workspace = rel_path[len("workspaces/"):-len(".json")]
+            else:
+                if rel_path.startswith("assets/"):
+                    event['assets'].append(rel_path)
+                continue
+            if any(entry['workspace'] == workspace for entry in event['items']):
+                continue
+            try:
+                delta = self._item_delta(workspace)
+            except Exception as e:
+                self.api.log(f"[FileWatcher] Could not read {rel_path}: {e}", "WARNING")
+                continue
+            if delta:
+                event['items'].append(delta)
+        self._push(event)
+
+    def read_items(self, workspace):
+        """Saved items of any workspace, coordinates merged, without touching the baseline."""
+        if workspace == 'main':
+            config_path = os.path.join(self.api._get_share_dir(), "config.json")
+            if not os.path.exists(config_path):
+                return []
+            with open(config_path, 'r', encoding='utf-8') as f:
+                items = json.load(f).get('desktop_items') or []
+            return self.api._merge_coords(items)
+        return self.api._workspaces.load_items(workspace)
+
+    def _item_delta(self, workspace):
+        items = self.read_items(workspace)
+        self.api._search.sync_items(workspace, items)
+        companion = self.api._loaded('_companion')
+        if companion is not None and workspace == self.api._workspaces.active:
+            companion.publish_items(workspace, items)
+        current = {item.get('id'): _canonical(item) for item in items if isinstance(item, dict)}
+        with self._lock:
+            known = self._known_items.get(workspace)
+            self._known_items[workspace] = current
+        if known is None:
+            return {'workspace': workspace, 'full': True, 'items': items}
+        upserted = [item for item in items if isinstance(item, dict) and known.get(item.get('id')) != current[item.get('id')]]
+        removed = [item_id for item_id in known if item_id not in current]
+        if not upserted and not removed:
+            return None
+        return {'workspace': workspace, 'full': False, 'upserted': upserted, 'removed': removed,
+                'order': [item.get('id') for item in items if isinstance(item, dict)]}
+
+    def _push(self, event):
+        window = self.api._window
+        if not window:
+            return
+        try:
+            window.evaluate_js(f"window.onDataDirChanged && window.onDataDirChanged({json.dumps(event)})")
+        except Exception as e:
+            self.api.log(f"[FileWatcher] Could not notify page: {e}", "WARNING")
@@ -0,0 +1,266 @@
+import os
+import io
+import sys
+import json
+import time
+import inspect
+import bisect
+import datetime
+import functools
+import threading
+import faulthandler
+import collections
+
+PROBE_INTERVAL = 2.0
+HANG_THRESHOLD = 5.0  # seconds a probe may be outstanding before a report is written
+RECENT_CALLS = 50
+MAX_REPORTS = 10
+# log is called from Python on every thread as well, so it would drown out real
+# bridge calls; extension calls have their own deadlines and latency stats
+UNTRACKED = {'log', 'call_extension'}
+# Upper bounds (ms) of the latency histogram buckets; the last one is open-ended
+BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+
+
+class LatencyHistogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.total = 0
+        self.max_ms = 0.0
+
+    def add(self, ms):
+        self.counts[bisect.bisect_left(BUCKETS_MS, ms)] += 1
+        self.total += 1
+        self.max_ms = max(self.max_ms, ms)
+
+    def to_dict(self):
+        labels = [f"<={b}ms" for b in BUCKETS_MS] + [f">{BUCKETS_MS[-1]}ms"]
+        return {'count': self.total, 'max_ms': round(self.max_ms, 1),
+                'buckets': {label: n for label, n in zip(labels, self.counts) if n}}
+
+    def summary(self):
+        data = self.to_dict()
+        buckets = ", ".join(f"{k}: {v}" for k, v in data['buckets'].items())
+        return f"{data['count']} samples, max {data['max_ms']} ms ({buckets})"
+
+
+class Watchdog:
+    """Detects hangs of the page, the save executor and bridge calls.
+
+    A monitor thread pings the page through evaluate_js and queues a no-op on
+    the executor every PROBE_INTERVAL. When a probe (or a bridge call) stays
+    outstanding longer than the threshold, a report with every Python thread's
+    stack, the pending executor tasks and the recent bridge calls is written
+    to diagnostics/. Latencies go into per-probe histograms for the session.
+    """
+
+    def __init__(self, api, threshold=HANG_THRESHOLD, interval=PROBE_INTERVAL):
+        self.api = api
+        self.threshold = threshold
+        self.interval = interval
+        self.histograms = collections.defaultdict(LatencyHistogram)
+        self._lock = threading.Lock()
+        self._recent = collections.deque(maxlen=RECENT_CALLS)
+        self._in_flight = {}  # call id -> (name, start, thread name)
+        self._call_ids = iter(range(sys.maxsize))
+        self._probes = {}  # probe kind -> start time while outstanding
+        self._reported = set()  # probe kinds / call ids already reported this episode
+        self._stop = threading.Event()
+        self._thread = None
+        self._fault_file = None
+
+    def _dir(self):
+        return os.path.join(self.api._get_share_dir(), "diagnostics")
+
+    # --- Bridge call tracking ---
+
+    def instrument(self, obj):
+        """Wraps the public methods of the js_api object to time every call."""
+        for name, method in inspect.getmembers(obj, inspect.ismethod):
+            if name.startswith('_') or name in UNTRACKED:
+                continue
+            setattr(obj, name, self._wrap(name, method))
+
+    def _wrap(self, name, method):
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            call_id = next(self._call_ids)
+            start = time.time()
+            with self._lock:
+                self._in_flight[call_id] = (name, start, threading.current_thread().name)
+            error = None
+            try:
+                return method(*args, **kwargs)
+            except Exception as e:
+                error = repr(e)
+                raise
+            finally:
+                elapsed = (time.time() - start) * 1000
+                with self._lock:
+                    self._in_flight.pop(call_id, None)
+                    self._reported.discard(call_id)
+                    self._recent.append((name, start, round(elapsed, 1), error))
+                    self.histograms['bridge'].add(elapsed)
+        # pywebview reads the parameter names to build the JS stub
+        wrapper.__signature__ = inspect.signature(method)
+        return wrapper
+
+    # --- Probes ---
+
+    def start(self):
+        if self._thread:
+            return
+        self._enable_fault_log()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='chomka-watchdog', daemon=True)
+        self._thread.start()
+        self.api.log(f"[Watchdog] Started (threshold {self.threshold:.1f} s)")
+
+    def stop(self):
+        if not self._thread:
+            return
+        self._stop.set()
+        self._thread = None
+        for kind, histogram in sorted(self.histograms.items()):
+            self.api.log(f"[Watchdog] {kind} latency: {histogram.summary()}")
+        try:
+            os.makedirs(self._dir(), exist_ok=True)
+            with open(os.path.join(self._dir(), "latency.json"), 'w', encoding='utf-8') as f:
+                json.dump(self.stats(), f, indent=2)
+        except OSError as e:
+            self.api.log(f"[Watchdog] Could not write latency stats: {e}", "WARNING")
+
+    def _enable_fault_log(self):
+        # Fatal errors (segfaults in the GUI toolkit, aborts) get a traceback too
+        try:
+            os.makedirs(self._dir(), exist_ok=True)
+            self._fault_file = open(os.path.join(self._dir(), "fatal.log"), 'a', encoding='utf-8')
+            faulthandler.enable(self._fault_file, all_threads=True)
+        except (OSError, RuntimeError) as e:
+            self.api.log(f"[Watchdog] faulthandler unavailable: {e}", "WARNING")
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self._tick()
+            except Exception as e:
+                self.api.log(f"[Watchdog] Probe failed: {e}", "ERROR")
+
+    def _tick(self):
+        now = time.time()
+        with self._lock:
+            probes = dict(self._probes)
+        if 'executor' not in probes:
+            self._probe_executor()
+        if 'page' not in probes and self.api._window:
+            self._probe_page()
+
+        for kind, start in probes.items():
+            if now - start > self.threshold and kind not in self._reported:
+                self._reported.add(kind)
+                self.dump_report(f"{kind} unresponsive for {now - start:.1f} s")
+        with self._lock:
+            slow_calls = [(cid, name, start) for cid, (name, start, _) in self._in_flight.items()
+                          if now - start > self.threshold and cid not in self._reported]
+            self._reported.update(cid for cid, _, _ in slow_calls)
+        for cid, name, start in slow_calls:
+            self.dump_report(f"bridge call {name} running for {now - start:.1f} s")
+
+    def _begin(self, kind):
+        with self._lock:
+            self._probes[kind] = time.time()
+
+    def _end(self, kind):
+        with self._lock:
+            start = self._probes.pop(kind, None)
+            if start is None:
+                return
+            elapsed = (time.time() - start) * 1000
+            self.histograms[kind].add(elapsed)
+            recovered = kind in self._reported
+            self._reported.discard(kind)
+        if recovered:
+            self.api.log(f"[Watchdog] {kind} recovered after {elapsed / 1000:.1f} s", "WARNING")
+
+    def _probe_executor(self):
+        self._begin('executor')
+        try:
+            self.api._executor.submit(self._end, 'executor')
+        except RuntimeError:
+            # Executor shut down: the app is quitting
+            with self._lock:
+                self._probes.pop('executor', None)
+
+    def _probe_page(self):
+        # evaluate_js blocks until the page answers, so it gets its own thread
+        def ping():
+            try:
+                self.api._window.evaluate_js('1')
+            except Exception:
+                pass
+            self._end('page')
+        self._begin('page')
+        threading.Thread(target=ping, name='chomka-watchdog-ping', daemon=True).start()
+
+    # --- Reports ---
+
+    def _pending_tasks(self):
+        queue = getattr(self.api._executor, '_work_queue', None)
+        tasks = []
+        for work_item in list(getattr(queue, 'queue', [])):
+            fn = getattr(work_item, 'fn', None)
+            if fn is not None:
+                tasks.append(getattr(fn, '__qualname__', repr(fn)))
+        return tasks
+
+    def dump_report(self, reason):
+        """Writes a hang report; returns its path (or None if it failed)."""
+        now = time.time()
+        stamp = datetime.datetime.fromtimestamp(now).strftime("%Y%m%d-%H%M%S-%f")[:-3]
+        with self._lock:
+            in_flight = sorted(self._in_flight.values(), key=lambda c: c[1])
+            recent = list(self._recent)
+            probes = dict(self._probes)
+        pending = self._pending_tasks()
+
+        out = io.StringIO()
+        out.write(f"Chomka hang report {stamp}\nReason: {reason}\n\n")
+        out.write("Outstanding probes:\n")
+        for kind, start in probes.items():
+            out.write(f"  {kind}: {now - start:.1f} s\n")
+        out.write("\nBridge calls in flight:\n")
+        for name, start, thread in in_flight:
+            out.write(f"  {name} on {thread}: {now - start:.1f} s\n")
+        out.write(f"\nPending executor tasks ({len(pending)}):\n")
+        for task in pending:
+            out.write(f"  {task}\n")
+        out.write(f"\nLast {len(recent)} bridge calls (oldest first):\n")
+        for name, start, elapsed, error in recent:
+            when = datetime.datetime.fromtimestamp(start).strftime("%H:%M:%S.%f")[:-3]
+            out.write(f"  {when} {name} {elapsed} ms" + (f" raised {error}" if error else "") + "\n")
+        out.write("\nLatency this session:\n")
+        for kind, histogram in sorted(self.histograms.items()):
+            out.write(f"  {kind}: {histogram.summary()}\n")
+        out.write("\nThread stacks:\n")
+
+        try:
+            os.makedirs(self._dir(), exist_ok=True)
+            path = os.path.join(self._dir(), f"hang-{stamp}.txt")
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(out.getvalue())
+                f.flush()
+                faulthandler.dump_traceback(f, all_threads=True)
+            self._prune_reports()
+        except OSError as e:
+            self.api.log(f"[Watchdog] Could not write hang report: {e}", "ERROR")
+            return None
+        self.api.log(f"[Watchdog] {reason}; report written to {path}", "WARNING")
+        return path
+
+    def _prune_reports(self):
+        reports = sorted(n for n in os.listdir(self._dir()) if n.startswith("hang-"))
+        for name in reports[:-MAX_REPORTS]:
+            os.remove(os.path.join(self._dir(), name))
+
+    def stats(self):
+        return {kind: histogram.to_dict() for kind, histogram in sorted(self.histograms.items())}
@@ -0,0 +1,239 @@
+import os
+import io
+import sys
+import json
+import glob
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+ICON_SIZE = 64  # CSS pixels, matches .app-icon-container
+SCALES = (1, 2, 3)
+RUNTIME_COLUMNS = 8
+RUNTIME_PAGE_ROWS = 8  # the runtime atlas is split into sheets of 8x8 icons
+BUNDLED_DIR = os.path.join("assets", "atlas")
+MAX_REMOTE_BYTES = 5 * 1024 * 1024  # an icon larger than this is not an icon
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+
+
+def _fit(img, size):
+    """Scales an icon into a size x size transparent cell, keeping its aspect."""
+    from PIL import Image
+    img = img.convert('RGBA')
+    img.thumbnail((size, size), Image.Resampling.LANCZOS)
+    cell = Image.new('RGBA', (size, size), (0, 0, 0, 0))
+    cell.paste(img, ((size - img.width) // 2, (size - img.height) // 2))
+    return cell
+
+
+def _sheet_name(prefix, version, scale):
+    return f"{prefix}-{version}@{scale}x.png"
+
+
+def build_atlas(icons, out_dir, prefix="icons", columns=None):
+    """Packs icons ({key: image path}) into one sheet per scale plus a manifest.
+
+    Positions in the manifest are CSS pixels at 1x; every scale uses the same
+    layout, so the page only swaps the sheet URL for the display density.
+    """
+    from PIL import Image
+    keys = sorted(icons)
+    columns = columns or max(1, int(len(keys) ** 0.5 + 0.999))
+    rows = max(1, (len(keys) + columns - 1) // columns)
+    sources = {key: Image.open(icons[key]) for key in keys}
+
+    digest = hashlib.sha256()
+    for key in keys:
+        digest.update(key.encode('utf-8'))
+        with open(icons[key], 'rb') as f:
+            digest.update(hashlib.sha256(f.read()).digest())
+    version = digest.hexdigest()[:12]
+
+    os.makedirs(out_dir, exist_ok=True)
+    for old in glob.glob(os.path.join(out_dir, f"{prefix}-*@*x.png")):
+        os.remove(old)
+
+    sheets = {}
+    for scale in SCALES:
+        cell = ICON_SIZE * scale
+        sheet = Image.new('RGBA', (columns * cell, rows * cell), (0, 0, 0, 0))
+        for index, key in enumerate(keys):
+            sheet.paste(_fit(sources[key], cell), ((index % columns) * cell, (index // columns) * cell))
+        name = _sheet_name(prefix, version, scale)
+        sheet.save(os.path.join(out_dir, name), optimize=True)
+        sheets[str(scale)] = name
+
+    manifest = {
+        'version': version,
+        'cell': ICON_SIZE,
+        'columns': columns,
+        'rows': rows,
+        'sheets': sheets,
+        'icons': {key: {'x': (i % columns) * ICON_SIZE, 'y': (i // columns) * ICON_SIZE} for i, key in enumerate(keys)},
+    }
+    with open(os.path.join(out_dir, f"{prefix}.json"), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    for img in sources.values():
+        img.close()
+    return manifest
+
+
+def build_bundled_atlas(app_dir="."):
+    """Build step: packs assets/*.png (the bundled app icons) into assets/atlas."""
+    assets_dir = os.path.join(app_dir, "assets")
+    icons = {f"assets/{os.path.basename(p)}": p for p in glob.glob(os.path.join(assets_dir, "*.png"))}
+    return build_atlas(icons, os.path.join(app_dir, BUNDLED_DIR))
+
+
+def load_bundled_manifest(app_dir):
+    path = os.path.join(app_dir, BUNDLED_DIR, "icons.json")
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    manifest['base'] = BUNDLED_DIR.replace(os.sep, '/') + '/'
+    return manifest
+
+
+class RuntimeAtlas:
+    """Atlas of user icons in <data>/cache/atlas, grown one cell at a time.
+
+    New icons go into the next free cell of a fixed-width grid. The grid is
+    split into pages of RUNTIME_PAGE_ROWS rows with their own sheets, so adding
+    icons re-encodes only the last page instead of every icon packed so far.
+    """
+
+    def __init__(self, api):
+        self.api = api
+        self._worker = ThreadPoolExecutor(max_workers=1, thread_name_prefix='chomka-atlas')
+        self._lock = threading.Lock()
+        self._manifest = None
+        self._failed = set()
+
+    def _dir(self):
+        return os.path.join(self.api._get_share_dir(), "cache", "atlas")
+
+    def _manifest_path(self):
+        return os.path.join(self._dir(), "user.json")
+
+    def manifest(self):
+        with self._lock:
+            if self._manifest is None:
+                self._manifest = {'version': '0', 'cell': ICON_SIZE, 'columns': RUNTIME_COLUMNS,
+                                  'rows': RUNTIME_PAGE_ROWS, 'sheets': {}, 'icons': {}}
+                path = self._manifest_path()
+                if os.path.exists(path):
+                    try:
+                        with open(path, 'r', encoding='utf-8') as f:
+                            manifest = json.load(f)
+                        if not all(isinstance(names, list) for names in manifest['sheets'].values()):
+                            raise ValueError("single-sheet layout of an older version")
+                        self._manifest = manifest
+                    except Exception as e:
+                        self.api.log(f"[IconAtlas] Runtime manifest unreadable, starting over: {e}", "WARNING")
+                        for old in glob.glob(os.path.join(self._dir(), "user*@*x.png")):
+                            os.remove(old)
+            return self._manifest
+
+    def reset(self):
+        with self._lock:
+            self._manifest = None
+            self._failed.clear()
+
+    def _load_icon(self, url):
+        from PIL import Image
+        if url.startswith('http://') or url.startswith('https://'):
+            from urllib.request import Request, urlopen
+            request = Request(url, headers={'User-Agent': USER_AGENT})
+            with urlopen(request, timeout=10) as response:
+                data = response.read(MAX_REMOTE_BYTES + 1)
+            if len(data) > MAX_REMOTE_BYTES:
+                raise ValueError("icon too large")
+            return Image.open(io.BytesIO(data))
+        root = os.path.realpath(self.api._get_share_dir())
+        path = os.path.realpath(os.path.join(root, url))
+        if os.path.commonpath([root, path]) != root:
+            raise ValueError(f"Not in the data folder: {url}")
+        return Image.open(path)
+
+    def add(self, urls, callback=None):
+        """Queues icons for the atlas; callback(manifest) runs if any were added."""
+        def job():
+            manifest = self._add_sync(urls)
+            if manifest and callback:
+                callback(manifest)
+            return manifest
+        return self._worker.submit(job)
+
+    def _add_sync(self, urls):
+        from PIL import Image
+        manifest = self.manifest()
+        pending = [u for u in dict.fromkeys(urls) if u and u not in manifest['icons'] and u not in self._failed]
+        if not pending:
+            return None
+
+        images = {}
+        for url in pending:
+            try:
+                images[url] = self._load_icon(url)
+            except Exception as e:
+                self._failed.add(url)
+                self.api.log(f"[IconAtlas] Could not load icon {url}: {e}", "WARNING")
+        if not images:
+            return None
+
+        with self._lock:
+            columns = manifest['columns']
+            per_page = columns * RUNTIME_PAGE_ROWS
+            start = len(manifest['icons'])
+            total = start + len(images)
+            out_dir = self._dir()
+            os.makedirs(out_dir, exist_ok=True)
+
+            # page -> [(slot on the page, image)]; earlier pages are full and stay as they are
+            pages = {}
+            for offset, img in enumerate(images.values()):
+                page, slot = divmod(start + offset, per_page)
+                pages.setdefault(page, []).append((slot, img))
+
+            sheets = {}
+            for scale in SCALES:
+                cell = ICON_SIZE * scale
+                names = list(manifest['sheets'].get(str(scale), []))
+                for page, cells in pages.items():
+                    old_name = names[page] if page < len(names) else None
+                    sheet = Image.new('RGBA', (columns * cell, RUNTIME_PAGE_ROWS * cell), (0, 0, 0, 0))
+                    if old_name and os.path.exists(os.path.join(out_dir, old_name)):
+                        with Image.open(os.path.join(out_dir, old_name)) as old:
+                            sheet.paste(old, (0, 0))
+                    for slot, img in cells:
+                        sheet.paste(_fit(img, cell), ((slot % columns) * cell, (slot // columns) * cell))
+                    # Named by how many icons the page holds, so a grown page gets a new URL
+                    name = _sheet_name(f"user{page}", cells[-1][0] + 1, scale)
+                    sheet.save(os.path.join(out_dir, name), optimize=True)
+                    if old_name is None:
+                        names.append(name)
+                    else:
+                        names[page] = name
+                        if old_name != name and os.path.exists(os.path.join(out_dir, old_name)):
+                            os.remove(os.path.join(out_dir, old_name))
+                sheets[str(scale)] = names
+
+            for offset, url in enumerate(images):
+                page, slot = divmod(start + offset, per_page)
+                manifest['icons'][url] = {'page': page, 'x': (slot % columns) * ICON_SIZE, 'y': (slot // columns) * ICON_SIZE}
+            manifest.update({'version': str(total), 'rows': RUNTIME_PAGE_ROWS, 'sheets': sheets})
+            self.api._write_atomic(self._manifest_path(), json.dumps(manifest, indent=2))
+        for img in images.values():
+            img.close()
+        self.api.log(f"[IconAtlas] Added {len(images)} icon(s) to the runtime atlas ({total} total)")
+        return manifest
+
+    def shutdown(self):
+        self._worker.shutdown(wait=False)
+
+
+if __name__ == '__main__':
+    # Build step: python icon_atlas.py [app dir]
+    result = build_bundled_atlas(sys.argv[1] if len(sys.argv) > 1 else ".")
+    print(f"Icon atlas: {len(result['icons'])} icons, version {result['version']}")
@@ -0,0 +1,401 @@
+import os
+import json
+import time
+import uuid
+import base64
+import shutil
+import hashlib
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+JOBS_DIR = "jobs"  # checkpoints of resumable jobs, one <id>.json each
+CHUNK = 1024 * 1024
+CHECKPOINT_BYTES = 16 * CHUNK  # copy jobs persist their offset this often
+PROGRESS_INTERVAL = 0.2
+FINISHED_KEPT = 50
+# How many jobs of each kind may run at once
+DEFAULT_LIMITS = {'copy_file': 2, 'save_asset': 2, 'migrate_assets': 1}
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job:
+    """One piece of background work. Handlers report progress, check for
+    cancellation and store checkpoints through it."""
+
+    def __init__(self, manager, kind, args, job_id=None, checkpoint=None, resumed=False):
+        self.manager = manager
+        self.id = job_id or uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.args = args
+        self.checkpoint = checkpoint or {}
+        self.resumed = resumed
+        self.created = time.time()
+        self.state = 'queued'
+        self.done = 0
+        self.total = 0
+        self.result = None
+        self.error = None
+        self._cancel = threading.Event()
+        self._finished = threading.Event()
+        self._last_push = 0.0
+
+    @property
+    def finished(self):
+        return self.state in ('done', 'failed', 'cancelled')
+
+    def check_cancelled(self):
+        if self._cancel.is_set():
+            raise JobCancelled()
+
+    def progress(self, done, total=None):
+        """Records progress, pushes it (throttled) and stops here if cancelled."""
+        self.done = done
+        if total is not None:
+            self.total = total
+        self.check_cancelled()
+        now = time.time()
+        if now - self._last_push >= PROGRESS_INTERVAL:
+            self._last_push = now
+            self.manager._push(self)
+
+    def save_checkpoint(self, **data):
+        self.checkpoint.update(data)
+        self.manager._persist(self)
+
+    def _finish(self):
+        # Finished jobs stay listed for a while; drop large arguments (base64 data)
+        self.args = {'label': self.args.get('label')} if self.args.get('label') else {}
+        self._finished.set()
+
+    def wait(self, timeout=None):
+        return self._finished.wait(timeout)
+
+    def to_dict(self):
+        return {
+            'id': self.id, 'kind': self.kind, 'label': self.args.get('label') or self.kind,
+            'state': self.state, 'done': self.done, 'total': self.total,
+            'resumed': self.resumed, 'finished': self.finished,
+            'success': self.state == 'done', 'result': self.result, 'error': self.error,
+        }
+
+
+def _asset_ext(header):
+    """File extension from a data URI header (data:image/png;base64,)."""
+    if "/" in header and ";" in header:
+        return header.split("/")[1].split(";")[0]
+    return "bin"
+
+
+def _decode_data_uri(api, data, dest, job=None):
+    """Streams base64 data (with or without a data URI header) into dest."""
+    start = data.find(",", 0, 256) + 1
+    step = CHUNK // 3 * 4  # whole base64 quanta per chunk
+    tmp_path = dest + ".tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            for pos in range(start, len(data), step):
+                f.write(base64.b64decode(data[pos:pos + step]))
+                if job:
+                    job.progress(min(pos + step, len(data)) - start, len(data) - start)
+        os.replace(tmp_path, dest)
+        api._watcher.note_write(dest)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _assets_dir(api):
+    assets_dir = os.path.join(api._get_share_dir(), "assets")
+    os.makedirs(assets_dir, exist_ok=True)
+    return assets_dir
+
+
+def save_asset(api, job):
+    """args: data (base64 or data URI), id (prefix of the asset name)."""
+    data = job.args['data']
+    start = data.find(",", 0, 256)
+    ext = _asset_ext(data[:start]) if start > 0 else "bin"
+    filename = f"{job.args.get('id', 'asset')}_{uuid.uuid4().hex}.{ext}"
+    _decode_data_uri(api, data, os.path.join(_assets_dir(api), filename), job)
+    api.log(f"Asset saved: {filename}")
+    return {'path': f"assets/{filename}"}
+
+
+def copy_file(api, job):
+    """args: src (absolute path), prefix. Resumes from the last checkpointed offset."""
+    src = job.args['src']
+    stat = os.stat(src)
+    name = job.checkpoint.get('name') or f"{job.args.get('prefix', 'user')}_{uuid.uuid4().hex}{os.path.splitext(src)[1]}"
+    dest = os.path.join(_assets_dir(api), name)
+    tmp_path = dest + ".tmp"
+
+    offset = job.checkpoint.get('offset', 0)
+    # Start over if the source changed or the partial copy is gone
+    if job.checkpoint.get('mtime') != stat.st_mtime or not os.path.exists(tmp_path) \
+            or os.path.getsize(tmp_path) < offset:
+        offset = 0
+    job.save_checkpoint(name=name, offset=offset, mtime=stat.st_mtime)
+    if offset:
+        api.log(f"[Jobs] Resuming copy of {src} at {offset} of {stat.st_size} bytes")
+
+    try:
+        with open(src, "rb") as fin, open(tmp_path, "r+b" if offset else "wb") as fout:
+            fin.seek(offset)
+            fout.seek(offset)
+            fout.truncate()
+            checkpointed = offset
+            for chunk in iter(lambda: fin.read(CHUNK), b""):
+                fout.write(chunk)
+                offset += len(chunk)
+                if offset - checkpointed >= CHECKPOINT_BYTES:
+                    fout.flush()
+                    os.fsync(fout.fileno())
+                    job.save_checkpoint(offset=offset)
+                    checkpointed = offset
+                job.progress(offset, stat.st_size)
+        shutil.copystat(src, tmp_path)
+        os.replace(tmp_path, dest)
+        api._watcher.note_write(dest)
+    except JobCancelled:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    api.log(f"[Jobs] Copied {src} to assets/{name}")
+    return {'path': f"assets/{name}"}
+
+
+def migrate_assets(api, job):
+    """args: workspace. Moves base64 images of a saved desktop, and of its
+    folders' image entries, into assets/.
+
+    Asset names derive from the image content, so a resumed or repeated run
+    only skips over what is already on disk. The page applies the returned
+    paths to its items and saves them; folder entries come with the length
+    of the data URI they replace, so the page can tell they are unchanged.
+    """
+    workspace = job.args.get('workspace') or api._workspaces.active
+    items = api._watcher.read_items(workspace)
+    todo = [(item['id'], item['id'], item['src']) for item in items if item.get('type') in ('image', 'gif')
+            and str(item.get('src', '')).startswith('data:image')]
+    for item in items:
+        if item.get('type') == 'folder':
+            todo += [(f"{item['id']}#{index}", f"{item['id']}-tab", tab['url'])
+                     for index, tab in enumerate(item.get('tabs') or [])
+                     if tab.get('type') == 'image' and str(tab.get('url', '')).startswith('data:image')]
+    paths = dict(job.checkpoint.get('paths', {}))
+    assets_dir = _assets_dir(api)
+    job.progress(0, len(todo))
+    for n, (key, prefix, src) in enumerate(todo, 1):
+        digest = hashlib.sha1(src.encode('utf-8')).hexdigest()[:16]
+        filename = f"{prefix}_{digest}.{_asset_ext(src[:src.find(',', 0, 256)])}"
+        if not os.path.exists(os.path.join(assets_dir, filename)):
+            _decode_data_uri(api, src, os.path.join(assets_dir, filename))
+        paths[key] = f"assets/{filename}"
+        job.save_checkpoint(paths=paths)
+        job.progress(n)
+    if todo:
+        api.log(f"[Jobs] Migrated {len(todo)} embedded images of workspace {workspace} to assets")
+    tabs = [{'folder': key.split('#')[0], 'index': int(key.split('#')[1]), 'length': len(src), 'path': paths[key]}
+            for key, prefix, src in todo if '#' in key]
+    return {'workspace': workspace, 'paths': {key: path for key, path in paths.items() if '#' not in key}, 'tabs': tabs}
+
+
+class JobManager:
+    """Runs long operations off the bridge thread on a shared pool, at most
+    limits[kind] at a time per kind.
+
+    Progress and completion go to window.onJobProgress. Resumable kinds keep
+    their arguments and checkpoint in jobs/<id>.json until they finish, so a
+    job interrupted by a quit or crash continues on the next launch.
+    """
+
+    def __init__(self, api, limits=None):
+        self.api = api
+        self.limits = dict(DEFAULT_LIMITS, **(limits or {}))
+        self._handlers = {}
+        self._resumable = set()
+        self._jobs = {}  # id -> Job, active and recently finished
+        self._queues = {}  # kind -> deque of queued jobs
+        self._running = {}  # kind -> count
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max(1, sum(self.limits.values())),
+                                        thread_name_prefix='chomka-job')
+        self._closed = False
+
+        self.register('save_asset', save_asset)
+        self.register('copy_file', copy_file, resumable=True)
+        self.register('migrate_assets', migrate_assets, resumable=True)
+
+    def register(self, kind, handler, resumable=False):
+        self._handlers[kind] = handler
+        self.limits.setdefault(kind, 1)
+        if resumable:
+            self._resumable.add(kind)
+
+    def _dir(self):
+        return os.path.join(self.api._get_share_dir(), JOBS_DIR)
+
+    def _checkpoint_path(self, job):
+        return os.path.join(self._dir(), f"{job.id}.json")
+
+    # --- Queueing ---
+
+    def _find_active(self, kind, args):
+        for job in self._jobs.values():
+            if job.kind == kind and job.args == args and not job.finished and not job._cancel.is_set():
+                return job
+        return None
+
+    def start(self, kind, args=None, job_id=None, checkpoint=None, resumed=False):
+        """Queues a job and returns it; an identical resumable job already
+        queued or running is returned instead of starting a second one."""
+        if kind not in self._handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        args = dict(args or {})
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Job manager is shut down")
+            if kind in self._resumable:
+                existing = self._find_active(kind, args)
+                if existing:
+                    return existing
+            job = Job(self, kind, args, job_id, checkpoint, resumed)
+            self._jobs[job.id] = job
+            self._queues.setdefault(kind, deque()).append(job)
+        if kind in self._resumable:
+            self._persist(job)
+        self._push(job)
+        self._dispatch(kind)
+        return job
+
+    def _dispatch(self, kind):
+        with self._lock:
+            queue = self._queues.get(kind)
+            while queue and not self._closed and self._running.get(kind, 0) < self.limits[kind]:
+                job = queue.popleft()
+                self._running[kind] = self._running.get(kind, 0) + 1
+                self._pool.submit(self._run, job)
+
+    def _run(self, job):
+        job.state = 'running'
+        self._push(job)
+        try:
+            job.check_cancelled()
+            job.result = self._handlers[job.kind](self.api, job)
+            job.state = 'done'
+        except JobCancelled:
+            job.state = 'cancelled'
+            self.api.log(f"[Jobs] {job.kind} {job.id} cancelled")
+        except Exception as e:
+            job.state = 'failed'
+            job.error = str(e)
+            self.api.log(f"[Jobs] {job.kind} {job.id} failed: {e}", "ERROR")
+        finally:
+            self._forget_checkpoint(job)
+            job._finish()
+            self._push(job)
+            with self._lock:
+                self._running[job.kind] -= 1
+                self._trim()
+            self._dispatch(job.kind)
+
+    def _trim(self):
+        finished = [job for job in self._jobs.values() if job.finished]
+        for job in finished[:-FINISHED_KEPT]:
+            del self._jobs[job.id]
+
+    def cancel(self, job_id):
+        job = self._jobs.get(job_id)
+        if not job or job.finished:
+            return False
+        job._cancel.set()
+        with self._lock:
+            queue = self._queues.get(job.kind)
+            queued = queue is not None and job in queue
+            if queued:
+                queue.remove(job)
+        if queued:
+            # Never started: finish it here instead of in a worker
+            job.state = 'cancelled'
+            self._forget_checkpoint(job)
+            job._finish()
+            self._push(job)
+        return True
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def list(self):
+        return [job.to_dict() for job in self._jobs.values()]
+
+    # --- Checkpoints ---
+
+    def _persist(self, job):
+        if job.kind not in self._resumable or job.finished:
+            return
+        try:
+            os.makedirs(self._dir(), exist_ok=True)
+            record = {'id': job.id, 'kind': job.kind, 'args': job.args,
+                      'checkpoint': job.checkpoint, 'created': job.created}
+            self.api._write_atomic(self._checkpoint_path(job), json.dumps(record))
+        except Exception as e:
+            self.api.log(f"[Jobs] Could not checkpoint {job.id}: {e}", "WARNING")
+
+    def _forget_checkpoint(self, job):
+        # Jobs cut short by shutdown keep their checkpoint for the next launch
+        if self._closed and job.state != 'done':
+            return
+        path = self._checkpoint_path(job)
+        if os.path.exists(path):
+            try:
+                os.remove(path)
+            except OSError as e:
+                self.api.log(f"[Jobs] Could not remove checkpoint {path}: {e}", "WARNING")
+
+    def resume(self):
+        """Re-queues jobs interrupted in an earlier session. Returns their ids."""
+        if not os.path.isdir(self._dir()):
+            return []
+        resumed = []
+        for name in sorted(os.listdir(self._dir())):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self._dir(), name)
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    record = json.load(f)
+                if record['id'] in self._jobs or record['kind'] not in self._resumable:
+                    continue
+                job = self.start(record['kind'], record['args'], record['id'], record.get('checkpoint'), resumed=True)
+                if job.id != record['id']:
+                    # The same work was started again this session
+                    os.remove(path)
+                    continue
+                resumed.append(job.id)
+            except Exception as e:
+                self.api.log(f"[Jobs] Dropping unreadable checkpoint {name}: {e}", "WARNING")
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+        if resumed:
+            self.api.log(f"[Jobs] Resumed {len(resumed)} interrupted jobs")
+        return resumed
+
+    def _push(self, job):
+        if not self.api._window:
+            return
+        try:
+            self.api._window.evaluate_js(f"window.onJobProgress && window.onJobProgress({json.dumps(job.to_dict())})")
+        except Exception as e:
+            self.api.log(f"[Jobs] Could not push progress: {e}", "WARNING")
+
+    def shutdown(self):
+        """Stops dispatching; running jobs are abandoned with their checkpoints."""
+        with self._lock:
+            self._closed = True
+        self._pool.shutdown(wait=False)
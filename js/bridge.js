@@ -53,6 +53,33 @@ window.chomka.init = function () {
     return this._bridgeReadyPromise;
 };
 
+// Startup timing: report when the JS bridge came up
+(function () {
+    const markReady = () => {
+        try { window.pywebview.api.mark_startup('pywebviewready'); } catch (e) { }
+    };
+    if (window.pywebview && window.pywebview.api) markReady();
+    else window.addEventListener('pywebviewready', markReady, { once: true });
+})();
+
+// Background jobs: the backend pushes every state change to onJobProgress.
+// Finished events nobody waits for yet are kept briefly (a job can finish
+// before startJob's reply arrives).
+const jobWaiters = new Map();
+const finishedJobs = new Map();
+window.onJobProgress = function (event) {
+    window.dispatchEvent(new CustomEvent('chomka-job', { detail: event }));
+    if (!event.finished) return;
+    const waiters = jobWaiters.get(event.id);
+    if (waiters) {
+        jobWaiters.delete(event.id);
+        waiters.forEach(resolve => resolve(event));
+        return;
+    }
+    finishedJobs.set(event.id, event);
+    if (finishedJobs.size > 50) finishedJobs.delete(finishedJobs.keys().next().value);
+};
+
 // --- Bridge Methods ---
 Object.assign(window.chomka, {
     saveFile: async function (filename, content, sync = false) {
@@ -111,10 +138,24 @@ Object.assign(window.chomka, {
         return null;
     },
 
+    getItemsPage: async function (cursor = null, limit = 200, viewport = null) {
+        if (window.pywebview) {
+            try {
+                return await window.pywebview.api.get_items_page(cursor, limit, viewport);
+            } catch (e) {
+                console.error("Bridge Error: getItemsPage", e);
+                return { success: false, error: e.toString() };
+            }
+        }
+        return { success: false };
+    },
+
     saveAsset: async function (base64, suggestedName) {
         if (window.pywebview) {
             try {
-                return await window.pywebview.api.save_asset(base64, suggestedName);
+                const job = await window.chomka.runJob('save_asset', { data: base64, id: suggestedName, label: suggestedName });
+                if (job.success) return { success: true, path: job.result.path };
+                return { success: false, error: job.error || job.state };
             } catch (e) {
                 console.error("Bridge Error: saveAsset", e);
                 return { success: false };
@@ -135,6 +176,551 @@ Object.assign(window.chomka, {
         return "";
     },
 
+    setAssetServerEnabled: async function (enabled) {
+        if (window.pywebview) {
+            try {
+                return await window.pywebview.api.set_asset_server_enabled(enabled);
+            } catch (e) {
+                console.error("Bridge Error: setAssetServerEnabled", e);
+                return { success: false, error: e.toString() };
+            }
+        }
+        return { success: false };
+    },
+
+    setCompanionEnabled: async function (enabled, lan) {
+        if (window.pywebview) {
+            try {
+                return await window.pywebview.api.set_companion_enabled(enabled, lan === undefined ? null : lan);
+            } catch (e) {
+                console.error("Bridge Error: setCompanionEnabled", e);
+                return { success: false, error: e.toString() };
+            }
+        }
+        return { success: false };
+    },
+
+    getCompanionInfo: async function () {
+        if (window.pywebview) {
+            try {
+                return await window.pywebview.api.get_companion_info();
+            } catch (e) {
+                console.error("Bridge Error: getCompanionInfo", e);
+                return { success: false, error: e.toString() };
+            }
+        }
+        return { success: false };
+    },
+
+    // Fire-and-forget: player events must not wait on the backend
+    companionPlayer: function (itemId, state, time) {
+        if (window.pywebview) {
+            window.pywebview.api.companion_player(itemId, state, time).catch(e => {
+                console.error("Bridge Error: companionPlayer", e);
+            });
+        }
+    },
+
+    getBestProxy: async function (exclude) {
+        if (window.pywebview) {
+            try {
+                return await window.pywebview.api.get_best_proxy(exclude || []);
+            } catch (e) {
+                console.error("Bridge Error: getBestProxy", e);
+                return { success: false, error: e.toString() };
+            }
+        }
+        return { success: false };
+    },
+
+    reportProxyFailure: async function (url) {
+        if (window.pywebview) {
+            try {
+                return await window.pywebview.api.report_proxy_failure(url);
+            } catch (e) {
+                console.error("Bridge Error: reportProxyFailure", e);
+                return { success: false, error: e.toString() };
+            }
+        }
+        return { success: false };
+    },
+
+    setSyncRemote: async function (target) {
+        if (window.pywebview) {
+            try {
+                return await window.pywebview.api.set_sync_remote(target);
+            } catch (e) {
+                console.error("Bridge Error: setSyncRemote", e);
+                return { success: false, error: e.toString() };
+            }
+        }
+        return { success: false };
+    },
+
+    syncNow: async function () {
+        if (window.pywebview) {
+            try {
+                return await window.pywebview.api.sync_now();
+            } catch (e) {
+                console.error("Bridge Error: syncNow", e);
+                return { success: false, error: e.toString() };
+            }
+        }
+        return { success: false };
+    },
+
+    search: async function (query, limit = 20) {
+        if (window.pywebview) {
+            try {
+                return await window.pywebview.api.search(query, limit);
+            } catch (e) {
+                console.error("Bridge Error: search", e);
+                return { success: false, error: e.toString() };
+            }
+        }
+        return { success: false, results: [] };
+    },
+
+    setWallpaper: async function (path) {
+        if (window.pywebview) {
+            try {
+                return await window.pywebview.api.set_wallpaper(path);
+            } catch (e) {
+                console.error("Bridge Error: setWallpaper", e);
+                return { success: false, error: e.toString() };
+            }
+        }
+        return { success: false };
+    },
+
+    getWallpaper: async function () {
+        if (window.pywebview) {
+            try {
+                return await window.pywebview.api.get_wallpaper();
+            } catch (e) {
+                console.error("Bridge Error: getWallpaper", e);
+                return { success: false, error: e.toString() };
+            }
+        }
+        return { success: false };
+    },
+
+    getThumbnail: async function (url, size) {
+        if (window.pywebview) {
+            try {
+                return await window.pywebview.api.get_thumbnail(url, size || 160);
+            } catch (e) {
+                console.error("Bridge Error: getThumbnail", e);
+                return { success: false, error: e.toString() };
+            }
+        }
+        return { success: false };
+    },
+
+    vaultStatus: async function () {
+        if (window.pywebview) {
+            try {
+                return await window.pywebview.api.vault_status();
+            } catch (e) {
+                console.error("Bridge Error: vaultStatus", e);
+                return { success: false, error: e.toString() };
+            }
+        }
+        return { success: false };
+    },
+
+    vaultUnlock: async function (password) {
+        if (window.pywebview) {
+            try {
+                return await window.pywebview.api.vault_unlock(password);
+            } catch (e) {
+                console.error("Bridge Error: vaultUnlock", e);
+                return { success: false, error: e.toString() };
+            }
+        }
+        return { success: false };
+    },
+
+    vaultLock: async function () {
+        if (window.pywebview) {
+            try {
+                return await window.pywebview.api.vault_lock();
+            } catch (e) {
+                console.error("Bridge Error: vaultLock", e);
+                return { success: false, error: e.toString() };
+            }
+        }
+        return { success: false };
+    },
+
+    vaultSearch: async function (query, limit) {
+        if (window.pywebview) {
+            try {
+                return await window.pywebview.api.vault_search(query || '', limit || 200);
+            } catch (e) {
+                console.error("Bridge Error: vaultSearch", e);
+                return { success: false, error: e.toString() };
+            }
+        }
+        return { success: false };
+    },
+
+    vaultAdd: async function (service, username, password) {
+        if (window.pywebview) {
+            try {
+                return await window.pywebview.api.vault_add(service, username, password);
+            } catch (e) {
+                console.error("Bridge Error: vaultAdd", e);
+                return { success: false, error: e.toString() };
+            }
+        }
+        return { success: false };
+    },
+
+    vaultDelete: async function (id) {
+        if (window.pywebview) {
+            try {
+                return await window.pywebview.api.vault_delete(id);
+            } catch (e) {
+                console.error("Bridge Error: vaultDelete", e);
+                return { success: false, error: e.toString() };
+            }
+        }
+        return { success: false };
+    },
+
+    vaultGetPassword: async function (id) {
+        if (window.pywebview) {
+            try {
+                return await window.pywebview.api.vault_get_password(id);
+            } catch (e) {
+                console.error("Bridge Error: vaultGetPassword", e);
+                return { success: false, error: e.toString() };
+            }
+        }
+        return { success: false };
+    },
+
+    getIconAtlas: async function () {
+        if (window.pywebview) {
+            try {
+                return await window.pywebview.api.get_icon_atlas();
+            } catch (e) {
+                console.error("Bridge Error: getIconAtlas", e);
+                return { success: false, error: e.toString() };
+            }
+        }
+        return { success: false };
+    },
+
+    addIconsToAtlas: async function (urls) {
+        if (window.pywebview) {
+            try {
+                return await window.pywebview.api.add_icons_to_atlas(urls);
+            } catch (e) {
+                console.error("Bridge Error: addIconsToAtlas", e);
+                return { success: false, error: e.toString() };
+            }
+        }
+        return { success: false };
+    },
+
+    showNotification: async function (title, message) {
+        if (window.pywebview) {
+            try {
+                return await window.pywebview.api.show_notification(title, message);
+            } catch (e) {
+                console.error("Bridge Error: showNotification", e);
+                return { success: false, error: e.toString() };
+            }
+        }
+        return { success: false };
+    },
+
+    exportArchive: async function (dest = null) {
+        if (window.pywebview) {
+            try {
+                return await window.pywebview.api.export_archive(dest);
+            } catch (e) {
+                console.error("Bridge Error: exportArchive", e);
+                return { success: false, error: e.toString() };
+            }
+        }
+        return { success: false };
+    },
+
+    importArchive: async function (src = null) {
+        if (window.pywebview) {
+            try {
+                return await window.pywebview.api.import_archive(src);
+            } catch (e) {
+                console.error("Bridge Error: importArchive", e);
+                return { success: false, error: e.toString() };
+            }
+        }
+        return { success: false };
+    },
+
+    startJob: async function (kind, args = {}) {
+        if (window.pywebview) {
+            try {
+                return await window.pywebview.api.start_job(kind, args);
+            } catch (e) {
+                console.error("Bridge Error: startJob", e);
+                return { success: false, error: e.toString() };
+            }
+        }
+        return { success: false };
+    },
+
+    // Resolves with the job's final event ({ success, result, error, state })
+    waitForJob: function (jobId) {
+        if (finishedJobs.has(jobId)) {
+            const event = finishedJobs.get(jobId);
+            finishedJobs.delete(jobId);
+            return Promise.resolve(event);
+        }
+        return new Promise(resolve => {
+            if (!jobWaiters.has(jobId)) jobWaiters.set(jobId, []);
+            jobWaiters.get(jobId).push(resolve);
+        });
+    },
+
+    runJob: async function (kind, args = {}) {
+        const started = await window.chomka.startJob(kind, args);
+        if (!started || !started.success) return { success: false, error: started ? started.error : 'Bridge unavailable' };
+        return await window.chomka.waitForJob(started.id);
+    },
+
+    cancelJob: async function (jobId) {
+        if (window.pywebview) {
+            try {
+                return await window.pywebview.api.cancel_job(jobId);
+            } catch (e) {
+                console.error("Bridge Error: cancelJob", e);
+                return { success: false, error: e.toString() };
+            }
+        }
+        return { success: false };
+    },
+
+    listJobs: async function () {
+        if (window.pywebview) {
+            try {
+                return await window.pywebview.api.list_jobs();
+            } catch (e) {
+                console.error("Bridge Error: listJobs", e);
+                return { success: false, error: e.toString() };
+            }
+        }
+        return { success: false, jobs: [] };
+    },
+
+    resumeJobs: async function () {
+        if (window.pywebview) {
+            try {
+                return await window.pywebview.api.resume_jobs();
+            } catch (e) {
+                console.error("Bridge Error: resumeJobs", e);
+                return { success: false, error: e.toString() };
+            }
+        }
+        return { success: false };
+    },
+
+    callExtension: async function (name, method, params = null) {
+        if (window.pywebview) {
+            try {
+                return await window.pywebview.api.call_extension(name, method, params);
+            } catch (e) {
+                console.error("Bridge Error: callExtension", e);
+                return { success: false, error: e.toString() };
+            }
+        }
+        return { success: false };
+    },
+
+    listExtensions: async function () {
+        if (window.pywebview) {
+            try {
+                return await window.pywebview.api.list_extensions();
+            } catch (e) {
+                console.error("Bridge Error: listExtensions", e);
+                return { success: false, error: e.toString() };
+            }
+        }
+        return { success: false, extensions: [] };
+    },
+
+    trustExtension: async function (name) {
+        if (window.pywebview) {
+            try {
+                return await window.pywebview.api.trust_extension(name);
+            } catch (e) {
+                console.error("Bridge Error: trustExtension", e);
+                return { success: false, error: e.toString() };
+            }
+        }
+        return { success: false };
+    },
+
+    reloadExtensions: async function () {
+        if (window.pywebview) {
+            try {
+                return await window.pywebview.api.reload_extensions();
+            } catch (e) {
+                console.error("Bridge Error: reloadExtensions", e);
+                return { success: false, error: e.toString() };
+            }
+        }
+        return { success: false };
+    },
+
+    memoryReport: async function () {
+        if (window.pywebview) {
+            try {
+                const page = window.collectMemoryStats ? window.collectMemoryStats() : null;
+                return await window.pywebview.api.memory_report(page);
+            } catch (e) {
+                console.error("Bridge Error: memoryReport", e);
+                return { success: false, error: e.toString() };
+            }
+        }
+        return { success: false };
+    },
+
+    getStorageReport: async function () {
+        if (window.pywebview) {
+            try {
+                return await window.pywebview.api.get_storage_report();
+            } catch (e) {
+                console.error("Bridge Error: getStorageReport", e);
+                return { success: false, error: e.toString() };
+            }
+        }
+        return { success: false };
+    },
+
+    runStorageCleanup: async function () {
+        if (window.pywebview) {
+            try {
+                return await window.pywebview.api.run_storage_cleanup();
+            } catch (e) {
+                console.error("Bridge Error: runStorageCleanup", e);
+                return { success: false, error: e.toString() };
+            }
+        }
+        return { success: false };
+    },
+
+    listQuarantinedAssets: async function () {
+        if (window.pywebview) {
+            try {
+                return await window.pywebview.api.list_quarantined_assets();
+            } catch (e) {
+                console.error("Bridge Error: listQuarantinedAssets", e);
+                return { success: false, error: e.toString() };
+            }
+        }
+        return { success: false };
+    },
+
+    restoreQuarantinedAsset: async function (name) {
+        if (window.pywebview) {
+            try {
+                return await window.pywebview.api.restore_quarantined_asset(name);
+            } catch (e) {
+                console.error("Bridge Error: restoreQuarantinedAsset", e);
+                return { success: false, error: e.toString() };
+            }
+        }
+        return { success: false };
+    },
+
+    listSnapshots: async function () {
+        if (window.pywebview) {
+            try {
+                return await window.pywebview.api.list_snapshots();
+            } catch (e) {
+                console.error("Bridge Error: listSnapshots", e);
+                return { success: false, error: e.toString() };
+            }
+        }
+        return { success: false, snapshots: [] };
+    },
+
+    restoreSnapshot: async function (snapshotId) {
+        if (window.pywebview) {
+            try {
+                return await window.pywebview.api.restore_snapshot(snapshotId);
+            } catch (e) {
+                console.error("Bridge Error: restoreSnapshot", e);
+                return { success: false, error: e.toString() };
+            }
+        }
+        return { success: false };
+    },
+
+    listWorkspaces: async function () {
+        if (window.pywebview) {
+            try {
+                return await window.pywebview.api.list_workspaces();
+            } catch (e) {
+                console.error("Bridge Error: listWorkspaces", e);
+                return { success: false, error: e.toString() };
+            }
+        }
+        return { success: false };
+    },
+
+    createWorkspace: async function (name) {
+        if (window.pywebview) {
+            try {
+                return await window.pywebview.api.create_workspace(name);
+            } catch (e) {
+                console.error("Bridge Error: createWorkspace", e);
+                return { success: false, error: e.toString() };
+            }
+        }
+        return { success: false };
+    },
+
+    renameWorkspace: async function (workspaceId, name) {
+        if (window.pywebview) {
+            try {
+                return await window.pywebview.api.rename_workspace(workspaceId, name);
+            } catch (e) {
+                console.error("Bridge Error: renameWorkspace", e);
+                return { success: false, error: e.toString() };
+            }
+        }
+        return { success: false };
+    },
+
+    deleteWorkspace: async function (workspaceId) {
+        if (window.pywebview) {
+            try {
+                return await window.pywebview.api.delete_workspace(workspaceId);
+            } catch (e) {
+                console.error("Bridge Error: deleteWorkspace", e);
+                return { success: false, error: e.toString() };
+            }
+        }
+        return { success: false };
+    },
+
+    switchWorkspace: async function (workspaceId) {
+        if (window.pywebview) {
+            try {
+                return await window.pywebview.api.switch_workspace(workspaceId);
+            } catch (e) {
+                console.error("Bridge Error: switchWorkspace", e);
+                return { success: false, error: e.toString() };
+            }
+        }
+        return { success: false };
+    },
+
     log: function (message, level = "INFO") {
         console.log(`[${level}] ${message}`);
         if (window.pywebview && window.pywebview.api) {
@@ -164,7 +750,11 @@ Object.assign(window.chomka, {
     pickAndSaveImage: async function () {
         if (window.pywebview) {
             try {
-                return await window.pywebview.api.pick_and_save_image();
+                const picked = await window.pywebview.api.pick_and_save_image();
+                if (!picked || !picked.job) return picked;
+                const job = await window.chomka.waitForJob(picked.job);
+                if (job.success) return { success: true, path: job.result.path };
+                return { success: false, error: job.error || job.state };
             } catch (e) {
                 console.error("Bridge Error: pickAndSaveImage", e);
                 return null;
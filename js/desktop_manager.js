@@ -1,12 +1,21 @@
+// YT.PlayerState values reported to companion devices (buffering/cued are not interesting)
+const YT_STATE_NAMES = { 0: 'ended', 1: 'playing', 2: 'paused' };
+
 class DesktopManager {
     constructor(containerId) {
-        this.container = document.getElementById(containerId);
+        this.rootContainer = document.getElementById(containerId);
+        this.workspaceId = 'main';
+        this.parkedWorkspaces = {}; // Hidden workspaces keep their DOM and players
+        this.container = this.createWorkspaceLayer(this.workspaceId);
         this.items = [];
         this.dragItem = null;
         this.selectedItemId = null;
         this.dragOffset = { x: 0, y: 0 };
         this.isDragging = false;
         this.baseUrl = ''; // To be set via setBaseUrl
+        this.iconAtlas = { bundled: null, user: null }; // Sprite sheets for app icons
+        this.pendingAtlasIcons = new Set();
+        this.atlasQueueTimer = null;
 
         this.initEventListeners();
 
@@ -22,6 +31,73 @@ class DesktopManager {
         this.snapPreview = this.createSnapPreview();
     }
 
+    createWorkspaceLayer(workspaceId) {
+        if (!this.rootContainer) return null;
+        const layer = document.createElement('div');
+        layer.className = 'workspace-layer';
+        layer.dataset.workspace = workspaceId;
+        this.rootContainer.appendChild(layer);
+        return layer;
+    }
+
+    setWorkspaceId(workspaceId) {
+        this.workspaceId = workspaceId;
+        if (this.container) this.container.dataset.workspace = workspaceId;
+    }
+
+    switchWorkspace(workspaceId, items) {
+        if (workspaceId === this.workspaceId) return this.items;
+
+        // Park the current workspace: hide its layer, pause players, keep everything alive
+        Object.values(this.players).forEach(player => {
+            if (player && player.pauseVideo) {
+                try { player.pauseVideo(); } catch (e) { }
+            }
+        });
+        Object.keys(this.tracks).forEach(id => clearInterval(this.tracks[id]));
+        if (this.container) this.container.classList.add('workspace-parked');
+        this.parkedWorkspaces[this.workspaceId] = {
+            container: this.container,
+            items: this.items,
+            players: this.players,
+            unmutedPlayerId: this.unmutedPlayerId
+        };
+
+        const parked = this.parkedWorkspaces[workspaceId];
+        delete this.parkedWorkspaces[workspaceId];
+        this.selectedItemId = null;
+        this.tracks = {};
+
+        if (parked) {
+            this.container = parked.container;
+            this.items = parked.items;
+            this.players = parked.players;
+            this.unmutedPlayerId = parked.unmutedPlayerId;
+            if (this.container) this.container.classList.remove('workspace-parked');
+            this.workspaceId = workspaceId;
+        } else {
+            this.container = this.createWorkspaceLayer(workspaceId);
+            this.items = Array.isArray(items) ? items : [];
+            this.players = {};
+            this.unmutedPlayerId = null;
+            this.workspaceId = workspaceId;
+            this.render();
+        }
+        return this.items;
+    }
+
+    dropParkedWorkspace(workspaceId) {
+        const parked = this.parkedWorkspaces[workspaceId];
+        if (!parked) return;
+        Object.values(parked.players).forEach(player => {
+            if (player && player.destroy) {
+                try { player.destroy(); } catch (e) { }
+            }
+        });
+        if (parked.container) parked.container.remove();
+        delete this.parkedWorkspaces[workspaceId];
+    }
+
     createSnapPreview() {
         const el = document.createElement('div');
         el.className = 'snap-preview';
@@ -48,6 +124,40 @@ class DesktopManager {
         this.render();
     }
 
+    setIconAtlas(bundled, user) {
+        if (bundled !== undefined) this.iconAtlas.bundled = bundled;
+        if (user !== undefined) this.iconAtlas.user = user;
+        this.render();
+    }
+
+    // Markup for an icon drawn from an atlas sheet, or null if it is not packed
+    atlasIconHtml(iconUrl) {
+        const { bundled, user } = this.iconAtlas;
+        const sources = [[bundled, bundled && bundled.base], [user, user && (this.baseUrl + user.base)]];
+        for (const [atlas, base] of sources) {
+            const pos = atlas && atlas.icons[iconUrl];
+            if (!pos) continue;
+            const scales = Object.keys(atlas.sheets).map(Number).sort((a, b) => a - b);
+            const dpr = window.devicePixelRatio || 1;
+            const scale = scales.find(s => s >= dpr) || scales[scales.length - 1];
+            // The runtime atlas has one sheet per page of icons, the bundled one a single sheet
+            const sheet = Array.isArray(atlas.sheets[scale]) ? atlas.sheets[scale][pos.page] : atlas.sheets[scale];
+            return `<div class="app-icon atlas-icon" style="background-image: url('${base}${sheet}'); background-size: ${atlas.columns * atlas.cell}px ${atlas.rows * atlas.cell}px; background-position: -${pos.x}px -${pos.y}px;"></div>`;
+        }
+        return null;
+    }
+
+    // User icons are packed into the runtime atlas in small batches
+    queueAtlasIcon(iconUrl) {
+        if (!/^https?:/.test(iconUrl) && !iconUrl.startsWith('assets/user_')) return;
+        if (this.pendingAtlasIcons.has(iconUrl) || !window.chomka || !window.chomka.addIconsToAtlas) return;
+        this.pendingAtlasIcons.add(iconUrl);
+        clearTimeout(this.atlasQueueTimer);
+        this.atlasQueueTimer = setTimeout(() => {
+            window.chomka.addIconsToAtlas(Array.from(this.pendingAtlasIcons));
+        }, 300);
+    }
+
     loadItems(items) {
         this.items = Array.isArray(items) ? items : [];
         this.render();
@@ -57,6 +167,38 @@ class DesktopManager {
         return this.items;
     }
 
+    // Adds a page of already-saved items (progressive loading); renders only those
+    appendItems(items) {
+        this.items.push(...items);
+        this.render(items);
+    }
+
+    // Merges items changed outside the app (another device, a sync client).
+    // Only the touched elements are rebuilt; everything else keeps its state.
+    applyExternalChanges(upserted, removedIds, order) {
+        upserted.forEach(item => {
+            const idx = this.items.findIndex(i => i.id === item.id);
+            if (idx >= 0) this.items[idx] = item;
+            else this.items.push(item);
+
+            const el = this.container.querySelector(`[data-id="${item.id}"]`);
+            if (el) {
+                this.destroyPlayer(item.id);
+                el.remove();
+            }
+        });
+        if (removedIds.length) {
+            const removed = new Set(removedIds);
+            this.items = this.items.filter(i => !removed.has(i.id));
+        }
+        if (order) {
+            const rank = new Map(order.map((id, pos) => [id, pos]));
+            this.items.sort((a, b) => (rank.has(a.id) ? rank.get(a.id) : Infinity) - (rank.has(b.id) ? rank.get(b.id) : Infinity));
+        }
+        this.render();
+        return this.items;
+    }
+
     addItem(item) {
         // Default zIndex if not set
         if (item.zIndex === undefined) item.zIndex = 1;
@@ -95,24 +237,27 @@ class DesktopManager {
         }
     }
 
-    render() {
+    // subset: only (re)build these items and leave every other element alone
+    render(subset = null) {
         if (!this.container) return;
 
-        // Use a Set to track which item elements should stay
-        const activeIds = new Set(this.items.map(i => i.id));
+        if (!subset) {
+            // Use a Set to track which item elements should stay
+            const activeIds = new Set(this.items.map(i => i.id));
 
-        // Remove elements that are no longer in items
-        Array.from(this.container.children).forEach(el => {
-            const id = el.dataset.id;
-            if (!activeIds.has(id)) {
-                if (this.players[id]) {
-                    this.destroyPlayer(id);
+            // Remove elements that are no longer in items
+            Array.from(this.container.children).forEach(el => {
+                const id = el.dataset.id;
+                if (!activeIds.has(id)) {
+                    if (this.players[id]) {
+                        this.destroyPlayer(id);
+                    }
+                    el.remove();
                 }
-                el.remove();
-            }
-        });
+            });
+        }
 
-        this.items.forEach(item => {
+        (subset || this.items).forEach(item => {
             let el = this.container.querySelector(`[data-id="${item.id}"]`);
             const isNew = !el;
 
@@ -304,6 +449,10 @@ class DesktopManager {
                                         }
                                     }
                                     else this.stopTracking(item.id);
+                                    const state = YT_STATE_NAMES[event.data];
+                                    if (state && window.chomka) {
+                                        window.chomka.companionPlayer(item.id, state, Math.floor(event.target.getCurrentTime() || 0));
+                                    }
                                 },
                                 'onError': (e) => {
                                     console.error(`Chomka: YouTube Error for ${item.id}:`, e.data);
@@ -436,9 +585,12 @@ class DesktopManager {
                     appIcon = 'assets/minecraft.png';
                 }
 
+                const atlasIcon = appIcon ? this.atlasIconHtml(appIcon) : null;
+                if (appIcon && !atlasIcon) this.queueAtlasIcon(appIcon);
+
                 el.innerHTML = `
                     <div class="app-icon-container">
-                        ${appIcon ? `<img src="${appIcon}" draggable="false" class="app-icon" onerror="this.onerror=null; this.parentElement.innerHTML='<div class=&quot;app-icon-placeholder&quot;>🌐</div>';">` : `<div class="app-icon-placeholder">🌐</div>`}
+                        ${atlasIcon || (appIcon ? `<img src="${appIcon}" draggable="false" class="app-icon" onerror="this.onerror=null; this.parentElement.innerHTML='<div class=&quot;app-icon-placeholder&quot;>🌐</div>';">` : `<div class="app-icon-placeholder">🌐</div>`)}
                     </div>
                     <div class="app-name">${item.name || item.title || 'App'}</div>
                     <div class="app-actions">
@@ -0,0 +1,174 @@
+/**
+ * FolderView - virtualized grid of a folder's entries (links and images).
+ *
+ * Only the rows in view (plus a little overscan) exist in the DOM. Cells are
+ * keyed by their entry object, so adding or deleting an entry builds or drops
+ * just that cell and moves the others. Images show backend thumbnails
+ * (cache/thumbs), requested a few at a time for the cells in view only.
+ */
+class FolderView {
+    constructor(folder, container) {
+        this.folder = folder;
+        this.container = container;
+        this.minCellWidth = 100;
+        this.gap = 10;
+        this.rowHeight = 150;
+        this.overscan = 2; // rows above and below the viewport
+        this.thumbSize = 160;
+        this.maxThumbRequests = 4;
+        this.columns = 1;
+        this.cellWidth = this.minCellWidth;
+        this.cells = new Map(); // entry -> element
+        this.thumbQueue = [];
+        this.thumbRequests = 0;
+        this.frame = null;
+
+        this.spacer = document.createElement('div');
+        this.spacer.className = 'folder-spacer';
+        this.empty = document.createElement('div');
+        this.empty.className = 'folder-empty';
+        this.empty.innerHTML = "Empty Folder<br><small>Paste images (Ctrl+V) or click 'Upload'</small>";
+        container.replaceChildren(this.spacer, this.empty);
+
+        this.onScroll = () => this.scheduleRender();
+        container.addEventListener('scroll', this.onScroll, { passive: true });
+        this.resizeObserver = new ResizeObserver(() => this.refresh());
+        this.resizeObserver.observe(container);
+        this.refresh();
+    }
+
+    // Thumbnails already resolved, shared by every folder opened this session
+    static thumbs = new Map(); // entry url -> thumbnail URL
+
+    static resolve(src) {
+        const base = window.desktopManager ? window.desktopManager.baseUrl : '';
+        return src && (src.startsWith('assets/') || src.startsWith('cache/')) ? base + src : src;
+    }
+
+    get entries() {
+        return this.folder.tabs || [];
+    }
+
+    // Call after entries were added or removed
+    refresh() {
+        const width = this.container.clientWidth;
+        this.columns = Math.max(1, Math.floor((width + this.gap) / (this.minCellWidth + this.gap)));
+        this.cellWidth = (width - this.gap * (this.columns - 1)) / this.columns;
+        const rows = Math.ceil(this.entries.length / this.columns);
+        this.spacer.style.height = `${Math.max(0, rows * this.rowHeight - this.gap)}px`;
+        this.empty.style.display = this.entries.length ? 'none' : '';
+        this.render();
+    }
+
+    scheduleRender() {
+        if (this.frame) return;
+        this.frame = requestAnimationFrame(() => {
+            this.frame = null;
+            this.render();
+        });
+    }
+
+    render() {
+        const entries = this.entries;
+        const top = this.container.scrollTop;
+        const firstRow = Math.max(0, Math.floor(top / this.rowHeight) - this.overscan);
+        const lastRow = Math.ceil((top + this.container.clientHeight) / this.rowHeight) + this.overscan;
+        const end = Math.min(entries.length, lastRow * this.columns);
+
+        const visible = new Set();
+        for (let index = firstRow * this.columns; index < end; index++) {
+            const entry = entries[index];
+            visible.add(entry);
+            let cell = this.cells.get(entry);
+            if (!cell) {
+                cell = this.createCell(entry);
+                this.cells.set(entry, cell);
+                this.container.appendChild(cell);
+            }
+            const x = (index % this.columns) * (this.cellWidth + this.gap);
+            const y = Math.floor(index / this.columns) * this.rowHeight;
+            cell.style.width = `${this.cellWidth}px`;
+            cell.style.transform = `translate(${x}px, ${y}px)`;
+        }
+        this.cells.forEach((cell, entry) => {
+            if (!visible.has(entry)) {
+                cell.remove();
+                this.cells.delete(entry);
+            }
+        });
+    }
+
+    createCell(entry) {
+        const cell = document.createElement('div');
+        cell.className = `folder-cell ${entry.type === 'image' ? 'folder-cell-image' : 'folder-cell-link'}`;
+
+        let preview;
+        if (entry.type === 'image') {
+            preview = document.createElement('img');
+            preview.className = 'folder-thumb';
+            preview.draggable = false;
+            this.requestThumbnail(entry, preview);
+        } else {
+            preview = document.createElement('div');
+            preview.className = 'folder-link-icon';
+            preview.textContent = '🔗';
+        }
+
+        const title = document.createElement('div');
+        title.className = 'folder-cell-title';
+        title.textContent = entry.title || (entry.type === 'image' ? 'Image' : 'Link');
+
+        const remove = document.createElement('button');
+        remove.className = 'folder-cell-delete';
+        remove.innerHTML = '&times;';
+        remove.onclick = () => window.chomkaDeleteFolderItem(this.folder.id, this.entries.indexOf(entry));
+
+        const open = document.createElement('button');
+        open.className = 'folder-cell-open';
+        open.textContent = entry.type === 'image' ? 'View' : 'Open';
+        open.onclick = () => window.openBrowser(FolderView.resolve(entry.url));
+
+        cell.append(preview, title, remove, open);
+        return cell;
+    }
+
+    requestThumbnail(entry, img) {
+        const known = FolderView.thumbs.get(entry.url);
+        // Inline images cannot be thumbnailed; they move to assets on the next load
+        if (known || !entry.url || entry.url.startsWith('data:')) {
+            img.src = known || entry.url || '';
+            return;
+        }
+        this.thumbQueue.push([entry, img]);
+        // After this render pass, once the cell is in the grid
+        queueMicrotask(() => this.pumpThumbnails());
+    }
+
+    pumpThumbnails() {
+        while (this.thumbRequests < this.maxThumbRequests && this.thumbQueue.length) {
+            const [entry, img] = this.thumbQueue.shift();
+            // Scrolled past before its turn came
+            if (this.cells.get(entry) !== img.parentElement) continue;
+            this.thumbRequests++;
+            const size = Math.round(this.thumbSize * (window.devicePixelRatio || 1));
+            window.chomka.getThumbnail(entry.url, size).then(result => {
+                const src = result && result.success ? FolderView.resolve(result.path) : FolderView.resolve(entry.url);
+                if (result && result.success) FolderView.thumbs.set(entry.url, src);
+                img.src = src;
+            }).finally(() => {
+                this.thumbRequests--;
+                this.pumpThumbnails();
+            });
+        }
+    }
+
+    destroy() {
+        this.container.removeEventListener('scroll', this.onScroll);
+        this.resizeObserver.disconnect();
+        if (this.frame) cancelAnimationFrame(this.frame);
+        this.thumbQueue = [];
+        this.cells.clear();
+    }
+}
+
+window.FolderView = FolderView;
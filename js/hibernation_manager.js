@@ -0,0 +1,184 @@
+/**
+ * HibernationManager - unloads idle in-desktop browser windows.
+ *
+ * A browser window that has not been used for the idle period (sooner when
+ * minimized) or that is the least recently used one while the page is short
+ * on memory has its iframe pointed at about:blank, which drops the page, its
+ * scripts and media. A placeholder keeps the URL, title and scroll position;
+ * interacting with the window loads the page again.
+ */
+class HibernationManager {
+    constructor() {
+        this.windows = new Map(); // window id -> { win, lastActive, hibernated, url, title, scrollY }
+        this.idleMinutes = parseFloat(localStorage.getItem('chomka_hibernate_minutes') || '10');
+        this.minimizedMinutes = 1;
+        this.maxLive = 6; // live windows kept before the least recently used is hibernated
+        this.heapPressure = 0.8; // share of the JS heap limit treated as memory pressure
+        this.checkInterval = 30000;
+        this.timer = null;
+    }
+
+    register(win) {
+        const entry = { win, lastActive: Date.now(), hibernated: false, url: null, title: null, scrollY: 0 };
+        this.windows.set(win.id, entry);
+        // Capture phase: wake before the click reaches a toolbar button
+        win.addEventListener('mousedown', () => this.touch(win.id), true);
+        win.addEventListener('focusin', () => this.touch(win.id), true);
+        if (!this.timer) this.timer = setInterval(() => this.check(), this.checkInterval);
+        this.enforceLimit();
+    }
+
+    unregister(win) {
+        this.windows.delete(win.id);
+        if (this.windows.size === 0 && this.timer) {
+            clearInterval(this.timer);
+            this.timer = null;
+        }
+        this.updateStatus();
+    }
+
+    touch(id) {
+        const entry = this.windows.get(id);
+        if (!entry) return;
+        entry.lastActive = Date.now();
+        if (entry.hibernated) this.wake(id);
+    }
+
+    setIdleMinutes(minutes) {
+        this.idleMinutes = Math.max(0, minutes);
+        localStorage.setItem('chomka_hibernate_minutes', String(this.idleMinutes));
+    }
+
+    isUnderPressure() {
+        const heap = performance.memory;
+        return !!heap && heap.usedJSHeapSize / heap.jsHeapSizeLimit > this.heapPressure;
+    }
+
+    // The window last interacted with stays live whatever happens
+    mostRecent() {
+        let latest = null;
+        this.windows.forEach(entry => {
+            if (!latest || entry.lastActive > latest.lastActive) latest = entry;
+        });
+        return latest;
+    }
+
+    liveByAge() {
+        const recent = this.mostRecent();
+        return [...this.windows.values()]
+            .filter(entry => !entry.hibernated && entry !== recent)
+            .sort((a, b) => a.lastActive - b.lastActive);
+    }
+
+    check() {
+        const now = Date.now();
+        if (this.idleMinutes > 0) {
+            this.liveByAge().forEach(entry => {
+                const limit = entry.win.classList.contains('minimized') ? this.minimizedMinutes : this.idleMinutes;
+                if (now - entry.lastActive >= limit * 60000) this.hibernate(entry.win.id, 'idle');
+            });
+        }
+        if (this.isUnderPressure()) {
+            const oldest = this.liveByAge()[0];
+            if (oldest) this.hibernate(oldest.win.id, 'memory pressure');
+        }
+        this.enforceLimit();
+    }
+
+    enforceLimit() {
+        const live = [...this.windows.values()].filter(entry => !entry.hibernated).length;
+        this.liveByAge().slice(0, Math.max(0, live - this.maxLive))
+            .forEach(entry => this.hibernate(entry.win.id, 'too many windows'));
+    }
+
+    hibernate(id, reason) {
+        const entry = this.windows.get(id);
+        if (!entry || entry.hibernated) return;
+        const frame = entry.win.querySelector('.browser-frame');
+        if (!frame) return;
+
+        // Same-origin pages tell us where they really are; cross-origin ones throw
+        entry.url = entry.win.querySelector('.browser-url-bar').value || frame.src;
+        entry.title = null;
+        entry.scrollY = 0;
+        try {
+            entry.url = frame.contentWindow.location.href;
+            entry.title = frame.contentDocument.title;
+            entry.scrollY = frame.contentWindow.scrollY;
+        } catch (e) { }
+        if (!entry.title) {
+            try { entry.title = new URL(entry.url).hostname; } catch (e) { entry.title = entry.url; }
+        }
+
+        frame.src = 'about:blank';
+        frame.style.display = 'none';
+        const placeholder = document.createElement('div');
+        placeholder.className = 'browser-hibernated';
+        const title = document.createElement('div');
+        title.className = 'hibernated-title';
+        title.textContent = `💤 ${entry.title}`;
+        const url = document.createElement('div');
+        url.className = 'hibernated-url';
+        url.textContent = entry.url;
+        const hint = document.createElement('div');
+        hint.className = 'hibernated-hint';
+        hint.textContent = entry.scrollY > 0
+            ? 'Hibernated to save memory. Click to reload and return to where you were.'
+            : 'Hibernated to save memory. Click to reload.';
+        placeholder.append(title, url, hint);
+        frame.after(placeholder);
+
+        entry.hibernated = true;
+        entry.win.classList.add('hibernated');
+        console.log(`Chomka: Hibernated browser window ${id} (${reason})`);
+        this.updateStatus();
+    }
+
+    wake(id) {
+        const entry = this.windows.get(id);
+        if (!entry || !entry.hibernated) return;
+        const frame = entry.win.querySelector('.browser-frame');
+        const placeholder = entry.win.querySelector('.browser-hibernated');
+        if (placeholder) placeholder.remove();
+
+        if (entry.scrollY > 0) {
+            const scrollY = entry.scrollY;
+            frame.addEventListener('load', () => {
+                try { frame.contentWindow.scrollTo(0, scrollY); } catch (e) { }
+            }, { once: true });
+        }
+        frame.style.display = '';
+        frame.src = entry.url;
+        entry.hibernated = false;
+        entry.win.classList.remove('hibernated');
+        this.updateStatus();
+        this.enforceLimit();
+    }
+
+    // Un-minimizes, brings to front and reloads if needed
+    restore(id) {
+        const entry = this.windows.get(id);
+        if (!entry) return;
+        entry.win.classList.remove('minimized');
+        entry.win.style.zIndex = window.chomkaZIndex++;
+        this.touch(id);
+        this.updateStatus();
+    }
+
+    hibernatedCount() {
+        return [...this.windows.values()].filter(entry => entry.hibernated).length;
+    }
+
+    // Shown while any window is hibernated or minimized, so those can be brought back
+    updateStatus() {
+        const el = document.getElementById('tray-hibernated');
+        if (!el) return;
+        const count = this.hibernatedCount();
+        const minimized = [...this.windows.values()].filter(entry => entry.win.classList.contains('minimized')).length;
+        el.textContent = `💤 ${count}`;
+        el.title = `${count} of ${this.windows.size} browser windows hibernated, ${minimized} minimized`;
+        el.classList.toggle('hidden', count === 0 && minimized === 0);
+    }
+}
+
+window.hibernationManager = new HibernationManager();
@@ -57,7 +57,7 @@ class KeyboardManager {
             id: i.id,
             name: i.name || i.text || i.type,
             type: 'item',
-            el: document.querySelector(`[data-id="${i.id}"]`)
+            el: window.desktopManager.container.querySelector(`[data-id="${i.id}"]`)
         })) : [];
 
         return [...windows, ...desktopItems];
@@ -111,8 +111,9 @@ class KeyboardManager {
     showCommandPalette() {
         const html = `
             <div class="cmd-palette" style="padding: 20px;">
-                <input type="text" id="cmd-input" placeholder="Type a command (e.g. /theme dark, /add note)..." 
+                <input type="text" id="cmd-input" placeholder="Search the desktop, or type a command (e.g. /theme dark)..." 
                     style="width: 100%; padding: 12px; background: rgba(0,0,0,0.3); border: 1px solid var(--accent-color); color: white; border-radius: 8px; outline: none;">
+                <div id="cmd-results" style="margin-top: 10px; max-height: 320px; overflow-y: auto;"></div>
                 <div id="cmd-hints" style="margin-top: 15px; font-size: 0.8rem; color: var(--text-secondary);">
                     <div>• <b>/theme [name]</b> - Quick switch style</div>
                     <div>• <b>/yt [url]</b> - Pin video to desktop</div>
@@ -126,9 +127,25 @@ class KeyboardManager {
                 const input = document.getElementById('cmd-input');
                 if (input) {
                     input.focus();
+                    this.paletteResults = [];
+                    this.paletteIdx = 0;
+                    this.paletteSeq = 0;
+                    input.oninput = () => this.updatePaletteResults(input.value);
                     input.onkeydown = (e) => {
-                        if (e.key === 'Enter') {
-                            this.executeCommand(input.value);
+                        if (e.key === 'ArrowDown' || e.key === 'ArrowUp') {
+                            e.preventDefault();
+                            const count = this.paletteResults.length;
+                            if (count) {
+                                this.paletteIdx = (this.paletteIdx + (e.key === 'ArrowDown' ? 1 : count - 1)) % count;
+                                this.renderPaletteResults();
+                            }
+                        } else if (e.key === 'Enter') {
+                            const result = this.paletteResults[this.paletteIdx];
+                            if (input.value.startsWith('/') || !result) {
+                                this.executeCommand(input.value);
+                            } else {
+                                this.openSearchResult(result);
+                            }
                             document.getElementById('modal-overlay').classList.add('hidden');
                         }
                     };
@@ -137,6 +154,66 @@ class KeyboardManager {
         }
     }
 
+    async updatePaletteResults(query) {
+        const seq = ++this.paletteSeq;
+        const hints = document.getElementById('cmd-hints');
+        if (hints) hints.style.display = query && !query.startsWith('/') ? 'none' : 'block';
+
+        if (!query.trim() || query.startsWith('/')) {
+            this.paletteResults = [];
+        } else {
+            const response = await window.chomka.search(query, 12);
+            // A newer keystroke already asked again
+            if (seq !== this.paletteSeq) return;
+            this.paletteResults = (response && response.success) ? response.results : [];
+        }
+        this.paletteIdx = 0;
+        this.renderPaletteResults();
+    }
+
+    renderPaletteResults() {
+        const list = document.getElementById('cmd-results');
+        if (!list) return;
+        const icons = { note: '📝', link: '🔗', app: '🧩', folder: '📁', image: '🖼️', video: '▶️', browser: '🌐' };
+        const currentWs = window.desktopManager ? window.desktopManager.workspaceId : 'main';
+        list.innerHTML = this.paletteResults.map((r, i) => `
+            <div class="cmd-result" data-idx="${i}" style="padding: 8px 10px; border-radius: 6px; cursor: pointer; display: flex; gap: 10px; align-items: center; ${i === this.paletteIdx ? 'background: rgba(255,255,255,0.12);' : ''}">
+                <span>${icons[r.type] || '•'}</span>
+                <span style="flex: 1; overflow: hidden; text-overflow: ellipsis; white-space: nowrap;">${this.escapeHtml(r.label)}</span>
+                ${r.workspace !== currentWs ? '<span style="font-size: 0.7rem; opacity: 0.6;">other desktop</span>' : ''}
+            </div>
+        `).join('');
+        list.querySelectorAll('.cmd-result').forEach(el => {
+            el.onclick = () => {
+                this.openSearchResult(this.paletteResults[parseInt(el.dataset.idx)]);
+                document.getElementById('modal-overlay').classList.add('hidden');
+            };
+        });
+        const active = list.querySelector(`[data-idx="${this.paletteIdx}"]`);
+        if (active) active.scrollIntoView({ block: 'nearest' });
+    }
+
+    escapeHtml(text) {
+        const div = document.createElement('div');
+        div.textContent = text || '';
+        return div.innerHTML;
+    }
+
+    async openSearchResult(result) {
+        const dm = window.desktopManager;
+        if (!dm) return;
+        if (result.workspace !== dm.workspaceId && window.switchWorkspace) {
+            await window.switchWorkspace(result.workspace);
+        }
+        if (result.type === 'folder') {
+            window.dispatchEvent(new CustomEvent('open-folder', { detail: { id: result.id } }));
+            return;
+        }
+        dm.selectItem(result.id);
+        const el = dm.container.querySelector(`[data-id="${result.id}"]`);
+        if (el) el.scrollIntoView({ block: 'center', inline: 'center', behavior: 'smooth' });
+    }
+
     executeCommand(cmd) {
         const parts = cmd.split(' ');
         const action = parts[0].toLowerCase();
@@ -30,7 +30,7 @@ class NotificationManager {
         this.startSimulation();
     }
 
-    notify(title, message, avatar = "🔔", meta = "") {
+    notify(title, message, avatar = "🔔", meta = "", native = true) {
         if (!this.isActive || !this.container) return;
 
         const toast = document.createElement('div');
@@ -60,9 +60,9 @@ class NotificationManager {
 
         this.container.appendChild(toast);
 
-        // Native Windows Notification Trigger
-        if (window.chomka && window.chomka.show_notification) {
-            window.chomka.show_notification(title, message);
+        // Native notification (queued and coalesced by the backend)
+        if (native && window.chomka && window.chomka.showNotification) {
+            window.chomka.showNotification(title, message);
         }
     }
 
@@ -86,7 +86,8 @@ class NotificationManager {
                 `${user.name} commented:`,
                 comment,
                 user.avatar,
-                "Just now • YouTube"
+                "Just now • YouTube",
+                false
             );
         }, 15000); // Check every 15s
     }
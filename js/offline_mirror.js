@@ -0,0 +1,236 @@
+/**
+ * OfflineMirror - IndexedDB copy of the desktop, used when the native bridge
+ * cannot provide config.json.
+ *
+ * One record per item ([workspace, id]) plus one order record per workspace.
+ * Saves are coalesced into an idle callback and only items that changed since
+ * the last write are put. Changes are found by comparing each item's fields
+ * with a shallow snapshot; only nested values (folder tabs and the like) are
+ * serialized for the comparison, so a save never stringifies the desktop.
+ */
+class OfflineMirror {
+    constructor() {
+        this.dbName = 'chomka-mirror';
+        this.legacyPrefix = 'chomka_desktop';
+        this.written = new Map(); // workspace -> Map(id -> field snapshot last written)
+        this.pending = new Map(); // workspace -> latest items array
+        this.flushHandle = null;
+        this.flushPromise = null;
+        this.dbPromise = null;
+    }
+
+    open() {
+        if (!this.dbPromise) {
+            this.dbPromise = new Promise((resolve, reject) => {
+                if (!window.indexedDB) {
+                    reject(new Error('IndexedDB unavailable'));
+                    return;
+                }
+                const request = indexedDB.open(this.dbName, 1);
+                request.onupgradeneeded = () => {
+                    const db = request.result;
+                    db.createObjectStore('items', { keyPath: ['workspace', 'id'] });
+                    db.createObjectStore('meta');
+                };
+                request.onsuccess = () => resolve(request.result);
+                request.onerror = () => reject(request.error);
+            }).then(db => this.migrateLegacy(db).then(() => db));
+            this.dbPromise.catch(e => console.warn('Chomka: Offline mirror unavailable', e));
+        }
+        return this.dbPromise;
+    }
+
+    static done(tx) {
+        return new Promise((resolve, reject) => {
+            tx.oncomplete = () => resolve();
+            tx.onerror = () => reject(tx.error);
+            tx.onabort = () => reject(tx.error);
+        });
+    }
+
+    // Field values as written: primitives as is, nested objects and arrays as JSON
+    static snapshot(item) {
+        const fields = {};
+        for (const key in item) {
+            const value = item[key];
+            fields[key] = value !== null && typeof value === 'object' ? { json: JSON.stringify(value) } : value;
+        }
+        return fields;
+    }
+
+    static unchanged(item, fields) {
+        if (!fields) return false;
+        let count = 0;
+        for (const key in item) {
+            if (!(key in fields)) return false;
+            const value = item[key];
+            const was = fields[key];
+            if (value !== null && typeof value === 'object') {
+                if (was === null || typeof was !== 'object' || was.json !== JSON.stringify(value)) return false;
+            } else if (value !== was) {
+                return false;
+            }
+            count++;
+        }
+        return count === Object.keys(fields).length;
+    }
+
+    static result(request) {
+        return new Promise((resolve, reject) => {
+            request.onsuccess = () => resolve(request.result);
+            request.onerror = () => reject(request.error);
+        });
+    }
+
+    // One-time move of the old localStorage JSON blobs into IndexedDB
+    async migrateLegacy(db) {
+        const flag = await OfflineMirror.result(db.transaction('meta').objectStore('meta').get('migrated'));
+        if (flag) return;
+
+        const keys = [];
+        for (let i = 0; i < localStorage.length; i++) {
+            const key = localStorage.key(i);
+            if (key === this.legacyPrefix || key.startsWith(`${this.legacyPrefix}:`)) keys.push(key);
+        }
+        const tx = db.transaction(['items', 'meta'], 'readwrite');
+        const itemStore = tx.objectStore('items');
+        const metaStore = tx.objectStore('meta');
+        let count = 0;
+        keys.forEach(key => {
+            const workspace = key === this.legacyPrefix ? 'main' : key.slice(this.legacyPrefix.length + 1);
+            let items;
+            try {
+                items = JSON.parse(localStorage.getItem(key));
+            } catch (e) {
+                return;
+            }
+            if (!Array.isArray(items)) return;
+            const order = [];
+            items.forEach(item => {
+                if (!item || item.id === undefined || item.id === null) return;
+                itemStore.put({ workspace, id: String(item.id), item });
+                order.push(String(item.id));
+                count++;
+            });
+            metaStore.put(order, `order:${workspace}`);
+        });
+        metaStore.put(true, 'migrated');
+        await OfflineMirror.done(tx);
+        keys.forEach(key => localStorage.removeItem(key));
+        if (keys.length) console.log(`Chomka: Migrated ${count} mirrored items from localStorage to IndexedDB`);
+    }
+
+    // --- Writes ---
+
+    save(workspace, items) {
+        this.pending.set(workspace, items);
+        if (this.flushHandle) return;
+        const run = () => {
+            this.flushHandle = null;
+            this.flush();
+        };
+        this.flushHandle = window.requestIdleCallback
+            ? { idle: requestIdleCallback(run, { timeout: 2000 }) }
+            : { timer: setTimeout(run, 200) };
+    }
+
+    async flush() {
+        if (this.flushHandle) {
+            if (this.flushHandle.idle !== undefined) cancelIdleCallback(this.flushHandle.idle);
+            else clearTimeout(this.flushHandle.timer);
+            this.flushHandle = null;
+        }
+        // Chain flushes so two never diff against the same baseline
+        const previous = this.flushPromise || Promise.resolve();
+        this.flushPromise = previous.then(() => this.writePending()).catch(e => {
+            console.warn('Chomka: Offline mirror write failed', e);
+        });
+        return this.flushPromise;
+    }
+
+    async writePending() {
+        if (!this.pending.size) return;
+        const batch = Array.from(this.pending.entries());
+        this.pending.clear();
+        const db = await this.open();
+
+        for (const [workspace, items] of batch) {
+            let written = this.written.get(workspace);
+            if (!written) {
+                // First write this session: only ids are known from the order record
+                const order = await OfflineMirror.result(db.transaction('meta').objectStore('meta').get(`order:${workspace}`));
+                written = new Map((order || []).map(id => [id, null]));
+            }
+
+            const next = new Map();
+            const tx = db.transaction(['items', 'meta'], 'readwrite');
+            const itemStore = tx.objectStore('items');
+            let changed = 0;
+            items.forEach(item => {
+                if (!item || item.id === undefined || item.id === null) return;
+                const id = String(item.id);
+                const fields = written.get(id);
+                if (OfflineMirror.unchanged(item, fields)) {
+                    next.set(id, fields);
+                } else {
+                    next.set(id, OfflineMirror.snapshot(item));
+                    itemStore.put({ workspace, id, item });
+                    changed++;
+                }
+            });
+            written.forEach((fields, id) => {
+                if (!next.has(id)) {
+                    itemStore.delete([workspace, id]);
+                    changed++;
+                }
+            });
+            const order = Array.from(next.keys());
+            const prevOrder = Array.from(written.keys());
+            if (changed || order.length !== prevOrder.length || order.some((id, i) => id !== prevOrder[i])) {
+                tx.objectStore('meta').put(order, `order:${workspace}`);
+            }
+            await OfflineMirror.done(tx);
+            this.written.set(workspace, next);
+        }
+    }
+
+    async dropWorkspace(workspace) {
+        this.pending.delete(workspace);
+        this.written.delete(workspace);
+        const db = await this.open();
+        const tx = db.transaction(['items', 'meta'], 'readwrite');
+        const range = IDBKeyRange.bound([workspace, ''], [workspace, '\uffff']);
+        tx.objectStore('items').delete(range);
+        tx.objectStore('meta').delete(`order:${workspace}`);
+        return OfflineMirror.done(tx);
+    }
+
+    // --- Reads ---
+
+    /**
+     * Loads a workspace in order, one batch per idle period. Each batch is
+     * handed to onBatch as soon as it is read so the desktop fills in
+     * progressively; resolves with all items (or null if nothing is mirrored).
+     */
+    async load(workspace, onBatch, batchSize = 100) {
+        const db = await this.open();
+        const order = await OfflineMirror.result(db.transaction('meta').objectStore('meta').get(`order:${workspace}`));
+        if (!order || !order.length) return null;
+
+        const all = [];
+        for (let start = 0; start < order.length; start += batchSize) {
+            if (start) await new Promise(resolve => (window.requestIdleCallback || setTimeout)(resolve));
+            const store = db.transaction('items').objectStore('items');
+            const ids = order.slice(start, start + batchSize);
+            const records = await Promise.all(ids.map(id => OfflineMirror.result(store.get([workspace, id]))));
+            const items = records.filter(Boolean).map(r => r.item);
+            all.push(...items);
+            if (items.length && onBatch) onBatch(items);
+        }
+        // Seed the diff baseline so the next save only writes what changed
+        this.written.set(workspace, new Map(all.map(item => [String(item.id), OfflineMirror.snapshot(item)])));
+        return all;
+    }
+}
+
+window.offlineMirror = new OfflineMirror();
@@ -1,70 +1,65 @@
 /**
  * Passkeeper - Simple Password Manager for Chomka WebOS
- * Saves credentials to credentials.json via Native Bridge
+ * Logins live in the backend's encrypted vault (vault.dat); the page only
+ * holds the rows in view and asks for a password when it is copied.
  */
 class Passkeeper {
     constructor() {
-        this.credentials = [];
         this.isOpen = false;
-        this.init();
+        this.query = '';
+        this.searchTimer = null;
+        this.searchSeq = 0;
+        this.count = 0;
     }
 
-    async init() {
-        // Load credentials on startup
-        const data = await window.chomka.readFile('credentials.json');
-        if (data) {
-            try {
-                this.credentials = JSON.parse(data);
-            } catch (e) {
-                console.error("Passkeeper: Corrupt data", e);
-            }
-        }
-    }
-
-    save() {
-        window.chomka.saveFile('credentials.json', JSON.stringify(this.credentials, null, 2));
-    }
-
-    open() {
+    async open() {
         this.isOpen = true;
-        this.renderModal();
-    }
-
-    addEntry(service, username, password) {
-        this.credentials.push({
-            id: Date.now(),
-            service,
-            username,
-            password, // In a real app, encrypt this!
-            timestamp: new Date().toISOString()
-        });
-        this.save();
-        this.renderModal();
-        if (window.notificationManager) {
-            window.notificationManager.notify("Passkeeper", "Credentials saved!", "🔑");
-        }
+        const status = await window.chomka.vaultStatus();
+        if (status && status.unlocked) this.renderVault();
+        else this.renderUnlock(status || {});
     }
 
-    deleteEntry(id) {
-        this.credentials = this.credentials.filter(c => c.id !== id);
-        this.save();
-        this.renderModal();
-    }
+    renderUnlock(status) {
+        const intro = status.exists
+            ? 'Enter your master password to unlock the vault.'
+            : 'Choose a master password for your new vault.' +
+              (status.legacy ? ' Logins saved by earlier versions will be moved into it.' : '');
 
-    renderModal() {
-        const listHtml = this.credentials.map(c => `
-            <div class="pk-entry" style="background:rgba(255,255,255,0.05); padding:10px; border-radius:8px; margin-bottom:8px; display:flex; justify-content:space-between; align-items:center;">
-                <div>
-                    <div style="font-weight:bold; color:var(--accent-color);">${c.service}</div>
-                    <div style="font-size:0.8rem; opacity:0.8;">${c.username}</div>
-                    <div style="font-size:0.8rem; font-family:monospace; margin-top:2px;">${'•'.repeat(8)} 
-                        <span style="font-size:0.7rem; cursor:pointer; color:var(--accent-color); margin-left:5px;" onclick="navigator.clipboard.writeText('${c.password}'); alert('Copied!');">Copy</span>
-                    </div>
-                </div>
-                <button onclick="window.passkeeper.deleteEntry(${c.id})" style="background:transparent; border:none; color:#ff4757; cursor:pointer;">🗑️</button>
+        const html = `
+            <div class="pk-container" style="color:white; font-family:'Inter', sans-serif;">
+                <p style="margin-top:0; opacity:0.8;">${intro}</p>
+                <input type="password" id="pk-master" placeholder="Master password" style="width:100%; margin-bottom:10px; padding:8px; background:rgba(255,255,255,0.1); border:none; color:white; border-radius:4px;">
+                <button id="pk-unlock-btn" class="theme-btn active" style="width:100%;">${status.exists ? 'Unlock' : 'Create Vault'}</button>
+                <div id="pk-unlock-error" style="color:#ff4757; font-size:0.8rem; margin-top:8px;"></div>
             </div>
-        `).join('') || '<div style="opacity:0.5; text-align:center; padding:20px;">No saved passwords.</div>';
+        `;
+        if (!window.showModal) return;
+        window.showModal('Passkeeper Vault', html);
 
+        const input = document.getElementById('pk-master');
+        const btn = document.getElementById('pk-unlock-btn');
+        const unlock = async () => {
+            if (!input.value) return;
+            btn.disabled = true;
+            const result = await window.chomka.vaultUnlock(input.value);
+            input.value = '';
+            btn.disabled = false;
+            if (result && result.success) {
+                if (result.migrated && window.notificationManager) {
+                    window.notificationManager.notify("Passkeeper", `Moved ${result.migrated} saved logins into the vault.`, "🔑");
+                }
+                this.renderVault();
+            } else {
+                document.getElementById('pk-unlock-error').textContent = (result && result.error) || 'Could not unlock the vault.';
+            }
+        };
+        btn.onclick = unlock;
+        input.onkeydown = (e) => { if (e.key === 'Enter') unlock(); };
+        input.focus();
+    }
+
+    // Built once per open; searches, adds and deletes only touch the list
+    renderVault() {
         const html = `
             <div class="pk-container" style="color:white; font-family:'Inter', sans-serif;">
                 <div class="pk-add-form" style="background:rgba(0,0,0,0.3); padding:15px; border-radius:10px; margin-bottom:20px; border:1px solid var(--glass-border);">
@@ -74,32 +69,170 @@ class Passkeeper {
                     <input type="password" id="pk-password" placeholder="Password" style="width:100%; margin-bottom:10px; padding:8px; background:rgba(255,255,255,0.1); border:none; color:white; border-radius:4px;">
                     <button id="pk-save-btn" class="theme-btn active" style="width:100%;">Save Credentials</button>
                 </div>
-                
-                <h4 style="border-bottom:1px solid var(--glass-border); padding-bottom:5px; margin-bottom:10px;">Saved Logins</h4>
-                <div class="pk-list" style="max-height:300px; overflow-y:auto;">
-                    ${listHtml}
+
+                <div style="display:flex; justify-content:space-between; align-items:center; border-bottom:1px solid var(--glass-border); padding-bottom:5px; margin-bottom:10px;">
+                    <h4 style="margin:0;">Saved Logins <span id="pk-count" style="opacity:0.6; font-weight:normal;"></span></h4>
+                    <button id="pk-lock-btn" class="theme-btn">🔒 Lock</button>
                 </div>
+                <input type="text" id="pk-search" placeholder="Search service or username" style="width:100%; margin-bottom:8px; padding:8px; background:rgba(255,255,255,0.1); border:none; color:white; border-radius:4px;">
+                <div class="pk-list" id="pk-list" style="max-height:300px; overflow-y:auto;"></div>
             </div>
         `;
+        if (!window.showModal) return;
+        window.showModal('Passkeeper Vault', html);
 
-        if (window.showModal) {
-            window.showModal('Passkeeper Vault', html);
-
-            // Re-bind save button since innerHTML replaces elements
-            setTimeout(() => {
-                const btn = document.getElementById('pk-save-btn');
-                if (btn) btn.onclick = () => {
-                    const s = document.getElementById('pk-service').value;
-                    const u = document.getElementById('pk-username').value;
-                    const p = document.getElementById('pk-password').value;
-                    if (s && u && p) {
-                        this.addEntry(s, u, p);
-                    } else {
-                        alert("Please fill all fields.");
-                    }
-                };
-            }, 100);
+        document.getElementById('pk-save-btn').onclick = () => {
+            const s = document.getElementById('pk-service').value;
+            const u = document.getElementById('pk-username').value;
+            const p = document.getElementById('pk-password').value;
+            if (s && u && p) {
+                this.addEntry(s, u, p);
+            } else {
+                alert("Please fill all fields.");
+            }
+        };
+        document.getElementById('pk-lock-btn').onclick = () => this.lock();
+        const search = document.getElementById('pk-search');
+        search.value = this.query;
+        search.oninput = () => {
+            clearTimeout(this.searchTimer);
+            this.searchTimer = setTimeout(() => this.search(search.value), 80);
+        };
+        this.search(this.query);
+    }
+
+    async search(query) {
+        this.query = query;
+        const seq = ++this.searchSeq;
+        const result = await window.chomka.vaultSearch(query);
+        // A newer search was sent while this one was in flight
+        if (seq !== this.searchSeq) return;
+        const list = document.getElementById('pk-list');
+        if (!list) return;
+        if (!result || !result.success) {
+            await this.unlockIfLocked();
+            return;
         }
+        list.replaceChildren(...result.entries.map(entry => this.createRow(entry)));
+        if (result.total > result.entries.length) {
+            const more = document.createElement('div');
+            more.style.cssText = 'opacity:0.5; text-align:center; padding:10px; font-size:0.8rem;';
+            more.textContent = `${result.total - result.entries.length} more - refine the search to see them.`;
+            list.appendChild(more);
+        }
+        this.updateEmpty();
+        this.setCount(result.count);
+    }
+
+    createRow(entry) {
+        const row = document.createElement('div');
+        row.className = 'pk-entry';
+        row.dataset.id = entry.id;
+        row.style.cssText = 'background:rgba(255,255,255,0.05); padding:10px; border-radius:8px; margin-bottom:8px; display:flex; justify-content:space-between; align-items:center;';
+
+        const info = document.createElement('div');
+        const service = document.createElement('div');
+        service.style.cssText = 'font-weight:bold; color:var(--accent-color);';
+        service.textContent = entry.service;
+        const username = document.createElement('div');
+        username.style.cssText = 'font-size:0.8rem; opacity:0.8;';
+        username.textContent = entry.username;
+        const secret = document.createElement('div');
+        secret.style.cssText = 'font-size:0.8rem; font-family:monospace; margin-top:2px;';
+        secret.textContent = `${'•'.repeat(8)} `;
+        const copy = document.createElement('span');
+        copy.style.cssText = 'font-size:0.7rem; cursor:pointer; color:var(--accent-color); margin-left:5px;';
+        copy.textContent = 'Copy';
+        copy.onclick = () => this.copyPassword(entry.id);
+        secret.appendChild(copy);
+        info.append(service, username, secret);
+
+        const remove = document.createElement('button');
+        remove.style.cssText = 'background:transparent; border:none; color:#ff4757; cursor:pointer;';
+        remove.textContent = '🗑️';
+        remove.onclick = () => this.deleteEntry(entry.id);
+
+        row.append(info, remove);
+        return row;
+    }
+
+    updateEmpty() {
+        const list = document.getElementById('pk-list');
+        if (!list) return;
+        let empty = list.querySelector('.pk-empty');
+        const hasRows = !!list.querySelector('.pk-entry');
+        if (hasRows && empty) empty.remove();
+        if (!hasRows && !empty) {
+            empty = document.createElement('div');
+            empty.className = 'pk-empty';
+            empty.style.cssText = 'opacity:0.5; text-align:center; padding:20px;';
+            empty.textContent = this.query ? 'No matching logins.' : 'No saved passwords.';
+            list.appendChild(empty);
+        }
+    }
+
+    setCount(count) {
+        this.count = count;
+        const el = document.getElementById('pk-count');
+        if (el) el.textContent = `(${count})`;
+    }
+
+    async addEntry(service, username, password) {
+        const result = await window.chomka.vaultAdd(service, username, password);
+        if (!result || !result.success) {
+            alert(`Could not save: ${(result && result.error) || 'unknown error'}`);
+            await this.unlockIfLocked();
+            return;
+        }
+        ['pk-service', 'pk-username', 'pk-password'].forEach(id => {
+            const input = document.getElementById(id);
+            if (input) input.value = '';
+        });
+        const list = document.getElementById('pk-list');
+        const text = `${service}\n${username}`.toLowerCase();
+        const words = this.query.toLowerCase().split(/\s+/).filter(Boolean);
+        if (list && words.every(word => text.includes(word))) {
+            list.prepend(this.createRow(result.entry));
+            this.updateEmpty();
+        }
+        this.setCount(this.count + 1);
+        if (window.notificationManager) {
+            window.notificationManager.notify("Passkeeper", "Credentials saved!", "🔑");
+        }
+    }
+
+    async deleteEntry(id) {
+        const result = await window.chomka.vaultDelete(id);
+        if (!result || !result.success) {
+            await this.unlockIfLocked();
+            return;
+        }
+        const row = document.querySelector(`#pk-list .pk-entry[data-id="${CSS.escape(id)}"]`);
+        if (row) row.remove();
+        this.updateEmpty();
+        this.setCount(Math.max(0, this.count - 1));
+    }
+
+    async copyPassword(id) {
+        const result = await window.chomka.vaultGetPassword(id);
+        if (result && result.success) {
+            await navigator.clipboard.writeText(result.password);
+            alert('Copied!');
+        } else {
+            await this.unlockIfLocked();
+        }
+    }
+
+    // The backend locks on its own when a sync or import replaces vault.dat
+    async unlockIfLocked() {
+        const status = await window.chomka.vaultStatus();
+        if (status && status.success && !status.unlocked) this.renderUnlock(status);
+    }
+
+    async lock() {
+        await window.chomka.vaultLock();
+        this.query = '';
+        this.renderUnlock({ exists: true });
     }
 }
 
@@ -9,11 +9,13 @@ document.addEventListener('DOMContentLoaded', () => {
         { name: 'Toolbelt', fn: initToolbelt },
         { name: 'Native Bridge', fn: initNativeBridge },
         { name: 'Settings Tray', fn: initSettingsTray },
+        { name: 'Hibernation Tray', fn: initHibernationTray },
         { name: 'Metrics', fn: initMetrics },
         { name: 'Search', fn: initSearch },
         { name: 'Desktop Manager', fn: () => { window.desktopManager = new DesktopManager('desktop-items-container'); } },
         { name: 'Notification Manager', fn: () => { window.notificationManager = new NotificationManager('notification-container'); } },
         { name: 'Tab Manager', fn: initTabManager },
+        { name: 'Workspaces', fn: initWorkspaces },
         { name: 'Add Panel', fn: initAddPanel },
         { name: 'Move Mode', fn: initMoveMode },
         { name: 'Recording Manager', fn: () => { window.recordingManager = new RecordingManager(); } },
@@ -238,6 +240,7 @@ window.createStickyFromSelection = () => {
     }
 };
 
+// Fallback order when the backend cannot rank the mirrors (no bridge)
 const YT_PROXIES = [
     'https://piped.video/embed',
     'https://yewtu.be/embed',
@@ -246,21 +249,42 @@ const YT_PROXIES = [
     'https://invidious.tiekoetter.com/embed'
 ];
 let proxyIndex = 0;
+const repairProxies = new Map(); // item id -> { current, tried }
+
+// Mirror for a repaired player: the item's current one, or the healthiest it has not tried yet
+async function pickRepairProxy(itemId, rotate) {
+    const state = repairProxies.get(itemId) || { current: null, tried: [] };
+    repairProxies.set(itemId, state);
+    if (state.current && !rotate) return state.current;
+    if (rotate && state.current) {
+        state.tried.push(state.current);
+        window.chomka.reportProxyFailure(state.current);
+    }
+
+    const result = await window.chomka.getBestProxy(state.tried);
+    if (result && result.success) {
+        // Every mirror tried: start over from the best one
+        if (state.tried.includes(result.proxy)) state.tried = [];
+        state.current = result.proxy;
+    } else {
+        if (rotate) proxyIndex = (proxyIndex + 1) % YT_PROXIES.length;
+        state.current = YT_PROXIES[proxyIndex];
+    }
+    return state.current;
+}
 
-window.repairYT = function (itemId, specificProxyIndex = -1) {
+window.repairYT = async function (itemId, rotate = false) {
     if (!window.desktopManager) return;
     const item = window.desktopManager.items.find(i => i.id === itemId);
     if (!item) return;
 
-    // Use specific index if provided, otherwise use global one
-    const pIndex = specificProxyIndex >= 0 ? specificProxyIndex : proxyIndex;
-    const proxyUrl = YT_PROXIES[pIndex % YT_PROXIES.length];
+    const proxyUrl = await pickRepairProxy(itemId, rotate);
 
     if (window.notificationManager) {
         window.notificationManager.notify("Repairing", `Redirecting via ${new URL(proxyUrl).hostname}...`, "🔧");
     }
 
-    const el = document.querySelector(`[data-id="${itemId}"]`);
+    const el = window.desktopManager.container.querySelector(`[data-id="${itemId}"]`);
     if (el) {
         const playerContainer = el.querySelector(`#yt-player-${itemId}`);
         if (playerContainer) {
@@ -311,8 +335,7 @@ window.repairYT = function (itemId, specificProxyIndex = -1) {
 };
 
 window.rotateProxy = function (itemId) {
-    proxyIndex = (proxyIndex + 1) % YT_PROXIES.length;
-    window.repairYT(itemId);
+    window.repairYT(itemId, true);
 };
 
 // --- Left Sidebar & Antigravity ---
@@ -611,7 +634,7 @@ function initToolbelt() {
     // --- Standard Video Injection (User Request) ---
     // Auto-executes once if needed
     setTimeout(() => {
-        if (window.desktopManager) {
+        if (window.desktopManager && window.desktopManager.workspaceId === 'main') {
             const targetUrl = "https://www.youtube.com/watch?v=jQHok8S4nDY";
             const exists = window.desktopManager.items.find(i => i.src && i.src.includes('jQHok8S4nDY'));
 
@@ -703,19 +726,69 @@ function initThemes() {
     extractWallpaperAccents();
 }
 
-function extractWallpaperAccents() {
-    // Simulated extraction for now - will be connected to actual wallpaper later
-    // Real logic would use a Canvas to sample the background image.
-    const root = document.documentElement;
-    const currentTheme = document.body.className;
+// --- Wallpaper & Accents ---
+// The palette itself is extracted by the backend (palette.py) off the UI thread.
+async function extractWallpaperAccents() {
+    // Last known wallpaper first, so accents are there before the bridge is
+    const cached = JSON.parse(localStorage.getItem('chomka_wallpaper') || 'null');
+    if (cached) {
+        setWallpaperImage(cached.url);
+        window.applyWallpaperPalette(cached.path, cached.css);
+    }
 
-    if (currentTheme.includes('sakura')) {
-        root.style.setProperty('--accent-glow', 'rgba(255, 71, 87, 0.5)');
-    } else if (currentTheme.includes('cyberpunk')) {
-        root.style.setProperty('--accent-glow', 'rgba(0, 255, 204, 0.7)');
-    } else {
-        root.style.setProperty('--accent-glow', 'rgba(0, 210, 255, 0.5)');
+    await window.chomka.init();
+    const result = await window.chomka.getWallpaper();
+    if (!result || !result.success) return;
+    await showWallpaper(result);
+}
+
+async function showWallpaper(result) {
+    if (!result.path) {
+        clearWallpaper();
+        return;
+    }
+    const baseUrl = await window.chomka.getDataUrl();
+    const url = baseUrl + result.path;
+    setWallpaperImage(url);
+    localStorage.setItem('chomka_wallpaper', JSON.stringify({ path: result.path, url: url, css: result.css || {} }));
+    // Otherwise the backend calls applyWallpaperPalette once it is extracted
+    if (result.css) window.applyWallpaperPalette(result.path, result.css);
+}
+
+function setWallpaperImage(url) {
+    if (url) document.body.style.setProperty('--bg-gradient', `url("${url}") center / cover no-repeat`);
+}
+
+function clearWallpaper() {
+    const cached = JSON.parse(localStorage.getItem('chomka_wallpaper') || 'null');
+    document.body.style.removeProperty('--bg-gradient');
+    if (cached && cached.css) {
+        Object.keys(cached.css).forEach(name => document.body.style.removeProperty(name));
+    }
+    localStorage.removeItem('chomka_wallpaper');
+}
+
+// Inline on body so the palette wins over theme classes
+window.applyWallpaperPalette = function (path, css) {
+    Object.entries(css || {}).forEach(([name, value]) => document.body.style.setProperty(name, value));
+    const cached = JSON.parse(localStorage.getItem('chomka_wallpaper') || 'null');
+    if (cached && cached.path === path) {
+        cached.css = css;
+        localStorage.setItem('chomka_wallpaper', JSON.stringify(cached));
     }
+};
+
+async function pickWallpaper() {
+    const picked = await window.chomka.pickAndSaveImage();
+    if (!picked || !picked.success) return;
+    clearWallpaper();
+    const result = await window.chomka.setWallpaper(picked.path);
+    if (result && result.success) await showWallpaper(result);
+}
+
+async function removeWallpaper() {
+    const result = await window.chomka.setWallpaper(null);
+    if (result && result.success) clearWallpaper();
 }
 
 function initMetrics() {
@@ -955,6 +1028,13 @@ function createBrowserWindow(url = 'https://google.com') {
     win.querySelector('.close').onclick = () => {
         win.remove();
         browserWindows = browserWindows.filter(w => w.id !== winId);
+        window.hibernationManager.unregister(win);
+    };
+
+    win.querySelector('.minimize').onclick = (e) => {
+        e.stopPropagation();
+        win.classList.add('minimized');
+        window.hibernationManager.updateStatus();
     };
 
     win.querySelector('.maximize').onclick = () => {
@@ -1015,6 +1095,7 @@ function createBrowserWindow(url = 'https://google.com') {
     };
 
     browserWindows.push({ id: winId, element: win });
+    window.hibernationManager.register(win);
     return win;
 }
 
@@ -1067,6 +1148,7 @@ function navigateTo(win, url) {
         console.log('Chomka: Navigation target is native-only, closing browser and opening native window');
         win.remove();
         browserWindows = browserWindows.filter(w => w.id !== win.id);
+        window.hibernationManager.unregister(win);
         window.chomka.openNativeWindow(finalUrl);
     } else {
         frame.src = finalUrl;
@@ -1113,11 +1195,27 @@ window.desktopItems = [];
 window.saveTimeout = null;
 let desktopItems = window.desktopItems; // Legacy local reference
 
+async function loadIconAtlas() {
+    const result = await window.chomka.getIconAtlas();
+    if (result && result.success && window.desktopManager) {
+        window.desktopManager.iconAtlas = { bundled: result.bundled, user: result.user };
+    }
+}
+
+window.onIconAtlasUpdated = function (manifest) {
+    if (!window.desktopManager) return;
+    window.desktopManager.pendingAtlasIcons.clear();
+    window.desktopManager.setIconAtlas(undefined, manifest);
+};
+
 async function initTabManager() {
     // CRITICAL: Wait for bridge before loading
     await window.chomka.init();
 
-    loadItems();
+    // Atlas first, so app icons come from one sprite sheet on first render
+    await loadIconAtlas();
+    // Jobs cut short last session continue once the desktop is up
+    loadItems().then(() => window.chomka.resumeJobs());
 
     // Event Listeners from DesktopManager
     window.addEventListener('save-desktop', (e) => {
@@ -1296,10 +1394,33 @@ async function initTabManager() {
 
 }
 
+// Queues the active workspace's items for the IndexedDB mirror (written when idle)
+function mirrorDesktop(items = desktopItems) {
+    // A partly loaded desktop would drop the missing items from the mirror
+    if (isLoadingPages) return;
+    const workspaceId = window.desktopManager ? window.desktopManager.workspaceId : 'main';
+    window.offlineMirror.save(workspaceId, items);
+}
+window.mirrorDesktop = mirrorDesktop;
+
 async function loadItems() {
     let storedData = null;
 
-    // 1. Try Native Bridge (Config/State)
+    // 0. Resolve the active workspace so only its items are loaded
+    try {
+        const workspaces = await window.chomka.listWorkspaces();
+        if (workspaces && workspaces.success) {
+            window.desktopManager.setWorkspaceId(workspaces.active);
+            renderWorkspaceSwitcher();
+        }
+    } catch (e) {
+        console.warn('Chomka: Could not resolve active workspace, using main', e);
+    }
+
+    // 1. Paged read: first screen now, the rest in idle time
+    if (await loadItemsPaged()) return;
+
+    // 2. Whole-array read (older backend)
     try {
         const state = await window.chomka.getState('desktop_items');
         if (state && state.success && state.value) {
@@ -1307,15 +1428,22 @@ async function loadItems() {
             console.log(`Chomka: Loaded ${Array.isArray(storedData) ? storedData.length : 'object'} items from config.json`);
         }
     } catch (e) {
-        console.warn('Chomka: Could not parse from native bridge, trying localStorage...', e);
+        console.warn('Chomka: Could not parse from native bridge, trying the offline mirror...', e);
     }
 
-    // 2. Fallback to LocalStorage
+    // 3. Fallback to the IndexedDB mirror, read in idle-time batches that render as they arrive
     if (!storedData) {
-        const stored = localStorage.getItem('chomka_desktop');
-        if (stored) {
-            storedData = JSON.parse(stored);
-            console.log('Chomka: Loaded items from localStorage');
+        try {
+            const workspaceId = window.desktopManager.workspaceId;
+            window.desktopManager.setBaseUrl(await window.chomka.getDataUrl());
+            storedData = await window.offlineMirror.load(workspaceId, items => {
+                if (window.desktopManager.workspaceId !== workspaceId) return;
+                desktopItems = window.desktopManager.applyExternalChanges(items, [], null);
+                window.desktopItems = desktopItems;
+            });
+            if (storedData) console.log(`Chomka: Loaded ${storedData.length} items from the offline mirror`);
+        } catch (e) {
+            console.warn('Chomka: Offline mirror unavailable', e);
         }
     }
 
@@ -1373,72 +1501,13 @@ async function loadItems() {
         }, 1000);
     }
 
-    // Migration: Extract large Base64 images to assets
     if (storedData) {
-        console.log('Chomka: Checking for assets to migrate...');
-        let migratedCount = 0;
-
-        // Count how many need migration
-        const toMigrate = (Array.isArray(desktopItems) ? desktopItems : []).filter(item =>
-            (item.type === 'image' || item.type === 'gif') && item.src && item.src.startsWith('data:image')
-        );
-
-        if (toMigrate.length > 0) {
-            updateSaveStatus('migrating');
-            for (const item of toMigrate) {
-                console.log(`Chomka: Migrating asset ${item.id}...`);
-                try {
-                    const result = await window.chomka.saveAsset(item.src, item.id);
-                    if (result && result.success) {
-                        item.src = result.path;
-                        migratedCount++;
-                    }
-                } catch (err) {
-                    console.warn(`Chomka: Failed to migrate ${item.id}`, err);
-                }
-            }
-        }
-
-        // New Migration: Ensure core apps exist and use 'app' type
-        const coreApps = [
-            { id: 'app-youtube', url: 'https://www.youtube.com', name: 'YouTube', iconUrl: 'assets/youtube.png' },
-            { id: 'app-discord', url: 'https://discord.com/app', name: 'Discord', iconUrl: 'assets/discord.png' },
-            { id: 'app-minecraft-wiki', url: 'https://minecraft.wiki', name: 'Minecraft Wiki', iconUrl: 'assets/minecraft.png' }
-        ];
-
-        window.chomka.log('Chomka: Checking for core app migration...');
-        let coreMigrated = false;
-        coreApps.forEach((app) => {
-            let existing = desktopItems.find((i) => i.id === app.id);
-            if (!existing) {
-                window.chomka.log(`Chomka: Core app ${app.id} missing, adding...`);
-                desktopItems.push({
-                    id: app.id,
-                    type: 'app',
-                    url: app.url,
-                    name: app.name,
-                    iconUrl: app.iconUrl,
-                    x: 20,
-                    y: 150 + (coreApps.indexOf(app) * 200)
-                });
-                coreMigrated = true;
-            } else if (existing.type !== 'app' || !existing.iconUrl) {
-                window.chomka.log(`Chomka: Upgrading core app ${app.id} to new branded type...`);
-                existing.type = 'app';
-                existing.url = app.url;
-                existing.name = app.name;
-                existing.iconUrl = app.iconUrl;
-                coreMigrated = true;
-            }
-        });
-
-        if (migratedCount > 0 || coreMigrated) {
+        const migratedCount = await migrateBase64Images(desktopItems);
+        if (migrateCoreApps() || migratedCount > 0) {
             window.chomka.log('Chomka: Migrated ' + migratedCount + ' assets and core apps, updating config.json');
             updateSaveStatus('saved');
-            localStorage.setItem('chomka_desktop', JSON.stringify(desktopItems));
+            mirrorDesktop();
             window.chomka.saveState('desktop_items', desktopItems);
-        } else if (toMigrate.length > 0) {
-            updateSaveStatus('hidden');
         }
     }
 
@@ -1448,9 +1517,183 @@ async function loadItems() {
     window.desktopManager.loadItems(desktopItems); // This also renders, wait
 }
 
+const ITEM_PAGE_SIZE = 150;
+
+// Settles once every page of the desktop has arrived; saves wait for it so a
+// half-loaded desktop is never written back.
+window.desktopLoadPromise = Promise.resolve();
+let isLoadingPages = false;
+
+async function loadItemsPaged() {
+    const dm = window.desktopManager;
+    const workspaceId = dm.workspaceId;
+    const viewport = {
+        x: dm.container ? dm.container.scrollLeft : 0,
+        y: dm.container ? dm.container.scrollTop : 0,
+        w: window.innerWidth,
+        h: window.innerHeight
+    };
+    const first = await window.chomka.getItemsPage(null, ITEM_PAGE_SIZE, viewport);
+    // Nothing saved yet: let the regular path create the default desktop
+    if (!first || !first.success || !first.exists) return false;
+
+    let finishLoad;
+    window.desktopLoadPromise = new Promise(resolve => { finishLoad = resolve; });
+    isLoadingPages = true;
+    const savedIndex = new Map();
+    const takePage = (page) => page.items.forEach((item, i) => savedIndex.set(item.id, page.indexes[i]));
+
+    try {
+        takePage(first);
+        dm.setBaseUrl(await window.chomka.getDataUrl());
+        dm.loadItems(first.items);
+        desktopItems = dm.items;
+        window.desktopItems = desktopItems;
+        console.log(`Chomka: Painted ${first.items.length} of ${first.total} items`);
+
+        let cursor = first.cursor;
+        while (cursor) {
+            await new Promise(resolve => (window.requestIdleCallback || setTimeout)(resolve));
+            if (dm.workspaceId !== workspaceId) return true;
+            const page = await window.chomka.getItemsPage(cursor, ITEM_PAGE_SIZE);
+            if (!page || !page.success) throw new Error(page ? page.error : 'bridge unavailable');
+            takePage(page);
+            dm.appendItems(page.items);
+            cursor = page.cursor;
+        }
+
+        // Back to the saved order; items added meanwhile go last
+        dm.items.sort((a, b) => (savedIndex.has(a.id) ? savedIndex.get(a.id) : Infinity) -
+            (savedIndex.has(b.id) ? savedIndex.get(b.id) : Infinity));
+        desktopItems = dm.items;
+        window.desktopItems = desktopItems;
+        console.log(`Chomka: Loaded ${first.total} items from config.json in pages`);
+
+        if (migrateCoreApps()) {
+            dm.render();
+            window.chomka.log('Chomka: Migrated core apps, updating config.json');
+            window.chomka.saveState('desktop_items', desktopItems);
+        }
+    } catch (e) {
+        console.error('Chomka: Paged load failed, reloading whole desktop', e);
+        window.chomka.log(`Paged load failed: ${e.message}`, 'ERROR');
+        const state = await window.chomka.getState('desktop_items');
+        if (state && state.success && Array.isArray(state.value)) {
+            desktopItems = state.value;
+            window.desktopItems = desktopItems;
+            dm.loadItems(desktopItems);
+        }
+    } finally {
+        isLoadingPages = false;
+        finishLoad();
+    }
+    mirrorDesktop();
+
+    // Embedded images move to assets in a background job; the desktop stays usable meanwhile
+    const before = new Map(desktopItems.map(item => [item.id, item.src]));
+    const migratedCount = await migrateBase64Images(desktopItems);
+    if (migratedCount > 0 && dm.workspaceId === workspaceId) {
+        const changed = desktopItems.filter(item => before.get(item.id) !== item.src);
+        desktopItems = dm.applyExternalChanges(changed, [], null);
+        window.desktopItems = desktopItems;
+        window.chomka.log('Chomka: Migrated ' + migratedCount + ' assets, updating config.json');
+        updateSaveStatus('saved');
+        saveItems();
+    }
+    return true;
+}
+
+// Migration: Extract large Base64 images to assets. Returns how many moved.
+// The backend migrates the saved copy of the desktop in a resumable job and
+// reports the new path of each item.
+async function migrateBase64Images(items) {
+    items = Array.isArray(items) ? items : [];
+    const toMigrate = items.filter(item =>
+        (item.type === 'image' || item.type === 'gif') && item.src && item.src.startsWith('data:image')
+    );
+    const hasInlineTabs = items.some(item => item.type === 'folder' && (item.tabs || []).some(isInlineImageTab));
+    if (toMigrate.length === 0 && !hasInlineTabs) return 0;
+
+    updateSaveStatus('migrating');
+    const workspace = window.desktopManager ? window.desktopManager.workspaceId : 'main';
+    const job = await window.chomka.runJob('migrate_assets', { workspace, label: 'Moving embedded images' });
+    const migratedCount = job.success
+        ? applyMigratedPaths(toMigrate, job.result.paths) + applyMigratedTabs(items, job.result.tabs || [])
+        : 0;
+    if (!job.success) console.warn('Chomka: Asset migration failed', job.error);
+    updateSaveStatus(migratedCount > 0 ? 'saved' : 'hidden');
+    return migratedCount;
+}
+
+function isInlineImageTab(tab) {
+    return tab.type === 'image' && typeof tab.url === 'string' && tab.url.startsWith('data:image');
+}
+
+// Folder entries are matched by position; the length check skips any that changed meanwhile
+function applyMigratedTabs(items, tabs) {
+    let count = 0;
+    tabs.forEach(moved => {
+        const folder = items.find(item => item.id === moved.folder);
+        const tab = folder && folder.tabs && folder.tabs[moved.index];
+        if (tab && isInlineImageTab(tab) && tab.url.length === moved.length) {
+            tab.url = moved.path;
+            count++;
+        }
+    });
+    return count;
+}
+
+function applyMigratedPaths(items, paths) {
+    let count = 0;
+    items.forEach(item => {
+        if (paths[item.id] && item.src && item.src.startsWith('data:image')) {
+            item.src = paths[item.id];
+            count++;
+        }
+    });
+    return count;
+}
+
+// Migration: Ensure core apps exist and use 'app' type. Returns true if desktopItems changed.
+function migrateCoreApps() {
+    const coreApps = [
+        { id: 'app-youtube', url: 'https://www.youtube.com', name: 'YouTube', iconUrl: 'assets/youtube.png' },
+        { id: 'app-discord', url: 'https://discord.com/app', name: 'Discord', iconUrl: 'assets/discord.png' },
+        { id: 'app-minecraft-wiki', url: 'https://minecraft.wiki', name: 'Minecraft Wiki', iconUrl: 'assets/minecraft.png' }
+    ];
+
+    window.chomka.log('Chomka: Checking for core app migration...');
+    let coreMigrated = false;
+    // Core apps only belong on the main workspace
+    (window.desktopManager.workspaceId === 'main' ? coreApps : []).forEach((app) => {
+        let existing = desktopItems.find((i) => i.id === app.id);
+        if (!existing) {
+            window.chomka.log(`Chomka: Core app ${app.id} missing, adding...`);
+            desktopItems.push({
+                id: app.id,
+                type: 'app',
+                url: app.url,
+                name: app.name,
+                iconUrl: app.iconUrl,
+                x: 20,
+                y: 150 + (coreApps.indexOf(app) * 200)
+            });
+            coreMigrated = true;
+        } else if (existing.type !== 'app' || !existing.iconUrl) {
+            window.chomka.log(`Chomka: Upgrading core app ${app.id} to new branded type...`);
+            existing.type = 'app';
+            existing.url = app.url;
+            existing.name = app.name;
+            existing.iconUrl = app.iconUrl;
+            coreMigrated = true;
+        }
+    });
+    return coreMigrated;
+}
+
 function saveItems() {
-    // Save to localStorage immediately
-    localStorage.setItem('chomka_desktop', JSON.stringify(desktopItems));
+    // Mirror locally (IndexedDB, off the critical path)
+    mirrorDesktop();
 
     // UI Feedback
     updateSaveStatus('saving');
@@ -1458,6 +1701,7 @@ function saveItems() {
     // Debounce Save
     if (saveTimeout) clearTimeout(saveTimeout);
     saveTimeout = setTimeout(async () => {
+        await window.desktopLoadPromise;
         // Visual "Save Realization"
         triggerSaveRealization();
 
@@ -1465,7 +1709,9 @@ function saveItems() {
 
         // Also save a raw text version as requested: "screenlayout.txt"
         const layoutText = desktopItems.map(i => `${i.id}: ${i.x},${i.y} [${i.type}]`).join('\n');
-        await window.chomka.saveFile('saves/screenlayout.txt', layoutText);
+        const workspaceId = window.desktopManager ? window.desktopManager.workspaceId : 'main';
+        const layoutFile = workspaceId === 'main' ? 'saves/screenlayout.txt' : `saves/screenlayout-${workspaceId}.txt`;
+        await window.chomka.saveFile(layoutFile, layoutText);
 
         if (result && result.success) {
             console.log('Chomka: Save state (config.json) updated');
@@ -1533,6 +1779,111 @@ window.onSaveError = (filename, error) => {
 
 
 
+// --- Virtual Workspaces ---
+let workspaceList = [];
+let isSwitchingWorkspace = false;
+
+async function initWorkspaces() {
+    await window.chomka.init();
+
+    const taskbarApps = document.getElementById('taskbar-apps');
+    if (taskbarApps && !document.getElementById('workspace-switcher')) {
+        const switcher = document.createElement('div');
+        switcher.id = 'workspace-switcher';
+        taskbarApps.parentNode.insertBefore(switcher, taskbarApps.nextSibling);
+    }
+
+    await refreshWorkspaceSwitcher();
+
+    // Ctrl+Alt+Left/Right cycles workspaces
+    window.addEventListener('keydown', (e) => {
+        if (!e.ctrlKey || !e.altKey || (e.key !== 'ArrowLeft' && e.key !== 'ArrowRight')) return;
+        e.preventDefault();
+        const ids = workspaceList.map(w => w.id);
+        const pos = ids.indexOf(window.desktopManager.workspaceId);
+        const next = ids[(pos + (e.key === 'ArrowRight' ? 1 : -1) + ids.length) % ids.length];
+        if (next) switchWorkspace(next);
+    });
+}
+
+async function refreshWorkspaceSwitcher() {
+    const result = await window.chomka.listWorkspaces();
+    if (!result || !result.success) return;
+    workspaceList = result.workspaces;
+    renderWorkspaceSwitcher();
+}
+
+function renderWorkspaceSwitcher() {
+    const switcher = document.getElementById('workspace-switcher');
+    if (!switcher) return;
+    const activeId = window.desktopManager ? window.desktopManager.workspaceId : 'main';
+
+    switcher.innerHTML = workspaceList.map((w, idx) => `
+        <button class="workspace-pill ${w.id === activeId ? 'active' : ''}" data-workspace="${w.id}" title="${w.name}">${idx + 1}</button>
+    `).join('') + `<button class="workspace-pill" id="workspace-add" title="New Workspace">+</button>`;
+
+    switcher.querySelectorAll('.workspace-pill[data-workspace]').forEach(pill => {
+        pill.onclick = () => switchWorkspace(pill.dataset.workspace);
+        pill.ondblclick = async () => {
+            const name = prompt('Workspace name:', pill.title);
+            if (name) {
+                await window.chomka.renameWorkspace(pill.dataset.workspace, name);
+                refreshWorkspaceSwitcher();
+            }
+        };
+        pill.oncontextmenu = async (e) => {
+            e.preventDefault();
+            e.stopPropagation();
+            const id = pill.dataset.workspace;
+            if (id === 'main' || !confirm(`Delete workspace "${pill.title}" and all of its items?`)) return;
+            if (id === window.desktopManager.workspaceId) await switchWorkspace('main');
+            const result = await window.chomka.deleteWorkspace(id);
+            if (result && result.success) {
+                window.desktopManager.dropParkedWorkspace(id);
+                window.offlineMirror.dropWorkspace(id);
+            }
+            refreshWorkspaceSwitcher();
+        };
+    });
+
+    document.getElementById('workspace-add').onclick = async () => {
+        const result = await window.chomka.createWorkspace(`Desktop ${workspaceList.length + 1}`);
+        if (result && result.success) {
+            await refreshWorkspaceSwitcher();
+            switchWorkspace(result.id);
+        }
+    };
+}
+
+async function switchWorkspace(workspaceId) {
+    const dm = window.desktopManager;
+    if (!dm || isSwitchingWorkspace || workspaceId === dm.workspaceId) return;
+    isSwitchingWorkspace = true;
+
+    try {
+        // Flush the current workspace before the backend changes its active target
+        await window.desktopLoadPromise;
+        dm.saveAllTimestamps();
+        if (saveTimeout) clearTimeout(saveTimeout);
+        await window.chomka.saveState('desktop_items', desktopItems);
+
+        const result = await window.chomka.switchWorkspace(workspaceId);
+        if (!result || !result.success) {
+            throw new Error(result ? result.error : 'bridge unavailable');
+        }
+
+        desktopItems = dm.switchWorkspace(workspaceId, result.items);
+        mirrorDesktop();
+        renderWorkspaceSwitcher();
+    } catch (e) {
+        console.error('Chomka: Workspace switch failed', e);
+        window.chomka.log(`Workspace switch failed: ${e.message}`, 'ERROR');
+    } finally {
+        isSwitchingWorkspace = false;
+    }
+}
+window.switchWorkspace = switchWorkspace;
+
 // --- Add Panel Logic ---
 function initAddPanel() {
     console.log('Chomka: Initializing Add Panel...');
@@ -1780,41 +2131,15 @@ function initMoveMode() {
 // --- Folder Interaction (Upload/Paste) ---
 
 let currentOpenFolderId = null;
+let currentFolderView = null;
 
 function openFolder(folder) {
     currentOpenFolderId = folder.id;
-    let html = `<h3>${folder.name}</h3>`;
-
-    // Render Items
-    if (folder.tabs && folder.tabs.length > 0) {
-        html += `<div class="folder-grid" style="display:grid; grid-template-columns:repeat(auto-fill, minmax(100px, 1fr)); gap:10px; max-height:400px; overflow-y:auto;">`;
-        folder.tabs.forEach((item, index) => {
-            if (item.type === 'image') {
-                html += `
-                <div style="position:relative; border:1px solid #444; padding:5px; border-radius:8px; background:rgba(0,0,0,0.3);">
-                    <img src="${item.url}" style="width:100%; height:80px; object-fit:cover; border-radius:4px; display:block;">
-                    <div style="font-size:0.8rem; margin-top:5px; white-space:nowrap; overflow:hidden; text-overflow:ellipsis;">${item.title || 'Image'}</div>
-                    <button onclick="window.chomkaDeleteFolderItem('${folder.id}', ${index})" style="position:absolute; top:2px; right:2px; background:red; color:white; border:none; border-radius:50%; width:20px; height:20px; cursor:pointer;">&times;</button>
-                    <button onclick="window.openBrowser('${item.url}')" style="width:100%; margin-top:5px; cursor:pointer; background:#333; color:white; border:none; padding:4px;">View</button>
-                </div>`;
-            } else {
-                // Link
-                html += `
-                <div style="position:relative; border:1px solid #444; padding:10px; border-radius:8px; background:rgba(0,0,0,0.3); display:flex; flex-direction:column; justify-content:center; align-items:center;">
-                    <div style="font-size:2rem;">🔗</div>
-                    <div style="font-size:0.8rem; margin-top:5px; white-space:nowrap; overflow:hidden; text-overflow:ellipsis; width:100%; text-align:center;">${item.title || 'Link'}</div>
-                    <button onclick="window.chomkaDeleteFolderItem('${folder.id}', ${index})" style="position:absolute; top:2px; right:2px; background:red; color:white; border:none; border-radius:50%; width:20px; height:20px; cursor:pointer;">&times;</button>
-                    <button onclick="window.openBrowser('${item.url}')" style="width:100%; margin-top:5px; cursor:pointer; background:var(--accent-color); color:black; border:none; padding:4px; border-radius:4px;">Open</button>
-                </div>`;
-            }
-        });
-        html += `</div>`;
-    } else {
-        html += `<div style="padding:20px; text-align:center; color:#888;">Empty Folder<br><small>Paste images (Ctrl+V) or click 'Upload'</small></div>`;
-    }
+    if (currentFolderView) currentFolderView.destroy();
 
-    // Controls
-    html += `
+    // Entries are rendered by FolderView, only the rows in view
+    const html = `<h3>${folder.name}</h3>
+    <div id="folder-grid" class="folder-grid"></div>
     <div style="margin-top:20px; padding-top:15px; border-top:1px solid rgba(255,255,255,0.1); display:flex; gap:10px; flex-wrap:wrap;">
         <button id="folder-add-link" style="padding:8px 12px; background:var(--accent-color); border:none; border-radius:4px; cursor:pointer; font-weight:600;">+ Link</button>
         <button id="folder-upload-img" style="padding:8px 12px; background:#e91e63; color:white; border:none; border-radius:4px; cursor:pointer; font-weight:600;">↑ Upload Image</button>
@@ -1823,6 +2148,7 @@ function openFolder(folder) {
     `;
 
     window.showModal(folder.name, html);
+    currentFolderView = new FolderView(folder, document.getElementById('folder-grid'));
 
     // Bind Actions
     setTimeout(() => {
@@ -1839,6 +2165,18 @@ function openFolder(folder) {
     }, 0);
 }
 
+// Patches the open folder view in place; reopens it if it was closed meanwhile
+function refreshFolder(folder) {
+    const modal = document.getElementById('modal-overlay');
+    const grid = document.getElementById('folder-grid');
+    if (currentFolderView && currentFolderView.folder === folder && grid === currentFolderView.container
+        && !modal.classList.contains('hidden')) {
+        currentFolderView.refresh();
+    } else {
+        openFolder(folder);
+    }
+}
+
 // Listen for Paste (Global, but filtered by modal existence)
 // Listen for Paste (Global)
 document.addEventListener('paste', (e) => {
@@ -1874,10 +2212,11 @@ document.addEventListener('paste', (e) => {
     }
 });
 
-// Update addItemToFolder to handle direct content (base64)
-function addItemToFolder(folderId, type, content = null) {
+// Pasted images (data URIs) are saved as assets, so folders never hold inline data
+async function addItemToFolder(folderId, type, content = null) {
     const folder = desktopItems.find(i => i.id === folderId);
     if (!folder) return;
+    if (!folder.tabs) folder.tabs = [];
 
     if (type === 'link') {
         const url = prompt("Enter URL:");
@@ -1885,7 +2224,7 @@ function addItemToFolder(folderId, type, content = null) {
             const title = prompt("Enter Title (optional):") || url;
             folder.tabs.push({ type: 'link', url: url, title: title });
             saveItems();
-            openFolder(folder);
+            refreshFolder(folder);
         }
     } else if (type === 'image') {
         let url = content;
@@ -1896,10 +2235,20 @@ function addItemToFolder(folderId, type, content = null) {
             title = "Image Link";
         }
 
+        if (url && url.startsWith('data:image')) {
+            updateSaveStatus('saving');
+            const saved = await window.chomka.saveAsset(url, `${folder.id}-tab`);
+            if (!saved || !saved.success) {
+                updateSaveStatus('error');
+                return;
+            }
+            url = saved.path;
+        }
+
         if (url) {
             folder.tabs.push({ type: 'image', url: url, title: title });
             saveItems();
-            openFolder(folder);
+            refreshFolder(folder);
         }
     }
 }
@@ -1907,14 +2256,47 @@ function addItemToFolder(folderId, type, content = null) {
 // Global helper for delete (needs to be on window to be called from string HTML)
 window.chomkaDeleteFolderItem = function (folderId, itemIndex) {
     const folder = desktopItems.find(i => i.id === folderId);
-    if (folder && folder.tabs) {
+    if (folder && folder.tabs && itemIndex >= 0) {
         folder.tabs.splice(itemIndex, 1);
         saveItems();
-        openFolder(folder); // Re-render
+        refreshFolder(folder);
     }
 };
 
 
+// --- Hibernated / Minimized Browser Windows ---
+function initHibernationTray() {
+    const trayEl = document.getElementById('tray-hibernated');
+    if (trayEl) trayEl.onclick = () => showBrowserWindowList();
+}
+
+function showBrowserWindowList() {
+    const hm = window.hibernationManager;
+    window.showModal('Browser Windows', '<div id="browser-window-list" style="padding:10px; color:white;">No browser windows open.</div>');
+    const list = document.getElementById('browser-window-list');
+    if (hm.windows.size === 0) return;
+    list.replaceChildren(...[...hm.windows.values()].map(entry => {
+        const row = document.createElement('div');
+        row.style.cssText = 'display:flex; align-items:center; gap:10px; margin-top:8px;';
+        const label = document.createElement('span');
+        label.style.cssText = 'flex:1; overflow:hidden; text-overflow:ellipsis; white-space:nowrap;';
+        label.textContent = entry.hibernated ? entry.title : entry.win.querySelector('.browser-url-bar').value;
+        const state = document.createElement('span');
+        state.style.cssText = 'font-size:0.8rem; opacity:0.6;';
+        state.textContent = [entry.hibernated ? '💤 hibernated' : 'live',
+            entry.win.classList.contains('minimized') ? 'minimized' : ''].filter(Boolean).join(', ');
+        const restore = document.createElement('button');
+        restore.className = 'theme-btn';
+        restore.textContent = 'Restore';
+        restore.onclick = () => {
+            hm.restore(entry.win.id);
+            document.getElementById('modal-overlay').classList.add('hidden');
+        };
+        row.append(label, state, restore);
+        return row;
+    }));
+}
+
 // --- Settings Tray & Themes ---
 function initSettingsTray() {
     const settingsBtn = document.getElementById('tray-settings');
@@ -1923,6 +2305,7 @@ function initSettingsTray() {
     // Load saved theme
     const savedTheme = localStorage.getItem('chomka_theme') || 'default';
     setTheme(savedTheme);
+    extractWallpaperAccents();
 
     settingsBtn.onclick = () => {
         // Toggle rotation animation
@@ -1948,6 +2331,52 @@ function initSettingsTray() {
                 <input type="checkbox" id="setting-show-fps" style="margin-right:10px;"> Show FPS Counter
             </label>
             <div style="margin-top:10px; font-size:0.8rem; opacity:0.6;">Resolution: ${window.innerWidth}x${window.innerHeight}</div>
+            <label style="display:flex; align-items:center; margin-top:10px;">
+                Hibernate idle browser windows after
+                <select id="setting-hibernate" style="margin-left:10px;">
+                    <option value="5">5 min</option>
+                    <option value="10">10 min</option>
+                    <option value="30">30 min</option>
+                    <option value="60">1 hour</option>
+                    <option value="0">Never</option>
+                </select>
+            </label>
+            <button id="setting-memory-report" class="theme-btn" style="margin-top:10px;">🧠 Write Memory Report</button>
+
+            <div class="divider"></div>
+            <h4 style="margin-bottom:10px;">💾 Storage</h4>
+            <label style="display:flex; align-items:center; cursor:pointer;">
+                <input type="checkbox" id="setting-asset-server" style="margin-right:10px;"> Serve assets via local server (faster video seeking, cached images)
+            </label>
+            <button id="setting-snapshots" class="theme-btn" style="margin-top:10px;">🕘 Desktop History...</button>
+            <button id="setting-sync" class="theme-btn" style="margin-top:10px;">🔄 Sync Now...</button>
+            <button id="setting-storage" class="theme-btn" style="margin-top:10px;">🧹 Clean Up Storage</button>
+            <button id="setting-quarantine" class="theme-btn" style="margin-top:10px;">🗂 Quarantined Files...</button>
+            <div id="setting-storage-usage" style="margin-top:10px; font-size:0.8rem; opacity:0.6;"></div>
+            <button id="setting-export" class="theme-btn" style="margin-top:10px;">📦 Export Desktop...</button>
+            <button id="setting-import" class="theme-btn" style="margin-top:10px;">📥 Import Desktop...</button>
+            <div id="archive-progress" style="margin-top:10px; font-size:0.8rem; opacity:0.6;"></div>
+            <div id="job-list" style="margin-top:10px; font-size:0.8rem;"></div>
+
+            <div class="divider"></div>
+            <h4 style="margin-bottom:10px;">📱 Companion</h4>
+            <label style="display:flex; align-items:center; cursor:pointer;">
+                <input type="checkbox" id="setting-companion" style="margin-right:10px;"> Let companion devices view and control the desktop
+            </label>
+            <label style="display:flex; align-items:center; cursor:pointer; margin-top:6px;">
+                <input type="checkbox" id="setting-companion-lan" style="margin-right:10px;"> Allow devices on the local network (otherwise this PC only)
+            </label>
+            <div id="companion-info" style="margin-top:10px; font-size:0.8rem; opacity:0.6; word-break:break-all;"></div>
+
+            <div class="divider"></div>
+            <h4 style="margin-bottom:10px;">🧩 Extensions</h4>
+            <div id="extension-list" style="font-size:0.8rem; opacity:0.8;"></div>
+            <button id="setting-extensions-reload" class="theme-btn" style="margin-top:10px;">🔄 Reload Extensions</button>
+
+            <div class="divider"></div>
+            <h4 style="margin-bottom:10px;">🖼️ Wallpaper</h4>
+            <button id="setting-wallpaper" class="theme-btn">Choose Image...</button>
+            <button id="setting-wallpaper-clear" class="theme-btn">Remove</button>
         </div>
     `;
 
@@ -1956,7 +2385,7 @@ function initSettingsTray() {
         }
 
         // Attach theme listeners inside modal
-        setTimeout(() => {
+        setTimeout(async () => {
             document.querySelectorAll('.theme-btn').forEach(btn => {
                 btn.onclick = () => {
                     const theme = btn.getAttribute('data-theme');
@@ -1969,10 +2398,472 @@ function initSettingsTray() {
                     btn.classList.add('active');
                 }
             });
+
+            const extensionsBtn = document.getElementById('setting-extensions-reload');
+            if (extensionsBtn) extensionsBtn.onclick = async () => {
+                await window.chomka.reloadExtensions();
+                showExtensions();
+            };
+            showExtensions();
+
+            const hibernateSelect = document.getElementById('setting-hibernate');
+            if (hibernateSelect) {
+                hibernateSelect.value = String(window.hibernationManager.idleMinutes);
+                hibernateSelect.onchange = () => window.hibernationManager.setIdleMinutes(parseFloat(hibernateSelect.value));
+            }
+
+            const memoryBtn = document.getElementById('setting-memory-report');
+            if (memoryBtn) memoryBtn.onclick = () => writeMemoryReport();
+
+            const historyBtn = document.getElementById('setting-snapshots');
+            if (historyBtn) historyBtn.onclick = () => openSnapshotHistory();
+
+            const syncBtn = document.getElementById('setting-sync');
+            if (syncBtn) syncBtn.onclick = () => syncDataDir();
+
+            const storageBtn = document.getElementById('setting-storage');
+            if (storageBtn) storageBtn.onclick = () => cleanUpStorage();
+            const quarantineBtn = document.getElementById('setting-quarantine');
+            if (quarantineBtn) quarantineBtn.onclick = () => openQuarantine();
+            const exportBtn = document.getElementById('setting-export');
+            if (exportBtn) exportBtn.onclick = () => exportDesktopArchive();
+            const importBtn = document.getElementById('setting-import');
+            if (importBtn) importBtn.onclick = () => importDesktopArchive();
+            showStorageUsage();
+            renderJobList();
+
+            const wallpaperBtn = document.getElementById('setting-wallpaper');
+            if (wallpaperBtn) wallpaperBtn.onclick = () => pickWallpaper();
+            const wallpaperClearBtn = document.getElementById('setting-wallpaper-clear');
+            if (wallpaperClearBtn) wallpaperClearBtn.onclick = () => removeWallpaper();
+
+            const companionToggle = document.getElementById('setting-companion');
+            const companionLan = document.getElementById('setting-companion-lan');
+            if (companionToggle && companionLan) {
+                showCompanionInfo(await window.chomka.getCompanionInfo());
+                const toggle = async () => {
+                    showCompanionInfo(await window.chomka.setCompanionEnabled(companionToggle.checked, companionLan.checked));
+                };
+                companionToggle.onchange = toggle;
+                companionLan.onchange = toggle;
+            }
+
+            const assetToggle = document.getElementById('setting-asset-server');
+            if (assetToggle) {
+                const state = await window.chomka.getState('asset_server');
+                assetToggle.checked = !!(state && state.value);
+                assetToggle.onchange = async () => {
+                    const result = await window.chomka.setAssetServerEnabled(assetToggle.checked);
+                    if (result && result.success && window.desktopManager) {
+                        window.desktopManager.setBaseUrl(result.url);
+                    } else {
+                        assetToggle.checked = !assetToggle.checked;
+                    }
+                };
+            }
         }, 100);
     };
 }
 
+// --- External Data Changes (file watcher) ---
+window.onDataDirChanged = function (event) {
+    const dm = window.desktopManager;
+    if (!dm) return;
+
+    (event.items || []).forEach(change => {
+        if (change.workspace !== dm.workspaceId) return;
+        if (change.full) {
+            desktopItems = change.items;
+            dm.loadItems(desktopItems);
+        } else {
+            desktopItems = dm.applyExternalChanges(change.upserted, change.removed, change.order);
+        }
+        window.desktopItems = desktopItems;
+        mirrorDesktop();
+        console.log(`Chomka: Merged external changes for ${change.workspace}`);
+    });
+
+    // Replaced assets: bust the cached copy of anything showing them
+    (event.assets || []).forEach(path => {
+        dm.container.querySelectorAll('img, video, source').forEach(el => {
+            const src = el.getAttribute('src') || '';
+            if (src.split('?')[0].endsWith(path)) {
+                el.setAttribute('src', `${src.split('?')[0]}?v=${Date.now()}`);
+            }
+        });
+    });
+};
+
+// --- Data Directory Sync ---
+async function syncDataDir() {
+    const current = await window.chomka.getState('sync_remote');
+    let target = current && current.value;
+    if (!target) {
+        target = prompt("Sync remote (folder path or http:// URL):");
+        if (!target) return;
+        await window.chomka.setSyncRemote(target);
+    }
+
+    // Flush pending desktop changes so they are part of this sync
+    await window.desktopLoadPromise;
+    if (saveTimeout) {
+        clearTimeout(saveTimeout);
+        saveTimeout = null;
+        await window.chomka.saveState('desktop_items', desktopItems);
+    }
+
+    const result = await window.chomka.syncNow();
+    if (result && result.running) {
+        if (window.notificationManager) {
+            window.notificationManager.notify("Sync", result.error, "🔄");
+        }
+        return; // onSyncFinished reports it
+    }
+    window.onSyncFinished(result);
+}
+
+window.onSyncFinished = function (result) {
+    if (!result || !result.success) {
+        if (window.notificationManager) {
+            window.notificationManager.notify("Sync", `Failed: ${result && result.error}`, "⚠️");
+        }
+        return;
+    }
+    const stats = result.stats;
+    if (window.notificationManager) {
+        window.notificationManager.notify("Sync",
+            `↑ ${stats.pushed.length} ↓ ${stats.pulled.length} files` + (stats.conflicts.length ? `, ${stats.conflicts.length} conflicts` : ''), "🔄");
+    }
+    if (stats.changed) {
+        location.reload();
+    }
+};
+
+// --- Storage Usage & Cleanup ---
+function formatBytes(bytes) {
+    if (bytes < 1024 * 1024) return `${(bytes / 1024).toFixed(0)} KB`;
+    if (bytes < 1024 * 1024 * 1024) return `${(bytes / (1024 * 1024)).toFixed(1)} MB`;
+    return `${(bytes / (1024 * 1024 * 1024)).toFixed(2)} GB`;
+}
+
+async function showStorageUsage() {
+    const el = document.getElementById('setting-storage-usage');
+    if (!el) return;
+    const result = await window.chomka.getStorageReport();
+    if (!result || !result.success) return;
+    const usage = result.usage;
+    el.textContent = `Assets ${formatBytes(usage.assets_bytes)} · Cache ${formatBytes(usage.cache_bytes)} of ${formatBytes(usage.cache_budget_bytes)}` +
+        ` · History ${formatBytes(usage.snapshots_bytes)} · Quarantine ${formatBytes(usage.quarantine_bytes)}`;
+}
+
+async function cleanUpStorage() {
+    const result = await window.chomka.runStorageCleanup();
+    if (result && result.success && window.notificationManager) {
+        window.notificationManager.notify("Storage",
+            "Cleaning up in the background. Unused files are kept in quarantine for 7 days.", "🧹");
+    }
+}
+
+async function openQuarantine() {
+    const result = await window.chomka.listQuarantinedAssets();
+    const files = (result && result.success) ? result.files : [];
+
+    // File names come from the data folder; they are set as text below
+    const listHtml = files.map((file, idx) => `
+        <div style="display:flex; justify-content:space-between; align-items:center; padding:8px; border-bottom:1px solid rgba(255,255,255,0.1);">
+            <div>
+                <div class="quarantine-name" data-idx="${idx}" style="font-size:0.9rem;"></div>
+                <div style="font-size:0.75rem; opacity:0.6;">${formatBytes(file.size)} · deleted ${new Date(file.purge_at * 1000).toLocaleDateString()}</div>
+            </div>
+            <button class="theme-btn quarantine-restore" data-idx="${idx}">Restore</button>
+        </div>
+    `).join('') || '<div style="opacity:0.5; text-align:center; padding:20px;">Nothing in quarantine.</div>';
+
+    window.showModal('Quarantined Files', `<div id="quarantine-list" style="max-height:400px; overflow-y:auto;">${listHtml}</div>`);
+    const list = document.getElementById('quarantine-list');
+    if (!list) return;
+    list.querySelectorAll('.quarantine-name').forEach(el => {
+        el.textContent = files[el.dataset.idx].name;
+    });
+    list.querySelectorAll('.quarantine-restore').forEach(btn => {
+        btn.onclick = () => restoreQuarantinedAsset(files[btn.dataset.idx].name);
+    });
+}
+
+async function restoreQuarantinedAsset(name) {
+    const result = await window.chomka.restoreQuarantinedAsset(name);
+    if (result && result.success) {
+        if (window.notificationManager) {
+            window.notificationManager.notify("Storage", `Restored ${result.path}`, "🗂");
+        }
+        openQuarantine();
+        showStorageUsage();
+    } else {
+        alert('Restore failed: ' + (result ? result.error : 'bridge unavailable'));
+    }
+}
+
+// --- Desktop Export / Import ---
+async function exportDesktopArchive() {
+    // Flush pending desktop changes so they are part of the archive
+    await window.desktopLoadPromise;
+    if (saveTimeout) {
+        clearTimeout(saveTimeout);
+        saveTimeout = null;
+        await window.chomka.saveState('desktop_items', desktopItems);
+    }
+    const result = await window.chomka.exportArchive();
+    if (result && !result.success && result.error !== 'Cancelled' && window.notificationManager) {
+        window.notificationManager.notify("Export", `Failed: ${result.error}`, "⚠️");
+    }
+}
+
+async function importDesktopArchive() {
+    if (!confirm("Importing replaces this desktop's settings and items with the archive's. Continue?")) return;
+    if (saveTimeout) clearTimeout(saveTimeout);
+    const result = await window.chomka.importArchive();
+    if (result && !result.success && result.error !== 'Cancelled' && window.notificationManager) {
+        window.notificationManager.notify("Import", `Failed: ${result.error}`, "⚠️");
+    }
+}
+
+window.onArchiveProgress = function (event) {
+    const label = event.operation === 'export' ? 'Export' : 'Import';
+    const el = document.getElementById('archive-progress');
+    if (!event.finished) {
+        if (el) el.textContent = `${label}: ${formatBytes(event.done)} of ${formatBytes(event.total)}`;
+        return;
+    }
+    if (el) el.textContent = '';
+    if (!event.success) {
+        if (window.notificationManager) window.notificationManager.notify(label, `Failed: ${event.error}`, "⚠️");
+        return;
+    }
+    if (event.operation === 'export') {
+        if (window.notificationManager) {
+            window.notificationManager.notify(label, `Saved ${event.result.files} files (${formatBytes(event.result.bytes)})`, "📦");
+        }
+    } else {
+        location.reload();
+    }
+};
+
+// --- Companion Devices ---
+function showCompanionInfo(info) {
+    const el = document.getElementById('companion-info');
+    if (!el || !info) return;
+    if (!info.success) {
+        el.textContent = `Companion server failed: ${info.error || 'unavailable'}`;
+        return;
+    }
+    document.getElementById('setting-companion').checked = info.running;
+    document.getElementById('setting-companion-lan').checked = info.lan;
+    el.textContent = info.running
+        ? `Connect to ${info.url} (${info.clients} connected). Keep this address private: it grants control of the desktop.`
+        : '';
+}
+
+// Commands from companion devices, applied like local edits (the save then reaches every client)
+window.applyRemoteCommand = async function (cmd) {
+    const dm = window.desktopManager;
+    if (!dm) return { success: false, error: 'desktop not ready' };
+    await window.desktopLoadPromise;
+
+    if (cmd.op === 'workspace') {
+        await switchWorkspace(cmd.id);
+        return { success: dm.workspaceId === cmd.id, error: dm.workspaceId === cmd.id ? null : 'switch failed' };
+    }
+    if (cmd.op === 'add') {
+        const item = { ...cmd.item, id: cmd.item.id || `${cmd.item.type}-${Date.now()}` };
+        if (dm.items.some(i => i.id === item.id)) return { success: false, error: 'id already exists' };
+        dm.addItem(item);
+        return { success: true, id: item.id };
+    }
+
+    const item = dm.items.find(i => i.id === cmd.id);
+    if (!item) return { success: false, error: 'no such item' };
+    if (cmd.op === 'remove') {
+        dm.removeItem(cmd.id);
+    } else if (cmd.op === 'player') {
+        const player = dm.players[cmd.id];
+        if (!player || !player.playVideo) return { success: false, error: 'player not ready' };
+        if (cmd.action === 'play') player.playVideo();
+        else if (cmd.action === 'pause') player.pauseVideo();
+        else player.seekTo(cmd.time, true);
+    } else {
+        const changes = cmd.op === 'move' ? { x: cmd.x, y: cmd.y } : cmd.changes;
+        desktopItems = dm.applyExternalChanges([{ ...item, ...changes }], [], null);
+        dm.saveState();
+    }
+    return { success: true };
+};
+
+// --- Extensions ---
+async function showExtensions() {
+    const el = document.getElementById('extension-list');
+    if (!el) return;
+    const result = await window.chomka.listExtensions();
+    const extensions = (result && result.success) ? result.extensions : [];
+    if (extensions.length === 0) {
+        el.textContent = 'No extensions installed (add them to the extensions folder in your data folder).';
+        return;
+    }
+    el.replaceChildren(...extensions.map(ext => {
+        const row = document.createElement('div');
+        row.style.marginTop = '6px';
+        const calls = ext.latency.count ? ` · ${ext.calls} calls, max ${ext.latency.max_ms} ms` : '';
+        const usage = ext.rss ? ` · ${formatBytes(ext.rss)}, ${ext.cpu_seconds} s CPU` : '';
+        const trouble = ext.crashes ? ` · ${ext.crashes} crashes (${ext.last_error})` : '';
+        row.textContent = `${ext.name}: ${ext.trusted ? ext.state : 'not trusted'}${calls}${usage}${trouble}`;
+        if (!ext.trusted) {
+            const trust = document.createElement('button');
+            trust.className = 'theme-btn';
+            trust.style.cssText = 'margin-left:8px; padding:2px 8px; font-size:0.75rem;';
+            trust.textContent = 'Trust';
+            trust.onclick = async () => {
+                if (!confirm(`Run the extension "${ext.name}"? It can read and change everything Chomka can. Only trust extensions you installed yourself.`)) return;
+                const result = await window.chomka.trustExtension(ext.name);
+                if (!result || !result.success) alert(`Could not trust ${ext.name}: ${(result && result.error) || 'unknown error'}`);
+                showExtensions();
+            };
+            row.appendChild(trust);
+        }
+        return row;
+    }));
+}
+
+// --- Memory Diagnostics ---
+// What the page holds; the backend adds these numbers to its memory reports
+window.collectMemoryStats = function () {
+    const dm = window.desktopManager;
+    const items = (dm && dm.items) || [];
+    const dataUrls = items.filter(item => typeof item.src === 'string' && item.src.startsWith('data:'));
+    const rec = window.recordingManager;
+    const heap = performance.memory;
+    let localStorageChars = 0;
+    for (let i = 0; i < localStorage.length; i++) {
+        const key = localStorage.key(i);
+        localStorageChars += key.length + (localStorage.getItem(key) || '').length;
+    }
+    return {
+        jsHeapUsed: heap ? formatBytes(heap.usedJSHeapSize) : 'unavailable',
+        jsHeapTotal: heap ? formatBytes(heap.totalJSHeapSize) : 'unavailable',
+        jsHeapLimit: heap ? formatBytes(heap.jsHeapSizeLimit) : 'unavailable',
+        domNodes: document.getElementsByTagName('*').length,
+        iframes: document.getElementsByTagName('iframe').length,
+        hibernatedWindows: window.hibernationManager ? `${window.hibernationManager.hibernatedCount()} of ${window.hibernationManager.windows.size}` : 0,
+        players: dm ? Object.keys(dm.players).length : 0,
+        desktopItems: items.length,
+        dataUrlItems: dataUrls.length,
+        dataUrlChars: dataUrls.reduce((n, item) => n + item.src.length, 0),
+        recordingChunks: rec && rec.recordedChunks ? formatBytes(rec.recordedChunks.reduce((n, c) => n + c.size, 0)) : '0 B',
+        localStorageChars,
+        activeJobs: activeJobs.size
+    };
+};
+
+async function writeMemoryReport() {
+    const result = await window.chomka.memoryReport();
+    if (window.notificationManager) {
+        let message = result && result.success ? `Written to ${result.path}` : `Failed: ${result ? result.error : 'bridge unavailable'}`;
+        if (result && result.success && result.baseline) {
+            message += '. Allocation tracing starts now: this report is the baseline, the next one shows growth.';
+        }
+        window.notificationManager.notify("Memory Report", message, "🧠");
+    }
+}
+
+// --- Background Jobs ---
+const activeJobs = new Map();
+
+window.addEventListener('chomka-job', (e) => {
+    const job = e.detail;
+    if (job.finished) activeJobs.delete(job.id);
+    else activeJobs.set(job.id, job);
+    renderJobList();
+    if (job.resumed && job.finished && job.success) finishResumedJob(job);
+});
+
+// Jobs continued from an earlier session have no caller waiting for them
+function finishResumedJob(job) {
+    const dm = window.desktopManager;
+    if (!dm) return;
+    if (job.kind === 'copy_file') {
+        dm.addItem({ id: `image-${Date.now()}`, type: 'image', src: job.result.path });
+        if (window.notificationManager) {
+            window.notificationManager.notify("Image Added", `Finished copying ${job.label} from last session`, "🖼️");
+        }
+    } else if (job.kind === 'migrate_assets' && job.result.workspace === dm.workspaceId) {
+        const changed = desktopItems.filter(item => job.result.paths[item.id]);
+        const tabCount = applyMigratedTabs(desktopItems, job.result.tabs || []);
+        if (applyMigratedPaths(changed, job.result.paths) + tabCount > 0) {
+            desktopItems = dm.applyExternalChanges(changed, [], null);
+            window.desktopItems = desktopItems;
+            saveItems();
+        }
+    }
+}
+
+function renderJobList() {
+    const el = document.getElementById('job-list');
+    if (!el) return;
+    el.replaceChildren(...Array.from(activeJobs.values()).map(job => {
+        const row = document.createElement('div');
+        row.style.cssText = 'display:flex; justify-content:space-between; align-items:center; margin-top:6px; opacity:0.8;';
+        const label = document.createElement('span');
+        const done = job.kind === 'migrate_assets' ? `${job.done} of ${job.total}` : `${formatBytes(job.done)} of ${formatBytes(job.total)}`;
+        label.textContent = `${job.label}: ${job.state === 'queued' ? 'waiting' : done}`;
+        const cancel = document.createElement('button');
+        cancel.textContent = '✕';
+        cancel.title = 'Cancel';
+        cancel.style.cssText = 'background:none; border:none; color:inherit; cursor:pointer;';
+        cancel.onclick = () => window.chomka.cancelJob(job.id);
+        row.append(label, cancel);
+        return row;
+    }));
+}
+
+// --- Desktop History (Snapshots) ---
+async function openSnapshotHistory() {
+    const result = await window.chomka.listSnapshots();
+    const snapshots = (result && result.success) ? result.snapshots : [];
+
+    const listHtml = snapshots.map(snap => `
+        <div style="display:flex; justify-content:space-between; align-items:center; padding:8px; border-bottom:1px solid rgba(255,255,255,0.1);">
+            <div>
+                <div style="font-size:0.9rem;">${new Date(snap.timestamp * 1000).toLocaleString()}</div>
+                <div style="font-size:0.75rem; opacity:0.6;">${snap.count} items</div>
+            </div>
+            <button class="theme-btn" onclick="window.restoreDesktopSnapshot('${snap.id}')">Restore</button>
+        </div>
+    `).join('') || '<div style="opacity:0.5; text-align:center; padding:20px;">No snapshots yet.</div>';
+
+    window.showModal('Desktop History', `<div style="max-height:400px; overflow-y:auto;">${listHtml}</div>`);
+}
+
+window.restoreDesktopSnapshot = async function (snapshotId) {
+    if (!confirm('Restore the desktop to this snapshot? The current layout stays in the history.')) return;
+
+    // Make sure a pending debounced save cannot overwrite the restored state
+    if (saveTimeout) clearTimeout(saveTimeout);
+
+    const result = await window.chomka.restoreSnapshot(snapshotId);
+    if (result && result.success && result.workspace !== window.desktopManager.workspaceId) {
+        // Snapshot belongs to another workspace; the backend switched to it
+        location.reload();
+    } else if (result && result.success) {
+        desktopItems = result.items;
+        mirrorDesktop();
+        window.desktopManager.loadItems(desktopItems);
+        document.getElementById('modal-overlay').classList.add('hidden');
+        if (window.notificationManager) {
+            window.notificationManager.notify("Desktop History", "Snapshot restored", "🕘");
+        }
+    } else {
+        alert('Restore failed: ' + (result ? result.error : 'bridge unavailable'));
+    }
+};
+
 // --- Theme Manager ---
 function setTheme(themeName) {
     document.body.className = ''; // Reset
@@ -45,6 +45,8 @@ const ShutdownManager = {
             this.updateStatus('Step 2: Collecting desktop items...', '📦', 30);
 
             let items = [];
+            // Never write back a desktop that is still loading page by page
+            if (window.desktopLoadPromise) await window.desktopLoadPromise;
             if (window.desktopManager) {
                 items = window.desktopManager.getItems();
                 window.chomkaSafe.log(`[Shutdown] Collected ${items.length} items`);
@@ -54,7 +56,11 @@ const ShutdownManager = {
 
             // 3. Local Cache (only if items available or to clear it)
             this.updateStatus('Step 3: Updating local cache...', '🖊️', 50);
-            localStorage.setItem('chomka_desktop', JSON.stringify(items));
+            if (window.offlineMirror && window.mirrorDesktop) {
+                window.mirrorDesktop(items);
+                // Never let a stuck IndexedDB hold up the disk write
+                await Promise.race([window.offlineMirror.flush(), new Promise(r => setTimeout(r, 1000))]);
+            }
 
             // 4. Native Disk Write
             if (window.chomka && window.chomka.saveState) {
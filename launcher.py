@@ -1,16 +1,63 @@
+import time
+_LAUNCH_TIME = time.time()  # first thing, for the startup benchmark
+
 import webview
 import os
 import sys
 
 import json
-from concurrent.futures import ThreadPoolExecutor
+import uuid
+import importlib
+from concurrent.futures import ThreadPoolExecutor, Future, TimeoutError as FutureTimeout
 import threading
+import multiprocessing
 import datetime
 import traceback
 from lifecycle import LifecycleManager
+from asset_server import AssetServer
+from native_windows import NativeWindowManager
+from snapshots import SnapshotStore
+from workspaces import WorkspaceManager, MAIN_WORKSPACE
+from sync_engine import SyncEngine, remote_from_config
+from file_watcher import FileWatcher
+from search_index import SearchIndex
+from palette import PaletteExtractor
+from icon_atlas import RuntimeAtlas, load_bundled_manifest
+from startup_bench import StartupTimer
+from storage_manager import StorageManager, DEFAULT_CACHE_BUDGET
+from hang_watchdog import Watchdog, HANG_THRESHOLD
+from jobs import JobManager
 
 CONFIG_FILE = 'config.json'
 USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+PAGE_ITEM_SIZE = (320, 240)  # assumed size of items without w/h when testing visibility
+SYNC_WAIT = 60  # seconds sync_now waits before leaving a slow sync to finish in the background
+IMPORT_BUSY = 'An import is replacing the desktop; it reloads when it is done'
+# Subsystems most sessions never use, imported on first access (Api.__getattr__):
+# attribute -> (module, build(api, module), method that stops it)
+LAZY_SUBSYSTEMS = {
+    '_notifier': ('notifier', lambda api, m: m.Notifier(api, m.pick_backend(api, api.config.get("notifications", "auto"))), 'close'),
+    '_archive': ('archive', lambda api, m: m.ArchiveManager(api), None),
+    '_memory': ('memory_profiler', lambda api, m: m.MemoryProfiler(api), 'stop'),
+    '_extensions': ('extension_host', lambda api, m: m.ExtensionHost(api), 'stop'),
+    '_companion': ('companion_server', lambda api, m: m.CompanionServer(api), 'stop'),
+    '_proxies': ('proxy_health', lambda api, m: m.ProxyHealth(api, proxies=api.config.get("yt_proxies")), 'stop'),
+    '_thumbnails': ('thumbnails', lambda api, m: m.ThumbnailCache(api), 'shutdown'),
+    '_vault': ('vault', lambda api, m: m.Vault(api), 'lock'),
+}
+
+
+def _page_rank(item, viewport):
+    """Sort key for paged loading: visible items first, topmost first, then by position."""
+    if not isinstance(item, dict):
+        return (2, 0, 0, 0)
+    x, y = item.get('x') or 0, item.get('y') or 0
+    w, h = item.get('w') or PAGE_ITEM_SIZE[0], item.get('h') or PAGE_ITEM_SIZE[1]
+    visible = bool(viewport) and (
+        x < viewport['x'] + viewport['w'] and x + w > viewport['x'] and
+        y < viewport['y'] + viewport['h'] and y + h > viewport['y'])
+    return (0 if visible else 1, -(item.get('zIndex') or 1) if visible else 0, y, x)
+
 
 class Api:
     def __init__(self, window=None, is_test_mode=False):
@@ -18,45 +65,80 @@ class Api:
         self.is_test_mode = is_test_mode
         self.config = self._load_config()
         self.is_saving_and_quitting = False
+        self._startup = None
+        self._bench_startup = False
         self._executor = ThreadPoolExecutor(max_workers=1)
         self._lifecycle = LifecycleManager(self)
+        self._watchdog = Watchdog(self, threshold=self.config.get("watchdog_threshold_ms", HANG_THRESHOLD * 1000) / 1000)
+        self._watcher = FileWatcher(self, poll_interval=self.config.get("watch_poll_interval", 2.0))
         self._log_file = os.path.join(self._get_share_dir(), "chomka.log")
+        self._asset_server = AssetServer(self)
+        self._native_windows = NativeWindowManager(
+            self,
+            pool_size=self.config.get("native_window_pool", 1),
+            max_windows=self.config.get("native_window_cap", 4)
+        )
+        self._snapshots = SnapshotStore(self)
+        self._workspaces = WorkspaceManager(self)
+        self._sync = SyncEngine(self)
+        self._search = SearchIndex(self)
+        self._palette = PaletteExtractor(self)
+        self._icon_atlas = RuntimeAtlas(self)
+        self._storage = StorageManager(self, cache_budget=self.config.get("storage_cache_budget_bytes", DEFAULT_CACHE_BUDGET))
+        self._subsystems_lock = threading.RLock()  # LAZY_SUBSYSTEMS are built under it
+        self._archive_lock = threading.Lock()
+        self._archive_busy = False
+        self._sync_future = None
+        self._sync_lock = threading.Lock()
+        # Held by everything that rewrites config.json and workspaces/: saves, sync, the import swap
+        self._state_lock = threading.RLock()
+        self._importing = False  # saves are refused until the page reloads with the imported state
+        self._item_pages = {}  # paged desktop reads in progress, by token
+        self._jobs = JobManager(self, limits=self.config.get("job_limits"))
         
         mode_str = " (TEST MODE)" if is_test_mode else ""
         self.log(f"Chomka: Session started (v1.14b){mode_str}")
 
+        if self.config.get("asset_server", False):
+            try:
+                self._asset_server.start()
+            except Exception as e:
+                self.log(f"[AssetServer] Failed to start, using file:// URLs: {e}", "ERROR")
+
+        self._executor.submit(self._snapshots.prune)
+        self._executor.submit(self._workspaces.prefetch_neighbours, self._workspaces.active)
+
     def show_notification(self, title, message):
-        """Triggers a native Windows toast notification via PowerShell."""
-        import subprocess
-        # Clean inputs for PowerShell safety
-        title_safe = title.replace("'", "''")
-        msg_safe = message.replace("'", "''")
-        
-        ps_script = f"""
-        $title = '{title_safe}'
-        $msg = '{msg_safe}'
-        [reflection.assembly]::loadwithpartialname('System.Windows.Forms') | Out-Null
-        $toast = New-Object System.Windows.Forms.NotifyIcon
-        $toast.Icon = [System.Drawing.Icon]::ExtractAssociatedIcon([System.Diagnostics.Process]::GetCurrentProcess().MainModule.FileName)
-        $toast.BalloonTipTitle = $title
-        $toast.BalloonTipText = $msg
-        $toast.Visible = $true
-        $toast.ShowBalloonTip(5000)
-        # Give it a tiny bit of time to display before cleanup (async shell call anyway)
-        Start-Sleep -Seconds 1
-        $toast.Dispose()
-        """
-        try:
-            subprocess.Popen(["powershell", "-WindowStyle", "Hidden", "-Command", ps_script], 
-                             creationflags=subprocess.CREATE_NO_WINDOW)
-            self.log(f"[Notification] Native trigger: {title}")
-        except Exception as e:
-            self.log(f"[Notification] Failed to trigger native: {e}", "ERROR")
+        """Queues a native notification; bursts are merged by the notifier."""
+        self._notifier.notify(title, message)
+        return {'success': True, 'queued': True}
 
     @property
     def lifecycle(self):
         return self._lifecycle
 
+    def __getattr__(self, name):
+        # Only reached for attributes not set yet: the subsystems in LAZY_SUBSYSTEMS,
+        # imported and built on first use. Being absent from dir() until then also
+        # keeps js_api and watchdog introspection from building them.
+        if name not in LAZY_SUBSYSTEMS:
+            raise AttributeError(f"'Api' object has no attribute '{name}'")
+        module, build, _ = LAZY_SUBSYSTEMS[name]
+        with self._subsystems_lock:
+            if name not in self.__dict__:
+                self.__dict__[name] = build(self, importlib.import_module(module))
+        return self.__dict__[name]
+
+    def _loaded(self, name):
+        """The subsystem if something already used it, else None (never builds it)."""
+        return self.__dict__.get(name)
+
+    def _stop_subsystems(self):
+        for name, (_, _, stop) in LAZY_SUBSYSTEMS.items():
+            subsystem = self._loaded(name)
+            if subsystem is not None and stop:
+                getattr(subsystem, stop)()
+
     def _load_config(self):
         try:
             if os.path.exists(CONFIG_FILE):
@@ -91,6 +173,10 @@ class Api:
         except:
             pass
 
+    def _get_app_dir(self):
+        """Directory holding index.html and the bundled assets."""
+        return sys._MEIPASS if getattr(sys, 'frozen', False) else os.getcwd()
+
     def _get_share_dir(self):
         """Helper to get the absolute path to the data directory."""
         share_dir = self.config.get("data_dir", "shared_data")
@@ -108,6 +194,20 @@ class Api:
             new_path = result[0]
             self.config["data_dir"] = new_path
             self._save_config()
+            self._workspaces.reset()
+            self._search.reset()
+            self._palette.reset()
+            self._icon_atlas.reset()
+            self._storage.reset()
+            for name, method in (('_thumbnails', 'reset'), ('_vault', 'lock'), ('_extensions', 'reload')):
+                subsystem = self._loaded(name)
+                if subsystem is not None:
+                    getattr(subsystem, method)()
+            companion = self._loaded('_companion')
+            if companion is not None and companion.is_running:
+                companion.reset(self._workspaces.active, self._watcher.read_items(self._workspaces.active))
+            if self.config.get("file_watcher", True):
+                self._watcher.restart()
             return {'success': True, 'path': new_path}
         
         return {'success': False, 'error': 'No folder selected'}
@@ -123,42 +223,15 @@ class Api:
         return {'success': True, 'queued': True}
 
     def save_asset(self, base64_data, original_id):
-        """Saves a base64 asset via the executor to maintain serial order."""
-        future = self._executor.submit(self._save_asset_internal, base64_data, original_id)
-        try:
-            return future.result(timeout=30) # Assets can be large
-        except Exception as e:
-            return {'success': False, 'error': str(e)}
-
-    def _save_asset_internal(self, base64_data, original_id):
-        """Worker method for saving assets."""
+        """Saves a base64 asset and waits for it. The page runs the save_asset job itself."""
         try:
-            import base64
-            import uuid
-            
-            # Extract file extension from data URI
-            ext = "bin"
-            if "," in base64_data:
-                header, base64_data = base64_data.split(",", 1)
-                if "/" in header and ";" in header:
-                    ext = header.split("/")[1].split(";")[0]
-
-            share_dir = self._get_share_dir()
-            assets_dir = os.path.join(share_dir, "assets")
-            if not os.path.exists(assets_dir):
-                os.makedirs(assets_dir)
-
-            filename = f"{original_id}_{uuid.uuid4().hex}.{ext}"
-            filepath = os.path.join(assets_dir, filename)
-            
-            with open(filepath, "wb") as f:
-                f.write(base64.b64decode(base64_data))
-            
-            self.log(f"Asset saved: {filename}")
-            return {'success': True, 'path': f"assets/{filename}"}
+            job = self._jobs.start('save_asset', {'data': base64_data, 'id': original_id})
+            if not job.wait(timeout=30): # Assets can be large
+                return {'success': False, 'error': 'Asset save timed out', 'job': job.id}
+            if job.state != 'done':
+                return {'success': False, 'error': job.error or job.state}
+            return {'success': True, 'path': job.result['path']}
         except Exception as e:
-            err_details = traceback.format_exc()
-            self.log(f"Asset save error: {e}\n{err_details}", "ERROR")
             return {'success': False, 'error': str(e)}
 
     def pick_and_save_image(self):
@@ -172,21 +245,9 @@ class Api:
         if result and len(result) > 0:
             src_path = result[0]
             try:
-                import shutil
-                import uuid
-                
-                ext = os.path.splitext(src_path)[1]
-                share_dir = self._get_share_dir()
-                assets_dir = os.path.join(share_dir, "assets")
-                if not os.path.exists(assets_dir):
-                    os.makedirs(assets_dir)
-                
-                new_filename = f"user_{uuid.uuid4().hex}{ext}"
-                dest_path = os.path.join(assets_dir, new_filename)
-                
-                shutil.copy2(src_path, dest_path)
-                self.log(f"Image picked and saved: {new_filename}")
-                return {'success': True, 'path': f"assets/{new_filename}"}
+                # Large files copy in the background; the page waits for the job
+                job = self._jobs.start('copy_file', {'src': src_path, 'prefix': 'user', 'label': os.path.basename(src_path)})
+                return {'success': True, 'job': job.id}
             except Exception as e:
                 self.log(f"Image pick/save error: {e}", "ERROR")
                 return {'success': False, 'error': str(e)}
@@ -194,10 +255,404 @@ class Api:
         return {'success': False, 'error': 'Cancelled'}
 
     def get_data_url(self):
-        """Returns the absolute file:// URL to the data directory."""
+        """Returns the base URL of the data directory (asset server or file://)."""
+        if self._asset_server.is_running:
+            return self._asset_server.base_url
         path = self._get_share_dir()
         return f"file:///{path.replace('\\', '/')}/"
 
+    def set_asset_server_enabled(self, enabled):
+        """Turns the loopback asset server on or off and remembers the choice."""
+        try:
+            if enabled:
+                self._asset_server.start()
+            else:
+                self._asset_server.stop()
+            self.config["asset_server"] = bool(enabled)
+            self._save_config()
+            return {'success': True, 'url': self.get_data_url()}
+        except Exception as e:
+            self.log(f"[AssetServer] Toggle failed: {e}", "ERROR")
+            return {'success': False, 'error': str(e)}
+
+    def set_companion_enabled(self, enabled, lan=None):
+        """Turns the companion WebSocket server on or off and remembers the choice."""
+        try:
+            if lan is not None and bool(lan) != self.config.get("companion_lan", False):
+                self.config["companion_lan"] = bool(lan)
+                self._companion.stop()
+            if enabled:
+                from companion_server import DEFAULT_PORT
+                self._companion.start(lan=self.config.get("companion_lan", False),
+                                      port=self.config.get("companion_port", DEFAULT_PORT))
+            else:
+                self._companion.stop()
+            self.config["companion"] = bool(enabled)
+            self._save_config()
+            return self.get_companion_info()
+        except Exception as e:
+            self.log(f"[Companion] Toggle failed: {e}", "ERROR")
+            return {'success': False, 'error': str(e)}
+
+    def get_companion_info(self):
+        """Whether the companion server runs, its URL (token included) and client count."""
+        return {'success': True, 'running': self._companion.is_running, 'url': self._companion.url,
+                'lan': self.config.get("companion_lan", False), 'clients': self._companion.client_count()}
+
+    def companion_player(self, item_id, state, position=None):
+        """Forwards a player state change to companion clients."""
+        companion = self._loaded('_companion')
+        if companion is not None:
+            companion.publish_player(item_id, state, position)
+        return {'success': True}
+
+    def get_best_proxy(self, exclude=None):
+        """Healthiest YouTube embed mirror, skipping the ones in exclude."""
+        try:
+            best = self._proxies.best(exclude or [])
+            if not best:
+                return {'success': False, 'error': 'No mirrors configured'}
+            return {'success': True, 'proxy': best['url'], 'ranking': self._proxies.ranking()}
+        except Exception as e:
+            self.log(f"[Proxies] Selection failed: {e}", "ERROR")
+            return {'success': False, 'error': str(e)}
+
+    def report_proxy_failure(self, url):
+        """Counts a mirror the page could not play through against its score."""
+        self._proxies.report_failure(url)
+        return {'success': True}
+
+    def set_sync_remote(self, target):
+        """Remembers the sync remote: a directory path or an http(s) URL."""
+        self.config["sync_remote"] = target or None
+        self._save_config()
+        return {'success': True}
+
+    def sync_now(self):
+        """Syncs the data directory with the configured remote."""
+        target = self.config.get("sync_remote")
+        if not target:
+            return {'success': False, 'error': 'No sync remote configured'}
+        with self._sync_lock:
+            if self._sync_future and not self._sync_future.done():
+                return {'success': False, 'error': 'A sync is already running', 'running': True}
+            self._sync_future = future = Future()
+
+        waited_out = threading.Event()
+
+        def run():
+            try:
+                # Let queued saves land first so the sync sees the latest state
+                self._executor.submit(lambda: None).result(timeout=30)
+                # Sync rewrites config.json and workspaces/ too; saves wait until it is done
+                with self._state_lock:
+                    result = {'success': True, 'stats': self._run_sync(target)}
+                future.set_result(result['stats'])
+            except Exception as e:
+                self.log(f"[Sync] Failed: {e}", "ERROR")
+                result = {'success': False, 'error': str(e)}
+                future.set_exception(e)
+            if waited_out.is_set() and self._window:
+                # The page stopped waiting; tell it how the sync ended
+                try:
+                    self._window.evaluate_js(f"window.onSyncFinished && window.onSyncFinished({json.dumps(result)})")
+                except Exception as e:
+                    self.log(f"[Sync] Could not push the result: {e}", "WARNING")
+        # Own thread: a slow remote must not hold up the save executor or the bridge
+        threading.Thread(target=run, name='chomka-sync', daemon=True).start()
+        try:
+            return {'success': True, 'stats': future.result(timeout=SYNC_WAIT)}
+        except FutureTimeout:
+            waited_out.set()
+            return {'success': False, 'error': 'Sync is still running; the result will follow', 'running': True}
+        except Exception as e:
+            return {'success': False, 'error': str(e)}
+
+    def _run_sync(self, target):
+        stats = self._sync.sync(remote_from_config(target))
+        self._workspaces.reset()
+        self._search.reset()
+        self.log(f"[Sync] Pushed {len(stats['pushed'])}, pulled {len(stats['pulled'])}, "
+                 f"conflicts {len(stats['conflicts'])} ({stats['bytes_sent']} B up, {stats['bytes_received']} B down)")
+        stats['changed'] = bool(stats['pulled'] or stats['deleted_local'])
+        return stats
+
+    def set_wallpaper(self, path):
+        """Sets the wallpaper (a path inside the data dir) or clears it with None."""
+        result = self.save_state('wallpaper', path or None)
+        if not result.get('success'):
+            return result
+        return self.get_wallpaper()
+
+    def get_wallpaper(self):
+        """Returns the wallpaper and its accent CSS variables.
+
+        Known wallpapers answer from the palette cache right away. New ones are
+        extracted on the palette worker and pushed to window.applyWallpaperPalette.
+        """
+        try:
+            path = self.get_state('wallpaper').get('value')
+            if not path:
+                return {'success': True, 'path': None, 'css': None}
+            full_path = os.path.join(self._get_share_dir(), path)
+            if not os.path.exists(full_path):
+                return {'success': False, 'error': f'Wallpaper not found: {path}'}
+            css = self._palette.cached(full_path)
+            if css is None:
+                self._palette.extract(full_path, lambda css: self._push_wallpaper_palette(path, css))
+            return {'success': True, 'path': path, 'css': css, 'pending': css is None}
+        except Exception as e:
+            self.log(f"[Palette] Wallpaper lookup failed: {e}", "ERROR")
+            return {'success': False, 'error': str(e)}
+
+    def _push_wallpaper_palette(self, path, css):
+        if css is None or not self._window:
+            return
+        try:
+            self._window.evaluate_js(
+                f"window.applyWallpaperPalette && window.applyWallpaperPalette({json.dumps(path)}, {json.dumps(css)})")
+        except Exception as e:
+            self.log(f"[Palette] Could not push palette: {e}", "WARNING")
+
+    def get_icon_atlas(self):
+        """Returns the bundled and the runtime (user icon) atlas manifests."""
+        try:
+            user = dict(self._icon_atlas.manifest(), base="cache/atlas/")
+            return {'success': True, 'bundled': load_bundled_manifest(self._get_app_dir()), 'user': user}
+        except Exception as e:
+            self.log(f"[IconAtlas] Could not load atlas: {e}", "ERROR")
+            return {'success': False, 'error': str(e)}
+
+    def get_thumbnail(self, url, size=160):
+        """Path (relative to the data folder) of a small preview of an image, made on first use."""
+        try:
+            return {'success': True, 'path': self._thumbnails.get(url, size)}
+        except Exception as e:
+            return {'success': False, 'error': str(e)}
+
+    def vault_status(self):
+        """Whether the Passkeeper vault exists and is unlocked, and if plaintext credentials are waiting to move in."""
+        return {'success': True, **self._vault.status()}
+
+    def vault_unlock(self, password):
+        """Derives the vault key (creating the vault on first use) and keeps it until vault_lock."""
+        try:
+            return {'success': True, **self._vault.unlock(password)}
+        except Exception as e:
+            self.log(f"[Vault] Unlock failed: {e}", "WARNING")
+            return {'success': False, 'error': str(e)}
+
+    def vault_lock(self):
+        self._vault.lock()
+        return {'success': True}
+
+    def vault_search(self, query="", limit=200):
+        """Logins (without passwords) whose service or username contain every word of query."""
+        try:
+            return {'success': True, **self._vault.search(query, limit)}
+        except Exception as e:
+            return {'success': False, 'error': str(e)}
+
+    def vault_add(self, service, username, password):
+        try:
+            return {'success': True, 'entry': self._vault.add(service, username, password)}
+        except Exception as e:
+            return {'success': False, 'error': str(e)}
+
+    def vault_delete(self, entry_id):
+        try:
+            return {'success': self._vault.delete(entry_id)}
+        except Exception as e:
+            return {'success': False, 'error': str(e)}
+
+    def vault_get_password(self, entry_id):
+        try:
+            return {'success': True, 'password': self._vault.password(entry_id)}
+        except Exception as e:
+            return {'success': False, 'error': str(e)}
+
+    def add_icons_to_atlas(self, urls):
+        """Queues user icons for the runtime atlas; the page hears back via onIconAtlasUpdated."""
+        def push(manifest):
+            if not self._window:
+                return
+            try:
+                payload = json.dumps(dict(manifest, base="cache/atlas/"))
+                self._window.evaluate_js(f"window.onIconAtlasUpdated && window.onIconAtlasUpdated({payload})")
+            except Exception as e:
+                self.log(f"[IconAtlas] Could not push atlas: {e}", "WARNING")
+        self._icon_atlas.add(list(urls or []), push)
+        return {'success': True, 'queued': True}
+
+    def get_storage_report(self):
+        """Disk usage of the data directory and the result of the last cleanup."""
+        try:
+            return {'success': True, 'usage': self._storage.usage(), 'last_run': self._storage.last_report}
+        except Exception as e:
+            return {'success': False, 'error': str(e)}
+
+    def run_storage_cleanup(self):
+        """Wakes the storage worker for a cleanup pass now instead of on its timer."""
+        self._storage.start()
+        self._storage.request_run()
+        return {'success': True, 'queued': True}
+
+    def export_archive(self, dest=None):
+        """Writes state and referenced assets to one archive in the background."""
+        if not dest:
+            if not self._window:
+                return {'success': False, 'error': 'Window not ready'}
+            name = f"chomka-{datetime.datetime.now().strftime('%Y%m%d')}.tar"
+            result = self._window.create_file_dialog(webview.SAVE_DIALOG, save_filename=name)
+            if not result:
+                return {'success': False, 'error': 'Cancelled'}
+            dest = result if isinstance(result, str) else result[0]
+        return self._run_archive('export', self._archive.export, dest)
+
+    def import_archive(self, src=None):
+        """Restores an archive into the data dir in the background; the page reloads when done."""
+        if not src:
+            if not self._window:
+                return {'success': False, 'error': 'Window not ready'}
+            file_types = ('Chomka Archive (*.tar)', 'All files (*.*)')
+            result = self._window.create_file_dialog(webview.OPEN_DIALOG, allow_multiple=False, file_types=file_types)
+            if not result:
+                return {'success': False, 'error': 'Cancelled'}
+            src = result[0]
+        return self._run_archive('import', self._import_archive_sync, src)
+
+    def _import_archive_sync(self, src):
+        self._importing = True
+        try:
+            stats = self._archive.import_(src)
+        except Exception:
+            self._importing = False
+            raise
+        self._workspaces.reset()
+        self._search.reset()
+        self._palette.reset()
+        self._icon_atlas.reset()
+        vault = self._loaded('_vault')
+        if vault is not None:
+            vault.lock()
+        self._storage.reset()
+        return stats
+
+    def _run_archive(self, operation, fn, path):
+        with self._archive_lock:
+            if self._archive_busy:
+                return {'success': False, 'error': 'Another export or import is running'}
+            self._archive_busy = True
+
+        def run():
+            try:
+                # Let queued saves land first so the archive sees the latest state
+                self._executor.submit(lambda: None).result(timeout=30)
+                result = fn(path)
+                self._push_archive_progress({'operation': operation, 'finished': True, 'success': True, 'result': result})
+            except Exception as e:
+                self.log(f"[Archive] {operation} of {path} failed: {e}", "ERROR")
+                self._push_archive_progress({'operation': operation, 'finished': True, 'success': False, 'error': str(e)})
+            finally:
+                self._archive_busy = False
+        threading.Thread(target=run, name=f'chomka-archive-{operation}', daemon=True).start()
+        return {'success': True, 'queued': True, 'path': path}
+
+    def _push_archive_progress(self, event):
+        if not self._window:
+            return
+        try:
+            self._window.evaluate_js(f"window.onArchiveProgress && window.onArchiveProgress({json.dumps(event)})")
+        except Exception as e:
+            self.log(f"[Archive] Could not push progress: {e}", "WARNING")
+
+    def start_job(self, kind, args=None):
+        """Queues a background job; progress and the result arrive via onJobProgress."""
+        try:
+            job = self._jobs.start(kind, args)
+            return {'success': True, 'id': job.id}
+        except Exception as e:
+            self.log(f"[Jobs] Could not start {kind}: {e}", "ERROR")
+            return {'success': False, 'error': str(e)}
+
+    def cancel_job(self, job_id):
+        return {'success': self._jobs.cancel(job_id)}
+
+    def list_jobs(self):
+        return {'success': True, 'jobs': self._jobs.list()}
+
+    def resume_jobs(self):
+        """Called by the page once it listens for job events."""
+        try:
+            return {'success': True, 'resumed': self._jobs.resume()}
+        except Exception as e:
+            self.log(f"[Jobs] Resume failed: {e}", "ERROR")
+            return {'success': False, 'error': str(e)}
+
+    def list_extensions(self):
+        """Installed backend extensions with their state, latency and resource use."""
+        try:
+            self._extensions.discover()
+            return {'success': True, 'extensions': self._extensions.stats()}
+        except Exception as e:
+            return {'success': False, 'error': str(e)}
+
+    def call_extension(self, name, method, params=None):
+        """Runs method of an extension in its worker process, within the extension's deadline."""
+        try:
+            return {'success': True, 'result': self._extensions.call(name, method, params)}
+        except Exception as e:
+            return {'success': False, 'error': str(e)}
+
+    def trust_extension(self, name):
+        """Lets an extension run as its files are now; any later change needs a new approval."""
+        try:
+            return {'success': True, 'fingerprint': self._extensions.trust(name)}
+        except Exception as e:
+            return {'success': False, 'error': str(e)}
+
+    def reload_extensions(self):
+        try:
+            return {'success': True, 'extensions': self._extensions.reload()}
+        except Exception as e:
+            self.log(f"[Extensions] Reload failed: {e}", "ERROR")
+            return {'success': False, 'error': str(e)}
+
+    def memory_report(self, page=None):
+        """Writes a memory report to diagnostics/; page holds the page's own numbers."""
+        try:
+            if page is None:
+                page = self._memory.collect_page()
+            return dict(self._memory.write_report("on demand", page), success=True)
+        except Exception as e:
+            self.log(f"[Memory] Report failed: {e}", "ERROR")
+            return {'success': False, 'error': str(e)}
+
+    def list_quarantined_assets(self):
+        try:
+            return {'success': True, 'files': self._storage.list_quarantined()}
+        except Exception as e:
+            self.log(f"[Storage] Listing quarantine failed: {e}", "ERROR")
+            return {'success': False, 'error': str(e)}
+
+    def restore_quarantined_asset(self, name):
+        try:
+            return {'success': True, 'path': self._storage.restore_quarantined(name)}
+        except Exception as e:
+            self.log(f"[Storage] Restore failed for {name}: {e}", "ERROR")
+            return {'success': False, 'error': str(e)}
+
+    def mark_startup(self, phase):
+        """Called from JS when a startup phase is reached (e.g. pywebviewready)."""
+        if not self._startup:
+            return {'success': False}
+        self._startup.mark(phase)
+        if phase == 'pywebviewready':
+            self.log(f"[Startup] {self._startup.summary()}")
+            if self._bench_startup:
+                self._startup.write_result()
+                threading.Timer(0.5, self.quit).start()
+        return {'success': True}
 
     def log_js_error(self, message, stack=""):
         """Called from JS to log client-side errors."""
@@ -206,9 +661,11 @@ class Api:
 
     def _write_atomic(self, filepath, content, is_binary=False):
         """Writes a file atomically by using a temporary file."""
-        temp_path = filepath + ".tmp"
+        # A unique name per write: two writers never share (or replace) each other's temp file
+        directory, name = os.path.split(filepath)
+        temp_path = os.path.join(directory, f".{name}.{uuid.uuid4().hex[:12]}.tmp")
         try:
-            mode = 'wb' if is_binary else 'w'
+            mode = 'xb' if is_binary else 'x'
             encoding = None if is_binary else 'utf-8'
             with open(temp_path, mode, encoding=encoding) as f:
                 f.write(content)
@@ -218,6 +675,7 @@ class Api:
                 os.replace(temp_path, filepath)
             else:
                 os.rename(temp_path, filepath)
+            self._watcher.note_write(filepath)
         except Exception as e:
             self.log(f"Atomic write error for {filepath}: {e}", "ERROR")
             if os.path.exists(temp_path):
@@ -227,6 +685,8 @@ class Api:
 
     def _save_file_internal(self, filename, content, notify_js=True):
         """Internal synchronous save method run in the executor thread."""
+        if self._importing:
+            return {'success': False, 'error': IMPORT_BUSY}
         try:
             share_dir = self._get_share_dir()
             filepath = os.path.join(share_dir, filename)
@@ -236,7 +696,8 @@ class Api:
             if not os.path.exists(parent_dir):
                 os.makedirs(parent_dir)
             
-            self._write_atomic(filepath, content)
+            with self._state_lock:
+                self._write_atomic(filepath, content)
             
             content_snippet = (content[:50] + '...') if len(content) > 50 else content
             self.log(f"File saved: {filename} (size: {len(content)} bytes, snippet: {content_snippet})")
@@ -328,6 +789,7 @@ class Api:
             
             with open(coords_path, 'w', encoding='utf-8') as f:
                 f.write('\n'.join(lines))
+            self._watcher.note_write(coords_path)
         except Exception as e:
             print(f"Error saving coords.txt: {e}")
 
@@ -335,6 +797,17 @@ class Api:
         """Reads a bit of app state."""
         if key == 'is_test_mode':
             return {'success': True, 'value': self.is_test_mode}
+        if key == 'asset_server':
+            return {'success': True, 'value': self._asset_server.is_running}
+        if key == 'sync_remote':
+            return {'success': True, 'value': self.config.get("sync_remote")}
+        if key == 'desktop_items' and self._workspaces.active != MAIN_WORKSPACE:
+            try:
+                items = self._workspaces.load_items(self._workspaces.active)
+                self._watcher.remember_items(self._workspaces.active, items)
+                return {'success': True, 'value': items}
+            except Exception as e:
+                return {'success': False, 'error': str(e)}
         try:
             share_dir = self._get_share_dir()
             config_path = os.path.join(share_dir, "config.json")
@@ -346,15 +819,77 @@ class Api:
                     # SPECIAL HANDLING: if requesting desktop_items, merge screenlayout.txt
                     if key == 'desktop_items' and isinstance(val, list):
                         val = self._merge_coords(val)
+                        self._watcher.remember_items(MAIN_WORKSPACE, val)
                         
                     return {'success': True, 'value': val}
             return {'success': True, 'value': None}
         except Exception as e:
             return {'success': False, 'error': str(e)}
 
+    def get_items_page(self, cursor=None, limit=200, viewport=None):
+        """Reads the active desktop in pages, items on screen first.
+
+        The first call (no cursor) loads and orders the items: those inside
+        viewport {x, y, w, h} first, topmost first, then the rest by position.
+        Each page carries the items' indexes in the saved array so the page
+        can restore the original order once everything has arrived.
+        """
+        try:
+            if cursor is None:
+                state = self.get_state('desktop_items')
+                if not state.get('success'):
+                    return state
+                items = state['value'] if isinstance(state['value'], list) else []
+                order = sorted(range(len(items)), key=lambda i: _page_rank(items[i], viewport))
+                token = uuid.uuid4().hex[:12]
+                # Only the latest read of each workspace is kept
+                self._item_pages = {t: p for t, p in self._item_pages.items()
+                                     if p['workspace'] != self._workspaces.active}
+                self._item_pages[token] = {'workspace': self._workspaces.active, 'items': items, 'order': order}
+                offset = 0
+                exists = state['value'] is not None
+            else:
+                token, offset = cursor.rsplit(':', 1)
+                offset = int(offset)
+                exists = True
+                if token not in self._item_pages:
+                    return {'success': False, 'error': 'Cursor expired'}
+
+            page = self._item_pages[token]
+            indexes = page['order'][offset:offset + limit]
+            next_offset = offset + len(indexes)
+            done = next_offset >= len(page['order'])
+            if done:
+                self._item_pages.pop(token, None)
+            return {
+                'success': True,
+                'exists': exists,
+                'workspace': page['workspace'],
+                'total': len(page['items']),
+                'items': [page['items'][i] for i in indexes],
+                'indexes': indexes,
+                'cursor': None if done else f"{token}:{next_offset}",
+            }
+        except Exception as e:
+            self.log(f"[Items] Paged read failed: {e}", "ERROR")
+            return {'success': False, 'error': str(e)}
+
     def save_state(self, key, value):
         """Saves a bits of app state to config.json atomically."""
+        if self._importing:
+            return {'success': False, 'error': IMPORT_BUSY}
+        with self._state_lock:
+            return self._save_state(key, value)
+
+    def _save_state(self, key, value):
         try:
+            # Non-main workspaces keep their items in workspaces/<id>.json
+            if key == 'desktop_items' and self._workspaces.active != MAIN_WORKSPACE:
+                self._workspaces.save_items(self._workspaces.active, value)
+                self._after_items_saved(value)
+                self.log(f"State saved: {key} (workspace {self._workspaces.active})")
+                return {'success': True}
+
             share_dir = self._get_share_dir()
             config_path = os.path.join(share_dir, "config.json")
             
@@ -371,6 +906,7 @@ class Api:
             # SPECIAL HANDLING: Sync coords to screenlayout.txt
             if key == 'desktop_items':
                 self._save_coords_file(value)
+                self._after_items_saved(value)
                 
             self.log(f"State saved: {key}")
             return {'success': True}
@@ -378,6 +914,113 @@ class Api:
             self.log(f"State save error: {e}", "ERROR")
             return {'success': False, 'error': str(e)}
 
+    def _after_items_saved(self, items):
+        """Background bookkeeping after desktop_items hit the disk."""
+        workspace = self._workspaces.active
+        self._watcher.remember_items(workspace, items)
+        companion = self._loaded('_companion')
+        if companion is not None:
+            companion.publish_items(workspace, items)
+        def record_snapshot():
+            try:
+                self._snapshots.record(items, workspace)
+            except Exception as e:
+                self.log(f"[Snapshots] Record failed: {e}", "ERROR")
+        def update_search():
+            try:
+                self._search.sync_items(workspace, items)
+            except Exception as e:
+                self.log(f"[Search] Index update failed: {e}", "ERROR")
+        try:
+            self._executor.submit(record_snapshot)
+            self._executor.submit(update_search)
+        except RuntimeError:
+            pass # Executor already shut down during quit
+
+    def search(self, query, limit=20):
+        """Finds desktop items (all workspaces) matching a typed query."""
+        try:
+            return {'success': True, 'results': self._search.search(query, int(limit))}
+        except Exception as e:
+            self.log(f"[Search] Query failed: {e}", "ERROR")
+            return {'success': False, 'error': str(e)}
+
+    def list_snapshots(self):
+        """Lists recorded desktop snapshots, newest first."""
+        try:
+            return {'success': True, 'snapshots': self._snapshots.list()}
+        except Exception as e:
+            self.log(f"[Snapshots] List failed: {e}", "ERROR")
+            return {'success': False, 'error': str(e)}
+
+    def restore_snapshot(self, snapshot_id):
+        """Restores desktop_items from a snapshot and returns the restored items."""
+        try:
+            workspace, items = self._snapshots.load(snapshot_id)
+            if workspace != self._workspaces.active and self._workspaces.exists(workspace):
+                self._workspaces.set_active(workspace)
+            result = self.save_state('desktop_items', items)
+            if not result.get('success'):
+                return result
+            self.log(f"[Snapshots] Restored {snapshot_id} ({len(items)} items)")
+            return {'success': True, 'items': items, 'workspace': workspace}
+        except Exception as e:
+            self.log(f"[Snapshots] Restore failed for {snapshot_id}: {e}", "ERROR")
+            return {'success': False, 'error': str(e)}
+
+    def list_workspaces(self):
+        """Lists virtual workspaces and the active one."""
+        try:
+            index = self._workspaces.index()
+            return {'success': True, 'active': index['active'], 'workspaces': index['workspaces']}
+        except Exception as e:
+            return {'success': False, 'error': str(e)}
+
+    def create_workspace(self, name=None):
+        """Creates an empty workspace (does not switch to it)."""
+        try:
+            workspace_id = self._workspaces.create(name)
+            self.log(f"[Workspaces] Created {workspace_id}")
+            return {'success': True, 'id': workspace_id}
+        except Exception as e:
+            self.log(f"[Workspaces] Create failed: {e}", "ERROR")
+            return {'success': False, 'error': str(e)}
+
+    def rename_workspace(self, workspace_id, name):
+        """Renames a workspace."""
+        try:
+            return {'success': self._workspaces.rename(workspace_id, name)}
+        except Exception as e:
+            return {'success': False, 'error': str(e)}
+
+    def delete_workspace(self, workspace_id):
+        """Deletes a non-main workspace and its items."""
+        try:
+            self._workspaces.delete(workspace_id)
+            self._search.drop_workspace(workspace_id)
+            self.log(f"[Workspaces] Deleted {workspace_id}")
+            return {'success': True, 'active': self._workspaces.active}
+        except Exception as e:
+            self.log(f"[Workspaces] Delete failed: {e}", "ERROR")
+            return {'success': False, 'error': str(e)}
+
+    def switch_workspace(self, workspace_id):
+        """Makes a workspace active and returns its items."""
+        try:
+            self._workspaces.set_active(workspace_id)
+            result = self.get_state('desktop_items')
+            if not result.get('success'):
+                return result
+            self._executor.submit(self._workspaces.prefetch_neighbours, workspace_id)
+            companion = self._loaded('_companion')
+            if companion is not None:
+                companion.reset(workspace_id, result.get('value') or [])
+            self.log(f"[Workspaces] Switched to {workspace_id}")
+            return {'success': True, 'id': workspace_id, 'items': result.get('value') or []}
+        except Exception as e:
+            self.log(f"[Workspaces] Switch failed: {e}", "ERROR")
+            return {'success': False, 'error': str(e)}
+
     def send_feedback(self, message):
         """Opens the default mail client with feedback."""
         try:
@@ -417,8 +1060,7 @@ class Api:
             if 'youtube.com' in url.lower() or 'youtu.be' in url.lower():
                 self.save_state('last_yt_url', url)
                 
-            webview.create_window('Chomka WebOS External', url)
-            return {'success': True}
+            return self._native_windows.open(url)
         except Exception as e:
             self.log(f"Error opening native window: {e}", "ERROR")
             return {'success': False, 'error': str(e)}
@@ -432,12 +1074,28 @@ class Api:
         self.is_saving_and_quitting = True
         try: self._executor.shutdown(wait=False)
         except: pass
+        self._asset_server.stop()
+        self._watcher.stop()
+        self._palette.shutdown()
+        self._icon_atlas.shutdown()
+        self._storage.stop()
+        self._watchdog.stop()
+        self._jobs.shutdown()
+        self._stop_subsystems()
         self._lifecycle.shut_down_immediately()
 
     def quit_finally(self):
         self.is_saving_and_quitting = True
         try: self._executor.shutdown(wait=False)
         except: pass
+        self._asset_server.stop()
+        self._watcher.stop()
+        self._palette.shutdown()
+        self._icon_atlas.shutdown()
+        self._storage.stop()
+        self._watchdog.stop()
+        self._jobs.shutdown()
+        self._stop_subsystems()
         self._lifecycle.shut_down_immediately()
 
     def confirm_quit(self):
@@ -446,12 +1104,57 @@ class Api:
 
     def hook_closing(self, window):
         window.events.closing += self._lifecycle.on_closing
+        window.events.closed += self._lifecycle.on_closed
+
+    def hook_loaded(self, window):
+        def end_import():
+            # The page reloaded with the imported state; its saves are current again
+            self._importing = False
+        window.events.loaded += end_import
+
+        # Pre-warm external windows only once the main page is up
+        def prewarm_async():
+            threading.Thread(target=self._native_windows.prewarm, daemon=True).start()
+        window.events.loaded += prewarm_async
+
+        def start_watcher():
+            if self.config.get("file_watcher", True) and not self._watcher.is_running:
+                self._watcher.start()
+        window.events.loaded += start_watcher
+
+        def start_storage():
+            if self.config.get("storage_gc", True):
+                self._storage.start()
+        window.events.loaded += start_storage
+
+        def start_watchdog():
+            if self.config.get("watchdog", True):
+                self._watchdog.start()
+        window.events.loaded += start_watchdog
+
+        def start_companion():
+            if self.config.get("companion", False) and not self._companion.is_running:
+                try:
+                    from companion_server import DEFAULT_PORT
+                    self._companion.start(lan=self.config.get("companion_lan", False),
+                                          port=self.config.get("companion_port", DEFAULT_PORT))
+                except Exception as e:
+                    self.log(f"[Companion] Failed to start: {e}", "ERROR")
+        window.events.loaded += start_companion
 
 def main():
+    startup = StartupTimer(_LAUNCH_TIME)
+    startup.mark('main')
+
     import argparse
     parser = argparse.ArgumentParser(description="Chomka WebOS Launcher")
     parser.add_argument('--test', '--debug', action='store_true', help="Run in test mode with DevTools enabled")
+    parser.add_argument('--bench-startup', action='store_true', help="Record startup timings and quit once the page is ready")
+    parser.add_argument('--profile-memory', action='store_true', help="Trace Python allocations and write memory reports to diagnostics/ every 10 minutes")
     args, unknown = parser.parse_known_args()
+    if args.profile_memory:
+        from memory_profiler import start_tracing
+        start_tracing()
     
     is_test = args.test
 
@@ -467,6 +1170,11 @@ def main():
         file_url = f"file://{html_path}"
         
         api = Api(is_test_mode=is_test)
+        api._startup = startup
+        api._bench_startup = args.bench_startup
+        api._watchdog.instrument(api)
+        if args.profile_memory:
+            api._memory.start_periodic()
         
         window = webview.create_window(
             'Chomka WebOS' + (" [TEST MODE]" if is_test else ""), 
@@ -477,9 +1185,11 @@ def main():
             resizable=True,
             min_size=(800, 600)
         )
+        startup.mark('window')
         
         api._window = window 
         api.hook_closing(window)
+        api.hook_loaded(window)
         
         # Start webview
         api.log(f"Chomka: Starting webview (debug={is_test})")
@@ -497,4 +1207,6 @@ def main():
         sys.exit(1)
 
 if __name__ == '__main__':
+    # Extension workers are spawned processes; frozen builds re-enter here
+    multiprocessing.freeze_support()
     main()
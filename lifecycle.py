@@ -37,6 +37,8 @@ class LifecycleManager:
                     time.sleep(60)
                     if not self.is_terminal:
                         self.api.log("[Lifecycle] Safety Exit Timer reached (60s). Force terminating...", "WARNING")
+                        self.api._watchdog.dump_report("shutdown did not finish within 60 s")
+                        self.api._watchdog.stop()
                         self.shut_down_immediately()
                 
                 import threading
@@ -54,12 +56,19 @@ class LifecycleManager:
             
         elif result is False:
             self.api.log("[Lifecycle] User chose QUIT WITHOUT SAVE")
+            # The hidden pool window would otherwise keep webview running headless
+            self.api._native_windows.close_all()
             return True # Close immediately
             
         else:
             self.api.log("[Lifecycle] User cancelled")
             return False # Cancel closing
 
+    def on_closed(self):
+        """The main window is gone: close native browser windows so the process can end."""
+        self.api.log("[Lifecycle] Main window closed, closing native windows")
+        self.api._native_windows.close_all()
+
     def shut_down_immediately(self):
         """Force the window to destroy and hard-exit the process."""
         self.api.log("[Lifecycle] shut_down_immediately called")
@@ -0,0 +1,263 @@
+import os
+import io
+import gc
+import sys
+import time
+import datetime
+import threading
+import linecache
+import tracemalloc
+import collections
+
+TRACE_FRAMES = 25
+# Tracing started by an on-demand report stays on for the session, so keep it cheap
+ON_DEMAND_FRAMES = 1
+TOP_SITES = 25
+TOP_DIFFS = 20
+TOP_TRACEBACKS = 5
+TOP_TYPES = 15
+PROFILE_INTERVAL = 600  # seconds between reports with --profile-memory
+MAX_REPORTS = 20
+# Allocations made by the profiler and the import machinery are noise
+_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, linecache.__file__),
+    tracemalloc.Filter(False, __file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+PAGE_STATS_JS = "window.collectMemoryStats ? window.collectMemoryStats() : null"
+
+
+def start_tracing(frames=TRACE_FRAMES):
+    """Starts tracemalloc; call as early as possible so startup allocations are attributed."""
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(frames)
+
+
+def _mb(size):
+    return f"{size / (1024 * 1024):.1f} MB"
+
+
+def _size(size):
+    return _mb(size) if size >= 1024 * 1024 else f"{size / 1024:.1f} KB"
+
+
+def _kb(size):
+    return f"{size / 1024:+.1f} KB"
+
+
+def _psutil():
+    """psutil if installed; the platform fallbacks below cover the basics."""
+    try:
+        import psutil
+        return psutil
+    except ImportError:
+        return None
+
+
+def process_memory():
+    """(rss, peak rss) of this process in bytes; None where unknown."""
+    psutil = _psutil()
+    if psutil:
+        info = psutil.Process().memory_info()
+        return info.rss, getattr(info, 'peak_wset', None)
+    if sys.platform == 'win32':
+        import ctypes
+        from ctypes import wintypes
+
+        class Counters(ctypes.Structure):
+            _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD),
+                        ('PeakWorkingSetSize', ctypes.c_size_t), ('WorkingSetSize', ctypes.c_size_t),
+                        ('QuotaPeakPagedPoolUsage', ctypes.c_size_t), ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                        ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t), ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                        ('PagefileUsage', ctypes.c_size_t), ('PeakPagefileUsage', ctypes.c_size_t)]
+        counters = Counters()
+        counters.cb = ctypes.sizeof(Counters)
+        handle = ctypes.windll.kernel32.GetCurrentProcess()
+        if ctypes.windll.psapi.GetProcessMemoryInfo(handle, ctypes.byref(counters), counters.cb):
+            return counters.WorkingSetSize, counters.PeakWorkingSetSize
+        return None, None
+    try:
+        values = {}
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in ("VmRSS", "VmHWM"):
+                    values[key] = int(value.split()[0]) * 1024
+        return values.get("VmRSS"), values.get("VmHWM")
+    except OSError:
+        return None, None
+
+
+class MemoryProfiler:
+    """Memory reports for the backend and the page, written to diagnostics/.
+
+    Each report has the process size, the top Python allocation sites
+    (tracemalloc), growth since the previous report and since tracing began,
+    object counts by type, backend queue sizes and what the page reports
+    about itself (JS heap, DOM nodes, players, data URLs, recording chunks).
+    Tracing starts with --profile-memory, or one frame deep with the first
+    on-demand report, which then only sets the baseline for the next one.
+    """
+
+    def __init__(self, api):
+        self.api = api
+        self._lock = threading.Lock()
+        self._baseline = None
+        self._previous = None  # (time, snapshot) of the last report
+        self._traced_since = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    def _dir(self):
+        return os.path.join(self.api._get_share_dir(), "diagnostics")
+
+    @property
+    def is_tracing(self):
+        return tracemalloc.is_tracing()
+
+    def start(self, frames=TRACE_FRAMES):
+        start_tracing(frames)
+        with self._lock:
+            if self._baseline is None:
+                self._traced_since = time.time()
+                self._baseline = self._snapshot()
+
+    def start_periodic(self, interval=PROFILE_INTERVAL):
+        self.start()
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(interval,), name='chomka-memory', daemon=True)
+        self._thread.start()
+        self.api.log(f"[Memory] Profiling on, a report every {interval} s")
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self, interval):
+        while not self._stop.wait(interval):
+            try:
+                self.write_report("periodic", self.collect_page())
+            except Exception as e:
+                self.api.log(f"[Memory] Periodic report failed: {e}", "ERROR")
+
+    @staticmethod
+    def _snapshot():
+        return tracemalloc.take_snapshot().filter_traces(_FILTERS)
+
+    # --- Collection ---
+
+    def collect_page(self):
+        """Asks the page for its own numbers; None if it does not answer."""
+        if not self.api._window:
+            return None
+        try:
+            return self.api._window.evaluate_js(PAGE_STATS_JS)
+        except Exception as e:
+            self.api.log(f"[Memory] Page stats unavailable: {e}", "WARNING")
+            return None
+
+    def _backend_stats(self):
+        api = self.api
+        stats = collections.OrderedDict()
+        queue = getattr(api._executor, '_work_queue', None)
+        stats['executor tasks pending'] = queue.qsize() if queue is not None else None
+        jobs = api._jobs.list()
+        stats['jobs active / kept'] = f"{sum(1 for j in jobs if not j['finished'])} / {len(jobs)}"
+        stats['paged reads open'] = f"{len(api._item_pages)} ({sum(len(p['items']) for p in api._item_pages.values())} items)"
+        stats['threads'] = threading.active_count()
+        stats['gc counts'] = gc.get_count()
+        try:
+            stats['log file'] = _mb(os.path.getsize(api._log_file))
+        except OSError:
+            pass
+        return stats
+
+    @staticmethod
+    def _object_counts():
+        counts = collections.Counter(type(obj).__name__ for obj in gc.get_objects())
+        return counts.most_common(TOP_TYPES)
+
+    # --- Reports ---
+
+    def write_report(self, reason, page=None):
+        """Writes a report; returns {'path', 'summary', 'baseline'}."""
+        baseline = not self.is_tracing
+        self.start(ON_DEMAND_FRAMES if baseline else TRACE_FRAMES)
+        now = time.time()
+        stamp = datetime.datetime.fromtimestamp(now).strftime("%Y%m%d-%H%M%S-%f")[:-3]
+        with self._lock:
+            snapshot = self._snapshot()
+            previous = self._previous
+            self._previous = (now, snapshot)
+        current, peak = tracemalloc.get_traced_memory()
+        rss, peak_rss = process_memory()
+
+        out = io.StringIO()
+        out.write(f"Chomka memory report {stamp}\nReason: {reason}\n\n")
+        out.write("Process:\n")
+        out.write(f"  rss: {_mb(rss) if rss else 'unknown'}, peak: {_mb(peak_rss) if peak_rss else 'unknown'}\n")
+        since = datetime.datetime.fromtimestamp(self._traced_since).strftime("%Y-%m-%d %H:%M:%S")
+        out.write(f"  python heap (traced since {since}): {_mb(current)}, peak {_mb(peak)}\n")
+        if baseline:
+            out.write("\nTracing started with this report, so it only sets the baseline: "
+                      "allocation sites and growth show up in the next one.\n")
+
+        out.write(f"\nTop {TOP_SITES} allocation sites:\n")
+        for stat in snapshot.statistics('lineno')[:TOP_SITES]:
+            frame = stat.traceback[0]
+            out.write(f"  {_size(stat.size):>10} {stat.count:>8} blocks  {frame.filename}:{frame.lineno}\n")
+
+        out.write(f"\nLargest allocations by call stack (top {TOP_TRACEBACKS}):\n")
+        for stat in snapshot.statistics('traceback')[:TOP_TRACEBACKS]:
+            out.write(f"  {_size(stat.size)} in {stat.count} blocks\n")
+            for line in stat.traceback.format(limit=6):
+                out.write(f"    {line}\n")
+
+        if previous:
+            out.write(f"\nGrowth since the previous report ({now - previous[0]:.0f} s ago):\n")
+            self._write_diff(out, snapshot, previous[1])
+        out.write("\nGrowth since tracing started:\n")
+        self._write_diff(out, snapshot, self._baseline)
+
+        out.write(f"\nObjects by type (top {TOP_TYPES}):\n")
+        for name, count in self._object_counts():
+            out.write(f"  {count:>9}  {name}\n")
+
+        out.write("\nBackend:\n")
+        for key, value in self._backend_stats().items():
+            out.write(f"  {key}: {value}\n")
+
+        out.write("\nPage:\n")
+        if page:
+            for key, value in page.items():
+                out.write(f"  {key}: {value}\n")
+        else:
+            out.write("  no answer from the page\n")
+
+        os.makedirs(self._dir(), exist_ok=True)
+        path = os.path.join(self._dir(), f"memory-{stamp}.txt")
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(out.getvalue())
+        self._prune_reports()
+        summary = {'rss': rss, 'python_heap': current, 'python_peak': peak, 'page': page}
+        self.api.log(f"[Memory] Report written to {path} (rss {_mb(rss) if rss else 'unknown'}, "
+                     f"python heap {_mb(current)})")
+        return {'path': path, 'summary': summary, 'baseline': baseline}
+
+    @staticmethod
+    def _write_diff(out, snapshot, older):
+        diffs = [d for d in snapshot.compare_to(older, 'lineno') if d.size_diff][:TOP_DIFFS]
+        if not diffs:
+            out.write("  none\n")
+        for diff in diffs:
+            frame = diff.traceback[0]
+            out.write(f"  {_kb(diff.size_diff):>12} {diff.count_diff:>+8} blocks  {frame.filename}:{frame.lineno}\n")
+
+    def _prune_reports(self):
+        reports = sorted(n for n in os.listdir(self._dir()) if n.startswith("memory-"))
+        for name in reports[:-MAX_REPORTS]:
+            os.remove(os.path.join(self._dir(), name))
@@ -0,0 +1,141 @@
+import time
+import threading
+import urllib.parse
+from collections import OrderedDict
+
+import webview
+
+WINDOW_TITLE = 'Chomka WebOS External'
+BLANK_URL = 'about:blank'
+
+
+class NativeWindowManager:
+    """Keeps external webview windows warm and reuses them per origin."""
+
+    def __init__(self, api, pool_size=1, max_windows=4):
+        self.api = api
+        self.pool_size = pool_size
+        self.max_windows = max_windows
+        self._pool = []
+        self._open = OrderedDict()  # origin -> window, least recently used first
+        self._pending = {}  # id(window) -> (url, t0, mode)
+        self._lock = threading.RLock()
+        self._closed = False  # set on quit so a late pre-warm cannot outlive the main window
+        self._prewarming = False  # one pre-warm at a time, so overlapping calls cannot overfill the pool
+
+    @staticmethod
+    def origin_of(url):
+        parts = urllib.parse.urlsplit(url)
+        return f"{parts.scheme}://{parts.netloc}".lower()
+
+    def prewarm(self):
+        """Fills the pool with hidden windows. Must run after webview.start()."""
+        with self._lock:
+            if self._closed or self._prewarming:
+                return
+            self._prewarming = True
+        try:
+            while True:
+                # Windows are created outside the lock: create_window waits for the GUI thread
+                with self._lock:
+                    if self._closed or len(self._pool) >= self.pool_size:
+                        # Cleared with the check, so a window taken meanwhile is refilled by the next call
+                        self._prewarming = False
+                        return
+                window = webview.create_window(WINDOW_TITLE, BLANK_URL, hidden=True)
+                self._attach_events(window)
+                with self._lock:
+                    closed = self._closed
+                    if not closed:
+                        self._pool.append(window)
+                if closed:
+                    self._close(window)
+        except Exception as e:
+            with self._lock:
+                self._prewarming = False
+            self.api.log(f"[NativeWindows] Pre-warm failed: {e}", "WARNING")
+
+    def open(self, url):
+        t0 = time.perf_counter()
+        origin = self.origin_of(url)
+
+        with self._lock:
+            window = self._open.get(origin)
+            if window is not None:
+                self._open.move_to_end(origin)
+                mode = 'reused'
+            elif self._pool:
+                window = self._pool.pop()
+                self._open[origin] = window
+                mode = 'pooled'
+            else:
+                window = None
+                mode = 'cold'
+            evicted = self._evict_over_cap(keep=origin)
+
+        for old in evicted:
+            self._close(old)
+
+        if window is None:
+            window = webview.create_window(WINDOW_TITLE, url)
+            self._pending[id(window)] = (url, t0, mode)
+            self._attach_events(window)
+            with self._lock:
+                self._open[origin] = window
+                evicted = self._evict_over_cap(keep=origin)
+            for old in evicted:
+                self._close(old)
+        else:
+            self._pending[id(window)] = (url, t0, mode)
+            window.load_url(url)
+            window.show()
+            window.restore()
+
+        # Refill the pool off the bridge thread so the next click is warm too
+        if mode == 'pooled':
+            threading.Thread(target=self.prewarm, daemon=True).start()
+        return {'success': True, 'mode': mode}
+
+    def close_all(self):
+        with self._lock:
+            self._closed = True
+            windows = list(self._open.values()) + self._pool
+            self._open.clear()
+            self._pool = []
+        for window in windows:
+            self._close(window)
+
+    def _evict_over_cap(self, keep):
+        evicted = []
+        while len(self._open) > self.max_windows:
+            origin = next(iter(self._open))
+            if origin == keep:
+                break
+            evicted.append(self._open.pop(origin))
+        return evicted
+
+    def _close(self, window):
+        try:
+            window.destroy()
+        except Exception as e:
+            self.api.log(f"[NativeWindows] Close failed: {e}", "WARNING")
+
+    def _attach_events(self, window):
+        window.events.loaded += lambda *args: self._on_loaded(window)
+        window.events.closed += lambda *args: self._on_closed(window)
+
+    def _on_loaded(self, window):
+        pending = self._pending.pop(id(window), None)
+        if pending:
+            url, t0, mode = pending
+            elapsed_ms = (time.perf_counter() - t0) * 1000
+            self.api.log(f"[NativeWindows] Visible in {elapsed_ms:.0f} ms ({mode}): {url}")
+
+    def _on_closed(self, window):
+        self._pending.pop(id(window), None)
+        with self._lock:
+            for origin, open_window in list(self._open.items()):
+                if open_window is window:
+                    del self._open[origin]
+            if window in self._pool:
+                self._pool.remove(window)
@@ -0,0 +1,196 @@
+import sys
+import time
+import base64
+import shutil
+import threading
+import subprocess
+
+COALESCE_WINDOW = 1.0  # seconds to wait for more notifications before showing
+MIN_INTERVAL = 4.0  # at most one native toast per this many seconds
+SUMMARY_TITLES = 3
+
+# One NotifyIcon for the whole session; arguments arrive base64 encoded so no
+# title or message can break out of the quoting.
+_PS_SETUP = (
+    "[void][Reflection.Assembly]::LoadWithPartialName('System.Windows.Forms'); "
+    "$chomkaIcon = New-Object System.Windows.Forms.NotifyIcon; "
+    "$chomkaIcon.Icon = [System.Drawing.Icon]::ExtractAssociatedIcon({exe}); "
+    "$chomkaIcon.Visible = $true; "
+    "function Show-Chomka($t, $m) {{ "
+    "$chomkaIcon.BalloonTipTitle = [Text.Encoding]::UTF8.GetString([Convert]::FromBase64String($t)); "
+    "$chomkaIcon.BalloonTipText = [Text.Encoding]::UTF8.GetString([Convert]::FromBase64String($m)); "
+    "$chomkaIcon.ShowBalloonTip(5000) }}\n"
+)
+
+
+def _b64(text):
+    return base64.b64encode(text.encode('utf-8')).decode('ascii')
+
+
+class PowerShellBackend:
+    """Windows balloon toasts from one long-lived PowerShell fed over stdin."""
+    name = "windows"
+
+    def __init__(self, api):
+        self.api = api
+        self._proc = None
+
+    @staticmethod
+    def available():
+        return sys.platform == 'win32' and shutil.which("powershell") is not None
+
+    def _ensure_process(self):
+        if self._proc and self._proc.poll() is None:
+            return
+        exe = "'" + sys.executable.replace("'", "''") + "'"
+        self._proc = subprocess.Popen(
+            ["powershell", "-NoProfile", "-NoLogo", "-WindowStyle", "Hidden", "-Command", "-"],
+            stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            creationflags=getattr(subprocess, 'CREATE_NO_WINDOW', 0))
+        self._send(_PS_SETUP.format(exe=exe))
+
+    def _send(self, line):
+        self._proc.stdin.write(line.encode('utf-8'))
+        self._proc.stdin.flush()
+
+    def show(self, title, message):
+        self._ensure_process()
+        self._send(f"Show-Chomka '{_b64(title)}' '{_b64(message)}'\n")
+
+    def close(self):
+        if self._proc and self._proc.poll() is None:
+            try:
+                self._send("$chomkaIcon.Dispose(); exit\n")
+                self._proc.stdin.close()
+                self._proc.wait(timeout=2)
+            except (OSError, subprocess.TimeoutExpired):
+                self._proc.kill()
+        self._proc = None
+
+
+class NotifySendBackend:
+    """Linux desktop notifications. notify-send is short-lived by design, so
+    coalescing is what keeps bursts from forking many processes."""
+    name = "linux"
+
+    def __init__(self, api):
+        self.api = api
+
+    @staticmethod
+    def available():
+        return sys.platform.startswith('linux') and shutil.which("notify-send") is not None
+
+    def show(self, title, message):
+        subprocess.Popen(["notify-send", "--app-name=Chomka", title, message],
+                         stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    def close(self):
+        pass
+
+
+class LogBackend:
+    """Writes notifications to the log only; used headless and in tests."""
+    name = "log"
+
+    def __init__(self, api):
+        self.api = api
+        self.shown = []
+
+    @staticmethod
+    def available():
+        return True
+
+    def show(self, title, message):
+        self.shown.append((title, message))
+        self.api.log(f"[Notification] {title}: {message}")
+
+    def close(self):
+        pass
+
+
+BACKENDS = {b.name: b for b in (PowerShellBackend, NotifySendBackend, LogBackend)}
+
+
+def pick_backend(api, preference="auto"):
+    if preference in BACKENDS and BACKENDS[preference].available():
+        return BACKENDS[preference](api)
+    for backend in (PowerShellBackend, NotifySendBackend):
+        if backend.available():
+            return backend(api)
+    return LogBackend(api)
+
+
+class Notifier:
+    """Queues native notifications and shows them from one worker thread.
+
+    Notifications arriving within COALESCE_WINDOW of each other, or while the
+    rate limit holds the next toast back, are merged into one summary toast.
+    """
+
+    def __init__(self, api, backend, coalesce_window=COALESCE_WINDOW, min_interval=MIN_INTERVAL):
+        self.api = api
+        self.backend = backend
+        self.coalesce_window = coalesce_window
+        self.min_interval = min_interval
+        self._pending = []
+        self._cond = threading.Condition()
+        self._last_shown = 0.0
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name='chomka-notifier', daemon=True)
+        self._thread.start()
+
+    def notify(self, title, message):
+        with self._cond:
+            if self._closed:
+                return
+            self._pending.append((str(title), str(message)))
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                # Let a burst finish, and respect the rate limit
+                deadline = max(time.time() + self.coalesce_window, self._last_shown + self.min_interval)
+                while not self._closed and time.time() < deadline:
+                    self._cond.wait(deadline - time.time())
+                batch, self._pending = self._pending, []
+            if batch:
+                self._show(*self.coalesce(batch))
+
+    @staticmethod
+    def coalesce(batch):
+        # Exact repeats collapse; different notifications become a summary
+        unique = list(dict.fromkeys(batch))
+        if len(unique) == 1:
+            title, message = unique[0]
+            return (title, message) if len(batch) == 1 else (title, f"{message} (x{len(batch)})")
+        titles = list(dict.fromkeys(title for title, _ in unique))
+        more = len(titles) - SUMMARY_TITLES
+        listed = ", ".join(titles[:SUMMARY_TITLES]) + (f" and {more} more" if more > 0 else "")
+        return f"{len(batch)} notifications", listed
+
+    def _show(self, title, message):
+        self._last_shown = time.time()
+        try:
+            self.backend.show(title, message)
+        except Exception as e:
+            self.api.log(f"[Notification] {self.backend.name} backend failed, logging instead: {e}", "ERROR")
+            try:
+                self.backend.close()
+            except Exception:
+                pass
+            self.backend = LogBackend(self.api)
+            self.backend.show(title, message)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        try:
+            self.backend.close()
+        except Exception as e:
+            self.api.log(f"[Notification] Backend close failed: {e}", "WARNING")
@@ -0,0 +1,187 @@
+import os
+import json
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+SAMPLE_SIZE = 128
+PALETTE_SIZE = 5
+KMEANS_ITERATIONS = 12
+
+
+def _hex(rgb):
+    return '#%02x%02x%02x' % tuple(int(c) for c in rgb)
+
+
+def _saturation_and_lightness(rgb):
+    r, g, b = (c / 255.0 for c in rgb)
+    high, low = max(r, g, b), min(r, g, b)
+    lightness = (high + low) / 2
+    if high == low:
+        return 0.0, lightness
+    delta = high - low
+    return delta / (1 - abs(2 * lightness - 1)), lightness
+
+
+def _numpy():
+    """NumPy if installed; median cut through Pillow still works without it."""
+    try:
+        import numpy
+        return numpy
+    except ImportError:
+        return None
+
+
+def load_sample(path):
+    """Decodes a small version of the image; JPEGs are scaled while decoding."""
+    from PIL import Image
+    with Image.open(path) as img:
+        img.draft('RGB', (SAMPLE_SIZE * 2, SAMPLE_SIZE * 2))
+        img = img.convert('RGB')
+        img.thumbnail((SAMPLE_SIZE, SAMPLE_SIZE), Image.Resampling.BILINEAR)
+        return img.copy()
+
+
+def kmeans_palette(img, k=PALETTE_SIZE, iterations=KMEANS_ITERATIONS):
+    """Vectorized k-means over the sampled pixels. Returns [(rgb, weight)]."""
+    np = _numpy()
+    pixels = np.asarray(img, dtype=np.float32).reshape(-1, 3)
+    # Deterministic start: centres spread along the brightness order
+    order = np.argsort(pixels.sum(axis=1))
+    centres = pixels[order[np.linspace(0, len(order) - 1, k).astype(int)]].copy()
+    for _ in range(iterations):
+        distances = ((pixels[:, None, :] - centres[None, :, :]) ** 2).sum(axis=2)
+        labels = distances.argmin(axis=1)
+        counts = np.bincount(labels, minlength=k)
+        sums = np.zeros_like(centres)
+        np.add.at(sums, labels, pixels)
+        moved = np.where(counts[:, None] > 0, sums / np.maximum(counts, 1)[:, None], centres)
+        if np.allclose(moved, centres, atol=0.5):
+            centres = moved
+            break
+        centres = moved
+    counts = np.bincount(labels, minlength=k)
+    total = counts.sum()
+    return [(tuple(int(round(c)) for c in centres[i]), counts[i] / total) for i in range(k) if counts[i]]
+
+
+def median_cut_palette(img, k=PALETTE_SIZE):
+    from PIL import Image
+    quantized = img.quantize(colors=k, method=Image.Quantize.MEDIANCUT)
+    palette = quantized.getpalette()
+    total = img.width * img.height
+    return [(tuple(palette[idx * 3:idx * 3 + 3]), count / total) for count, idx in quantized.getcolors()]
+
+
+def palette_to_css(colors):
+    """Turns weighted colors into the CSS variables the themes use."""
+    colors = sorted(colors, key=lambda c: -c[1])
+    dominant = colors[0][0]
+
+    def accent_score(entry):
+        saturation, lightness = _saturation_and_lightness(entry[0])
+        # Vivid, mid-lightness colors make readable accents
+        return saturation * (1 - abs(lightness - 0.55) * 1.5) * (0.3 + entry[1])
+
+    accent = max(colors, key=accent_score)[0]
+    css = {
+        '--accent-color': _hex(accent),
+        '--accent-glow': 'rgba(%d, %d, %d, 0.5)' % accent,
+        '--wallpaper-dominant': _hex(dominant),
+    }
+    for i, (rgb, weight) in enumerate(colors):
+        css[f'--wallpaper-palette-{i}'] = _hex(rgb)
+    return css
+
+
+class PaletteExtractor:
+    """Extracts wallpaper palettes off the UI and bridge threads.
+
+    Results are cached by image content hash in cache/palettes.json, so a
+    wallpaper seen before gets its colors without decoding it again.
+    """
+
+    def __init__(self, api):
+        self.api = api
+        self._worker = ThreadPoolExecutor(max_workers=1, thread_name_prefix='chomka-palette')
+        self._lock = threading.Lock()
+        self._cache = None
+        self._hashes = {}  # path -> ((size, mtime_ns), digest)
+
+    def _cache_path(self):
+        return os.path.join(self.api._get_share_dir(), "cache", "palettes.json")
+
+    def _load_cache(self):
+        if self._cache is None:
+            self._cache = {}
+            path = self._cache_path()
+            if os.path.exists(path):
+                try:
+                    with open(path, 'r', encoding='utf-8') as f:
+                        self._cache = json.load(f)
+                except Exception as e:
+                    self.api.log(f"[Palette] Cache unreadable, starting fresh: {e}", "WARNING")
+        return self._cache
+
+    def reset(self):
+        with self._lock:
+            self._cache = None
+            self._hashes.clear()
+
+    def content_hash(self, path):
+        st = os.stat(path)
+        key = (st.st_size, st.st_mtime_ns)
+        cached = self._hashes.get(path)
+        if cached and cached[0] == key:
+            return cached[1]
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        self._hashes[path] = (key, digest.hexdigest())
+        return self._hashes[path][1]
+
+    def cached(self, path):
+        """CSS variables for path if it was extracted before, else None."""
+        try:
+            digest = self.content_hash(path)
+        except OSError:
+            return None
+        with self._lock:
+            entry = self._load_cache().get(digest)
+        return entry['css'] if entry else None
+
+    def extract(self, path, callback=None):
+        """Queues extraction; callback(css or None) runs on the palette worker."""
+        def job():
+            css = None
+            try:
+                css = self._extract_sync(path)
+            except Exception as e:
+                self.api.log(f"[Palette] Extraction failed for {path}: {e}", "ERROR")
+            if callback:
+                callback(css)
+            return css
+        return self._worker.submit(job)
+
+    def _extract_sync(self, path):
+        digest = self.content_hash(path)
+        with self._lock:
+            entry = self._load_cache().get(digest)
+        if entry:
+            return entry['css']
+
+        img = load_sample(path)
+        use_kmeans = _numpy() is not None
+        colors = kmeans_palette(img) if use_kmeans else median_cut_palette(img)
+        css = palette_to_css(colors)
+        with self._lock:
+            cache = self._load_cache()
+            cache[digest] = {'colors': [[list(rgb), round(float(w), 4)] for rgb, w in colors], 'css': css}
+            os.makedirs(os.path.dirname(self._cache_path()), exist_ok=True)
+            self.api._write_atomic(self._cache_path(), json.dumps(cache))
+        self.api.log(f"[Palette] Extracted {os.path.basename(path)} ({'k-means' if use_kmeans else 'median cut'})")
+        return css
+
+    def shutdown(self):
+        self._worker.shutdown(wait=False)
@@ -0,0 +1,233 @@
+import sys
+import ssl
+import time
+import random
+import asyncio
+import threading
+import urllib.parse
+
+DEFAULT_PROXIES = [
+    'https://piped.video/embed',
+    'https://yewtu.be/embed',
+    'https://vid.puffyan.us/embed',
+    'https://invidious.projectsegfau.lt/embed',
+    'https://invidious.tiekoetter.com/embed',
+]
+PROBE_VIDEO = 'jNQXAC9IVRw'  # a short, long-lived video every mirror can embed
+PROBE_TIMEOUT = 4.0  # seconds for connect + status line
+CACHE_TTL = 300  # a ranking younger than this is used as is
+REPROBE_INTERVAL = 600
+ALPHA = 0.3  # EWMA weight of the newest sample
+FAILURE_WEIGHT = 4.0  # a mirror failing half of the time ranks like one three times slower
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+
+
+async def probe(url, timeout=PROBE_TIMEOUT, video=PROBE_VIDEO):
+    """(status, seconds to the status line) of one embed request; raises on failure."""
+    parts = urllib.parse.urlsplit(url)
+    secure = parts.scheme == 'https'
+    port = parts.port or (443 if secure else 80)
+    path = f"{parts.path.rstrip('/')}/{video}"
+    started = time.monotonic()
+
+    async def request():
+        reader, writer = await asyncio.open_connection(
+            parts.hostname, port, ssl=ssl.create_default_context() if secure else None)
+        try:
+            writer.write((f"GET {path} HTTP/1.1\r\nHost: {parts.netloc}\r\nUser-Agent: {USER_AGENT}\r\n"
+                          "Accept: text/html\r\nConnection: close\r\n\r\n").encode())
+            await writer.drain()
+            line = await reader.readline()
+        finally:
+            writer.close()
+        fields = line.decode('latin-1').split()
+        if len(fields) < 2 or not fields[1].isdigit():
+            raise ConnectionError(f"bad response {line[:40]!r}")
+        return int(fields[1])
+
+    status = await asyncio.wait_for(request(), timeout)
+    return status, time.monotonic() - started
+
+
+class ProxyHealth:
+    """Health-scored ranking of the YouTube embed mirrors used by repairYT.
+
+    All mirrors are probed concurrently with a deadline; each keeps an EWMA
+    of its latency and of its failure rate (probe errors, non-2xx/3xx
+    answers and failures the page reports). The ranking is cached for
+    CACHE_TTL and refreshed in the background every REPROBE_INTERVAL once
+    the page has asked for a mirror, so no mirror is contacted until repair
+    is actually used.
+    """
+
+    def __init__(self, api, proxies=None, timeout=PROBE_TIMEOUT, ttl=CACHE_TTL, interval=REPROBE_INTERVAL):
+        self.api = api
+        self.timeout = timeout
+        self.ttl = ttl
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._probe_lock = threading.Lock()
+        self._stats = {}
+        self._probed_at = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self.set_proxies(proxies or DEFAULT_PROXIES)
+
+    def set_proxies(self, proxies):
+        """Replaces the mirror list, keeping what is known about mirrors that stay."""
+        with self._lock:
+            self._stats = {url: self._stats.get(url) or {
+                'latency': None, 'failure': 0.0, 'consecutive': 0, 'probed': None, 'status': None, 'error': None}
+                for url in proxies}
+            self._probed_at = None
+
+    # --- Scores ---
+
+    def record(self, url, ok, latency=None, status=None, error=None):
+        with self._lock:
+            stats = self._stats.get(url)
+            if stats is None:
+                return
+            if ok:
+                stats['latency'] = latency if stats['latency'] is None else ALPHA * latency + (1 - ALPHA) * stats['latency']
+                stats['consecutive'] = 0
+            else:
+                stats['consecutive'] += 1
+            stats['failure'] = ALPHA * (0.0 if ok else 1.0) + (1 - ALPHA) * stats['failure']
+            stats['probed'] = time.time()
+            stats['status'] = status
+            stats['error'] = error
+
+    def report_failure(self, url, reason="reported by the page"):
+        """The page could not play through this mirror."""
+        self.record(url, False, error=reason)
+        self.api.log(f"[Proxies] {url} failed: {reason}", "WARNING")
+
+    def _score(self, stats):
+        if stats['probed'] is None:
+            return self.timeout * 2  # unknown: after every mirror that answered
+        latency = stats['latency'] if stats['latency'] is not None else self.timeout
+        penalty = self.timeout * min(stats['consecutive'], 3)  # currently down: behind the ones that answer
+        return latency * (1 + FAILURE_WEIGHT * stats['failure']) + penalty
+
+    def ranking(self):
+        """Mirrors best first, with the numbers behind their place."""
+        with self._lock:
+            rows = [dict(stats, url=url, score=round(self._score(stats), 4)) for url, stats in self._stats.items()]
+        rows.sort(key=lambda row: row['score'])
+        return rows
+
+    # --- Probing ---
+
+    async def _probe_all(self, urls):
+        async def one(url):
+            try:
+                status, latency = await probe(url, self.timeout)
+                if status < 400:
+                    self.record(url, True, latency, status)
+                else:
+                    self.record(url, False, status=status, error=f"HTTP {status}")
+            except Exception as e:
+                self.record(url, False, error=str(e) or type(e).__name__)
+        await asyncio.gather(*(one(url) for url in urls))
+
+    def probe_all(self):
+        """Probes every mirror concurrently; returns the new ranking."""
+        with self._probe_lock:
+            with self._lock:
+                urls = list(self._stats)
+            started = time.monotonic()
+            asyncio.run(self._probe_all(urls))
+            self._probed_at = time.time()
+        ranking = self.ranking()
+        healthy = sum(1 for row in ranking if not row['consecutive'])
+        self.api.log(f"[Proxies] Probed {len(urls)} mirrors in {time.monotonic() - started:.2f} s, "
+                     f"{healthy} healthy, best {ranking[0]['url'] if ranking else None}")
+        return ranking
+
+    def best(self, exclude=()):
+        """The best mirror not in exclude (all of them once every one was tried)."""
+        if self._probed_at is None:
+            self.probe_all()
+        elif time.time() - self._probed_at > self.ttl:
+            self._wake.set()
+        self.start()
+        ranking = self.ranking()
+        exclude = set(exclude or ())
+        candidates = [row for row in ranking if row['url'] not in exclude] or ranking
+        return candidates[0] if candidates else None
+
+    # --- Background loop ---
+
+    def start(self):
+        if self._thread:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='chomka-proxies', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.interval)
+            if self._stop.is_set():
+                break
+            self._wake.clear()
+            try:
+                self.probe_all()
+            except Exception as e:
+                self.api.log(f"[Proxies] Probe failed: {e}", "ERROR")
+
+
+# --- Stand-in mirror for tests ---
+
+def serve_stand_in(port, delay=0.0, failure_rate=0.0, status=200):
+    """Local HTTP server answering like a mirror, with injected delay and failures."""
+    from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            time.sleep(delay)
+            if random.random() < failure_rate:
+                self.send_error(503)
+                return
+            body = b"<html>embed</html>"
+            self.send_response(status)
+            self.send_header('Content-Type', 'text/html')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    httpd = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+    httpd.daemon_threads = True
+    return httpd
+
+
+if __name__ == '__main__':
+    # python proxy_health.py serve <port> [delay_s] [failure_rate]  - stand-in mirror
+    # python proxy_health.py probe <url> [<url> ...]                - probe and rank mirrors
+    if len(sys.argv) >= 3 and sys.argv[1] == 'serve':
+        httpd = serve_stand_in(int(sys.argv[2]),
+                               delay=float(sys.argv[3]) if len(sys.argv) > 3 else 0.0,
+                               failure_rate=float(sys.argv[4]) if len(sys.argv) > 4 else 0.0)
+        print(f"Stand-in mirror at http://127.0.0.1:{sys.argv[2]}/embed")
+        httpd.serve_forever()
+    elif len(sys.argv) >= 3 and sys.argv[1] == 'probe':
+        class _ConsoleApi:
+            def log(self, message, level="INFO"):
+                print(f"[{level}] {message}")
+        health = ProxyHealth(_ConsoleApi(), proxies=sys.argv[2:])
+        for row in health.probe_all():
+            latency = f"{row['latency'] * 1000:.0f} ms" if row['latency'] is not None else "-"
+            print(f"{row['score']:>8}  {latency:>8}  {row['error'] or row['status']}  {row['url']}")
+    else:
+        print("Usage: python proxy_health.py serve <port> [delay_s] [failure_rate]\n"
+              "       python proxy_health.py probe <url> [<url> ...]")
@@ -0,0 +1,348 @@
+import os
+import re
+import json
+import heapq
+import bisect
+import hashlib
+import threading
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+# How much a hit in each field counts
+FIELD_WEIGHTS = {
+    'label': 3.0,
+    'url': 1.5,
+    'text': 1.0,
+    'contents': 0.8,
+}
+EXACT, PREFIX, INFIX = 1.0, 0.7, 0.35
+MAX_EXPANSION = 64  # terms a prefix or infix query token may expand to
+SHORT_EXPANSION = 16  # ... when the token is a single character
+LABEL_BONUS = 0.5  # for labels starting with the whole query
+BONUS_LIMIT = 256  # labels with the bonus scored up front; more are scored as the walk reaches them
+WALK_BUDGET = 256  # docs a multi-token walk reaches before it intersects the tokens' postings
+DIRECT_LIMIT = 512  # intersections up to this size are scored outright; larger ones filter the walk
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower()) if text else []
+
+
+def trigrams(term):
+    return {term[i:i + 3] for i in range(len(term) - 2)}
+
+
+def item_fields(item):
+    """The searchable text of a desktop item, per field."""
+    fields = {
+        'label': ' '.join(str(item.get(k) or '') for k in ('name', 'title')),
+        'url': ' '.join(str(item.get(k) or '') for k in ('url', 'src') if not str(item.get(k) or '').startswith('data:')),
+        'text': str(item.get('text') or ''),
+    }
+    tabs = item.get('tabs')
+    if isinstance(tabs, list):
+        fields['contents'] = ' '.join(
+            f"{tab.get('title') or ''} {tab.get('url') or ''}" for tab in tabs if isinstance(tab, dict)
+        )
+    return fields
+
+
+def _remove_sorted(rows, row):
+    pos = bisect.bisect_left(rows, row)
+    if pos < len(rows) and rows[pos] == row:
+        del rows[pos]
+
+
+def _ranked_stream(rows, quality):
+    """A term's ranked postings as (-score, label length, doc key)."""
+    for neg_weight, length, key in rows:
+        yield neg_weight * quality, length, key
+
+
+def item_label(item):
+    label = item.get('name') or item.get('title') or (item.get('text') or '').strip().split('\n')[0]
+    return (label or item.get('type') or '')[:80]
+
+
+class SearchIndex:
+    """Inverted index over desktop items of every workspace.
+
+    Terms are kept in a sorted vocabulary so a prefix is a bisect away, and a
+    trigram -> terms map covers matches inside words. Each term's postings are
+    also kept ranked (best weight, then shortest label), so a query walks the
+    rarest token's docs best first and stops once no later doc can make the
+    top results. Items are (re)indexed one at a time when their content hash
+    changes, never rebuilt wholesale.
+    """
+
+    def __init__(self, api):
+        self.api = api
+        self._lock = threading.RLock()
+        self._postings = {}  # term -> {doc key: weight}
+        self._ranked = {}  # term -> sorted [(-weight, label length, doc key)]
+        self._labels = []  # sorted [(lower-cased label, doc key)]
+        self._vocab = []  # sorted terms
+        self._trigrams = {}  # trigram -> set of terms
+        self._docs = {}  # doc key -> {'hash', 'terms', 'meta'}
+        self._workspace_docs = {}  # workspace -> set of doc keys
+        self._built = False
+
+    # --- Maintenance ---
+
+    def ensure_built(self):
+        if self._built:
+            return
+        with self._lock:
+            if self._built:
+                return
+            for workspace in self.api._workspaces.index()['workspaces']:
+                try:
+                    self.sync_items(workspace['id'], self._load_items(workspace['id']))
+                except Exception as e:
+                    self.api.log(f"[Search] Could not index {workspace['id']}: {e}", "WARNING")
+            self._built = True
+
+    def _load_items(self, workspace):
+        if workspace != 'main':
+            return self.api._workspaces.load_items(workspace)
+        config_path = os.path.join(self.api._get_share_dir(), "config.json")
+        if not os.path.exists(config_path):
+            return []
+        with open(config_path, 'r', encoding='utf-8') as f:
+            return json.load(f).get('desktop_items') or []
+
+    def reset(self):
+        with self._lock:
+            self._postings.clear()
+            self._ranked.clear()
+            self._labels = []
+            self._vocab = []
+            self._trigrams.clear()
+            self._docs.clear()
+            self._workspace_docs.clear()
+            self._built = False
+
+    def sync_items(self, workspace, items):
+        """Brings one workspace up to date. Returns (added, removed) doc counts."""
+        if not isinstance(items, list):
+            return 0, 0
+        with self._lock:
+            seen = set()
+            added = 0
+            for item in items:
+                if not isinstance(item, dict) or item.get('id') is None:
+                    continue
+                key = (workspace, str(item['id']))
+                seen.add(key)
+                digest = hashlib.sha1(json.dumps(item, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+                doc = self._docs.get(key)
+                if doc and doc['hash'] == digest:
+                    continue
+                if doc:
+                    self._remove_doc(key)
+                self._add_doc(key, item, digest)
+                added += 1
+            stale = self._workspace_docs.get(workspace, set()) - seen
+            for key in stale:
+                self._remove_doc(key)
+            return added, len(stale)
+
+    def drop_workspace(self, workspace):
+        with self._lock:
+            for key in list(self._workspace_docs.get(workspace, ())):
+                self._remove_doc(key)
+            self._workspace_docs.pop(workspace, None)
+
+    def _add_doc(self, key, item, digest):
+        weights = {}
+        for field, text in item_fields(item).items():
+            for term in tokenize(text):
+                weights[term] = max(weights.get(term, 0.0), FIELD_WEIGHTS[field])
+        label = item_label(item)
+        for term, weight in weights.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = {}
+                self._ranked[term] = []
+                bisect.insort(self._vocab, term)
+                for gram in trigrams(term):
+                    self._trigrams.setdefault(gram, set()).add(term)
+            postings[key] = weight
+            bisect.insort(self._ranked[term], (-weight, len(label), key))
+        bisect.insort(self._labels, (label.lower(), key))
+        self._docs[key] = {
+            'hash': digest,
+            'terms': weights,
+            'meta': {'id': item['id'], 'workspace': key[0], 'type': item.get('type'), 'label': label}
+        }
+        self._workspace_docs.setdefault(key[0], set()).add(key)
+
+    def _remove_doc(self, key):
+        doc = self._docs.pop(key, None)
+        if doc is None:
+            return
+        self._workspace_docs.get(key[0], set()).discard(key)
+        label = doc['meta']['label']
+        _remove_sorted(self._labels, (label.lower(), key))
+        for term, weight in doc['terms'].items():
+            postings = self._postings.get(term)
+            if postings is None:
+                continue
+            postings.pop(key, None)
+            _remove_sorted(self._ranked[term], (-weight, len(label), key))
+            if not postings:
+                del self._postings[term]
+                del self._ranked[term]
+                pos = bisect.bisect_left(self._vocab, term)
+                if pos < len(self._vocab) and self._vocab[pos] == term:
+                    del self._vocab[pos]
+                for gram in trigrams(term):
+                    terms = self._trigrams.get(gram)
+                    if terms:
+                        terms.discard(term)
+                        if not terms:
+                            del self._trigrams[gram]
+
+    # --- Queries ---
+
+    def _expand(self, token, allow_prefix):
+        """Index terms matching a query token, with the match quality factor."""
+        matches = {}
+        if token in self._postings:
+            matches[token] = EXACT
+        if allow_prefix:
+            start = bisect.bisect_left(self._vocab, token)
+            cap = MAX_EXPANSION if len(token) > 1 else SHORT_EXPANSION
+            for term in self._vocab[start:start + cap]:
+                if not term.startswith(token):
+                    break
+                matches.setdefault(term, PREFIX)
+        if len(token) >= 3 and len(matches) < MAX_EXPANSION:
+            grams = [self._trigrams.get(g, ()) for g in trigrams(token)]
+            if all(grams):
+                candidates = set.intersection(*map(set, sorted(grams, key=len)))
+                for term in candidates:
+                    if token in term:
+                        matches.setdefault(term, INFIX)
+                        if len(matches) >= MAX_EXPANSION:
+                            break
+        return matches
+
+    def _score(self, key, expansions):
+        """Sum over query tokens of the doc's best matching term, or None if a token misses."""
+        terms = self._docs[key]['terms']
+        total = 0.0
+        for expansion in expansions:
+            best = 0.0
+            if len(expansion) < len(terms):
+                for term, quality in expansion.items():
+                    weight = terms.get(term)
+                    if weight and weight * quality > best:
+                        best = weight * quality
+            else:
+                for term, weight in terms.items():
+                    quality = expansion.get(term)
+                    if quality and weight * quality > best:
+                        best = weight * quality
+            if not best:
+                return None
+            total += best
+        return round(total, 6)
+
+    def search(self, query, limit=20):
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        self.ensure_built()
+        with self._lock:
+            # Every token must match; the last one is still being typed
+            expansions = [self._expand(token, pos == len(tokens) - 1) for pos, token in enumerate(tokens)]
+            if not all(expansions):
+                return []
+            needle = query.strip().lower()
+
+            # Ranks are (-score, label length, doc key): smaller is better
+            best = []
+            seen = set()
+            start = bisect.bisect_left(self._labels, (needle,))
+            end = start
+            while end < len(self._labels) and self._labels[end][0].startswith(needle):
+                end += 1
+            bonus = {key for _, key in self._labels[start:end]}
+            bonus_left = len(bonus)
+            if bonus_left <= BONUS_LIMIT:
+                # Few enough to score right away; the walk below then ignores the bonus
+                for key in bonus:
+                    seen.add(key)
+                    score = self._score(key, expansions)
+                    if score is not None:
+                        best.append((-round(score + LABEL_BONUS, 6), len(self._docs[key]['meta']['label']), key))
+                best = sorted(best)[:limit]
+                bonus_left = 0
+
+            # Walk every token's docs best first, alternating between the token with the best
+            # head (the one holding the bound up) and each token in turn. A doc not reached yet
+            # scores at most the sum of the heads, and on a tie comes after every head in label
+            # length and key.
+            streams = [heapq.merge(*(_ranked_stream(self._ranked[term], quality)
+                                     for term, quality in expansion.items())) for expansion in expansions]
+            heads = [next(stream) for stream in streams]
+            head_sum = sum(head[0] for head in heads)
+            step = 0
+            candidates = None  # docs matching every token, once the walk runs long
+            while True:
+                step += 1
+                if step == WALK_BUDGET and len(heads) > 1:
+                    # Common words spread over many docs: the walk would take long to prove the top
+                    candidates = self._intersect(expansions)
+                    if len(candidates) <= DIRECT_LIMIT:
+                        for key in candidates - seen:
+                            score = self._score(key, expansions)
+                            if key in bonus:
+                                score = round(score + LABEL_BONUS, 6)
+                            best.append((-score, len(self._docs[key]['meta']['label']), key))
+                        best = heapq.nsmallest(limit, best)
+                        break
+                if len(heads) == 1:
+                    turn = 0
+                elif step % 2:
+                    turn = min(range(len(heads)), key=heads.__getitem__)
+                else:
+                    turn = step // 2 % len(heads)
+                neg, length, key = heads[turn]
+                if len(best) >= limit:
+                    bound = round(head_sum, 6)
+                    tie = max(head[1:] for head in heads) if len(heads) > 1 else (length, key)
+                    plain_done = (bound, *tie) > best[-1]
+                    bonus_done = not bonus_left or (round(bound - LABEL_BONUS, 6), *tie) > best[-1]
+                    if plain_done and bonus_done:
+                        break
+                else:
+                    plain_done = bonus_done = False
+                in_bonus = key in bonus
+                if key not in seen and not (bonus_done if in_bonus else plain_done) and (
+                        candidates is None or key in candidates):
+                    seen.add(key)
+                    score = self._score(key, expansions)
+                    if in_bonus:
+                        bonus_left -= 1
+                        if score is not None:
+                            score = round(score + LABEL_BONUS, 6)
+                    if score is not None:
+                        bisect.insort(best, (-score, length, key))
+                        del best[limit:]
+                head = next(streams[turn], None)
+                if head is None:
+                    break  # every doc matching this token was reached, so every possible result was
+                heads[turn] = head
+                head_sum += head[0] - neg
+            return [dict(self._docs[key]['meta'], score=round(-neg - (LABEL_BONUS if key in bonus else 0.0), 3))
+                    for neg, _, key in best]
+
+    def _intersect(self, expansions):
+        """Keys of the docs matching every token, smallest token first."""
+        sets = sorted((set().union(*(self._postings[term] for term in expansion)) for expansion in expansions), key=len)
+        result = sets[0]
+        for other in sets[1:]:
+            result &= other
+        return result
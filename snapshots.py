@@ -0,0 +1,178 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+# (max age in seconds, bucket width in seconds). Snapshots younger than the
+# first bound are all kept; older ones keep the newest snapshot per bucket.
+RETENTION_BUCKETS = [
+    (60 * 60, 0),                 # last hour: everything
+    (24 * 60 * 60, 10 * 60),      # last day: one per 10 minutes
+    (7 * 24 * 60 * 60, 60 * 60),  # last week: one per hour
+    (90 * 24 * 60 * 60, 24 * 60 * 60),  # last 90 days: one per day
+]
+BLOB_CACHE_SIZE = 4096  # parsed items kept in memory, least recently used evicted first
+
+
+def _canonical(obj):
+    return json.dumps(obj, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+
+
+class SnapshotStore:
+    """Content-addressed history of desktop_items.
+
+    Every item is stored once as a blob named by its hash. A snapshot is only
+    the ordered list of item hashes, so unchanged items are shared between
+    versions and a snapshot costs one small file plus the changed items.
+    """
+
+    def __init__(self, api):
+        self.api = api
+        self._lock = threading.Lock()
+        self._blob_cache = OrderedDict()  # digest -> item, least recently used first
+        self._last_manifest = None
+
+    def _root(self):
+        return os.path.join(self.api._get_share_dir(), "snapshots")
+
+    def _objects_dir(self):
+        return os.path.join(self._root(), "objects")
+
+    def _versions_dir(self):
+        return os.path.join(self._root(), "versions")
+
+    def _blob_path(self, digest):
+        return os.path.join(self._objects_dir(), digest[:2], digest[2:] + ".json")
+
+    def _cache_blob(self, digest, item):
+        # Caller holds self._lock
+        self._blob_cache[digest] = item
+        self._blob_cache.move_to_end(digest)
+        while len(self._blob_cache) > BLOB_CACHE_SIZE:
+            self._blob_cache.popitem(last=False)
+
+    def record(self, items, workspace="main"):
+        """Stores a snapshot of items. Returns the snapshot id or None if unchanged."""
+        if not isinstance(items, list):
+            return None
+        with self._lock:
+            hashes = []
+            for item in items:
+                data = _canonical(item)
+                digest = hashlib.sha256(data.encode('utf-8')).hexdigest()
+                hashes.append(digest)
+                if digest in self._blob_cache:
+                    self._blob_cache.move_to_end(digest)
+                    continue
+                path = self._blob_path(digest)
+                if not os.path.exists(path):
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    self.api._write_atomic(path, data)
+                self._cache_blob(digest, item)
+
+            manifest_hash = hashlib.sha256('\n'.join(hashes).encode('ascii')).hexdigest()
+            if self._last_manifest == (workspace, manifest_hash):
+                return None
+
+            now = time.time()
+            snapshot_id = f"{int(now * 1000)}-{manifest_hash[:8]}"
+            manifest = {
+                'id': snapshot_id,
+                'timestamp': now,
+                'workspace': workspace,
+                'count': len(hashes),
+                'items': hashes
+            }
+            os.makedirs(self._versions_dir(), exist_ok=True)
+            self.api._write_atomic(os.path.join(self._versions_dir(), snapshot_id + ".json"), json.dumps(manifest))
+            self._last_manifest = (workspace, manifest_hash)
+        return snapshot_id
+
+    def list(self):
+        versions_dir = self._versions_dir()
+        if not os.path.exists(versions_dir):
+            return []
+        snapshots = []
+        for name in sorted(os.listdir(versions_dir), reverse=True):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(versions_dir, name), 'r', encoding='utf-8') as f:
+                    manifest = json.load(f)
+                snapshots.append({
+                    'id': manifest['id'],
+                    'timestamp': manifest['timestamp'],
+                    'workspace': manifest.get('workspace', 'main'),
+                    'count': manifest['count']
+                })
+            except Exception as e:
+                self.api.log(f"[Snapshots] Skipping unreadable version {name}: {e}", "WARNING")
+        return snapshots
+
+    def load(self, snapshot_id):
+        """Returns (workspace, items) for a snapshot. Recently used blobs are not read again."""
+        path = os.path.join(self._versions_dir(), os.path.basename(snapshot_id) + ".json")
+        with open(path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        items = []
+        with self._lock:
+            for digest in manifest['items']:
+                item = self._blob_cache.get(digest)
+                if item is None:
+                    with open(self._blob_path(digest), 'r', encoding='utf-8') as f:
+                        item = json.load(f)
+                self._cache_blob(digest, item)
+                items.append(item)
+        # Hand out copies so later edits never mutate cached blobs
+        return manifest.get('workspace', 'main'), json.loads(_canonical(items))
+
+    def prune(self, now=None):
+        """Applies time-bucketed retention, then sweeps unreferenced blobs."""
+        now = now or time.time()
+        versions_dir = self._versions_dir()
+        if not os.path.exists(versions_dir):
+            return 0
+        with self._lock:
+            kept_buckets = set()
+            removed = 0
+            live = set()
+            for name in sorted(os.listdir(versions_dir), reverse=True):
+                if not name.endswith(".json"):
+                    continue
+                path = os.path.join(versions_dir, name)
+                try:
+                    with open(path, 'r', encoding='utf-8') as f:
+                        manifest = json.load(f)
+                except Exception:
+                    continue
+                age = now - manifest['timestamp']
+                keep = False
+                for max_age, width in RETENTION_BUCKETS:
+                    if age <= max_age:
+                        if width == 0:
+                            keep = True
+                        else:
+                            bucket = (manifest.get('workspace', 'main'), width, int(manifest['timestamp'] // width))
+                            keep = bucket not in kept_buckets
+                            kept_buckets.add(bucket)
+                        break
+                if keep:
+                    live.update(manifest['items'])
+                else:
+                    os.remove(path)
+                    removed += 1
+
+            objects_dir = self._objects_dir()
+            if os.path.exists(objects_dir):
+                for prefix in os.listdir(objects_dir):
+                    prefix_dir = os.path.join(objects_dir, prefix)
+                    for name in os.listdir(prefix_dir):
+                        digest = prefix + name[:-len(".json")]
+                        if digest not in live:
+                            os.remove(os.path.join(prefix_dir, name))
+                            self._blob_cache.pop(digest, None)
+        if removed:
+            self.api.log(f"[Snapshots] Pruned {removed} snapshots")
+        return removed
@@ -0,0 +1,94 @@
+import os
+import sys
+import json
+import time
+import tempfile
+import statistics
+import subprocess
+
+# Set by the runner: wall-clock time right before the process was spawned,
+# and the file each launch appends its timings to.
+ENV_T0 = "CHOMKA_BENCH_T0"
+ENV_OUT = "CHOMKA_BENCH_OUT"
+PHASES = ("import", "main", "window", "pywebviewready")
+
+
+class StartupTimer:
+    """Wall-clock marks for the phases of one launch.
+
+    Times are relative to the spawn time passed in by the runner, or to
+    launcher.py's first line when the app was started normally (which then
+    misses the bootloader / unpack time).
+    """
+
+    def __init__(self, import_time):
+        spawn = os.environ.get(ENV_T0)
+        self.t0 = float(spawn) if spawn else import_time
+        self.has_spawn_time = bool(spawn)
+        self.marks = {"import": import_time}
+
+    def mark(self, phase):
+        self.marks.setdefault(phase, time.time())
+
+    def report(self):
+        return {phase: round((t - self.t0) * 1000, 1) for phase, t in self.marks.items()}
+
+    def summary(self):
+        origin = "exec" if self.has_spawn_time else "launcher import"
+        return ", ".join(f"{phase} +{ms:.0f} ms" for phase, ms in self.report().items()) + f" (from {origin})"
+
+    def write_result(self):
+        out = os.environ.get(ENV_OUT)
+        if not out:
+            return False
+        with open(out, "a", encoding="utf-8") as f:
+            f.write(json.dumps(self.report()) + "\n")
+        return True
+
+
+def run(command, runs, timeout=60):
+    """Launches the app `runs` times and collects one timing line per launch."""
+    fd, out_path = tempfile.mkstemp(prefix="chomka-bench-", suffix=".jsonl")
+    os.close(fd)
+    results = []
+    try:
+        for i in range(runs):
+            before = os.path.getsize(out_path)
+            env = dict(os.environ, **{ENV_OUT: out_path, ENV_T0: repr(time.time())})
+            proc = subprocess.run(command + ["--bench-startup"], env=env, timeout=timeout)
+            with open(out_path, "r", encoding="utf-8") as f:
+                f.seek(before)
+                line = f.read().strip()
+            if not line:
+                print(f"Run {i + 1}: no timings recorded (exit code {proc.returncode})")
+                continue
+            results.append(json.loads(line))
+            print(f"Run {i + 1} ({'cold' if i == 0 else 'warm'}): " +
+                  ", ".join(f"{k} {v:.0f} ms" for k, v in results[-1].items()))
+    finally:
+        os.remove(out_path)
+    return results
+
+
+def print_summary(results):
+    if not results:
+        return
+    print("\nphase             cold      warm (median)")
+    for phase in PHASES:
+        cold = results[0].get(phase)
+        warm = [r[phase] for r in results[1:] if phase in r]
+        warm_text = f"{statistics.median(warm):7.0f} ms" if warm else "      -"
+        cold_text = f"{cold:7.0f} ms" if cold is not None else "      -"
+        print(f"{phase:<16}{cold_text}  {warm_text}")
+
+
+if __name__ == "__main__":
+    # python startup_bench.py [--runs N] [command ...]
+    # e.g. python startup_bench.py --runs 5 dist/Chomka/Chomka.exe
+    args = sys.argv[1:]
+    runs = 5
+    if len(args) >= 2 and args[0] == "--runs":
+        runs = int(args[1])
+        args = args[2:]
+    command = args or [sys.executable, "launcher.py"]
+    print_summary(run(command, runs))
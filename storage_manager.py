@@ -0,0 +1,331 @@
+import os
+import re
+import json
+import time
+import shutil
+import threading
+
+# assets/<name> anywhere in saved state (items, folder tabs, note text, wallpaper...)
+ASSET_REF_RE = re.compile(r'assets/([^\s"\'<>)?#\\]+)')
+
+# Recordings are never referenced by an item but are the user's originals
+EXEMPT_PREFIXES = ("rec-",)
+SWEEP_GRACE_SECONDS = 60 * 60  # new assets may not be referenced by a save yet
+QUARANTINE_SECONDS = 7 * 24 * 60 * 60
+DEFAULT_CACHE_BUDGET = 256 * 1024 * 1024
+# Derived data under cache/ that must stay consistent as a whole
+PROTECTED_CACHE = ("cache/atlas/", "cache/palettes.json", "cache/storage_index.json")
+BATCH_SIZE = 200
+BATCH_PAUSE = 0.05
+INTERVAL_SECONDS = 15 * 60
+
+
+class StorageManager:
+    """Keeps the data directory from growing without bound.
+
+    - Unreferenced assets are found by mark-and-sweep against every
+      workspace, the app config and snapshot history, then moved to
+      quarantine/ and purged only after QUARANTINE_SECONDS.
+    - Regenerable files under cache/ are evicted least recently used first
+      once they exceed the byte budget.
+    Work runs on its own daemon thread in small batches, never on the save
+    executor.
+    """
+
+    def __init__(self, api, cache_budget=DEFAULT_CACHE_BUDGET, interval=INTERVAL_SECONDS):
+        self.api = api
+        self.cache_budget = cache_budget
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._index = None  # rel path -> {'size', 'atime'}
+        self._index_dirty = False
+        self._blob_refs = {}  # snapshot blob path -> set of asset names
+        self._thread = None
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self.last_report = None
+
+    def _root(self):
+        return self.api._get_share_dir()
+
+    def _index_path(self):
+        return os.path.join(self._root(), "cache", "storage_index.json")
+
+    def _load_index(self):
+        if self._index is None:
+            self._index = {}
+            path = self._index_path()
+            if os.path.exists(path):
+                try:
+                    with open(path, 'r', encoding='utf-8') as f:
+                        self._index = json.load(f)
+                except Exception as e:
+                    self.api.log(f"[Storage] Index unreadable, rebuilding: {e}", "WARNING")
+        return self._index
+
+    def _save_index(self):
+        with self._lock:
+            if not self._index_dirty:
+                return
+            data = json.dumps(self._index)
+            self._index_dirty = False
+        os.makedirs(os.path.dirname(self._index_path()), exist_ok=True)
+        self.api._write_atomic(self._index_path(), data)
+
+    def reset(self):
+        with self._lock:
+            self._index = None
+            self._index_dirty = False
+            self._blob_refs.clear()
+
+    def touch(self, path):
+        """Records an access (e.g. the asset server served the file)."""
+        rel_path = os.path.relpath(path, self._root()).replace(os.sep, '/')
+        with self._lock:
+            entry = self._load_index().setdefault(rel_path, {'size': 0})
+            entry['atime'] = time.time()
+            self._index_dirty = True
+
+    # --- Background loop ---
+
+    def start(self):
+        if self._thread:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='chomka-storage', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        self._thread = None
+
+    def request_run(self):
+        self._wake.set()
+
+    def _run(self):
+        # Let startup finish before touching the disk
+        self._wake.wait(60)
+        while not self._stop.is_set():
+            self._wake.clear()
+            try:
+                self.run_once()
+            except Exception as e:
+                self.api.log(f"[Storage] Cycle failed: {e}", "ERROR")
+            self._wake.wait(self.interval)
+
+    def _pause(self, count):
+        if count % BATCH_SIZE == 0:
+            time.sleep(BATCH_PAUSE)
+        return not self._stop.is_set()
+
+    def run_once(self):
+        quarantined = self.sweep_assets()
+        purged = self.purge_quarantine()
+        evicted, freed = self.evict_cache()
+        self._save_index()
+        self.last_report = dict(self.usage(), quarantined=quarantined, purged=purged,
+                                evicted=evicted, freed=freed, at=time.time())
+        if quarantined or purged or evicted:
+            self.api.log(f"[Storage] Quarantined {quarantined}, purged {purged}, evicted {evicted} cache files ({freed} bytes)")
+        return self.last_report
+
+    # --- Mark ---
+
+    def _refs_in_file(self, path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return set(ASSET_REF_RE.findall(f.read()))
+        except (OSError, UnicodeDecodeError):
+            return set()
+
+    def referenced_assets(self, include_history=True):
+        """Names of assets referenced by any saved state (and snapshot)."""
+        root = self._root()
+        refs = self._refs_in_file(os.path.join(root, "config.json"))
+        refs |= self._refs_in_file(os.path.join(root, "credentials.json"))
+        workspaces_dir = os.path.join(root, "workspaces")
+        if os.path.isdir(workspaces_dir):
+            for name in os.listdir(workspaces_dir):
+                if name.endswith(".json"):
+                    refs |= self._refs_in_file(os.path.join(workspaces_dir, name))
+
+        if not include_history:
+            return refs
+
+        # Snapshot blobs never change, so each is read once per session
+        objects_dir = os.path.join(root, "snapshots", "objects")
+        live_blobs = set()
+        count = 0
+        if os.path.isdir(objects_dir):
+            for dirpath, dirnames, filenames in os.walk(objects_dir):
+                for name in filenames:
+                    blob = os.path.join(dirpath, name)
+                    live_blobs.add(blob)
+                    if blob not in self._blob_refs:
+                        self._blob_refs[blob] = self._refs_in_file(blob)
+                        count += 1
+                        if not self._pause(count):
+                            return None
+        for blob in list(self._blob_refs):
+            if blob not in live_blobs:
+                del self._blob_refs[blob]
+        for blob_refs in self._blob_refs.values():
+            refs |= blob_refs
+        return refs
+
+    # --- Sweep ---
+
+    def _quarantine_dir(self):
+        return os.path.join(self._root(), "quarantine")
+
+    def sweep_assets(self):
+        assets_dir = os.path.join(self._root(), "assets")
+        if not os.path.isdir(assets_dir):
+            return 0
+        refs = self.referenced_assets()
+        if refs is None:
+            return 0
+        now = time.time()
+        moved = 0
+        batch_dir = os.path.join(self._quarantine_dir(), str(int(now)))
+        for count, entry in enumerate(os.scandir(assets_dir), 1):
+            if not self._pause(count):
+                break
+            if not entry.is_file() or entry.name.startswith(EXEMPT_PREFIXES) or entry.name.endswith(".tmp"):
+                continue
+            st = entry.stat()
+            self._record(f"assets/{entry.name}", st)
+            # Copies keep their source's mtime (copy2/copystat); ctime is when
+            # the file arrived here (its creation time on Windows)
+            if entry.name in refs or now - max(st.st_mtime, st.st_ctime) < SWEEP_GRACE_SECONDS:
+                continue
+            os.makedirs(batch_dir, exist_ok=True)
+            shutil.move(entry.path, os.path.join(batch_dir, entry.name))
+            self.api._watcher.note_write(entry.path)
+            with self._lock:
+                if self._load_index().pop(f"assets/{entry.name}", None) is not None:
+                    self._index_dirty = True
+            moved += 1
+        return moved
+
+    def purge_quarantine(self, now=None):
+        now = now or time.time()
+        quarantine_dir = self._quarantine_dir()
+        if not os.path.isdir(quarantine_dir):
+            return 0
+        purged = 0
+        for name in os.listdir(quarantine_dir):
+            batch = os.path.join(quarantine_dir, name)
+            if name.isdigit() and now - int(name) > QUARANTINE_SECONDS:
+                purged += len(os.listdir(batch))
+                shutil.rmtree(batch, ignore_errors=True)
+        return purged
+
+    def list_quarantined(self):
+        """Quarantined assets, newest first, with when each is purged."""
+        quarantine_dir = self._quarantine_dir()
+        if not os.path.isdir(quarantine_dir):
+            return []
+        files = []
+        for batch in sorted(os.listdir(quarantine_dir), reverse=True):
+            batch_dir = os.path.join(quarantine_dir, batch)
+            if not batch.isdigit() or not os.path.isdir(batch_dir):
+                continue
+            for entry in os.scandir(batch_dir):
+                if entry.is_file():
+                    files.append({
+                        'name': entry.name,
+                        'size': entry.stat().st_size,
+                        'quarantined': int(batch),
+                        'purge_at': int(batch) + QUARANTINE_SECONDS,
+                    })
+        return files
+
+    def restore_quarantined(self, name):
+        """Moves a quarantined asset back into assets/. Returns its path."""
+        name = os.path.basename(name)
+        quarantine_dir = self._quarantine_dir()
+        if name and os.path.isdir(quarantine_dir):
+            for batch in sorted(os.listdir(quarantine_dir), reverse=True):
+                candidate = os.path.join(quarantine_dir, batch, name)
+                if os.path.isfile(candidate):
+                    target = os.path.join(self._root(), "assets", name)
+                    os.makedirs(os.path.dirname(target), exist_ok=True)
+                    self.api._watcher.note_write(target)
+                    shutil.move(candidate, target)
+                    return f"assets/{name}"
+        raise FileNotFoundError(name)
+
+    # --- Cache eviction ---
+
+    def _record(self, rel_path, st):
+        with self._lock:
+            entry = self._load_index().get(rel_path)
+            if entry is None or entry.get('size') != st.st_size:
+                self._index[rel_path] = {'size': st.st_size, 'atime': max(entry.get('atime', 0) if entry else 0, st.st_mtime)}
+                self._index_dirty = True
+            return self._index[rel_path]
+
+    def evict_cache(self):
+        cache_dir = os.path.join(self._root(), "cache")
+        if not os.path.isdir(cache_dir):
+            return 0, 0
+        files = []
+        total = 0
+        count = 0
+        for dirpath, dirnames, filenames in os.walk(cache_dir):
+            for name in filenames:
+                count += 1
+                if not self._pause(count):
+                    return 0, 0
+                path = os.path.join(dirpath, name)
+                rel_path = os.path.relpath(path, self._root()).replace(os.sep, '/')
+                if rel_path.startswith(PROTECTED_CACHE) or name.endswith(".tmp"):
+                    continue
+                try:
+                    entry = self._record(rel_path, os.stat(path))
+                except OSError:
+                    continue
+                files.append((entry.get('atime', 0), entry['size'], path, rel_path))
+                total += entry['size']
+
+        evicted, freed = 0, 0
+        if total <= self.cache_budget:
+            return 0, 0
+        for atime, size, path, rel_path in sorted(files):
+            if total <= self.cache_budget:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            with self._lock:
+                self._index.pop(rel_path, None)
+                self._index_dirty = True
+            total -= size
+            freed += size
+            evicted += 1
+        return evicted, freed
+
+    # --- Reporting ---
+
+    def _dir_size(self, path):
+        total = 0
+        for dirpath, dirnames, filenames in os.walk(path):
+            for name in filenames:
+                try:
+                    total += os.path.getsize(os.path.join(dirpath, name))
+                except OSError:
+                    pass
+        return total
+
+    def usage(self):
+        root = self._root()
+        return {
+            'assets_bytes': self._dir_size(os.path.join(root, "assets")),
+            'cache_bytes': self._dir_size(os.path.join(root, "cache")),
+            'quarantine_bytes': self._dir_size(self._quarantine_dir()),
+            'snapshots_bytes': self._dir_size(os.path.join(root, "snapshots")),
+            'cache_budget_bytes': self.cache_budget,
+        }
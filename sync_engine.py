@@ -0,0 +1,628 @@
+import os
+import io
+import sys
+import json
+import base64
+import hashlib
+import fnmatch
+import secrets
+import threading
+import urllib.parse
+
+BLOCK_SIZE = 16 * 1024
+DELTA_MIN_SIZE = 64 * 1024  # smaller files are simply uploaded whole
+MOD_ADLER = 65521
+SYNC_META_DIR = ".sync"
+REMOTE_META_DIR = ".chomka-sync"
+
+# Paths that never leave the machine. screenlayout.txt is derived from
+# config.json and regenerated after a merge; credentials.json holds plaintext
+# passwords; extensions/ is code, installed per machine; vault.dat is a chain of
+# records that a whole-file conflict rule would cut, losing one side's logins.
+EXCLUDE_PATTERNS = [
+    "chomka.log", "*.tmp", "screenlayout.txt", "credentials.json", "extensions/*", "vault.dat*",
+    SYNC_META_DIR + "/*", REMOTE_META_DIR + "/*", "snapshots/*", "cache/*", "quarantine/*", "diagnostics/*", "jobs/*",
+]
+
+# Files whose item lists are merged per item id instead of per file
+ITEM_FILES = {"config.json": "desktop_items"}
+ITEM_FILE_PATTERNS = [("workspaces/ws-*.json", "items")]
+
+
+def _canonical(obj):
+    return json.dumps(obj, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+
+
+def _digest(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def is_excluded(rel_path):
+    return any(fnmatch.fnmatch(rel_path, pattern) for pattern in EXCLUDE_PATTERNS)
+
+
+def item_key_for(rel_path):
+    if rel_path in ITEM_FILES:
+        return ITEM_FILES[rel_path]
+    for pattern, key in ITEM_FILE_PATTERNS:
+        if fnmatch.fnmatch(rel_path, pattern):
+            return key
+    return None
+
+
+# --- Rolling checksum block deltas (rsync style) ---
+
+def weak_checksum(block):
+    a = sum(block) % MOD_ADLER
+    b = sum((len(block) - i) * byte for i, byte in enumerate(block)) % MOD_ADLER
+    return a, b
+
+
+def block_signature(data, block_size=BLOCK_SIZE):
+    """Weak and strong checksums of every block of data."""
+    signature = []
+    for offset in range(0, len(data), block_size):
+        block = data[offset:offset + block_size]
+        a, b = weak_checksum(block)
+        signature.append({'weak': (b << 16) | a, 'strong': _digest(block)[:16]})
+    return signature
+
+
+def compute_delta(data, signature, block_size=BLOCK_SIZE):
+    """Encodes data as copies of blocks the other side already has plus literals.
+
+    Matching blocks are skipped a whole block at a time, so only regions that
+    actually changed pay for the byte-by-byte rolling checksum.
+    """
+    weak_index = {}
+    for idx, entry in enumerate(signature):
+        weak_index.setdefault(entry['weak'], []).append((idx, entry['strong']))
+
+    ops = []
+    literal = bytearray()
+    n = len(data)
+    pos = 0
+    a = b = None
+    while pos < n:
+        end = min(pos + block_size, n)
+        length = end - pos
+        if a is None:
+            a, b = weak_checksum(data[pos:end])
+        match = None
+        candidates = weak_index.get((b << 16) | a)
+        if candidates:
+            strong = _digest(data[pos:end])[:16]
+            for idx, candidate_strong in candidates:
+                if candidate_strong == strong:
+                    match = idx
+                    break
+        if match is not None:
+            if literal:
+                ops.append(('data', bytes(literal)))
+                literal = bytearray()
+            ops.append(('copy', match))
+            pos = end
+            a = None
+            continue
+
+        # Roll the window forward by one byte
+        out_byte = data[pos]
+        literal.append(out_byte)
+        pos += 1
+        if end < n:
+            in_byte = data[end]
+            a = (a - out_byte + in_byte) % MOD_ADLER
+            b = (b - length * out_byte + a) % MOD_ADLER
+        else:
+            # Window shrinking at the end of data: drop the outgoing byte only
+            a = (a - out_byte) % MOD_ADLER
+            b = (b - length * out_byte) % MOD_ADLER
+    if literal:
+        ops.append(('data', bytes(literal)))
+    return ops
+
+
+def apply_delta(base, ops, block_size=BLOCK_SIZE):
+    out = io.BytesIO()
+    for op, value in ops:
+        if op == 'copy':
+            out.write(base[value * block_size:(value + 1) * block_size])
+        else:
+            out.write(value)
+    return out.getvalue()
+
+
+def delta_size(ops):
+    return sum(len(value) for op, value in ops if op == 'data')
+
+
+def encode_ops(ops):
+    return [[op, value if op == 'copy' else base64.b64encode(value).decode('ascii')] for op, value in ops]
+
+
+def decode_ops(encoded):
+    return [(op, value if op == 'copy' else base64.b64decode(value)) for op, value in encoded]
+
+
+# --- Item level three-way merge ---
+
+def _pick(local, remote):
+    """Deterministic winner for a true conflict: both machines pick the same side."""
+    if local is None or remote is None:
+        # An edit beats a delete
+        return local if local is not None else remote
+    return local if _digest(_canonical(local).encode('utf-8')) >= _digest(_canonical(remote).encode('utf-8')) else remote
+
+
+def merge_value(base, local, remote):
+    if _canonical(local) == _canonical(remote):
+        return local
+    if _canonical(local) == _canonical(base):
+        return remote
+    if _canonical(remote) == _canonical(base):
+        return local
+    return _pick(local, remote)
+
+
+def merge_items(base, local, remote):
+    """Merges two edited item lists against their common ancestor by item id."""
+    def by_id(items):
+        return {item.get('id'): item for item in (items or []) if isinstance(item, dict)}
+
+    base_map, local_map, remote_map = by_id(base), by_id(local), by_id(remote)
+    order = [item.get('id') for item in (local or []) if isinstance(item, dict)]
+    order += [item.get('id') for item in (remote or []) if isinstance(item, dict) and item.get('id') not in local_map]
+
+    merged = []
+    for item_id in order:
+        value = merge_value(base_map.get(item_id), local_map.get(item_id), remote_map.get(item_id))
+        if value is not None:
+            merged.append(value)
+    return merged
+
+
+def merge_document(base, local, remote, items_key):
+    """Merges a JSON object key by key, and its item list per item."""
+    base, local, remote = base or {}, local or {}, remote or {}
+    merged = {}
+    for key in list(local.keys()) + [k for k in remote.keys() if k not in local]:
+        if key == items_key:
+            merged[key] = merge_items(base.get(key), local.get(key), remote.get(key))
+        else:
+            value = merge_value(base.get(key), local.get(key), remote.get(key))
+            if value is not None:
+                merged[key] = value
+    return merged
+
+
+# --- Remotes ---
+
+class DirectoryRemote:
+    """A remote that is just another directory (network share, USB stick...)."""
+
+    def __init__(self, root):
+        self.root = root
+
+    def _path(self, rel_path):
+        full_path = os.path.realpath(os.path.join(self.root, rel_path))
+        if os.path.commonpath([os.path.realpath(self.root), full_path]) != os.path.realpath(self.root):
+            raise ValueError(f"Path escapes remote root: {rel_path}")
+        return full_path
+
+    def _write(self, rel_path, data):
+        path = self._path(rel_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".tmp", 'wb') as f:
+            f.write(data)
+        os.replace(path + ".tmp", path)
+
+    def get_manifest(self):
+        path = self._path(f"{REMOTE_META_DIR}/manifest.json")
+        if not os.path.exists(path):
+            return {}
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def put_manifest(self, manifest):
+        self._write(f"{REMOTE_META_DIR}/manifest.json", json.dumps(manifest).encode('utf-8'))
+
+    def read(self, rel_path):
+        with open(self._path(rel_path), 'rb') as f:
+            return f.read()
+
+    def write(self, rel_path, data):
+        self._write(rel_path, data)
+
+    def delete(self, rel_path):
+        path = self._path(rel_path)
+        if os.path.exists(path):
+            os.remove(path)
+
+    def signature(self, rel_path, block_size=BLOCK_SIZE):
+        return block_signature(self.read(rel_path), block_size)
+
+    def patch(self, rel_path, ops, block_size=BLOCK_SIZE):
+        self._write(rel_path, apply_delta(self.read(rel_path), ops, block_size))
+
+    def delta(self, rel_path, signature, block_size=BLOCK_SIZE):
+        return compute_delta(self.read(rel_path), signature, block_size)
+
+
+class HttpRemote:
+    """Client for a SyncServer (or anything speaking the same small protocol)."""
+
+    def __init__(self, base_url, timeout=30):
+        self.base_url = base_url.rstrip('/') + '/'
+        self.timeout = timeout
+
+    def _request(self, method, route, rel_path='', body=None, query=None):
+        url = self.base_url + route + ('/' + urllib.parse.quote(rel_path) if rel_path else '')
+        if query:
+            url += '?' + urllib.parse.urlencode(query)
+        from urllib.request import Request, urlopen
+        request = Request(url, data=body, method=method)
+        with urlopen(request, timeout=self.timeout) as response:
+            return response.read()
+
+    def _json(self, method, route, rel_path='', payload=None, query=None):
+        body = json.dumps(payload).encode('utf-8') if payload is not None else None
+        raw = self._request(method, route, rel_path, body, query)
+        return json.loads(raw) if raw else None
+
+    def get_manifest(self):
+        return self._json('GET', 'manifest') or {}
+
+    def put_manifest(self, manifest):
+        self._json('PUT', 'manifest', payload=manifest)
+
+    def read(self, rel_path):
+        return self._request('GET', 'files', rel_path)
+
+    def write(self, rel_path, data):
+        self._request('PUT', 'files', rel_path, data)
+
+    def delete(self, rel_path):
+        self._request('DELETE', 'files', rel_path)
+
+    def signature(self, rel_path, block_size=BLOCK_SIZE):
+        return self._json('GET', 'signature', rel_path, query={'block_size': block_size})
+
+    def patch(self, rel_path, ops, block_size=BLOCK_SIZE):
+        self._json('POST', 'patch', rel_path, {'block_size': block_size, 'ops': encode_ops(ops)})
+
+    def delta(self, rel_path, signature, block_size=BLOCK_SIZE):
+        encoded = self._json('POST', 'delta', rel_path, {'block_size': block_size, 'signature': signature})
+        return decode_ops(encoded)
+
+
+def remote_from_config(target):
+    if target.startswith('http://') or target.startswith('https://'):
+        return HttpRemote(target)
+    return DirectoryRemote(target)
+
+
+class SyncServer:
+    """Serves a DirectoryRemote over HTTP. Handy as a LAN or test stand-in.
+
+    Every request needs the token in its path (one is generated when none is
+    given), since the server reads, writes and deletes the whole directory;
+    on loopback too, where any web page could otherwise post to it.
+    """
+
+    def __init__(self, root, host='127.0.0.1', port=0, token=''):
+        from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+        self.remote = DirectoryRemote(root)
+        self.token = token or secrets.token_urlsafe(16)
+        handler = type('ChomkaSyncHandler', (_SyncRequestHandler, BaseHTTPRequestHandler), {'server_ref': self})
+        self._httpd = ThreadingHTTPServer((host, port), handler)
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/{self.token}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self.url
+
+    def serve_forever(self):
+        self._httpd.serve_forever()
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+class _SyncRequestHandler:
+    """Request handling, mixed into BaseHTTPRequestHandler by SyncServer."""
+
+    server_ref = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _route(self):
+        parsed = urllib.parse.urlsplit(self.path)
+        parts = parsed.path.lstrip('/').split('/')
+        if not parts or not secrets.compare_digest(parts[0].encode('utf-8'), self.server_ref.token.encode('utf-8')):
+            return None, None, None
+        parts = parts[1:]
+        route = parts[0] if parts else ''
+        rel_path = urllib.parse.unquote('/'.join(parts[1:]))
+        return route, rel_path, dict(urllib.parse.parse_qsl(parsed.query))
+
+    def _body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length) if length else b''
+
+    def _reply(self, status, data=b'', content_type='application/octet-stream'):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _reply_json(self, payload):
+        self._reply(200, json.dumps(payload).encode('utf-8'), 'application/json')
+
+    def _handle(self, method):
+        route, rel_path, query = self._route()
+        remote = self.server_ref.remote
+        try:
+            if route is None:
+                self._reply(403)
+            elif route == 'manifest' and method == 'GET':
+                self._reply_json(remote.get_manifest())
+            elif route == 'manifest' and method == 'PUT':
+                remote.put_manifest(json.loads(self._body()))
+                self._reply(204)
+            elif route == 'files' and method == 'GET':
+                self._reply(200, remote.read(rel_path))
+            elif route == 'files' and method == 'PUT':
+                remote.write(rel_path, self._body())
+                self._reply(204)
+            elif route == 'files' and method == 'DELETE':
+                remote.delete(rel_path)
+                self._reply(204)
+            elif route == 'signature' and method == 'GET':
+                self._reply_json(remote.signature(rel_path, int(query.get('block_size', BLOCK_SIZE))))
+            elif route == 'patch' and method == 'POST':
+                payload = json.loads(self._body())
+                remote.patch(rel_path, decode_ops(payload['ops']), payload['block_size'])
+                self._reply(204)
+            elif route == 'delta' and method == 'POST':
+                payload = json.loads(self._body())
+                ops = remote.delta(rel_path, payload['signature'], payload['block_size'])
+                self._reply_json(encode_ops(ops))
+            else:
+                self._reply(404)
+        except FileNotFoundError:
+            self._reply(404)
+        except ValueError:
+            self._reply(400)
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_PUT(self):
+        self._handle('PUT')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def do_DELETE(self):
+        self._handle('DELETE')
+
+
+# --- Engine ---
+
+class SyncEngine:
+    """Two-way sync of the data directory against a remote.
+
+    Each side keeps a manifest of content hashes. The last agreed manifest
+    (and a copy of every item file at that point) is the merge base, so a
+    sync only transfers files that changed since then: large files as block
+    deltas, item files (config.json, workspaces) merged per item.
+    """
+
+    def __init__(self, api):
+        self.api = api
+        self._lock = threading.Lock()
+
+    def _root(self):
+        return self.api._get_share_dir()
+
+    def _meta_path(self, name):
+        return os.path.join(self._root(), SYNC_META_DIR, name)
+
+    def _load_meta(self, name, default):
+        path = self._meta_path(name)
+        if not os.path.exists(path):
+            return default
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception:
+            return default
+
+    def _save_meta(self, name, data):
+        path = self._meta_path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.api._write_atomic(path, json.dumps(data))
+
+    def local_manifest(self):
+        """Hashes of all syncable files, reusing cached hashes for unchanged files."""
+        root = self._root()
+        cache = self._load_meta("hash_cache.json", {})
+        manifest, new_cache = {}, {}
+        for dirpath, dirnames, filenames in os.walk(root):
+            for name in filenames:
+                full_path = os.path.join(dirpath, name)
+                rel_path = os.path.relpath(full_path, root).replace(os.sep, '/')
+                if is_excluded(rel_path):
+                    continue
+                st = os.stat(full_path)
+                key = [st.st_size, st.st_mtime_ns]
+                cached = cache.get(rel_path)
+                digest = cached['hash'] if cached and cached['key'] == key else file_hash(full_path)
+                new_cache[rel_path] = {'key': key, 'hash': digest}
+                manifest[rel_path] = {'hash': digest, 'size': st.st_size}
+        self._save_meta("hash_cache.json", new_cache)
+        return manifest
+
+    def _local_path(self, rel_path):
+        return os.path.join(self._root(), *rel_path.split('/'))
+
+    def _read_local(self, rel_path):
+        with open(self._local_path(rel_path), 'rb') as f:
+            return f.read()
+
+    def _write_local(self, rel_path, data):
+        path = self._local_path(rel_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.api._write_atomic(path, data, is_binary=True)
+
+    def _push(self, remote, rel_path, data, remote_has_file, stats):
+        if remote_has_file and len(data) >= DELTA_MIN_SIZE:
+            ops = compute_delta(data, remote.signature(rel_path))
+            remote.patch(rel_path, ops)
+            stats['bytes_sent'] += delta_size(ops)
+        else:
+            remote.write(rel_path, data)
+            stats['bytes_sent'] += len(data)
+        stats['pushed'].append(rel_path)
+
+    def _pull(self, remote, rel_path, local_has_file, stats):
+        if local_has_file:
+            base = self._read_local(rel_path)
+            if len(base) >= DELTA_MIN_SIZE:
+                ops = remote.delta(rel_path, block_signature(base))
+                stats['bytes_received'] += delta_size(ops)
+                data = apply_delta(base, ops)
+                self._write_local(rel_path, data)
+                stats['pulled'].append(rel_path)
+                return data
+        data = remote.read(rel_path)
+        stats['bytes_received'] += len(data)
+        self._write_local(rel_path, data)
+        stats['pulled'].append(rel_path)
+        return data
+
+    def _merge_item_file(self, remote, rel_path, items_key, local_entry, remote_entry, stats):
+        bases = self._load_meta("item_bases.json", {})
+        local_doc = json.loads(self._read_local(rel_path)) if local_entry else {}
+        remote_doc = json.loads(remote.read(rel_path)) if remote_entry else {}
+        if remote_entry:
+            stats['bytes_received'] += remote_entry['size']
+        merged = merge_document(bases.get(rel_path), local_doc, remote_doc, items_key)
+        data = json.dumps(merged, indent=4).encode('utf-8')
+
+        if _canonical(merged) != _canonical(local_doc):
+            self._write_local(rel_path, data)
+            stats['pulled'].append(rel_path)
+            if rel_path == "config.json" and isinstance(merged.get(items_key), list):
+                self.api._save_coords_file(merged[items_key])
+        if _canonical(merged) != _canonical(remote_doc):
+            self._push(remote, rel_path, data, bool(remote_entry), stats)
+        stats['merged'].append(rel_path)
+        return merged, data
+
+    def sync(self, remote):
+        with self._lock:
+            stats = {'pushed': [], 'pulled': [], 'deleted_local': [], 'deleted_remote': [],
+                     'merged': [], 'conflicts': [], 'bytes_sent': 0, 'bytes_received': 0}
+            base = self._load_meta("base_manifest.json", {})
+            local = self.local_manifest()
+            remote_manifest = remote.get_manifest()
+            result = {}
+            item_bases = self._load_meta("item_bases.json", {})
+
+            for rel_path in sorted(set(base) | set(local) | set(remote_manifest)):
+                if is_excluded(rel_path):
+                    if rel_path in remote_manifest:
+                        # Synced before it was excluded: take it off the remote too
+                        remote.delete(rel_path)
+                        stats['deleted_remote'].append(rel_path)
+                    continue
+                l_entry, r_entry, b_entry = local.get(rel_path), remote_manifest.get(rel_path), base.get(rel_path)
+                l_hash = l_entry and l_entry['hash']
+                r_hash = r_entry and r_entry['hash']
+                b_hash = b_entry and b_entry['hash']
+
+                items_key = item_key_for(rel_path)
+                if l_hash == r_hash:
+                    if l_entry:
+                        result[rel_path] = l_entry
+                        if items_key:
+                            item_bases[rel_path] = json.loads(self._read_local(rel_path))
+                    continue
+
+                if items_key and l_entry and r_entry and l_hash != b_hash and r_hash != b_hash:
+                    merged, data = self._merge_item_file(remote, rel_path, items_key, l_entry, r_entry, stats)
+                    item_bases[rel_path] = merged
+                    result[rel_path] = {'hash': _digest(data), 'size': len(data)}
+                    continue
+
+                if l_hash != b_hash and r_hash == b_hash:
+                    # Changed (or deleted) only here
+                    if l_entry:
+                        data = self._read_local(rel_path)
+                        self._push(remote, rel_path, data, bool(r_entry), stats)
+                        result[rel_path] = l_entry
+                    else:
+                        remote.delete(rel_path)
+                        stats['deleted_remote'].append(rel_path)
+                elif r_hash != b_hash and l_hash == b_hash:
+                    # Changed (or deleted) only on the remote
+                    if r_entry:
+                        self._pull(remote, rel_path, bool(l_entry), stats)
+                        result[rel_path] = r_entry
+                    else:
+                        os.remove(self._local_path(rel_path))
+                        stats['deleted_local'].append(rel_path)
+                else:
+                    # Both sides changed: the larger hash wins on every machine,
+                    # a deleted side loses to an edited one.
+                    winner_is_local = r_hash is None or (l_hash is not None and l_hash > r_hash)
+                    stats['conflicts'].append(rel_path)
+                    if winner_is_local:
+                        data = self._read_local(rel_path)
+                        self._push(remote, rel_path, data, bool(r_entry), stats)
+                        result[rel_path] = l_entry
+                    else:
+                        if l_entry:
+                            stem, ext = os.path.splitext(rel_path)
+                            self._write_local(f"{stem}.conflict-{l_hash[:8]}{ext}", self._read_local(rel_path))
+                        self._pull(remote, rel_path, bool(l_entry), stats)
+                        result[rel_path] = r_entry
+                if items_key and rel_path in result:
+                    item_bases[rel_path] = json.loads(self._read_local(rel_path))
+
+            remote.put_manifest(result)
+            self._save_meta("base_manifest.json", result)
+            self._save_meta("item_bases.json", item_bases)
+            return stats
+
+
+if __name__ == '__main__':
+    # Stand-in remote: python sync_engine.py serve <dir> [port] [token] [host]
+    # Loopback only unless a host is given; without a token one is generated (see the printed URL).
+    if len(sys.argv) >= 3 and sys.argv[1] == 'serve':
+        server = SyncServer(sys.argv[2], host=sys.argv[5] if len(sys.argv) > 5 else '127.0.0.1',
+                            port=int(sys.argv[3]) if len(sys.argv) > 3 else 8765,
+                            token=sys.argv[4] if len(sys.argv) > 4 else '')
+        print(f"Serving {sys.argv[2]} at {server.url}")
+        server.serve_forever()
+    else:
+        print("Usage: python sync_engine.py serve <dir> [port] [token] [host]")
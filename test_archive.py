@@ -0,0 +1,167 @@
+import os
+import io
+import json
+import tarfile
+import hashlib
+import threading
+
+import pytest
+
+from archive import ARCHIVE_VERSION, ArchiveError, ArchiveManager
+from storage_manager import StorageManager
+
+
+class FakeWatcher:
+    def note_write(self, path):
+        pass
+
+
+class FakeApi:
+    def __init__(self, root):
+        self.root = str(root)
+        os.makedirs(self.root, exist_ok=True)
+        self._watcher = FakeWatcher()
+        self._state_lock = threading.RLock()
+        self._storage = StorageManager(self)
+        self.progress = []
+
+    def _get_share_dir(self):
+        return self.root
+
+    def _push_archive_progress(self, event):
+        self.progress.append(event)
+
+    def log(self, message, level="INFO"):
+        pass
+
+
+def _write(root, rel_path, data):
+    path = os.path.join(root, *rel_path.split('/'))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def _read(root, rel_path):
+    with open(os.path.join(root, *rel_path.split('/')), 'rb') as f:
+        return f.read()
+
+
+def _files(root):
+    found = {}
+    for dirpath, dirnames, filenames in os.walk(root):
+        for name in filenames:
+            path = os.path.join(dirpath, name)
+            found[os.path.relpath(path, root).replace(os.sep, '/')] = _read(root, os.path.relpath(path, root))
+    return found
+
+
+CONFIG = json.dumps({'desktop_items': [{'id': 1, 'src': 'assets/used.png'}]}).encode()
+
+
+@pytest.fixture
+def source(tmp_path):
+    api = FakeApi(tmp_path / "source")
+    _write(api.root, "config.json", CONFIG)
+    _write(api.root, "workspaces/ws-2.json", b'{"items": []}' * 1000)
+    _write(api.root, "assets/used.png", os.urandom(300 * 1024))
+    _write(api.root, "assets/rec-1.webm", os.urandom(1000))
+    _write(api.root, "assets/unused.png", b"not referenced")
+    _write(api.root, "extensions/hello/main.py", b"print('hi')")
+    _write(api.root, "cache/thumbs/a.jpg", b"cache")
+    _write(api.root, "chomka.log", b"log")
+    return api
+
+
+def test_round_trip_copies_state_and_referenced_assets(source, tmp_path):
+    dest = str(tmp_path / "desk.tar")
+    result = ArchiveManager(source).export(dest)
+    assert result['files'] == 4
+
+    target = FakeApi(tmp_path / "target")
+    stats = ArchiveManager(target).import_(dest)
+    assert stats['written'] == 4
+    assert _files(target.root) == {rel: _read(source.root, rel) for rel in (
+        "config.json", "workspaces/ws-2.json", "assets/used.png", "assets/rec-1.webm")}
+    assert target.progress[-1]['done'] == target.progress[-1]['total']
+
+    # Importing again finds every asset already present
+    assert ArchiveManager(target).import_(dest)['skipped'] == 2
+
+
+def test_identical_assets_are_copied_locally(source, tmp_path):
+    dest = str(tmp_path / "desk.tar")
+    ArchiveManager(source).export(dest)
+    target = FakeApi(tmp_path / "target")
+    _write(target.root, "assets/renamed.png", _read(source.root, "assets/used.png"))
+    stats = ArchiveManager(target).import_(dest)
+    assert stats['copied'] == 1
+    assert _read(target.root, "assets/used.png") == _read(source.root, "assets/used.png")
+
+
+def test_truncated_archive_leaves_the_state_alone(source, tmp_path):
+    dest = str(tmp_path / "desk.tar")
+    ArchiveManager(source).export(dest)
+    with open(dest, 'rb') as f:
+        data = f.read()
+
+    target = FakeApi(tmp_path / "target")
+    _write(target.root, "config.json", b'{"desktop_items": []}')
+    with tarfile.open(dest) as tar:
+        last = tar.getmembers()[-1]
+    # Inside the first asset, inside the last state file, and right after its header
+    for cut in (len(data) // 3, last.offset_data + last.size // 2, last.offset_data):
+        with open(dest, 'wb') as f:
+            f.write(data[:cut])
+        with pytest.raises((ArchiveError, tarfile.TarError, EOFError)):
+            ArchiveManager(target).import_(dest)
+        assert _read(target.root, "config.json") == b'{"desktop_items": []}'
+        assert not [rel for rel in _files(target.root) if rel.endswith(".tmp")]
+
+
+def _archive(path, files, manifest_files=None):
+    """Hand-built archive: files is [(member name, manifest entry, data)]."""
+    manifest = {'version': ARCHIVE_VERSION, 'created': 0,
+                'files': manifest_files if manifest_files is not None else [entry for _, entry, _ in files]}
+    with tarfile.open(path, 'w') as tar:
+        for name, data in [('manifest.json', json.dumps(manifest).encode())] + [(n, d) for n, _, d in files]:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+
+
+def _entry(rel, data, kind='state'):
+    return {'path': rel, 'kind': kind, 'size': len(data), 'sha256': hashlib.sha256(data).hexdigest(), 'member': rel}
+
+
+@pytest.mark.parametrize("rel, kind", [
+    ("extensions/evil/main.py", 'state'),
+    ("cache/atlas/user.json", 'state'),
+    ("assets/x.png", 'state'),
+    ("config.json", 'asset'),
+])
+def test_import_rejects_paths_it_may_not_write(tmp_path, rel, kind):
+    path = str(tmp_path / "bad.tar")
+    _archive(path, [(rel, _entry(rel, b"data", kind), b"data")])
+    target = FakeApi(tmp_path / "target")
+    with pytest.raises(ArchiveError, match="may not write"):
+        ArchiveManager(target).import_(path)
+    assert _files(target.root) == {}
+
+
+def test_import_rejects_unsafe_names_and_bad_checksums(tmp_path):
+    target = FakeApi(tmp_path / "target")
+    path = str(tmp_path / "bad.tar")
+    _archive(path, [("../escape.json", _entry("../escape.json", b"x"), b"x")])
+    with pytest.raises(ArchiveError, match="Unsafe"):
+        ArchiveManager(target).import_(path)
+
+    entry = _entry("config.json", b"{}")
+    _archive(path, [("config.json", entry, b"[]")])
+    with pytest.raises(ArchiveError, match="Checksum"):
+        ArchiveManager(target).import_(path)
+
+    _archive(path, [("config.json", entry, b"{}")], manifest_files=[entry, _entry("notes.json", b"{}")])
+    with pytest.raises(ArchiveError, match="truncated"):
+        ArchiveManager(target).import_(path)
+    assert _files(target.root) == {}
@@ -0,0 +1,192 @@
+import os
+import json
+import base64
+import threading
+
+import pytest
+
+import jobs
+from jobs import JobManager
+
+
+class FakeWatcher:
+    def __init__(self):
+        self.items = {}
+
+    def note_write(self, path):
+        pass
+
+    def read_items(self, workspace):
+        return self.items.get(workspace, [])
+
+
+class FakeApi:
+    _window = None
+
+    def __init__(self, root):
+        self.root = str(root)
+        os.makedirs(self.root, exist_ok=True)
+        self._watcher = FakeWatcher()
+        self.logs = []
+
+    def _get_share_dir(self):
+        return self.root
+
+    def _write_atomic(self, path, content, is_binary=False):
+        with open(path, 'wb' if is_binary else 'w') as f:
+            f.write(content)
+
+    def log(self, message, level="INFO"):
+        self.logs.append(message)
+
+
+@pytest.fixture
+def api(tmp_path):
+    return FakeApi(tmp_path / "data")
+
+
+@pytest.fixture
+def manager(api):
+    manager = JobManager(api)
+    yield manager
+    manager.shutdown()
+
+
+@pytest.fixture
+def source(tmp_path, monkeypatch):
+    # Small chunks so a few hundred KB make many checkpoints
+    monkeypatch.setattr(jobs, "CHUNK", 4096)
+    monkeypatch.setattr(jobs, "CHECKPOINT_BYTES", 4 * 4096)
+    path = tmp_path / "picked.png"
+    path.write_bytes(os.urandom(300 * 1024))
+    return str(path)
+
+
+def _run(manager, kind, args):
+    job = manager.start(kind, args)
+    assert job.wait(10)
+    return job
+
+
+def _asset(api, rel_path):
+    with open(os.path.join(api.root, *rel_path.split('/')), 'rb') as f:
+        return f.read()
+
+
+def test_copy_file_copies_and_forgets_its_checkpoint(api, manager, source):
+    job = _run(manager, 'copy_file', {'src': source, 'prefix': 'user'})
+    assert job.state == 'done'
+    with open(source, 'rb') as f:
+        assert _asset(api, job.result['path']) == f.read()
+    assert os.listdir(os.path.join(api.root, "jobs")) == []
+
+
+def _interrupted_copy(api, source, offset, mtime=None):
+    """Leaves a checkpoint and a partial copy as a quit during copy_file would."""
+    name = "user_resumed.png"
+    os.makedirs(os.path.join(api.root, "assets"), exist_ok=True)
+    with open(source, 'rb') as f:
+        partial = f.read(offset)
+    with open(os.path.join(api.root, "assets", name + ".tmp"), 'wb') as f:
+        f.write(partial)
+    os.makedirs(os.path.join(api.root, "jobs"), exist_ok=True)
+    record = {'id': 'abc123', 'kind': 'copy_file', 'args': {'src': source, 'prefix': 'user'},
+              'checkpoint': {'name': name, 'offset': offset, 'mtime': mtime or os.stat(source).st_mtime}}
+    with open(os.path.join(api.root, "jobs", "abc123.json"), 'w') as f:
+        json.dump(record, f)
+
+
+def test_interrupted_copy_resumes_at_its_checkpoint(api, manager, source):
+    _interrupted_copy(api, source, 64 * 1024)
+    assert manager.resume() == ['abc123']
+    job = manager.get('abc123')
+    assert job.wait(10) and job.state == 'done' and job.resumed
+    assert any("Resuming copy" in line and "at 65536" in line for line in api.logs)
+    with open(source, 'rb') as f:
+        assert _asset(api, "assets/user_resumed.png") == f.read()
+    assert os.listdir(os.path.join(api.root, "jobs")) == []
+
+
+def test_changed_source_starts_the_copy_over(api, manager, source):
+    _interrupted_copy(api, source, 64 * 1024, mtime=1.0)
+    with open(os.path.join(api.root, "assets", "user_resumed.png.tmp"), 'r+b') as f:
+        f.write(b"stale" * 100)
+    manager.resume()
+    job = manager.get('abc123')
+    assert job.wait(10) and job.state == 'done'
+    assert not any("Resuming copy" in line for line in api.logs)
+    with open(source, 'rb') as f:
+        assert _asset(api, "assets/user_resumed.png") == f.read()
+
+
+def test_unreadable_checkpoints_are_dropped(api, manager):
+    os.makedirs(os.path.join(api.root, "jobs"))
+    with open(os.path.join(api.root, "jobs", "broken.json"), 'w') as f:
+        f.write("{")
+    assert manager.resume() == []
+    assert os.listdir(os.path.join(api.root, "jobs")) == []
+
+
+def _blocking(manager, kind, resumable=False):
+    """Registers a job kind that runs until released, checkpointing as it goes."""
+    release, started = threading.Event(), threading.Semaphore(0)
+
+    def handler(api, job):
+        job.save_checkpoint(step=1)
+        started.release()
+        while not release.wait(0.01):
+            job.progress(1, 2)
+        return {'ok': True}
+    manager.register(kind, handler, resumable=resumable)
+    return release, started
+
+
+def test_limits_queue_jobs_of_a_kind(manager):
+    release, started = _blocking(manager, 'slow')
+    first, second = manager.start('slow'), manager.start('slow')
+    assert started.acquire(timeout=5)
+    assert (first.state, second.state) == ('running', 'queued')
+    release.set()
+    assert first.wait(5) and second.wait(5)
+    assert (first.state, second.state) == ('done', 'done')
+
+
+def test_cancel_running_and_queued_jobs(manager):
+    release, started = _blocking(manager, 'slow')
+    running, queued = manager.start('slow'), manager.start('slow')
+    assert started.acquire(timeout=5)
+    assert manager.cancel(queued.id) and queued.state == 'cancelled'
+    assert manager.cancel(running.id)
+    assert running.wait(5) and running.state == 'cancelled'
+    assert not manager.cancel(running.id)
+
+
+def test_shutdown_keeps_checkpoints_of_unfinished_jobs(api, manager):
+    release, started = _blocking(manager, 'slow', resumable=True)
+    job = manager.start('slow', {'label': 'long'})
+    assert started.acquire(timeout=5)
+    manager.shutdown()
+    # Cut short after the shutdown, as the process exiting would
+    manager.cancel(job.id)
+    assert job.wait(5) and job.state == 'cancelled'
+    with open(os.path.join(api.root, "jobs", f"{job.id}.json")) as f:
+        assert json.load(f)['checkpoint'] == {'step': 1}
+
+
+def test_save_asset_and_migrate_assets(api, manager):
+    png = b"\x89PNG" + os.urandom(5000)
+    uri = "data:image/png;base64," + base64.b64encode(png).decode()
+    job = _run(manager, 'save_asset', {'data': uri, 'id': 'note'})
+    assert job.result['path'].endswith(".png") and _asset(api, job.result['path']) == png
+
+    api._watcher.items['main'] = [
+        {'id': 'img', 'type': 'image', 'src': uri},
+        {'id': 'dir', 'type': 'folder', 'tabs': [{'type': 'image', 'url': uri}, {'type': 'link', 'url': 'x'}]},
+    ]
+    first = _run(manager, 'migrate_assets', {'workspace': 'main'}).result
+    assert _asset(api, first['paths']['img']) == png
+    assert first['tabs'] == [{'folder': 'dir', 'index': 0, 'length': len(uri), 'path': first['tabs'][0]['path']}]
+    # Names come from the content: a repeated run writes nothing new
+    count = len(os.listdir(os.path.join(api.root, "assets")))
+    assert _run(manager, 'migrate_assets', {'workspace': 'main'}).result == first
+    assert len(os.listdir(os.path.join(api.root, "assets"))) == count
@@ -0,0 +1,102 @@
+import random
+
+import pytest
+
+from search_index import LABEL_BONUS, SearchIndex, item_label, tokenize
+
+
+class FakeWorkspaces:
+    def index(self):
+        return {'workspaces': []}
+
+
+class FakeApi:
+    def __init__(self):
+        self._workspaces = FakeWorkspaces()
+
+    def log(self, message, level="INFO"):
+        pass
+
+
+WORDS = ["alpha", "alpine", "beta", "betamax", "gamma", "delta", "notes", "news", "net", "music", "mu"]
+
+
+def _random_items(rng, count):
+    items = []
+    for i in range(count):
+        item = {'id': i, 'type': rng.choice(['note', 'folder', 'app'])}
+        item['name'] = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(1, 3)))
+        if rng.random() < 0.5:
+            item['url'] = f"https://{rng.choice(WORDS)}.example/{rng.choice(WORDS)}"
+        if rng.random() < 0.3:
+            item['text'] = ' '.join(rng.choice(WORDS) for _ in range(5))
+        if item['type'] == 'folder':
+            item['tabs'] = [{'title': rng.choice(WORDS), 'url': ''}]
+        items.append(item)
+    return items
+
+
+def _brute_force(index, query, limit):
+    """Scores every doc: the ranking search() must reproduce without doing so."""
+    tokens = tokenize(query)
+    expansions = [index._expand(token, pos == len(tokens) - 1) for pos, token in enumerate(tokens)]
+    if not all(expansions):
+        return []
+    needle = query.strip().lower()
+    ranked = []
+    for key, doc in index._docs.items():
+        score = index._score(key, expansions)
+        if score is None:
+            continue
+        if doc['meta']['label'].lower().startswith(needle):
+            score = round(score + LABEL_BONUS, 6)
+        ranked.append((-score, len(doc['meta']['label']), key))
+    return [key for _, _, key in sorted(ranked)[:limit]]
+
+
+@pytest.fixture(scope="module")
+def index():
+    index = SearchIndex(FakeApi())
+    rng = random.Random(3)
+    index.sync_items('main', _random_items(rng, 1500))
+    index.sync_items('ws-2', _random_items(rng, 300))
+    return index
+
+
+@pytest.mark.parametrize("query", ["a", "al", "alpha", "bet", "eta", "notes n", "net", "mu", "alpha be",
+                                   "gamma delta", "music alpha n", "zzz", "alpha zzz"])
+@pytest.mark.parametrize("limit", [1, 5, 20])
+def test_ranking_matches_brute_force(index, query, limit):
+    results = index.search(query, limit)
+    assert [(r['workspace'], str(r['id'])) for r in results] == _brute_force(index, query, limit)
+
+
+def test_label_hits_outrank_text_hits():
+    index = SearchIndex(FakeApi())
+    index.sync_items('main', [
+        {'id': 1, 'type': 'note', 'text': 'groceries'},
+        {'id': 2, 'type': 'app', 'name': 'Groceries'},
+    ])
+    assert [r['id'] for r in index.search('groc')] == [2, 1]
+
+
+def test_edits_and_removals_are_reindexed():
+    index = SearchIndex(FakeApi())
+    index.sync_items('main', [{'id': 1, 'name': 'Old name'}, {'id': 2, 'name': 'Other'}])
+    assert index.sync_items('main', [{'id': 1, 'name': 'New name'}]) == (1, 1)
+    assert index.search('old') == []
+    assert [r['id'] for r in index.search('new')] == [1]
+    assert index.search('other') == []
+    assert 'old' not in index._vocab and 'other' not in index._postings
+
+
+def test_drop_workspace_forgets_its_docs():
+    index = SearchIndex(FakeApi())
+    index.sync_items('ws-2', [{'id': 1, 'name': 'Music'}])
+    index.drop_workspace('ws-2')
+    assert index.search('music') == []
+
+
+def test_item_label_falls_back_to_first_text_line():
+    assert item_label({'type': 'note', 'text': '\n  First line\nsecond'}) == 'First line'
+    assert item_label({'type': 'note'}) == 'note'
@@ -0,0 +1,105 @@
+import os
+import json
+import time
+import shutil
+
+import pytest
+
+import storage_manager
+from storage_manager import QUARANTINE_SECONDS, StorageManager
+
+
+class FakeWatcher:
+    def note_write(self, path):
+        pass
+
+
+class FakeApi:
+    def __init__(self, root):
+        self.root = str(root)
+        self._watcher = FakeWatcher()
+
+    def _get_share_dir(self):
+        return self.root
+
+    def _write_atomic(self, path, content, is_binary=False):
+        with open(path, 'wb' if is_binary else 'w') as f:
+            f.write(content)
+
+    def log(self, message, level="INFO"):
+        pass
+
+
+def _write(root, rel_path, data=b"x"):
+    path = os.path.join(root, *rel_path.split('/'))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+    return path
+
+
+@pytest.fixture
+def storage(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage_manager, "BATCH_PAUSE", 0)
+    root = str(tmp_path)
+    _write(root, "config.json", json.dumps({'desktop_items': [{'src': 'assets/used.png'}]}).encode())
+    _write(root, "workspaces/ws-2.json", json.dumps({'items': [{'text': 'see assets/in-note.png'}]}).encode())
+    for name in ("used.png", "in-note.png", "in-history.png", "unused.png", "rec-1.webm", "copy.tmp"):
+        _write(root, f"assets/{name}")
+    _write(root, "snapshots/objects/ab/cdef.json", json.dumps({'src': 'assets/in-history.png'}).encode())
+    return StorageManager(FakeApi(root))
+
+
+def test_sweep_quarantines_only_unreferenced_assets(storage, monkeypatch):
+    monkeypatch.setattr(storage_manager, "SWEEP_GRACE_SECONDS", -1)
+    assert storage.sweep_assets() == 1
+    assert sorted(os.listdir(os.path.join(storage.api.root, "assets"))) == [
+        "copy.tmp", "in-history.png", "in-note.png", "rec-1.webm", "used.png"]
+    assert [f['name'] for f in storage.list_quarantined()] == ["unused.png"]
+
+
+def test_fresh_copies_of_old_files_are_in_the_grace_window(storage, tmp_path):
+    # copy2 keeps the source's old mtime; the file only just arrived
+    source = _write(str(tmp_path / "elsewhere"), "old.png")
+    old = time.time() - 10 * 24 * 60 * 60
+    os.utime(source, (old, old))
+    shutil.copy2(source, os.path.join(storage.api.root, "assets", "picked.png"))
+    storage.sweep_assets()
+    assert os.path.exists(os.path.join(storage.api.root, "assets", "picked.png"))
+
+
+def test_restore_and_purge(storage, monkeypatch):
+    monkeypatch.setattr(storage_manager, "SWEEP_GRACE_SECONDS", -1)
+    storage.sweep_assets()
+    assert storage.restore_quarantined("../../unused.png") == "assets/unused.png"
+    assert os.path.exists(os.path.join(storage.api.root, "assets", "unused.png"))
+    with pytest.raises(FileNotFoundError):
+        storage.restore_quarantined("unused.png")
+
+    # Referenced again, then dropped: quarantined and eventually purged
+    storage.sweep_assets()
+    assert storage.purge_quarantine() == 0
+    assert storage.purge_quarantine(now=time.time() + QUARANTINE_SECONDS + 10) == 1
+    assert storage.list_quarantined() == []
+
+
+def test_cache_is_trimmed_least_recently_used_first(storage):
+    root = storage.api.root
+    for i, name in enumerate(("a.jpg", "b.jpg", "c.jpg")):
+        path = _write(root, f"cache/thumbs/{name}", b"x" * 100)
+        os.utime(path, (1000 + i, 1000 + i))
+    _write(root, "cache/palettes.json", b"x" * 1000)
+    storage.touch(os.path.join(root, "cache", "thumbs", "a.jpg"))
+    storage.cache_budget = 150
+
+    evicted, freed = storage.evict_cache()
+    assert (evicted, freed) == (2, 200)
+    assert sorted(os.listdir(os.path.join(root, "cache", "thumbs"))) == ["a.jpg"]
+    assert os.path.exists(os.path.join(root, "cache", "palettes.json"))
+
+
+def test_run_once_reports_usage(storage):
+    report = storage.run_once()
+    assert report['quarantined'] == 0
+    assert report['assets_bytes'] == 6
+    assert os.path.exists(os.path.join(storage.api.root, "cache", "storage_index.json"))
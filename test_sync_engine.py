@@ -0,0 +1,168 @@
+import os
+import json
+import random
+import urllib.error
+
+import pytest
+
+from sync_engine import (
+    BLOCK_SIZE, DELTA_MIN_SIZE, DirectoryRemote, HttpRemote, SyncEngine, SyncServer,
+    apply_delta, block_signature, compute_delta, decode_ops, delta_size, encode_ops,
+    merge_items, weak_checksum,
+)
+
+
+class FakeApi:
+    def __init__(self, root):
+        self.root = str(root)
+        os.makedirs(self.root, exist_ok=True)
+
+    def _get_share_dir(self):
+        return self.root
+
+    def _write_atomic(self, path, content, is_binary=False):
+        with open(path, 'wb' if is_binary else 'w') as f:
+            f.write(content)
+
+    def _save_coords_file(self, items):
+        pass
+
+
+def _roundtrip(old, new):
+    ops = compute_delta(new, block_signature(old))
+    assert apply_delta(old, ops) == new
+    return ops
+
+
+@pytest.fixture
+def data():
+    return random.Random(7).randbytes(BLOCK_SIZE * 8 + 123)
+
+
+def test_rolled_checksum_matches_recomputed(data):
+    # Rolling the window one byte at a time must agree with a fresh checksum
+    window = data[:BLOCK_SIZE]
+    a, b = weak_checksum(window)
+    for pos in range(1, 200):
+        out_byte, in_byte = data[pos - 1], data[pos + BLOCK_SIZE - 1]
+        a = (a - out_byte + in_byte) % 65521
+        b = (b - BLOCK_SIZE * out_byte + a) % 65521
+        assert (a, b) == weak_checksum(data[pos:pos + BLOCK_SIZE])
+
+
+def test_unchanged_data_is_all_copies(data):
+    ops = _roundtrip(data, data)
+    assert delta_size(ops) == 0
+
+
+def test_insert_at_start_reuses_every_block(data):
+    ops = _roundtrip(data, b"inserted" + data)
+    assert delta_size(ops) == len(b"inserted")
+
+
+def test_edit_in_the_middle_sends_about_one_block(data):
+    new = bytearray(data)
+    new[BLOCK_SIZE * 3 + 10:BLOCK_SIZE * 3 + 20] = b"x" * 10
+    ops = _roundtrip(data, bytes(new))
+    assert delta_size(ops) <= BLOCK_SIZE
+
+
+def test_short_tail_and_truncation(data):
+    # The window shrinks at the end of the data; the tail must still match
+    _roundtrip(data, data[BLOCK_SIZE // 2:])
+    _roundtrip(data, data[:-BLOCK_SIZE // 3])
+    _roundtrip(data, b"")
+    _roundtrip(b"", data)
+
+
+def test_encoded_ops_survive_json(data):
+    ops = compute_delta(b"head" + data, block_signature(data))
+    assert decode_ops(json.loads(json.dumps(encode_ops(ops)))) == ops
+
+
+def test_merge_items_keeps_both_sides_edits():
+    base = [{'id': 'a', 'x': 0}, {'id': 'b', 'x': 0}, {'id': 'c', 'x': 0}]
+    local = [{'id': 'a', 'x': 1}, {'id': 'b', 'x': 0}, {'id': 'c', 'x': 0}]
+    remote = [{'id': 'a', 'x': 0}, {'id': 'b', 'x': 2}, {'id': 'd', 'x': 0}]
+    merged = merge_items(base, local, remote)
+    assert merged == [{'id': 'a', 'x': 1}, {'id': 'b', 'x': 2}, {'id': 'd', 'x': 0}]
+
+
+def test_conflicts_resolve_the_same_way_on_both_machines():
+    base = [{'id': 'a', 'x': 0}]
+    one, two = [{'id': 'a', 'x': 1}], [{'id': 'a', 'x': 2}]
+    assert merge_items(base, one, two) == merge_items(base, two, one)
+
+
+def _write(root, rel_path, data):
+    path = os.path.join(root, *rel_path.split('/'))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def _read(root, rel_path):
+    with open(os.path.join(root, *rel_path.split('/')), 'rb') as f:
+        return f.read()
+
+
+def test_two_machines_meet_through_a_directory_remote(tmp_path):
+    remote = DirectoryRemote(str(tmp_path / "remote"))
+    one, two = SyncEngine(FakeApi(tmp_path / "one")), SyncEngine(FakeApi(tmp_path / "two"))
+    big = random.Random(1).randbytes(DELTA_MIN_SIZE * 2)
+    _write(one.api.root, "assets/big.bin", big)
+    _write(one.api.root, "config.json", json.dumps({'desktop_items': [{'id': 'a'}]}).encode())
+    one.sync(remote)
+    two.sync(remote)
+    assert _read(two.api.root, "assets/big.bin") == big
+
+    # A small edit of a large file travels as a delta
+    edited = big[:100] + b"changed" + big[107:]
+    _write(two.api.root, "assets/big.bin", edited)
+    stats = two.sync(remote)
+    assert stats['bytes_sent'] < len(big) // 4
+    one.sync(remote)
+    assert _read(one.api.root, "assets/big.bin") == edited
+
+    # Items added on both machines are merged per item
+    _write(one.api.root, "config.json", json.dumps({'desktop_items': [{'id': 'a'}, {'id': 'b'}]}).encode())
+    _write(two.api.root, "config.json", json.dumps({'desktop_items': [{'id': 'a'}, {'id': 'c'}]}).encode())
+    one.sync(remote)
+    two.sync(remote)
+    one.sync(remote)
+    for engine in (one, two):
+        ids = [item['id'] for item in json.loads(_read(engine.api.root, "config.json"))['desktop_items']]
+        assert sorted(ids) == ['a', 'b', 'c']
+
+
+def test_excluded_files_stay_local_and_leave_the_remote(tmp_path):
+    remote = DirectoryRemote(str(tmp_path / "remote"))
+    _write(str(tmp_path / "remote"), "credentials.json", b"{}")
+    remote.put_manifest({'credentials.json': {'hash': 'x', 'size': 2}})
+    engine = SyncEngine(FakeApi(tmp_path / "one"))
+    for rel_path in ("vault.dat", "credentials.json", "extensions/x/main.py", "cache/thumbs/a.jpg", "notes.txt"):
+        _write(engine.api.root, rel_path, b"local")
+    stats = engine.sync(remote)
+    assert stats['pushed'] == ['notes.txt']
+    assert stats['deleted_remote'] == ['credentials.json']
+    assert not os.path.exists(tmp_path / "remote" / "credentials.json")
+
+
+def test_sync_server_requires_its_token(tmp_path):
+    server = SyncServer(str(tmp_path / "served"))
+    server.start()
+    try:
+        host, port = server._httpd.server_address[:2]
+        with pytest.raises(urllib.error.HTTPError) as error:
+            HttpRemote(f"http://{host}:{port}/").patch("a.txt", [('data', b"x")])
+        assert error.value.code == 403
+        with pytest.raises(urllib.error.HTTPError):
+            HttpRemote(f"http://{host}:{port}/wrong-token").get_manifest()
+
+        remote = HttpRemote(server.url)
+        remote.write("notes/a.txt", b"hello")
+        assert remote.read("notes/a.txt") == b"hello"
+        remote.patch("notes/a.txt", compute_delta(b"hello world", remote.signature("notes/a.txt")))
+        assert _read(str(tmp_path / "served"), "notes/a.txt") == b"hello world"
+    finally:
+        server.stop()
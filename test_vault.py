@@ -0,0 +1,165 @@
+import os
+import json
+
+import pytest
+
+pytest.importorskip("cryptography")
+
+from vault import LEGACY_FILE, MAGIC, VAULT_FILE, Vault, VaultError, _LEN
+
+
+class FakeApi:
+    def __init__(self, root):
+        self.root = str(root)
+        os.makedirs(self.root, exist_ok=True)
+        self.logs = []
+
+    def _get_share_dir(self):
+        return self.root
+
+    def _write_atomic(self, path, content, is_binary=False):
+        with open(path + ".tmp", 'wb' if is_binary else 'w') as f:
+            f.write(content)
+        os.replace(path + ".tmp", path)
+
+    def log(self, message, level="INFO"):
+        self.logs.append((message, level))
+
+
+PASSWORD = "correct horse"
+
+
+@pytest.fixture
+def api(tmp_path):
+    return FakeApi(tmp_path)
+
+
+def _path(api):
+    return os.path.join(api.root, VAULT_FILE)
+
+
+def _split(api):
+    """(header bytes, [record frames]) of vault.dat."""
+    with open(_path(api), 'rb') as f:
+        data = f.read()
+    (length,) = _LEN.unpack_from(data, len(MAGIC))
+    offset = len(MAGIC) + _LEN.size + length
+    header, frames = data[:offset], []
+    while offset < len(data):
+        (length,) = _LEN.unpack_from(data, offset)
+        frames.append(data[offset:offset + _LEN.size + length])
+        offset += _LEN.size + length
+    return header, frames
+
+
+def _rewrite(api, header, frames, tail=b""):
+    with open(_path(api), 'wb') as f:
+        f.write(header + b"".join(frames) + tail)
+
+
+def _reopen(api):
+    vault = Vault(api)
+    vault.unlock(PASSWORD)
+    return vault
+
+
+@pytest.fixture
+def filled(api):
+    """A vault with three logins written as one batch (migrated) and two appends."""
+    with open(os.path.join(api.root, LEGACY_FILE), 'w') as f:
+        json.dump([{'service': f"site{i}", 'username': 'me', 'password': f"pw{i}"} for i in range(3)], f)
+    vault = Vault(api)
+    assert vault.unlock(PASSWORD)['migrated'] == 3
+    vault.add("Mail", "me@example.com", "secret")
+    vault.add("Bank", "me", "hunter2")
+    vault.lock()
+    return api
+
+
+def test_logins_survive_lock_and_unlock(filled):
+    assert not os.path.exists(os.path.join(filled.root, LEGACY_FILE))
+    vault = _reopen(filled)
+    result = vault.search("mail me")
+    assert result['total'] == 1 and result['count'] == 5
+    assert vault.password(result['entries'][0]['id']) == "secret"
+    assert [e['service'] for e in vault.search()['entries']][:2] == ["Bank", "Mail"]
+
+    assert vault.delete(result['entries'][0]['id'])
+    assert _reopen(filled).search("mail")['total'] == 0
+
+
+def test_wrong_password_and_locked_vault(filled):
+    vault = Vault(filled)
+    with pytest.raises(VaultError, match="Wrong master password"):
+        vault.unlock("wrong")
+    with pytest.raises(VaultError, match="locked"):
+        vault.search()
+
+
+def test_tampered_record_is_refused(filled):
+    header, frames = _split(filled)
+    damaged = bytearray(frames[1])
+    damaged[-1] ^= 1
+    _rewrite(filled, header, frames[:1] + [bytes(damaged)] + frames[2:])
+    with pytest.raises(VaultError, match="damaged"):
+        _reopen(filled)
+
+
+@pytest.mark.parametrize("edit", [
+    lambda frames: frames[:3] + frames[4:],  # a record dropped
+    lambda frames: frames[:3] + [frames[4], frames[3]],  # two records swapped
+    lambda frames: frames[:2],  # cut inside the first write, which ends on its third record
+])
+def test_dropped_moved_or_cut_records_are_refused(filled, edit):
+    header, frames = _split(filled)
+    _rewrite(filled, header, edit(frames))
+    with pytest.raises(VaultError, match="damaged"):
+        _reopen(filled)
+
+
+def test_records_of_another_vault_are_refused(filled, tmp_path):
+    other = FakeApi(tmp_path / "other")
+    vault = Vault(other)
+    vault.unlock(PASSWORD)
+    vault.add("Other", "me", "pw")
+    header, frames = _split(filled)
+    _rewrite(filled, header, frames + _split(other)[1])
+    with pytest.raises(VaultError, match="damaged"):
+        _reopen(filled)
+
+
+@pytest.mark.parametrize("tail", ["half", "zeros"])
+def test_torn_last_append_is_dropped(filled, tail):
+    header, frames = _split(filled)
+    extra = frames[-1][:len(frames[-1]) // 2] if tail == "half" else b"\0" * 40
+    _rewrite(filled, header, frames, extra)
+    vault = _reopen(filled)
+    assert vault.search()['count'] == 5
+    assert os.path.getsize(_path(filled)) == len(header) + sum(map(len, frames))
+    # Appends go after the last good record
+    vault.add("After", "me", "pw")
+    assert _reopen(filled).search()['count'] == 6
+
+
+def test_unbounded_kdf_cost_is_refused_before_deriving(api):
+    header = Vault._header(os.urandom(16), os.urandom(32), cost=(2 ** 30, 8, 1))
+    with open(_path(api), 'wb') as f:
+        f.write(header)
+    with pytest.raises(VaultError, match="unsupported KDF cost"):
+        Vault(api).unlock(PASSWORD)
+
+
+def test_replaced_file_locks_the_vault(filled, tmp_path):
+    vault = _reopen(filled)
+    other = FakeApi(tmp_path / "other")
+    Vault(other).unlock(PASSWORD)
+    os.replace(_path(other), _path(filled))
+    with pytest.raises(VaultError, match="replaced"):
+        vault.search()
+    assert not vault.unlocked
+
+
+def test_appends_from_another_process_are_read(filled):
+    first, second = _reopen(filled), _reopen(filled)
+    entry = second.add("Shared", "me", "pw")
+    assert first.password(entry['id']) == "pw"
@@ -0,0 +1,121 @@
+import os
+import io
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+THUMB_SIZES = (96, 160, 320)  # longest side in pixels; requests round up to one of these
+THUMB_DIR = os.path.join("cache", "thumbs")
+QUALITY = 80
+MAX_REMOTE_BYTES = 20 * 1024 * 1024
+WAIT_TIMEOUT = 30
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+
+
+def _size_bucket(size):
+    for bucket in THUMB_SIZES:
+        if size <= bucket:
+            return bucket
+    return THUMB_SIZES[-1]
+
+
+def make_thumbnail(source, base, size):
+    """Decodes a reduced version of source (path or file object) into base.jpg, or base.png if
+    it has transparency. Returns the path written."""
+    from PIL import Image, ImageOps
+    with Image.open(source) as img:
+        img.draft('RGB', (size * 2, size * 2))  # JPEGs decode at a fraction of full size
+        img = ImageOps.exif_transpose(img)
+        img.thumbnail((size, size), Image.Resampling.LANCZOS)
+        has_alpha = img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info)
+        img = img.convert('RGBA' if has_alpha else 'RGB')
+        out_path = base + ('.png' if has_alpha else '.jpg')
+        tmp_path = out_path + ".tmp"
+        if has_alpha:
+            img.save(tmp_path, 'PNG', optimize=True)
+        else:
+            img.save(tmp_path, 'JPEG', quality=QUALITY, optimize=True)
+    os.replace(tmp_path, out_path)
+    return out_path
+
+
+class ThumbnailCache:
+    """Small previews of folder images in <data>/cache/thumbs.
+
+    Thumbnails are named after the source (path + size + mtime, or URL) so a
+    changed file gets a new one; the storage manager evicts old ones with the
+    rest of the cache. At most two images are decoded at once however many
+    rows ask, and concurrent requests for the same image share one decode.
+    """
+
+    def __init__(self, api):
+        self.api = api
+        self._worker = ThreadPoolExecutor(max_workers=2, thread_name_prefix='chomka-thumbs')
+        self._lock = threading.Lock()
+        self._pending = {}  # thumbnail path -> future
+        self._failed = set()
+
+    def _dir(self):
+        return os.path.join(self.api._get_share_dir(), THUMB_DIR)
+
+    def _key(self, url):
+        """(cache key, local source path or None) for url."""
+        if url.startswith('http://') or url.startswith('https://'):
+            return hashlib.sha1(url.encode('utf-8')).hexdigest()[:24], None
+        root = os.path.realpath(self.api._get_share_dir())
+        path = os.path.realpath(os.path.join(root, url))
+        if os.path.commonpath([root, path]) != root:
+            raise ValueError(f"Not in the data folder: {url}")
+        st = os.stat(path)
+        digest = hashlib.sha1(f"{url}|{st.st_size}|{st.st_mtime_ns}".encode('utf-8')).hexdigest()[:24]
+        return digest, path
+
+    def _existing(self, base):
+        for ext in ('.jpg', '.png'):
+            if os.path.exists(base + ext):
+                return base + ext
+        return None
+
+    def get(self, url, size=160):
+        """Relative path of a thumbnail of url (assets/... or http(s)), made on first request."""
+        if url.startswith('data:'):
+            raise ValueError("Inline images have no thumbnails; move them to assets first")
+        size = _size_bucket(int(size))
+        key, source = self._key(url)
+        base = os.path.join(self._dir(), f"{key}-{size}")
+        found = self._existing(base)
+        if found is None:
+            if base in self._failed:
+                raise ValueError(f"Could not make a thumbnail of {url}")
+            with self._lock:
+                future = self._pending.get(base)
+                if future is None:
+                    future = self._worker.submit(self._make, url, source, base, size)
+                    self._pending[base] = future
+                    future.add_done_callback(lambda f: self._pending.pop(base, None))
+            found = future.result(timeout=WAIT_TIMEOUT)
+        self.api._storage.touch(found)
+        return os.path.relpath(found, self.api._get_share_dir()).replace(os.sep, '/')
+
+    def _make(self, url, source, base, size):
+        os.makedirs(self._dir(), exist_ok=True)
+        try:
+            if source is None:
+                from urllib.request import Request, urlopen
+                with urlopen(Request(url, headers={'User-Agent': USER_AGENT}), timeout=10) as response:
+                    data = response.read(MAX_REMOTE_BYTES + 1)
+                if len(data) > MAX_REMOTE_BYTES:
+                    raise ValueError("image too large")
+                source = io.BytesIO(data)
+            return make_thumbnail(source, base, size)
+        except Exception as e:
+            self._failed.add(base)
+            self.api.log(f"[Thumbnails] Could not make a thumbnail of {url[:120]}: {e}", "WARNING")
+            raise
+
+    def reset(self):
+        with self._lock:
+            self._failed.clear()
+
+    def shutdown(self):
+        self._worker.shutdown(wait=False)
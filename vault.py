@@ -0,0 +1,433 @@
+import os
+import hmac
+import json
+import time
+import uuid
+import struct
+import hashlib
+import threading
+
+VAULT_FILE = "vault.dat"
+LEGACY_FILE = "credentials.json"
+MAGIC = b"CHVAULT1"
+# scrypt cost: 32 MB and about 0.1 s per unlock; stored in the header so it can be raised later
+KDF_N = 2 ** 15
+KDF_R = 8
+KDF_P = 1
+# Highest cost a header may ask for; the header can't be authenticated before the key exists
+MAX_KDF_N = 2 ** 20
+MAX_KDF_R = 16
+MAX_KDF_P = 4
+MAX_KDF_MEMORY = 1024 ** 3  # scrypt needs 128 * n * r bytes
+NONCE_SIZE = 12
+TAG_SIZE = 16
+CHECK_LABEL = b"chomka-vault-check"
+# Compact once this many records are dead and they outnumber the live ones
+COMPACT_MIN_DEAD = 64
+SEARCH_LIMIT = 200
+_LEN = struct.Struct(">I")
+_AAD = struct.Struct(">QB")  # record sequence number, FINAL flag
+# Set on the last record of each write; a file must end on one
+FINAL = 1
+
+
+class VaultError(Exception):
+    pass
+
+
+def check_cost(n, r, p):
+    """Refuses scrypt parameters that would take unbounded memory or time."""
+    if not all(type(v) is int and v > 0 for v in (n, r, p)):
+        raise VaultError("Damaged vault header: bad KDF cost")
+    if n < 2 or n & (n - 1) or n > MAX_KDF_N or r > MAX_KDF_R or p > MAX_KDF_P or 128 * n * r > MAX_KDF_MEMORY:
+        raise VaultError(f"Vault asks for an unsupported KDF cost (n={n}, r={r}, p={p})")
+
+
+def derive_keys(password, salt, n=KDF_N, r=KDF_R, p=KDF_P):
+    """(encryption key, key-check key) from the master password."""
+    material = hashlib.scrypt(password.encode('utf-8'), salt=salt, n=n, r=r, p=p,
+                              maxmem=256 * n * r, dklen=64)
+    return material[:32], material[32:]
+
+
+def _aead(key):
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+    return AESGCM(key)
+
+
+def _associated(header_hash, seq, flags):
+    """Ties a record to its vault and its place in it, so records can't be dropped or moved."""
+    return header_hash + _AAD.pack(seq, flags)
+
+
+def seal(cipher, header_hash, seq, flags, plaintext):
+    """flags + nonce + AES-GCM ciphertext and tag."""
+    nonce = os.urandom(NONCE_SIZE)
+    return bytes([flags]) + nonce + cipher.encrypt(nonce, plaintext, _associated(header_hash, seq, flags))
+
+
+def open_sealed(cipher, header_hash, seq, blob):
+    """(flags, plaintext) of the record at position seq."""
+    from cryptography.exceptions import InvalidTag
+    if len(blob) < 1 + NONCE_SIZE + TAG_SIZE:
+        raise VaultError("Record too short")
+    flags, nonce = blob[0], blob[1:1 + NONCE_SIZE]
+    try:
+        return flags, cipher.decrypt(nonce, blob[1 + NONCE_SIZE:], _associated(header_hash, seq, flags))
+    except InvalidTag:
+        raise VaultError("Record failed authentication")
+
+
+class Vault:
+    """Encrypted store of Passkeeper logins in <data>/vault.dat.
+
+    The file is a header (KDF salt and cost, key check) followed by
+    length-prefixed records, each one put or delete sealed on its own with
+    AES-GCM, so adding or deleting a login appends one record instead of
+    rewriting the vault. Each record is bound to the header and to its
+    sequence number, and the last record of every write is flagged FINAL:
+    records that were removed, reordered or taken from another vault fail
+    authentication, and a file has to end on a FINAL record. Only a torn
+    last append is dropped. Rolling the whole file back to an earlier
+    version (like restoring an old copy) can't be told from the file alone.
+    The key is derived once at unlock and kept until lock(); the
+    decrypted logins stay in memory with a lower-cased service/username
+    index for search. Dead records are dropped by rewriting the file once
+    they outnumber the live ones.
+
+    Archive import (or another program) can replace vault.dat while it is
+    unlocked, so every operation first compares the file's size, mtime and
+    inode with what was last read or written. A changed file with the same header
+    (same salt and keys) is read again; anything else locks the vault.
+    """
+
+    def __init__(self, api):
+        self.api = api
+        self._lock = threading.Lock()
+        self._cipher = None
+        self._entries = {}  # id -> entry, insertion order = oldest first
+        self._index = {}  # id -> "service\nusername", lower-cased
+        self._dead = 0
+        self._size = 0  # bytes of the file known to be good
+        self._seq = 0  # sequence number of the next record
+        self._header_bytes = None
+        self._header_hash = None
+        self._stat = None  # (size, mtime_ns, inode) after our last read or write
+
+    def _path(self):
+        return os.path.join(self.api._get_share_dir(), VAULT_FILE)
+
+    def _legacy_path(self):
+        return os.path.join(self.api._get_share_dir(), LEGACY_FILE)
+
+    @property
+    def unlocked(self):
+        return self._cipher is not None
+
+    def status(self):
+        return {
+            'exists': os.path.exists(self._path()),
+            'unlocked': self.unlocked,
+            'count': len(self._entries) if self.unlocked else None,
+            'legacy': os.path.exists(self._legacy_path()),
+        }
+
+    # --- Lock / unlock ---
+
+    def unlock(self, password):
+        """Opens the vault, creating it (and moving credentials.json in) on first use."""
+        if not password:
+            raise VaultError("Enter the master password")
+        with self._lock:
+            started = time.monotonic()
+            path = self._path()
+            migrated = 0
+            if os.path.exists(path):
+                self._load(path, password)
+            else:
+                migrated = self._create(path, password)
+            self.api.log(f"[Vault] Unlocked {len(self._entries)} logins in {time.monotonic() - started:.2f} s"
+                         + (f", moved {migrated} from {LEGACY_FILE}" if migrated else ""))
+            return {'count': len(self._entries), 'migrated': migrated}
+
+    def lock(self):
+        with self._lock:
+            self._clear()
+
+    def _clear(self):
+        self._cipher = None
+        self._entries = {}
+        self._index = {}
+        self._dead = 0
+        self._size = 0
+        self._seq = 0
+        self._header_bytes = None
+        self._header_hash = None
+        self._stat = None
+
+    def _open(self, cipher, header):
+        """Starts an empty unlocked state for the vault with this header."""
+        self._clear()
+        self._cipher = cipher
+        self._header_bytes = header
+        self._header_hash = hashlib.sha256(header).digest()
+
+    @staticmethod
+    def _file_id(st):
+        return st.st_size, st.st_mtime_ns, st.st_ino
+
+    @staticmethod
+    def _header(salt, check, cost=(KDF_N, KDF_R, KDF_P)):
+        n, r, p = cost
+        header = json.dumps({'version': 1, 'kdf': 'scrypt', 'n': n, 'r': r, 'p': p, 'cipher': 'aes-256-gcm',
+                             'salt': salt.hex(), 'check': check.hex()}).encode('utf-8')
+        return MAGIC + _LEN.pack(len(header)) + header
+
+    def _write_all(self, path):
+        """Writes the header and one put per live login, replacing the file."""
+        records = [{'op': 'put', **entry} for entry in self._entries.values()]
+        data = self._header_bytes + self._frames(records, 0)
+        self.api._write_atomic(path, data, is_binary=True)
+        self._seq = len(records)
+        self._size = len(data)
+        self._stat = self._file_id(os.stat(path))
+
+    def _create(self, path, password):
+        salt = os.urandom(16)
+        keys = derive_keys(password, salt)
+        check = hmac.new(keys[1], CHECK_LABEL, hashlib.sha256).digest()
+        legacy = self._read_legacy()
+        self._open(_aead(keys[0]), self._header(salt, check))
+        for entry in legacy:
+            self._apply(entry)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._write_all(path)
+        if legacy:
+            # The plaintext copy is what the vault replaces
+            os.remove(self._legacy_path())
+        return len(legacy)
+
+    def _read_legacy(self):
+        try:
+            with open(self._legacy_path(), 'r', encoding='utf-8') as f:
+                rows = json.load(f)
+        except FileNotFoundError:
+            return []
+        except (OSError, ValueError) as e:
+            raise VaultError(f"Could not read {LEGACY_FILE}: {e}")
+        entries = []
+        for row in rows if isinstance(rows, list) else []:
+            if isinstance(row, dict) and row.get('password'):
+                entries.append(self._entry(row.get('service'), row.get('username'), row['password'],
+                                           entry_id=row.get('id'), timestamp=row.get('timestamp')))
+        return entries
+
+    @staticmethod
+    def _read_header(data):
+        """(header bytes, salt, check, KDF cost)."""
+        if data[:len(MAGIC)] != MAGIC or len(data) < len(MAGIC) + _LEN.size:
+            raise VaultError("Not a vault file")
+        (length,) = _LEN.unpack_from(data, len(MAGIC))
+        end = len(MAGIC) + _LEN.size + length
+        try:
+            header = json.loads(data[len(MAGIC) + _LEN.size:end].decode('utf-8'))
+            salt, check = bytes.fromhex(header['salt']), bytes.fromhex(header['check'])
+            cost = (header['n'], header['r'], header['p'])
+        except (ValueError, KeyError, TypeError) as e:
+            raise VaultError(f"Damaged vault header: {e}")
+        check_cost(*cost)
+        return data[:end], salt, check, cost
+
+    def _load(self, path, password):
+        with open(path, 'rb') as f:
+            data = f.read()
+        header, salt, check, cost = self._read_header(data)
+        keys = derive_keys(password, salt, *cost)
+        if not hmac.compare_digest(check, hmac.new(keys[1], CHECK_LABEL, hashlib.sha256).digest()):
+            raise VaultError("Wrong master password")
+        self._replay(path, data, header, _aead(keys[0]))
+
+    @staticmethod
+    def _frames_in(data, offset):
+        """(offset, blob) of each complete length-prefixed record from offset on."""
+        while offset + _LEN.size <= len(data):
+            (length,) = _LEN.unpack_from(data, offset)
+            end = offset + _LEN.size + length
+            if end > len(data):
+                return
+            yield offset, data[offset + _LEN.size:end]
+            offset = end
+
+    def _replay_record(self, record):
+        if record.get('op') == 'del':
+            if self._entries.pop(record.get('id'), None) is not None:
+                self._index.pop(record['id'], None)
+                self._dead += 1
+            self._dead += 1
+        else:
+            record.pop('op', None)
+            self._apply(record)
+
+    def _replay(self, path, data, header, cipher):
+        """Rebuilds the logins from the records after the header."""
+        self._open(cipher, header)
+        offset = len(header)
+        flags = FINAL
+        for start, blob in self._frames_in(data, offset):
+            try:
+                flags, plaintext = open_sealed(self._cipher, self._header_hash, self._seq, blob)
+                record = json.loads(plaintext.decode('utf-8'))
+            except (VaultError, ValueError):
+                # A torn append leaves a cut-off record (never yielded) or zeroed bytes;
+                # a whole record that fails is damage, even at the end
+                if data[start:].strip(b"\0"):
+                    self._clear()
+                    raise VaultError("Vault is damaged (a record failed authentication)")
+                break
+            self._replay_record(record)
+            self._seq += 1
+            offset = start + _LEN.size + len(blob)
+        if not flags & FINAL:
+            # Appends are one FINAL record and rewrites are atomic, so this is a cut-off file
+            self._clear()
+            raise VaultError("Vault is damaged (records are missing at the end)")
+        if offset < len(data):
+            # An append was cut short (crash, full disk): drop the partial record
+            self.api.log(f"[Vault] Dropping {len(data) - offset} bytes of an incomplete record", "WARNING")
+            with open(path, 'r+b') as f:
+                f.truncate(offset)
+        self._size = offset
+        self._stat = self._file_id(os.stat(path))
+
+    def _refresh(self):
+        """Re-reads vault.dat if something else replaced it; locks if it can't."""
+        path = self._path()
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            self._clear()
+            raise VaultError("The vault file is gone; unlock again")
+        if self._file_id(st) == self._stat:
+            return
+        with open(path, 'rb') as f:
+            data = f.read()
+        try:
+            header = self._read_header(data)[0]
+        except VaultError:
+            header = None
+        if header != self._header_bytes:
+            self._clear()
+            raise VaultError("The vault file was replaced; unlock it again")
+        self.api.log("[Vault] vault.dat changed on disk, reloading it")
+        self._replay(path, data, header, self._cipher)
+
+    # --- Records ---
+
+    def _entry(self, service, username, password, entry_id=None, timestamp=None):
+        return {
+            'id': str(entry_id) if entry_id is not None else uuid.uuid4().hex[:12],
+            'service': str(service or ''),
+            'username': str(username or ''),
+            'password': str(password),
+            'timestamp': timestamp or time.strftime('%Y-%m-%dT%H:%M:%S'),
+        }
+
+    def _apply(self, entry):
+        if entry['id'] in self._entries:
+            self._dead += 1
+            del self._entries[entry['id']]
+        self._entries[entry['id']] = entry
+        self._index[entry['id']] = f"{entry['service']}\n{entry['username']}".lower()
+
+    def _frames(self, records, seq):
+        """The records sealed as one write, numbered from seq; the last is FINAL."""
+        frames = []
+        for i, record in enumerate(records):
+            blob = seal(self._cipher, self._header_hash, seq + i, FINAL if i == len(records) - 1 else 0,
+                        json.dumps(record, separators=(',', ':')).encode('utf-8'))
+            frames.append(_LEN.pack(len(blob)) + blob)
+        return b"".join(frames)
+
+    def _append(self, record):
+        frame = self._frames([record], self._seq)
+        path = self._path()
+        with open(path, 'r+b') as f:
+            if self._file_id(os.fstat(f.fileno())) != self._stat:
+                raise VaultError("The vault file changed while saving; try again")
+            f.truncate(self._size)  # never append after a partial record
+            f.seek(self._size)
+            f.write(frame)
+            f.flush()
+            os.fsync(f.fileno())
+            self._stat = self._file_id(os.fstat(f.fileno()))
+        self._size += len(frame)
+        self._seq += 1
+
+    def _require(self):
+        if not self.unlocked:
+            raise VaultError("Vault is locked")
+        self._refresh()
+
+    def add(self, service, username, password):
+        if not password:
+            raise VaultError("Password is empty")
+        with self._lock:
+            self._require()
+            entry = self._entry(service, username, password)
+            self._append({'op': 'put', **entry})
+            self._apply(entry)
+            return self._public(entry)
+
+    def delete(self, entry_id):
+        with self._lock:
+            self._require()
+            entry_id = str(entry_id)
+            if entry_id not in self._entries:
+                return False
+            self._append({'op': 'del', 'id': entry_id})
+            del self._entries[entry_id]
+            del self._index[entry_id]
+            self._dead += 2  # the put and the delete
+            self._maybe_compact()
+            return True
+
+    def password(self, entry_id):
+        with self._lock:
+            self._require()
+            entry = self._entries.get(str(entry_id))
+            if entry is None:
+                raise VaultError("No such login")
+            return entry['password']
+
+    def _public(self, entry):
+        return {k: entry[k] for k in ('id', 'service', 'username', 'timestamp')}
+
+    def search(self, query='', limit=SEARCH_LIMIT):
+        """Newest first; every space-separated word must appear in the service or username."""
+        with self._lock:
+            self._require()
+            words = (query or '').lower().split()
+            matches = []
+            total = 0
+            for entry_id in reversed(self._entries):
+                text = self._index[entry_id]
+                if all(word in text for word in words):
+                    total += 1
+                    if len(matches) < limit:
+                        matches.append(self._public(self._entries[entry_id]))
+            return {'entries': matches, 'total': total, 'count': len(self._entries)}
+
+    # --- Compaction ---
+
+    def _maybe_compact(self):
+        if self._dead >= COMPACT_MIN_DEAD and self._dead > len(self._entries):
+            try:
+                self._compact()
+            except Exception as e:
+                self.api.log(f"[Vault] Compaction failed, keeping the log as is: {e}", "WARNING")
+
+    def _compact(self):
+        self._refresh()
+        self._write_all(self._path())
+        self.api.log(f"[Vault] Compacted: dropped {self._dead} dead records, {len(self._entries)} live")
+        self._dead = 0
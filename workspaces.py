@@ -0,0 +1,140 @@
+import os
+import json
+import time
+import uuid
+import threading
+
+MAIN_WORKSPACE = 'main'
+
+
+class WorkspaceManager:
+    """Tracks virtual desktops. Each one persists its items separately.
+
+    The main workspace keeps living in config.json (desktop_items) so older
+    data dirs keep working. Every other workspace is stored in
+    workspaces/<id>.json and is only read when it becomes active or a
+    neighbour of the active one.
+    """
+
+    def __init__(self, api):
+        self.api = api
+        self._cache = {}
+        self._index = None
+        self._lock = threading.RLock()
+
+    def _dir(self):
+        return os.path.join(self.api._get_share_dir(), "workspaces")
+
+    def _index_path(self):
+        return os.path.join(self._dir(), "index.json")
+
+    def _items_path(self, workspace_id):
+        return os.path.join(self._dir(), os.path.basename(workspace_id) + ".json")
+
+    def index(self):
+        with self._lock:
+            if self._index is None:
+                self._index = {
+                    'active': MAIN_WORKSPACE,
+                    'workspaces': [{'id': MAIN_WORKSPACE, 'name': 'Desktop 1'}]
+                }
+                path = self._index_path()
+                if os.path.exists(path):
+                    try:
+                        with open(path, 'r', encoding='utf-8') as f:
+                            self._index = json.load(f)
+                    except Exception as e:
+                        self.api.log(f"[Workspaces] Index unreadable, using defaults: {e}", "WARNING")
+            return self._index
+
+    @property
+    def active(self):
+        return self.index().get('active', MAIN_WORKSPACE)
+
+    def reset(self):
+        """Forgets cached state, e.g. after the data directory changed."""
+        with self._lock:
+            self._index = None
+            self._cache.clear()
+
+    def _save_index(self):
+        os.makedirs(self._dir(), exist_ok=True)
+        self.api._write_atomic(self._index_path(), json.dumps(self._index, indent=4))
+
+    def exists(self, workspace_id):
+        return any(w['id'] == workspace_id for w in self.index()['workspaces'])
+
+    def create(self, name):
+        with self._lock:
+            index = self.index()
+            workspace_id = f"ws-{int(time.time() * 1000)}-{uuid.uuid4().hex[:6]}"
+            index['workspaces'].append({'id': workspace_id, 'name': name or f"Desktop {len(index['workspaces']) + 1}"})
+            self._cache[workspace_id] = []
+            self.save_items(workspace_id, [])
+            self._save_index()
+        return workspace_id
+
+    def rename(self, workspace_id, name):
+        with self._lock:
+            for workspace in self.index()['workspaces']:
+                if workspace['id'] == workspace_id:
+                    workspace['name'] = name
+                    self._save_index()
+                    return True
+        return False
+
+    def delete(self, workspace_id):
+        if workspace_id == MAIN_WORKSPACE:
+            raise ValueError("The main workspace cannot be deleted")
+        with self._lock:
+            index = self.index()
+            index['workspaces'] = [w for w in index['workspaces'] if w['id'] != workspace_id]
+            if index.get('active') == workspace_id:
+                index['active'] = MAIN_WORKSPACE
+            self._cache.pop(workspace_id, None)
+            path = self._items_path(workspace_id)
+            if os.path.exists(path):
+                os.remove(path)
+            self._save_index()
+
+    def set_active(self, workspace_id):
+        if not self.exists(workspace_id):
+            raise ValueError(f"Unknown workspace: {workspace_id}")
+        with self._lock:
+            self.index()['active'] = workspace_id
+            self._save_index()
+
+    def load_items(self, workspace_id):
+        """Returns the items of a non-main workspace (cached after first read)."""
+        with self._lock:
+            if workspace_id in self._cache:
+                return self._cache[workspace_id]
+        items = []
+        path = self._items_path(workspace_id)
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                items = json.load(f).get('items', [])
+        with self._lock:
+            self._cache.setdefault(workspace_id, items)
+            return self._cache[workspace_id]
+
+    def save_items(self, workspace_id, items):
+        os.makedirs(self._dir(), exist_ok=True)
+        self.api._write_atomic(self._items_path(workspace_id), json.dumps({'items': items}, indent=4))
+        with self._lock:
+            self._cache[workspace_id] = items
+
+    def neighbours(self, workspace_id):
+        ids = [w['id'] for w in self.index()['workspaces']]
+        if workspace_id not in ids:
+            return []
+        pos = ids.index(workspace_id)
+        return [ids[i] for i in (pos - 1, pos + 1) if 0 <= i < len(ids) and ids[i] != MAIN_WORKSPACE]
+
+    def prefetch_neighbours(self, workspace_id):
+        """Parses adjacent workspaces in the background so switching is instant."""
+        for neighbour in self.neighbours(workspace_id):
+            try:
+                self.load_items(neighbour)
+            except Exception as e:
+                self.api.log(f"[Workspaces] Prefetch failed for {neighbour}: {e}", "WARNING")